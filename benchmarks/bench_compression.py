@@ -0,0 +1,132 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+"""Benchmark of the compression and quantization options of preloaded cubes.
+
+Writes a synthetic daily cube with smooth spatial patterns and noise, similar
+to the FLUXCOM-X-BASE fluxes, to Zarr with each option, and reports the
+compression ratio, the time to encode and write the cube, and the time to
+read it back. Run from the repository root with::
+
+    python -m benchmarks.bench_compression
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import dask.array as da
+import numpy as np
+import xarray as xr
+
+from xcube_icosdp.constants import ZARR_FORMAT
+from xcube_icosdp.encoding import bitround, get_encoding
+
+OPTIONS = [
+    dict(name="default"),
+    dict(name="zlib", compression="zlib"),
+    dict(name="lz4", compression="lz4"),
+    dict(name="zstd", compression="zstd"),
+    dict(name="zstd-noshuffle", compression="zstd", shuffle=False),
+    dict(name="zstd-keepbits10", compression="zstd", keepbits=10),
+    dict(name="zstd-keepbits7", compression="zstd", keepbits=7),
+    dict(name="zstd-int16", compression="zstd", pack_int16=("NEE",)),
+]
+
+
+def get_dataset(days: int) -> xr.Dataset:
+    lat = np.arange(89.75, -90, -0.5)
+    lon = np.arange(-179.75, 180, 0.5)
+    time_ = np.datetime64("2020-01-01") + np.arange(days).astype("timedelta64[D]")
+    rng = np.random.default_rng(0)
+    pattern = np.cos(np.deg2rad(lat))[:, None] * np.sin(np.deg2rad(lon))[None, :]
+    season = np.sin(2 * np.pi * np.arange(days) / 365.0)
+    data = (
+        season[:, None, None] * pattern[None]
+        + 0.1 * rng.standard_normal((days, lat.size, lon.size))
+    ).astype(np.float32)
+    return xr.Dataset(
+        dict(NEE=(("time", "lat", "lon"), da.from_array(data, chunks=(30, -1, -1)))),
+        coords=dict(time=time_, lat=lat, lon=lon),
+    )
+
+
+def bench_option(ds: xr.Dataset, option: dict, path: str) -> dict:
+    source = ds
+    t0 = time.perf_counter()
+    if "keepbits" in option:
+        ds = bitround(ds, option["keepbits"])
+    if "compression" in option:
+        encoding = get_encoding(
+            ds,
+            compression=option["compression"],
+            shuffle=option.get("shuffle", True),
+            pack_int16=option.get("pack_int16", ()),
+        )
+    else:
+        encoding = None
+    ds.to_zarr(path, mode="w", encoding=encoding, zarr_format=ZARR_FORMAT)
+    encode_time = time.perf_counter() - t0
+    size = sum(
+        os.path.getsize(os.path.join(root, file_name))
+        for root, _, file_names in os.walk(path)
+        for file_name in file_names
+    )
+    t0 = time.perf_counter()
+    values = xr.open_zarr(path)["NEE"].values
+    read_time = time.perf_counter() - t0
+    error = np.abs(values - source["NEE"].values).max()
+    return dict(
+        name=option["name"],
+        ratio=source.nbytes / size,
+        encode_time=encode_time,
+        read_time=read_time,
+        max_error=float(error),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--days", type=int, default=365, help="Number of days of the cube"
+    )
+    args = parser.parse_args()
+
+    ds = get_dataset(args.days).persist()
+    temp_dir = tempfile.mkdtemp()
+    try:
+        results = [
+            bench_option(ds, option, os.path.join(temp_dir, f"{option['name']}.zarr"))
+            for option in OPTIONS
+        ]
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    print(
+        f"{'option':>16} {'ratio':>7} {'encode [s]':>11} {'read [s]':>9} "
+        f"{'max error':>10}"
+    )
+    for result in results:
+        print(
+            f"{result['name']:>16} {result['ratio']:>7.2f} "
+            f"{result['encode_time']:>11.2f} {result['read_time']:>9.2f} "
+            f"{result['max_error']:>10.2g}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+"""Benchmark of concurrent multi-year downloads against the local stand-in.
+
+Run from the repository root with::
+
+    python -m benchmarks.bench_download
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+
+from xcube_icosdp.download import download_year_objects
+
+from .stand_in import IcosStandInServer
+
+
+def bench_download(server: IcosStandInServer, agg_mode: str, max_workers: int) -> dict:
+    icos_meta, icos_data = server.new_clients()
+    folder = tempfile.mkdtemp(prefix="icosdp_bench_")
+    try:
+        t0 = time.perf_counter()
+        meta_years = icos_meta.get_collection_meta("collection").members
+        file_names = download_year_objects(
+            icos_meta,
+            icos_data,
+            meta_years,
+            agg_mode,
+            folder,
+            max_workers=max_workers,
+        )
+        duration = time.perf_counter() - t0
+    finally:
+        shutil.rmtree(folder)
+    return dict(max_workers=max_workers, num_files=len(file_names), duration=duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, default=21)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--bandwidth", type=float, default=20e6)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    agg_mode = "050_monthly"
+    with IcosStandInServer(
+        years=range(2001, 2001 + args.years),
+        agg_modes=(agg_mode,),
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+    ) as server:
+        results = [
+            bench_download(server, agg_mode, max_workers)
+            for max_workers in args.workers
+        ]
+    baseline = results[0]["duration"]
+    print(f"{'max_workers':>12} {'files':>6} {'time [s]':>9} {'speedup':>8}")
+    for result in results:
+        print(
+            f"{result['max_workers']:>12} {result['num_files']:>6} "
+            f"{result['duration']:>9.2f} {baseline / result['duration']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+"""Benchmark of flattening the time and hour dimensions of the hourly cube.
+
+Compares the former stack-based implementation of ``_flatten_time_hour``
+with the current one on the synthetic 0.05° hourly cube. Run from the
+repository root with::
+
+    python -m benchmarks.bench_flatten
+"""
+
+import argparse
+import time
+from typing import Callable
+
+import numpy as np
+import xarray as xr
+
+from xcube_icosdp.utils import _flatten_time_hour
+
+from .datasets import get_hourly_005_dataset
+
+
+def flatten_time_hour_stack(ds: xr.Dataset) -> xr.Dataset:
+    """Former implementation based on ``Dataset.stack``."""
+    times = ds["time"].values
+    hours = ds["hour"].values
+    date_times = np.array(
+        [t + np.timedelta64(int(h), "h") for t in times for h in hours],
+        dtype="datetime64[ns]",
+    )
+    ds_stacked = ds.stack({"time_new": ("time", "hour")})
+    ds_stacked = ds_stacked.drop_vars(["time_new", "time", "hour", "hour_bnds"])
+    ds_stacked = ds_stacked.rename({"time_new": "time"})
+    ds_stacked = ds_stacked.assign_coords({"time": date_times})
+    ds_stacked = ds_stacked.transpose("time", "lat", "lon", ...)
+    return ds_stacked
+
+
+def bench_flatten(
+    name: str, flatten: Callable[[xr.Dataset], xr.Dataset], ds: xr.Dataset, days: int
+) -> dict:
+    t0 = time.perf_counter()
+    ds_flat = flatten(ds)
+    build_time = time.perf_counter() - t0
+    nee = ds_flat["NEE"].data
+    # compute one chunk column of a small region
+    subset = ds_flat["NEE"].isel(time=slice(0, days * 24), lat=slice(0, 40))
+    subset = subset.isel(lon=slice(0, 40))
+    t0 = time.perf_counter()
+    subset.compute()
+    compute_time = time.perf_counter() - t0
+    return dict(
+        name=name,
+        build_time=build_time,
+        compute_time=compute_time,
+        num_tasks=len(nee.__dask_graph__()),
+        chunk_size=nee.chunksize,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--days", type=int, default=366, help="Number of days of the computed subset"
+    )
+    args = parser.parse_args()
+
+    ds = get_hourly_005_dataset()
+    results = [
+        bench_flatten("stack", flatten_time_hour_stack, ds, args.days),
+        bench_flatten("reshape", _flatten_time_hour, ds, args.days),
+    ]
+    print(
+        f"{'method':>8} {'build [s]':>10} {'compute [s]':>12} {'tasks':>8} "
+        f"{'chunk size':>20}"
+    )
+    for result in results:
+        print(
+            f"{result['name']:>8} {result['build_time']:>10.2f} "
+            f"{result['compute_time']:>12.2f} {result['num_tasks']:>8} "
+            f"{str(result['chunk_size']):>20}"
+        )
+
+
+if __name__ == "__main__":
+    main()
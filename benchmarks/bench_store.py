@@ -0,0 +1,202 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+"""Benchmark suite of the data store and the preload handle.
+
+Measures wall time, peak memory and bytes read and written of
+
+* ``IcosdpDataStore.open_data`` for all combinations of ``time_range``,
+  ``bbox`` and ``flatten_time``, reading a subset of the synthetic 0.05°
+  hourly cube from a local Zarr dataset,
+* ``IcosdpDataStore.describe_data`` with a cold and a warm catalog, and
+* ``IcosdpPreloadHandle.preload_data`` for each aggregation mode and target
+  format, downloading from the local ICOS stand-in.
+
+Run from the repository root with::
+
+    python -m benchmarks.bench_store
+
+Results can be saved with ``--save results.json`` and compared to earlier
+results with ``--baseline results.json``.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+import dask.array as da
+
+from xcube_icosdp.constants import FluxcomBaseDataIdsUri
+
+from .datasets import AGG_MODE_NAMES, get_hourly_005_dataset
+from .measure import format_results, run_measured
+from .stand_in import IcosStandInServer, StandInDataClient, StandInMetaClient
+
+DATA_ID = "FLUXCOM-X-BASE_NEE"
+BBOX = [0, 40, 10, 50]
+TIME_RANGE = ("2001-01-01", "2001-01-02")
+
+
+def write_hourly_cube(path: str, days: int) -> None:
+    """Write a subset of the synthetic 0.05° hourly cube around the benchmark
+    bbox to a local Zarr dataset, filled with random values."""
+    ds = get_hourly_005_dataset()
+    ds = ds.isel(time=slice(0, days), lat=slice(700, 1100), lon=slice(3500, 4100))
+    nee = ds["NEE"]
+    ds["NEE"] = nee.copy(
+        data=da.random.random(nee.shape, chunks=(days, 24, 40, 40)).astype("float32")
+    )
+    ds = ds.chunk(dict(time=days, hour=24, lat=40, lon=40))
+    for var in ds.variables.values():
+        var.encoding = {}
+    ds.to_zarr(path, mode="w")
+
+
+def new_store(cube_path: str, root: str):
+    from xcube.core.store import new_data_store
+
+    patch.dict(
+        FluxcomBaseDataIdsUri.datasets[DATA_ID].agg_mode, {"005_hourly": cube_path}
+    ).start()
+    return new_data_store(
+        "icosdp",
+        cache_store_params=dict(root=os.path.join(root, "cache")),
+        raw_cache_size=0,
+    )
+
+
+def bench_open_data(cube_path: str, root: str, open_params: dict) -> None:
+    store = new_store(cube_path, root)
+    ds = store.open_data(DATA_ID, **open_params)
+    ds["NEE"].mean().compute()
+
+
+def bench_describe_data(cube_path: str, root: str) -> None:
+    store = new_store(cube_path, root)
+    store.describe_data(DATA_ID)
+
+
+def bench_preload_data(base_url: str, root: str, preload_params: dict) -> None:
+    from xcube.core.store import new_data_store
+
+    from xcube_icosdp.preload import IcosdpPreloadHandle
+
+    # the processing folder is created in the working directory
+    os.chdir(root)
+    cache_store = new_data_store("file", root=os.path.join(root, "cache"))
+    handle = IcosdpPreloadHandle(
+        cache_store,
+        StandInMetaClient(base_url),
+        StandInDataClient(),
+        DATA_ID,
+        silent=True,
+        **preload_params,
+    )
+    state = handle.get_state(DATA_ID)
+    if state.exception is not None:
+        raise state.exception
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--days", type=int, default=4, help="Number of days of the hourly cube"
+    )
+    parser.add_argument(
+        "--years", type=int, default=2, help="Number of years served for preload"
+    )
+    parser.add_argument(
+        "--spatial-res",
+        type=float,
+        default=2.0,
+        help="Spatial resolution of all served yearly files in degree",
+    )
+    parser.add_argument(
+        "--filter", default="", help="Run only cases containing this string"
+    )
+    parser.add_argument("--save", help="Save the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare to results in this JSON file")
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp(prefix="icosdp_bench_")
+    cube_path = os.path.join(temp_dir, "NEE.zarr")
+    results = {}
+
+    def run(name: str, func, source: str, *func_args, setup=None):
+        if args.filter not in name:
+            return
+        root = tempfile.mkdtemp(dir=temp_dir)
+        results[name] = run_measured(func, source, root, *func_args, setup=setup)
+        shutil.rmtree(root)
+        print(f"{name}: {'failed' if 'error' in results[name] else 'done'}")
+
+    try:
+        write_hourly_cube(cube_path, args.days)
+        for time_range, bbox, flatten_time in itertools.product(
+            (None, TIME_RANGE), (None, BBOX), (False, True)
+        ):
+            open_params = dict(flatten_time=flatten_time)
+            if time_range:
+                open_params["time_range"] = time_range
+            if bbox:
+                open_params["bbox"] = bbox
+            name = "open_data " + " ".join(
+                key for key, value in open_params.items() if value
+            )
+            run(name.strip(), bench_open_data, cube_path, open_params)
+        run("describe_data cold", bench_describe_data, cube_path)
+        run(
+            "describe_data warm",
+            bench_describe_data,
+            cube_path,
+            setup=bench_describe_data,
+        )
+
+        with IcosStandInServer(
+            years=range(2001, 2001 + args.years),
+            agg_modes=AGG_MODE_NAMES.keys(),
+            spatial_res=args.spatial_res,
+            latency=0.0,
+            bandwidth=None,
+        ) as server:
+            for agg_mode, target_format in itertools.product(
+                AGG_MODE_NAMES, ("zarr", "netcdf")
+            ):
+                run(
+                    f"preload_data {agg_mode} {target_format}",
+                    bench_preload_data,
+                    server.base_url,
+                    dict(agg_mode=agg_mode, target_format=target_format),
+                )
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+    print(format_results(results, baseline))
+    if args.save:
+        with open(args.save, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+"""Synthetic FLUXCOM-X-BASE datasets used by the benchmarks and the tests."""
+
+import dask.array as da
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+
+def get_hourly_005_dataset() -> xr.Dataset:
+    """Lazy synthetic dataset of the 0.05 degree hourly FLUXCOM-X-BASE cube
+    of 2001 to 2021, filled with zeros."""
+    # Dimensions
+    time = pd.date_range("2001-01-01", "2021-12-31", freq="D")
+    hour = np.arange(0, 24, 1)
+    lat = np.linspace(89.97, -89.97, 3600)
+    lon = np.linspace(-180.0, 180.0, 7200)
+    nbnds = 2
+
+    # Build Dataset lazily with Dask
+    ds = xr.Dataset(
+        data_vars={
+            "NEE": (
+                ("time", "hour", "lat", "lon"),
+                da.zeros(
+                    (len(time), len(hour), len(lat), len(lon)),
+                    chunks=(1461, 24, 40, 40),  # adjust chunk sizes to taste
+                    dtype="float32",
+                ),
+            ),
+            "land_fraction": (
+                ("lat", "lon"),
+                da.full(
+                    (len(lat), len(lon)),
+                    fill_value=1.0,
+                    chunks=(40, 40),
+                    dtype="float64",
+                ),
+            ),
+        },
+        coords={
+            "time": time,
+            "hour": hour,
+            "lat": lat,
+            "lon": lon,
+            "hour_bnds": (("hour", "nbnds"), np.zeros((len(hour), nbnds), dtype=int)),
+            "lat_bnds": (("lat", "nbnds"), np.zeros((len(lat), nbnds))),
+            "lon_bnds": (("lon", "nbnds"), np.zeros((len(lon), nbnds))),
+        },
+        attrs={
+            "contact": "The FLUXCOM-X team, fluxcomx@bgc-jena.mpg.de",
+            "contributor": "Mock contributor",
+            "conventions": "CF-1.8",
+            "creation_date": "mock",
+            "crs": "WGS 84 / Plate Carree",
+            "publisher_url": "http://fluxcom.org/",
+            "source": "Mock source",
+            "time_coverage_start": "2001-01-01T00:00:00",
+            "time_coverage_end": "2021-12-31T00:00:00",
+        },
+    )
+    return ds
+
+
+AGG_MODE_NAMES = {
+    "050_monthly": "0.5 degree monthly",
+    "025_monthlycycle": "0.25 degree monthly diurnal cycle",
+    "025_daily": "0.25 degree daily",
+    "005_monthly": "0.05 degree monthly",
+}
+
+
+def get_yearly_dataset(
+    var_name: str, year: int, agg_mode: str, spatial_res: float = 2.0
+) -> xr.Dataset:
+    """Synthetic yearly dataset as published in the ICOS FLUXCOM-X-BASE
+    collections. A coarse grid is used by default to keep the files small."""
+    freq = agg_mode.split("_")[1]
+    if freq == "daily":
+        time = pd.date_range(f"{year}-01-01", f"{year}-12-31", freq="D")
+    else:
+        time = pd.date_range(f"{year}-01-01", f"{year}-12-01", freq="MS")
+    lat = np.arange(90 - spatial_res / 2, -90, -spatial_res)
+    lon = np.arange(-180 + spatial_res / 2, 180, spatial_res)
+    dims = ("time", "lat", "lon")
+    coords = dict(time=time, lat=lat, lon=lon)
+    if freq == "monthlycycle":
+        dims = ("time", "hour", "lat", "lon")
+        coords["hour"] = np.arange(24)
+    shape = tuple(len(coords[dim]) for dim in dims)
+    data = np.full(shape, year, dtype="float32")
+    return xr.Dataset(
+        data_vars={
+            var_name: (dims, data),
+            "land_fraction": (("lat", "lon"), np.ones((len(lat), len(lon)))),
+        },
+        coords=coords,
+        attrs=dict(title=f"FLUXCOM-X-BASE {var_name} {year}"),
+    )
@@ -0,0 +1,179 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+"""Measurement of wall time, peak memory and I/O of benchmark cases.
+
+Each case runs in a fresh process, so that the peak resident set size and
+the I/O counters are not affected by other cases.
+"""
+
+import multiprocessing
+import os
+import resource
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Callable
+
+MiB = 1024**2
+# ratio of wall time or peak memory to the baseline flagged as regression
+REGRESSION_THRESHOLD = 1.25
+# wall time differences below this are considered noise
+REGRESSION_MIN_SECONDS = 0.05
+
+
+def run_measured(
+    func: Callable[..., Any],
+    *args: Any,
+    setup: Callable[..., Any] | None = None,
+) -> dict[str, Any]:
+    """Run ``func(*args)`` in a new process and measure it.
+
+    Args:
+        func: The benchmarked function. Must be importable by name.
+        args: Arguments passed to *func* and *setup*.
+        setup: Optional function called with *args* before the
+            measurement starts, e.g. to warm up caches.
+
+    Returns:
+        Dictionary with the wall time in seconds, the peak resident set size
+        of the process, its growth during the run of *func*, and the bytes
+        read and written during the run, or the error if it failed. The I/O
+        counters include reads and writes of files and sockets. Growth and
+        I/O counters are only available on Linux.
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_child, args=(queue, func, args, setup))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def _run_child(queue, func, args, setup):
+    try:
+        if setup is not None:
+            setup(*args)
+        sampler = _RssSampler()
+        io_start = _read_io()
+        t0 = time.perf_counter()
+        with sampler:
+            func(*args)
+        wall_time = time.perf_counter() - t0
+        io_end = _read_io()
+        result = dict(wall_time=wall_time, peak_rss=_get_peak_rss())
+        if sampler.start_rss is not None:
+            result["rss_growth"] = sampler.peak_rss - sampler.start_rss
+        if io_start and io_end:
+            result["bytes_read"] = io_end[0] - io_start[0]
+            result["bytes_written"] = io_end[1] - io_start[1]
+    except Exception:
+        result = dict(error=traceback.format_exc())
+    queue.put(result)
+
+
+class _RssSampler:
+    """Samples the resident set size in a background thread, since the peak
+    reported by the OS cannot be reset after the imports of a case."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.start_rss = _read_rss()
+        self.peak_rss = self.start_rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        if self.start_rss is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._sample()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = _read_rss()
+        if rss is not None and self.peak_rss is not None:
+            self.peak_rss = max(self.peak_rss, rss)
+
+
+def _get_peak_rss() -> int:
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+def _read_rss() -> int | None:
+    try:
+        with open(f"/proc/{os.getpid()}/statm") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+def _read_io() -> tuple[int, int] | None:
+    try:
+        with open(f"/proc/{os.getpid()}/io") as fp:
+            counters = dict(line.split(": ") for line in fp.read().splitlines())
+    except OSError:
+        return None
+    return int(counters["rchar"]), int(counters["wchar"])
+
+
+def format_results(results: dict[str, dict], baseline: dict[str, dict] = None) -> str:
+    """Format measured results as table. If *baseline* results are given,
+    the ratios of the wall time and peak memory are added, and regressions
+    are flagged with "!"."""
+    header = (
+        f"{'case':<40} {'wall [s]':>9} {'peak RSS [MiB]':>15} "
+        f"{'RSS growth [MiB]':>17} {'read [MiB]':>11} {'written [MiB]':>14}"
+    )
+    if baseline is not None:
+        header += f" {'wall ratio':>11} {'RSS ratio':>10}"
+    lines = [header]
+    for name, result in results.items():
+        if "error" in result:
+            lines.append(f"{name:<40} failed: {result['error'].splitlines()[-1]}")
+            continue
+        line = (
+            f"{name:<40} {result['wall_time']:>9.3f} "
+            f"{result['peak_rss'] / MiB:>15.1f} "
+            f"{result.get('rss_growth', float('nan')) / MiB:>17.1f} "
+            f"{result.get('bytes_read', float('nan')) / MiB:>11.1f} "
+            f"{result.get('bytes_written', float('nan')) / MiB:>14.1f}"
+        )
+        base = (baseline or {}).get(name)
+        if base and "wall_time" in base:
+            wall_ratio = result["wall_time"] / base["wall_time"]
+            rss_ratio = result["peak_rss"] / base["peak_rss"]
+            line += f" {wall_ratio:>11.2f} {rss_ratio:>10.2f}"
+            wall_regression = (
+                wall_ratio > REGRESSION_THRESHOLD
+                and result["wall_time"] - base["wall_time"] > REGRESSION_MIN_SECONDS
+            )
+            if wall_regression or rss_ratio > REGRESSION_THRESHOLD:
+                line += " !"
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,199 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+"""Local HTTP stand-in for the ICOS metadata and data clients.
+
+The server publishes a synthetic FLUXCOM-X-BASE collection with one member
+collection per year and serves synthetic yearly NetCDF files. Each request is
+delayed by a fixed latency and each response stream is throttled to a fixed
+bandwidth, so that the effect of concurrent downloads can be measured offline.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Iterable
+
+from .datasets import AGG_MODE_NAMES, get_yearly_dataset
+
+
+class IcosStandInServer:
+    """Local HTTP server standing in for the ICOS metadata and data services.
+
+    Args:
+        var_name: Variable name, e.g. "NEE".
+        years: Years published in the collection.
+        agg_modes: Aggregation modes for which files are generated.
+        spatial_res: Spatial resolution of the synthetic files in degree.
+        latency: Delay of every request in seconds.
+        bandwidth: Throughput limit of every response in bytes per second.
+            If None, responses are not throttled.
+    """
+
+    def __init__(
+        self,
+        var_name: str = "NEE",
+        years: Iterable[int] = range(2001, 2022),
+        agg_modes: Iterable[str] = ("050_monthly",),
+        spatial_res: float = 0.5,
+        latency: float = 0.05,
+        bandwidth: float | None = 50e6,
+    ):
+        self.var_name = var_name
+        self.years = list(years)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self._folder = tempfile.mkdtemp(prefix="icosdp_stand_in_")
+        self._hashes: dict[str, str] = {}
+        for year in self.years:
+            for agg_mode in agg_modes:
+                ds = get_yearly_dataset(var_name, year, agg_mode, spatial_res)
+                file_name = self._file_name(year, agg_mode)
+                path = os.path.join(self._folder, file_name)
+                ds.to_netcdf(path)
+                with open(path, "rb") as fp:
+                    self._hashes[file_name] = hashlib.sha256(fp.read()).hexdigest()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def folder(self) -> str:
+        return self._folder
+
+    def start(self) -> "IcosStandInServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        shutil.rmtree(self._folder, ignore_errors=True)
+
+    def __enter__(self) -> "IcosStandInServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def new_clients(self) -> tuple["StandInMetaClient", "StandInDataClient"]:
+        """Create metadata and data clients connected to this server."""
+        return StandInMetaClient(self.base_url), StandInDataClient()
+
+    def _file_name(self, year: int, agg_mode: str) -> str:
+        return f"{self.var_name}_{year}_{agg_mode}.nc"
+
+    def _get_meta(self, path: str) -> dict:
+        if path.startswith("/meta/years/"):
+            year = int(path.split("/")[-1])
+            members = [
+                dict(
+                    res=f"{self.base_url}/objects/{self._file_name(year, agg_mode)}",
+                    hash=self._hashes[self._file_name(year, agg_mode)],
+                    name=f"FLUXCOM-X-BASE {self.var_name} {name} {year}",
+                )
+                for agg_mode, name in AGG_MODE_NAMES.items()
+                if self._file_name(year, agg_mode) in self._hashes
+            ]
+        else:
+            members = [
+                dict(
+                    res=f"{self.base_url}/meta/years/{year}",
+                    title=f"FLUXCOM-X-BASE {self.var_name} {year}",
+                )
+                for year in self.years
+            ]
+        return dict(
+            title=f"FLUXCOM-X-BASE {self.var_name}",
+            description=None,
+            doi=None,
+            members=members,
+        )
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(server.latency)
+                if self.path.startswith("/meta/"):
+                    body = json.dumps(server._get_meta(self.path)).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                file_name = self.path.split("/")[-1]
+                path = os.path.join(server.folder, file_name)
+                if not self.path.startswith("/objects/") or not os.path.isfile(path):
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", str(os.path.getsize(path)))
+                self.send_header(
+                    "Content-Disposition", f'attachment; filename="{file_name}"'
+                )
+                self.end_headers()
+                block_size = 1 << 16
+                with open(path, "rb") as fp:
+                    while block := fp.read(block_size):
+                        self.wfile.write(block)
+                        if server.bandwidth:
+                            time.sleep(len(block) / server.bandwidth)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class StandInMetaClient:
+    """Metadata client fetching collection metadata from the stand-in server.
+    The URI of the top-level collection is ignored."""
+
+    def __init__(self, base_url: str):
+        self._base_url = base_url
+
+    def get_collection_meta(self, uri: str) -> SimpleNamespace:
+        if not uri.startswith(self._base_url):
+            uri = f"{self._base_url}/meta/collection"
+        with urllib.request.urlopen(uri) as response:
+            meta = json.load(response)
+        meta["members"] = [SimpleNamespace(**member) for member in meta["members"]]
+        return SimpleNamespace(res=uri, **meta)
+
+
+class StandInDataClient:
+    """Data client downloading objects from the stand-in server."""
+
+    def save_to_folder(self, dobj_uri: str, folder_path: str) -> str:
+        with urllib.request.urlopen(dobj_uri) as response:
+            file_name = dobj_uri.split("/")[-1]
+            with open(os.path.join(folder_path, file_name), "wb") as fp:
+                shutil.copyfileobj(response, fp)
+        return file_name
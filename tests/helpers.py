@@ -14,60 +14,208 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
 
-import dask.array as da
-import numpy as np
-import pandas as pd
-import xarray as xr
-
-
-def get_hourly_005_dataseet():
-    # Dimensions
-    time = pd.date_range("2001-01-01", "2021-12-31", freq="D")
-    hour = np.arange(0, 24, 1)
-    lat = np.linspace(89.97, -89.97, 3600)
-    lon = np.linspace(-180.0, 180.0, 7200)
-    nbnds = 2
-
-    # Build Dataset lazily with Dask
-    ds = xr.Dataset(
-        data_vars={
-            "NEE": (
-                ("time", "hour", "lat", "lon"),
-                da.zeros(
-                    (len(time), len(hour), len(lat), len(lon)),
-                    chunks=(1461, 24, 40, 40),  # adjust chunk sizes to taste
-                    dtype="float32",
-                ),
-            ),
-            "land_fraction": (
-                ("lat", "lon"),
-                da.full(
-                    (len(lat), len(lon)),
-                    fill_value=1.0,
-                    chunks=(40, 40),
-                    dtype="float64",
-                ),
-            ),
-        },
-        coords={
-            "time": time,
-            "hour": hour,
-            "lat": lat,
-            "lon": lon,
-            "hour_bnds": (("hour", "nbnds"), np.zeros((len(hour), nbnds), dtype=int)),
-            "lat_bnds": (("lat", "nbnds"), np.zeros((len(lat), nbnds))),
-            "lon_bnds": (("lon", "nbnds"), np.zeros((len(lon), nbnds))),
-        },
-        attrs={
-            "contact": "The FLUXCOM-X team, fluxcomx@bgc-jena.mpg.de",
-            "contributor": "Mock contributor",
-            "conventions": "CF-1.8",
-            "creation_date": "mock",
-            "crs": "WGS 84 / Plate Carree",
-            "publisher_url": "http://fluxcom.org/",
-            "source": "Mock source",
-            "time_coverage_start": "2001-01-01T00:00:00",
-            "time_coverage_end": "2021-12-31T00:00:00",
-        },
-    )
-    return ds
+import functools
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Iterable
+from urllib.parse import urlsplit
+
+from benchmarks.datasets import AGG_MODE_NAMES, get_yearly_dataset
+
+# the NetCDF library is not thread-safe, so synthetic files are written
+# one at a time
+_NETCDF_LOCK = threading.Lock()
+
+
+def write_yearly_file(var_name: str, year: int, agg_mode: str, path: str):
+    """Write the dataset of :func:`get_yearly_dataset` as NetCDF file."""
+    ds = get_yearly_dataset(var_name, year, agg_mode)
+    with _NETCDF_LOCK:
+        ds.to_netcdf(path)
+
+
+@functools.lru_cache
+def get_yearly_file_hash(var_name: str, year: int, agg_mode: str) -> str:
+    """SHA-256 hash of the file written by :func:`write_yearly_file`, as
+    published for each data object in the ICOS metadata."""
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "data.nc")
+        write_yearly_file(var_name, year, agg_mode, path)
+        with open(path, "rb") as fp:
+            return hashlib.sha256(fp.read()).hexdigest()
+
+
+class MockIcosMetaClient:
+    """Stand-in for the ICOS metadata client serving a FLUXCOM-X-BASE
+    collection with one member collection per year."""
+
+    def __init__(self, var_name: str, years: Iterable[int]):
+        self.var_name = var_name
+        self.years = list(years)
+
+    def get_collection_meta(self, uri: str) -> SimpleNamespace:
+        if uri.startswith("years/"):
+            year = int(uri.split("/")[-1])
+            members = [
+                SimpleNamespace(
+                    res=(
+                        f"https://meta.icos-cp.eu/objects/"
+                        f"{self.var_name}_{year}_{agg_mode}.nc"
+                    ),
+                    hash=get_yearly_file_hash(self.var_name, year, agg_mode),
+                    name=f"FLUXCOM-X-BASE {self.var_name} {name} {year}",
+                )
+                for agg_mode, name in AGG_MODE_NAMES.items()
+            ]
+        else:
+            members = [
+                SimpleNamespace(
+                    res=f"years/{year}",
+                    title=f"FLUXCOM-X-BASE {self.var_name} {year}",
+                )
+                for year in self.years
+            ]
+        return SimpleNamespace(
+            res=uri,
+            title=f"FLUXCOM-X-BASE {self.var_name}",
+            description=None,
+            doi=None,
+            members=members,
+        )
+
+
+class MockIcosDataClient:
+    """Stand-in for the ICOS data client writing synthetic yearly NetCDF
+    files. It records the maximum number of concurrent downloads and can
+    simulate latency, transient failures, and permanent failures of objects
+    whose URI contains *fail_on*. If *base_url* is given, data objects are
+    served from there for remote reads."""
+
+    def __init__(
+        self,
+        delay: float = 0.0,
+        num_failures: int = 0,
+        fail_on: str | None = None,
+        base_url: str | None = None,
+    ):
+        self.meta = SimpleNamespace(
+            get_dobj_meta=lambda dobj_uri: SimpleNamespace(
+                accessUrl=f"{base_url}{urlsplit(dobj_uri).path}" if base_url else None
+            )
+        )
+        self.auth = SimpleNamespace(
+            get_token=lambda: SimpleNamespace(cookie_value=MOCK_COOKIE)
+        )
+        self.delay = delay
+        self.num_failures = num_failures
+        self.fail_on = fail_on
+        self.max_concurrency = 0
+        self.num_calls = 0
+        self._concurrency = 0
+        self._failures: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def save_to_folder(self, dobj_uri: str, folder_path: str) -> str:
+        with self._lock:
+            self.num_calls += 1
+            if self.fail_on is not None and self.fail_on in dobj_uri:
+                raise OSError(f"Mock failure for {dobj_uri}")
+            num_failures = self._failures.get(dobj_uri, 0)
+            if num_failures < self.num_failures:
+                self._failures[dobj_uri] = num_failures + 1
+                raise OSError(f"Mock failure {num_failures + 1} for {dobj_uri}")
+            self._concurrency += 1
+            self.max_concurrency = max(self.max_concurrency, self._concurrency)
+        try:
+            time.sleep(self.delay)
+            filename = dobj_uri.split("/")[-1]
+            # file names are formatted as "{var_name}_{year}_{agg_mode}.nc"
+            var_name, year, res, freq = filename[: -len(".nc")].rsplit("_", 3)
+            write_yearly_file(
+                var_name,
+                int(year),
+                f"{res}_{freq}",
+                os.path.join(folder_path, filename),
+            )
+            return filename
+        finally:
+            with self._lock:
+                self._concurrency -= 1
+
+
+MOCK_COOKIE = "cpauthToken=mock"
+
+
+class RangeHttpServer:
+    """Local HTTP server serving the files of a folder below ``/objects/``.
+
+    Range requests are supported unless *ranges* is False, and requests
+    without the cookie of :class:`MockIcosDataClient` are rejected. The
+    number of sent body bytes is recorded.
+    """
+
+    def __init__(self, folder: str, ranges: bool = True):
+        self.folder = folder
+        self.ranges = ranges
+        self.num_bytes_sent = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "RangeHttpServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler_class(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.headers.get("Cookie") != MOCK_COOKIE:
+                    self.send_error(401)
+                    return
+                file_name = self.path.split("/")[-1]
+                path = os.path.join(server.folder, file_name)
+                if not self.path.startswith("/objects/") or not os.path.isfile(path):
+                    self.send_error(404)
+                    return
+                with open(path, "rb") as fp:
+                    content = fp.read()
+                size = len(content)
+                range_header = self.headers.get("Range")
+                if server.ranges and range_header:
+                    start, end = range_header.removeprefix("bytes=").split("-")
+                    start, end = int(start), min(int(end), size - 1)
+                    body = content[start : end + 1]
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                else:
+                    body = content
+                    self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header(
+                    "Content-Disposition", f'attachment; filename="{file_name}"'
+                )
+                self.end_headers()
+                self.wfile.write(body)
+                with server._lock:
+                    server.num_bytes_sent += len(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
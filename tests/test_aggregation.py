@@ -0,0 +1,210 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import unittest
+
+import dask.array as da
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from xcube_icosdp.aggregation import aggregate_time, coarsen_spatial
+
+
+def get_hourly_dataset() -> xr.Dataset:
+    time = pd.date_range("2020-01-01", "2020-06-30", freq="D")
+    rng = np.random.default_rng(42)
+    data = rng.random((len(time), 24, 3, 4), dtype="float32")
+    data[5, 3, 0, 0] = np.nan
+    data[:, :, 1, 1] = np.nan
+    return xr.Dataset(
+        data_vars=dict(
+            NEE=(
+                ("time", "hour", "lat", "lon"),
+                da.from_array(data, chunks=(50, 12, 3, 2)),
+                dict(units="gC m-2 d-1"),
+            ),
+            land_fraction=(("lat", "lon"), np.ones((3, 4))),
+        ),
+        coords=dict(
+            time=time,
+            hour=np.arange(24),
+            lat=[45.0, 44.0, 43.0],
+            lon=[5.0, 6.0, 7.0, 8.0],
+            hour_bnds=(("hour", "nbnds"), np.zeros((24, 2), dtype=int)),
+        ),
+    )
+
+
+class AggregateTimeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ds = get_hourly_dataset()
+
+    def test_daily(self):
+        ds = aggregate_time(self.ds, "daily", "max")
+        self.assertEqual(("time", "lat", "lon"), ds["NEE"].dims)
+        self.assertEqual((182, 3, 4), ds["NEE"].shape)
+        self.assertNotIn("hour", ds.coords)
+        self.assertNotIn("hour_bnds", ds.coords)
+        np.testing.assert_equal(self.ds.time.values, ds.time.values)
+        np.testing.assert_allclose(
+            self.ds["NEE"].max("hour").values, ds["NEE"].values, equal_nan=True
+        )
+        self.assertEqual(
+            dict(units="gC m-2 d-1", cell_methods="time: max"), ds["NEE"].attrs
+        )
+        # the source dataset is not altered
+        self.assertEqual(dict(units="gC m-2 d-1"), self.ds["NEE"].attrs)
+
+    def test_monthly(self):
+        for method in ("mean", "sum", "min", "max"):
+            ds = aggregate_time(self.ds, "monthly", method)
+            self.assertEqual(("time", "lat", "lon"), ds["NEE"].dims)
+            self.assertEqual((6, 3, 4), ds["NEE"].shape)
+            self.assertEqual(np.float32, ds["NEE"].dtype)
+            np.testing.assert_equal(
+                pd.date_range("2020-01-01", periods=6, freq="MS").values,
+                ds.time.values,
+            )
+            kwargs = dict(min_count=1) if method == "sum" else {}
+            expected = getattr(self.ds["NEE"].resample(time="MS"), method)(
+                dim=["time", "hour"], **kwargs
+            )
+            np.testing.assert_allclose(
+                expected.values, ds["NEE"].values, rtol=1e-5, equal_nan=True
+            )
+            self.assertTrue(np.isnan(ds["NEE"].values[:, 1, 1]).all())
+            self.assertIn("land_fraction", ds)
+
+    def test_monthly_chunks(self):
+        ds = aggregate_time(self.ds, "monthly")
+        # chunks of at most 50 days, aligned to months
+        self.assertEqual((1,) * 6, ds["NEE"].chunks[0])
+        ds = aggregate_time(self.ds.chunk(time=100), "monthly")
+        self.assertEqual((3, 3), ds["NEE"].chunks[0])
+        self.assertEqual((2, 2), ds["NEE"].chunks[2])
+
+    def test_monthlycycle(self):
+        ds = aggregate_time(self.ds, "monthlycycle")
+        self.assertEqual(("time", "hour", "lat", "lon"), ds["NEE"].dims)
+        self.assertEqual((6, 24, 3, 4), ds["NEE"].shape)
+        self.assertIn("hour_bnds", ds.coords)
+        np.testing.assert_allclose(
+            self.ds["NEE"].resample(time="MS").mean().values,
+            ds["NEE"].values,
+            rtol=1e-5,
+            equal_nan=True,
+        )
+
+    def test_numpy(self):
+        ds = aggregate_time(self.ds.compute(), "monthly", "sum")
+        self.assertIsInstance(ds["NEE"].data, np.ndarray)
+        self.assertEqual((6, 3, 4), ds["NEE"].shape)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            aggregate_time(self.ds, "yearly")
+        with self.assertRaises(ValueError):
+            aggregate_time(self.ds, "daily", "median")
+
+
+class CoarsenSpatialTest(unittest.TestCase):
+
+    def setUp(self):
+        lat = np.linspace(44.975, 44.675, 7)
+        lon = np.linspace(5.025, 5.375, 8)
+        rng = np.random.default_rng(42)
+        data = rng.random((3, 7, 8), dtype="float32")
+        data[1, 0, 0] = np.nan
+        data[:, 2:4, 2:4] = np.nan
+        land_fraction = rng.random((7, 8))
+        land_fraction[0:2, 4:6] = 0.0
+        self.data = data
+        self.land_fraction = land_fraction
+        self.ds = xr.Dataset(
+            data_vars=dict(
+                NEE=(
+                    ("time", "lat", "lon"),
+                    da.from_array(data, chunks=(1, 4, 4)),
+                    dict(units="gC m-2 d-1"),
+                ),
+                land_fraction=(
+                    ("lat", "lon"),
+                    da.from_array(land_fraction, chunks=(4, 4)),
+                ),
+            ),
+            coords=dict(
+                time=pd.date_range("2020-01-01", periods=3),
+                lat=lat,
+                lon=lon,
+                lat_bnds=(("lat", "nbnds"), np.stack([lat + 0.025, lat - 0.025], 1)),
+            ),
+        )
+
+    def test_coarsen_spatial(self):
+        ds = coarsen_spatial(self.ds, 2)
+        self.assertEqual((3, 3, 4), ds["NEE"].shape)
+        self.assertEqual(np.float32, ds["NEE"].dtype)
+        self.assertEqual(dict(units="gC m-2 d-1"), ds["NEE"].attrs)
+        # the spatial chunks are multiples of the factor and are kept
+        self.assertEqual(((2, 1), (2, 2)), ds["NEE"].chunks[1:])
+
+        data = self.data[:, :6, :].reshape((3, 3, 2, 4, 2))
+        weights = np.broadcast_to(
+            self.land_fraction[:6, :].reshape((3, 2, 4, 2)), data.shape
+        )
+        weights = np.where(np.isnan(data), 0, weights)
+        with np.errstate(invalid="ignore"):
+            expected = np.nansum(data * weights, axis=(2, 4)) / weights.sum(axis=(2, 4))
+        np.testing.assert_allclose(expected, ds["NEE"].values, rtol=1e-5)
+        # no valid values, or land fraction of zero
+        self.assertTrue(np.isnan(ds["NEE"].values[:, 1, 1]).all())
+        self.assertTrue(np.isnan(ds["NEE"].values[:, 0, 2]).all())
+        np.testing.assert_allclose(
+            self.land_fraction[:6].reshape((3, 2, 4, 2)).mean(axis=(1, 3)),
+            ds["land_fraction"].values,
+        )
+        np.testing.assert_allclose([44.95, 44.85, 44.75], ds.lat.values)
+        np.testing.assert_allclose(
+            [[45.0, 44.9], [44.9, 44.8], [44.8, 44.7]], ds.lat_bnds.values
+        )
+
+    def test_coarsen_spatial_bounds_data_vars(self):
+        lon = self.ds.lon.values
+        ds = self.ds.assign(
+            lon_bnds=(("lon", "nbnds"), np.stack([lon - 0.025, lon + 0.025], 1)),
+            lat_profile=(("time", "lat"), np.ones((3, 7))),
+        )
+        ds = coarsen_spatial(ds, 2)
+        np.testing.assert_allclose(
+            [[5.0, 5.1], [5.1, 5.2], [5.2, 5.3], [5.3, 5.4]], ds.lon_bnds.values
+        )
+        self.assertEqual(("lon", "nbnds"), ds.lon_bnds.dims)
+        self.assertIn("lon_bnds", ds.data_vars)
+        # variables which cannot be coarsened are dropped
+        self.assertNotIn("lat_profile", ds)
+
+    def test_coarsen_spatial_rechunk(self):
+        ds = coarsen_spatial(self.ds.chunk(lat=3, lon=3), 2)
+        self.assertEqual(((1, 1, 1), (1, 1, 1, 1)), ds["NEE"].chunks[1:])
+        expected = coarsen_spatial(self.ds.compute(), 2)
+        self.assertIsInstance(expected["NEE"].data, np.ndarray)
+        np.testing.assert_allclose(expected["NEE"].values, ds["NEE"].values)
+
+    def test_coarsen_spatial_invalid(self):
+        with self.assertRaises(ValueError):
+            coarsen_spatial(self.ds, 10)
@@ -0,0 +1,331 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import fsspec
+
+from xcube_icosdp.cache import (
+    CacheStats,
+    CubeIndex,
+    DatasetCache,
+    ObjectCache,
+    get_params_key,
+)
+
+
+class DatasetCacheTest(unittest.TestCase):
+
+    def test_get_hit_and_miss(self):
+        cache = DatasetCache(max_size=2)
+        self.assertEqual(1, cache.get("a", lambda: 1))
+        self.assertEqual(1, cache.get("a", lambda: 2))
+        self.assertEqual(CacheStats(hits=1, misses=1, evictions=0, size=1), cache.stats)
+
+    def test_get_lru_eviction(self):
+        cache = DatasetCache(max_size=2)
+        cache.get("a", lambda: 1)
+        cache.get("b", lambda: 2)
+        cache.get("a", lambda: 1)
+        cache.get("c", lambda: 3)
+        self.assertEqual(1, cache.get("a", lambda: 10))
+        self.assertEqual(20, cache.get("b", lambda: 20))
+        self.assertEqual(2, cache.stats.evictions)
+
+    def test_get_ttl_eviction(self):
+        now = [0.0]
+        cache = DatasetCache(max_size=2, ttl=10, timer=lambda: now[0])
+        self.assertEqual(1, cache.get("a", lambda: 1))
+        now[0] = 5.0
+        self.assertEqual(1, cache.get("a", lambda: 2))
+        now[0] = 11.0
+        self.assertEqual(3, cache.get("a", lambda: 3))
+        self.assertEqual(CacheStats(hits=1, misses=2, evictions=1, size=1), cache.stats)
+
+    def test_get_disabled(self):
+        cache = DatasetCache(max_size=0)
+        self.assertEqual(1, cache.get("a", lambda: 1))
+        self.assertEqual(2, cache.get("a", lambda: 2))
+        self.assertEqual(0, cache.stats.size)
+
+    def test_get_single_flight(self):
+        cache = DatasetCache()
+        calls = []
+        release = threading.Event()
+
+        def opener():
+            calls.append(1)
+            release.wait(5)
+            return "ds"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get("a", opener)))
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, len(calls))
+        self.assertEqual(["ds"] * 10, results)
+        self.assertEqual(
+            CacheStats(hits=0, misses=1, evictions=0, size=1, coalesced=9),
+            cache.stats,
+        )
+
+    def test_get_error_not_cached(self):
+        cache = DatasetCache()
+
+        def opener():
+            raise OSError("remote not reachable")
+
+        with self.assertRaises(OSError):
+            cache.get("a", opener)
+        self.assertEqual(1, cache.get("a", lambda: 1))
+        self.assertEqual(0, cache.stats.hits)
+
+    def test_invalidate_and_clear(self):
+        cache = DatasetCache()
+        cache.get("a", lambda: 1)
+        cache.invalidate("a")
+        self.assertEqual(2, cache.get("a", lambda: 2))
+        cache.clear()
+        self.assertEqual(CacheStats(hits=0, misses=0, evictions=0, size=0), cache.stats)
+
+
+class ObjectCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.folder = tempfile.mkdtemp()
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        shutil.rmtree(self.folder)
+
+    def fetcher(self, content: bytes, file_name: str = "data.nc"):
+        def fetch(folder_path: str) -> str:
+            self.calls.append(file_name)
+            with open(os.path.join(folder_path, file_name), "wb") as fp:
+                fp.write(content)
+            return file_name
+
+        return fetch
+
+    def read(self, file_name: str) -> bytes:
+        with open(os.path.join(self.folder, file_name), "rb") as fp:
+            return fp.read()
+
+    def test_get_hit_and_miss(self):
+        cache = ObjectCache(self.root)
+        content = b"x" * 100
+        object_hash = hashlib.sha256(content).hexdigest()
+        for _ in range(2):
+            file_name = cache.get(object_hash, self.fetcher(content), self.folder)
+            self.assertEqual("data.nc", file_name)
+            self.assertEqual(content, self.read(file_name))
+            # callers may delete the provided file
+            os.remove(os.path.join(self.folder, file_name))
+        self.assertEqual(["data.nc"], self.calls)
+        self.assertEqual(CacheStats(hits=1, misses=1, evictions=0, size=1), cache.stats)
+
+        # the cache is persistent
+        cache = ObjectCache(self.root)
+        cache.get(object_hash, self.fetcher(content), self.folder)
+        self.assertEqual(["data.nc"], self.calls)
+
+    def test_get_base64_hash(self):
+        cache = ObjectCache(self.root)
+        content = b"x" * 100
+        digest = hashlib.sha256(content).digest()
+        pid = base64.urlsafe_b64encode(digest[:18]).decode()
+        cache.get(pid, self.fetcher(content), self.folder)
+        self.assertEqual(content, self.read("data.nc"))
+        with self.assertRaises(ValueError):
+            cache.get("not-a-hash", self.fetcher(content), self.folder)
+
+    def test_get_checksum_mismatch(self):
+        cache = ObjectCache(self.root)
+        object_hash = hashlib.sha256(b"expected").hexdigest()
+        with self.assertRaises(ValueError):
+            cache.get(object_hash, self.fetcher(b"corrupted"), self.folder)
+        self.assertEqual(0, cache.stats.size)
+        self.assertEqual([], os.listdir(os.path.join(self.root, "tmp")))
+
+    def test_get_verify_hits(self):
+        cache = ObjectCache(self.root, verify_hits=True)
+        content = b"x" * 100
+        object_hash = hashlib.sha256(content).hexdigest()
+        cache.get(object_hash, self.fetcher(content), self.folder)
+        key_path = os.path.join(self.root, object_hash[:2], object_hash, "data.nc")
+        os.remove(os.path.join(self.folder, "data.nc"))
+        with open(key_path, "wb") as fp:
+            fp.write(b"tampered")
+        cache.get(object_hash, self.fetcher(content), self.folder)
+        self.assertEqual(2, len(self.calls))
+        self.assertEqual(content, self.read("data.nc"))
+
+    def test_get_lru_eviction(self):
+        cache = ObjectCache(self.root, max_size=250)
+        contents = [bytes([i]) * 100 for i in range(3)]
+        hashes = [hashlib.sha256(content).hexdigest() for content in contents]
+        cache.get(hashes[0], self.fetcher(contents[0], "a.nc"), self.folder)
+        time.sleep(0.01)
+        cache.get(hashes[1], self.fetcher(contents[1], "b.nc"), self.folder)
+        time.sleep(0.01)
+        # use "a.nc" again, so that "b.nc" is the least recently used
+        cache.get(hashes[0], self.fetcher(contents[0], "a.nc"), self.folder)
+        time.sleep(0.01)
+        cache.get(hashes[2], self.fetcher(contents[2], "c.nc"), self.folder)
+        self.assertEqual(CacheStats(hits=1, misses=3, evictions=1, size=2), cache.stats)
+        # files handed out before are not affected by the eviction
+        self.assertEqual(contents[1], self.read("b.nc"))
+        cache.get(hashes[0], self.fetcher(contents[0], "a.nc"), self.folder)
+        cache.get(hashes[1], self.fetcher(contents[1], "b.nc"), self.folder)
+        self.assertEqual(["a.nc", "b.nc", "c.nc", "b.nc"], self.calls)
+
+    def test_get_concurrent(self):
+        # two caches on the same root stand in for two processes
+        caches = [ObjectCache(self.root), ObjectCache(self.root)]
+        content = b"x" * 1000
+        object_hash = hashlib.sha256(content).hexdigest()
+        folders = [tempfile.mkdtemp(dir=self.folder) for _ in range(8)]
+        errors = []
+
+        def get(index: int):
+            try:
+                cache = caches[index % 2]
+                cache.get(object_hash, self.fetcher(content), folders[index])
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=get, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
+        for folder in folders:
+            with open(os.path.join(folder, "data.nc"), "rb") as fp:
+                self.assertEqual(content, fp.read())
+        self.assertEqual(1, caches[0].stats.size)
+
+    def test_clear(self):
+        cache = ObjectCache(self.root)
+        content = b"x" * 100
+        object_hash = hashlib.sha256(content).hexdigest()
+        cache.get(object_hash, self.fetcher(content), self.folder)
+        cache.clear()
+        self.assertEqual(CacheStats(hits=0, misses=0, evictions=0, size=0), cache.stats)
+
+
+class CubeIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.temp_dir, "cache")
+        self.path = os.path.join(self.temp_dir, "index.json")
+        self.fs = fsspec.filesystem("file")
+        self.now = 0.0
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def new_index(self, max_size: int | None = None) -> CubeIndex:
+        return CubeIndex(
+            self.fs, self.root, self.path, max_size=max_size, timer=lambda: self.now
+        )
+
+    def add_cube(self, index: CubeIndex, data_id: str, size: int):
+        os.makedirs(os.path.join(self.root, data_id))
+        index.put(data_id, dict(key=data_id, years=[2020]), size=size)
+        self.now += 1.0
+
+    def test_put_get_persisted(self):
+        index = self.new_index()
+        self.add_cube(index, "a.zarr", 10)
+        entry = self.new_index().get("a.zarr")
+        self.assertEqual(
+            dict(key="a.zarr", years=[2020], size=10, last_access=0.0), entry
+        )
+        self.assertIsNone(index.get("b.zarr"))
+
+    def test_get_drops_deleted_cube(self):
+        index = self.new_index()
+        self.add_cube(index, "a.zarr", 10)
+        shutil.rmtree(os.path.join(self.root, "a.zarr"))
+        self.assertIsNone(index.get("a.zarr"))
+        self.assertEqual(0, self.new_index().total_size)
+
+    def test_find_most_recently_used(self):
+        index = self.new_index()
+        self.add_cube(index, "a.zarr", 10)
+        self.add_cube(index, "b.zarr", 10)
+        self.assertEqual("b.zarr", index.find(lambda data_id, entry: True))
+        index.touch("a.zarr")
+        self.assertEqual("a.zarr", index.find(lambda data_id, entry: True))
+        self.assertIsNone(index.find(lambda data_id, entry: entry["key"] == "c"))
+
+    def test_evict_least_recently_used(self):
+        index = self.new_index(max_size=25)
+        self.add_cube(index, "a.zarr", 10)
+        self.add_cube(index, "b.zarr", 10)
+        index.touch("a.zarr")
+        self.add_cube(index, "c.zarr", 10)
+        self.assertEqual(["b.zarr"], index.evict(keep="c.zarr"))
+        self.assertFalse(os.path.exists(os.path.join(self.root, "b.zarr")))
+        self.assertEqual(20, index.total_size)
+        # the kept cube is not evicted even if it exceeds the limit alone
+        self.add_cube(index, "d.zarr", 30)
+        self.assertEqual(["a.zarr", "c.zarr"], index.evict(keep="d.zarr"))
+        self.assertEqual(30, index.total_size)
+
+    def test_evict_pyramid(self):
+        index = self.new_index(max_size=15)
+        os.makedirs(os.path.join(self.root, "a.zarr"))
+        os.makedirs(os.path.join(self.root, "a.levels"))
+        index.put("a.zarr", dict(key="a", pyramid="a.levels"), size=10)
+        self.add_cube(index, "b.zarr", 10)
+        self.assertEqual(["a.zarr"], index.evict(keep="b.zarr"))
+        self.assertFalse(os.path.exists(os.path.join(self.root, "a.levels")))
+
+    def test_clear(self):
+        index = self.new_index()
+        self.add_cube(index, "a.zarr", 10)
+        index.clear()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIsNone(index.get("a.zarr"))
+
+    def test_get_params_key(self):
+        self.assertEqual(
+            get_params_key(dict(bbox=(0, 1, 2, 3), agg_mode="050_monthly")),
+            get_params_key(dict(agg_mode="050_monthly", bbox=[0, 1, 2, 3])),
+        )
+        self.assertNotEqual(
+            get_params_key(dict(agg_mode="050_monthly")),
+            get_params_key(dict(agg_mode="025_daily")),
+        )
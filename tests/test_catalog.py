@@ -0,0 +1,75 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import json
+import os
+import tempfile
+import unittest
+
+import fsspec
+import numpy as np
+
+from xcube_icosdp.catalog import DescriptorCatalog
+
+
+class DescriptorCatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "sub", "icosdp_catalog.json")
+        self.fs = fsspec.filesystem("file")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_put_and_get(self):
+        catalog = DescriptorCatalog(self.fs, self.path)
+        self.assertIsNone(catalog.get("FLUXCOM-X-BASE_NEE", "005_hourly"))
+        catalog.put(
+            "FLUXCOM-X-BASE_NEE",
+            "005_hourly",
+            dict(
+                time_range=("2001-01-01T00:00:00Z", "2021-12-31T00:00:00Z"),
+                dims=dict(time=np.int64(7670)),
+                attrs=dict(valid_range=np.array([0.0, 1.0])),
+            ),
+        )
+        expected = dict(
+            time_range=["2001-01-01T00:00:00Z", "2021-12-31T00:00:00Z"],
+            dims=dict(time=7670),
+            attrs=dict(valid_range=[0.0, 1.0]),
+        )
+        self.assertEqual(expected, catalog.get("FLUXCOM-X-BASE_NEE", "005_hourly"))
+
+        # persisted catalog is loaded by a new instance
+        catalog = DescriptorCatalog(self.fs, self.path)
+        self.assertEqual(expected, catalog.get("FLUXCOM-X-BASE_NEE", "005_hourly"))
+        self.assertIsNone(catalog.get("FLUXCOM-X-BASE_NEE", "050_monthly"))
+
+    def test_outdated_version(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "w") as fp:
+            json.dump(dict(version=0, entries={"NEE": {"005_hourly": {}}}), fp)
+        catalog = DescriptorCatalog(self.fs, self.path)
+        self.assertIsNone(catalog.get("NEE", "005_hourly"))
+
+    def test_clear(self):
+        catalog = DescriptorCatalog(self.fs, self.path)
+        catalog.put("NEE", "005_hourly", dict(dims={}))
+        self.assertTrue(os.path.isfile(self.path))
+        catalog.clear()
+        self.assertFalse(os.path.isfile(self.path))
+        self.assertIsNone(catalog.get("NEE", "005_hourly"))
@@ -0,0 +1,212 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import xarray as xr
+
+from xcube_icosdp.download import (
+    call_with_retries,
+    download_year_objects,
+    find_year_object,
+    iter_year_objects,
+    read_year_subset,
+)
+
+from .helpers import (
+    MockIcosDataClient,
+    MockIcosMetaClient,
+    RangeHttpServer,
+    get_yearly_dataset,
+)
+
+
+class CallWithRetriesTest(unittest.TestCase):
+
+    @patch("time.sleep")
+    def test_success_after_retries(self, mock_sleep):
+        calls = []
+
+        def func(value):
+            calls.append(value)
+            if len(calls) < 3:
+                raise OSError("connection reset")
+            return value
+
+        self.assertEqual(42, call_with_retries(func, 42, retries=3, retry_backoff=1))
+        self.assertEqual(3, len(calls))
+        self.assertEqual([((1,),), ((2,),)], [c[:1] for c in mock_sleep.call_args_list])
+
+    @patch("time.sleep")
+    def test_failure(self, mock_sleep):
+        def func():
+            raise OSError("connection reset")
+
+        with self.assertRaises(OSError):
+            call_with_retries(func, retries=2)
+        self.assertEqual(2, mock_sleep.call_count)
+
+
+class DownloadYearObjectsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_find_year_object(self):
+        icos_meta = MockIcosMetaClient("NEE", range(2020, 2022))
+        meta_year = icos_meta.get_collection_meta("collection").members[0]
+        year_obj = find_year_object(icos_meta, meta_year, "025_monthlycycle")
+        self.assertEqual(
+            "https://meta.icos-cp.eu/objects/NEE_2020_025_monthlycycle.nc",
+            year_obj.res,
+        )
+
+    def test_download_year_objects(self):
+        icos_meta = MockIcosMetaClient("NEE", range(2001, 2011))
+        icos_data = MockIcosDataClient(delay=0.05)
+        meta_years = icos_meta.get_collection_meta("collection").members
+        progress = []
+        threads = set()
+
+        def progress_callback(num_done: int, num_files: int):
+            threads.add(threading.current_thread())
+            progress.append((num_done, num_files))
+
+        file_names = download_year_objects(
+            icos_meta,
+            icos_data,
+            meta_years,
+            "050_monthly",
+            self.temp_dir.name,
+            max_workers=4,
+            progress_callback=progress_callback,
+        )
+        self.assertEqual(
+            [f"NEE_{year}_050_monthly.nc" for year in range(2001, 2011)], file_names
+        )
+        for file_name in file_names:
+            self.assertTrue(os.path.isfile(os.path.join(self.temp_dir.name, file_name)))
+        self.assertEqual([(n, 10) for n in range(1, 11)], progress)
+        self.assertEqual({threading.current_thread()}, threads)
+        self.assertLessEqual(icos_data.max_concurrency, 4)
+        self.assertGreater(icos_data.max_concurrency, 1)
+
+    @patch("time.sleep")
+    def test_download_year_objects_retries(self, mock_sleep):
+        icos_meta = MockIcosMetaClient("NEE", range(2001, 2004))
+        icos_data = MockIcosDataClient(num_failures=2)
+        meta_years = icos_meta.get_collection_meta("collection").members
+        file_names = download_year_objects(
+            icos_meta,
+            icos_data,
+            meta_years,
+            "050_monthly",
+            self.temp_dir.name,
+            retries=2,
+        )
+        self.assertEqual(3, len(file_names))
+
+    @patch("time.sleep")
+    def test_download_year_objects_failure(self, mock_sleep):
+        icos_meta = MockIcosMetaClient("NEE", range(2001, 2004))
+        icos_data = MockIcosDataClient(num_failures=10)
+        meta_years = icos_meta.get_collection_meta("collection").members
+        with self.assertRaises(OSError):
+            download_year_objects(
+                icos_meta,
+                icos_data,
+                meta_years,
+                "050_monthly",
+                self.temp_dir.name,
+                retries=1,
+            )
+
+    def test_iter_year_objects(self):
+        icos_meta = MockIcosMetaClient("NEE", range(2001, 2011))
+        icos_data = MockIcosDataClient(delay=0.02)
+        meta_years = icos_meta.get_collection_meta("collection").members
+        file_names = []
+        max_num_files = 0
+        for file_name in iter_year_objects(
+            icos_meta,
+            icos_data,
+            meta_years,
+            "050_monthly",
+            self.temp_dir.name,
+            max_workers=3,
+        ):
+            file_names.append(file_name)
+            max_num_files = max(max_num_files, len(os.listdir(self.temp_dir.name)))
+            # consumer deletes the file after processing it
+            os.remove(os.path.join(self.temp_dir.name, file_name))
+        self.assertEqual(
+            [f"NEE_{year}_050_monthly.nc" for year in range(2001, 2011)], file_names
+        )
+        self.assertLessEqual(max_num_files, 4)
+        self.assertEqual([], os.listdir(self.temp_dir.name))
+
+    def test_iter_year_objects_close(self):
+        icos_meta = MockIcosMetaClient("NEE", range(2001, 2011))
+        icos_data = MockIcosDataClient(delay=0.1)
+        meta_years = icos_meta.get_collection_meta("collection").members
+        file_names = iter_year_objects(
+            icos_meta,
+            icos_data,
+            meta_years,
+            "050_monthly",
+            self.temp_dir.name,
+            max_workers=3,
+        )
+        self.assertEqual("NEE_2001_050_monthly.nc", next(file_names))
+        file_names.close()
+        # pending downloads are cancelled, running ones are finished
+        num_files = len(os.listdir(self.temp_dir.name))
+        self.assertLessEqual(icos_data.num_calls, 4)
+        self.assertEqual(icos_data.num_calls, num_files)
+        time.sleep(0.3)
+        self.assertEqual(num_files, len(os.listdir(self.temp_dir.name)))
+
+    def test_read_year_subset(self):
+        server_dir = os.path.join(self.temp_dir.name, "server")
+        os.mkdir(server_dir)
+        ds_source = get_yearly_dataset("NEE", 2020, "050_monthly", spatial_res=0.5)
+        source_path = os.path.join(server_dir, "NEE_2020_050_monthly.nc")
+        ds_source.to_netcdf(
+            source_path, encoding=dict(NEE=dict(chunksizes=(12, 36, 36)))
+        )
+
+        with RangeHttpServer(server_dir) as server:
+            file_name = read_year_subset(
+                MockIcosDataClient(base_url=server.base_url),
+                "https://meta.icos-cp.eu/objects/NEE_2020_050_monthly.nc",
+                self.temp_dir.name,
+                lambda ds: ds.sel(lat=slice(50, 40), lon=slice(0, 10)),
+            )
+        self.assertEqual("NEE_2020_050_monthly.nc", file_name)
+        with xr.open_dataset(os.path.join(self.temp_dir.name, file_name)) as ds:
+            xr.testing.assert_equal(
+                ds_source.sel(lat=slice(50, 40), lon=slice(0, 10)), ds
+            )
+        # only the chunks within the bbox and the metadata are transferred
+        self.assertLess(server.num_bytes_sent, os.path.getsize(source_path) / 2)
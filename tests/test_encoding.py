@@ -0,0 +1,159 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numcodecs
+import numpy as np
+import xarray as xr
+import zarr
+
+from xcube_icosdp.encoding import PACKED_FILL_VALUE, bitround, get_encoding
+
+
+def get_dataset() -> xr.Dataset:
+    rng = np.random.default_rng(0)
+    nee = rng.normal(0.0, 5.0, (12, 20, 30)).astype(np.float32)
+    nee[0, 0, 0] = np.nan
+    return xr.Dataset(
+        dict(
+            NEE=(("time", "lat", "lon"), nee),
+            GPP=(("time", "lat", "lon"), rng.uniform(0.0, 20.0, (12, 20, 30))),
+            mask=(("lat", "lon"), np.ones((20, 30), dtype=np.int8)),
+        )
+    ).chunk(dict(time=6))
+
+
+class BitroundTest(unittest.TestCase):
+
+    def test_bitround(self):
+        ds = get_dataset()
+        ds_rounded = bitround(ds, 7)
+        for name in ("NEE", "GPP"):
+            self.assertEqual(7, ds_rounded[name].attrs["bitround_keepbits"])
+            self.assertEqual(ds[name].dtype, ds_rounded[name].dtype)
+            # the relative error is at most half of the last kept bit
+            np.testing.assert_allclose(
+                ds[name].values, ds_rounded[name].values, rtol=2**-8
+            )
+        self.assertNotIn("bitround_keepbits", ds_rounded["mask"].attrs)
+        self.assertTrue(np.isnan(ds_rounded["NEE"].values[0, 0, 0]))
+        # the dropped mantissa bits are zero
+        bits = ds_rounded["NEE"].values.view(np.uint32)
+        self.assertTrue(np.all(bits & np.uint32(2**16 - 1) == 0))
+
+    def test_bitround_ties_to_even(self):
+        data = np.array([1.0 + 2**-8, 1.0 + 3 * 2**-8], dtype=np.float32)
+        ds = bitround(xr.Dataset(dict(x=("n", data))), 7)
+        np.testing.assert_equal([1.0, 1.0 + 2**-6], ds["x"].values)
+
+    def test_bitround_per_variable(self):
+        ds = bitround(get_dataset(), dict(GPP=10))
+        self.assertNotIn("bitround_keepbits", ds["NEE"].attrs)
+        self.assertEqual(10, ds["GPP"].attrs["bitround_keepbits"])
+        with self.assertRaises(ValueError) as cm:
+            bitround(get_dataset(), dict(mask=4))
+        self.assertIn("requires a floating-point variable", f"{cm.exception}")
+
+
+class GetEncodingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_get_encoding_zarr(self):
+        ds = get_dataset()
+        for compression, codec, cname in (
+            ("zstd", numcodecs.Blosc, "zstd"),
+            ("lz4", numcodecs.Blosc, "lz4"),
+            ("zlib", numcodecs.Zlib, None),
+        ):
+            encoding = get_encoding(ds, compression=compression, compression_level=3)
+            self.assertEqual({"NEE", "GPP", "mask"}, set(encoding))
+            (compressor,) = encoding["NEE"]["compressors"]
+            self.assertIsInstance(compressor, codec)
+            if cname is not None:
+                self.assertEqual(cname, compressor.cname)
+                self.assertEqual(3, compressor.clevel)
+            path = os.path.join(self.temp_dir, f"{compression}.zarr")
+            ds.to_zarr(path, encoding=encoding, zarr_format=2)
+            xr.testing.assert_equal(ds, xr.open_zarr(path))
+
+        encoding = get_encoding(ds, compression="none")
+        self.assertEqual(dict(compressors=None), encoding["NEE"])
+        self.assertEqual({}, get_encoding(ds, compression=None)["NEE"])
+
+    def test_get_encoding_zarr_format_3(self):
+        ds = get_dataset()
+        for compression, codec, cname in (
+            ("zstd", zarr.codecs.BloscCodec, "zstd"),
+            ("lz4", zarr.codecs.BloscCodec, "lz4"),
+            ("zlib", zarr.codecs.GzipCodec, None),
+        ):
+            encoding = get_encoding(
+                ds, compression=compression, compression_level=3, zarr_format=3
+            )
+            (compressor,) = encoding["NEE"]["compressors"]
+            self.assertIsInstance(compressor, codec)
+            if cname is not None:
+                self.assertEqual(cname, compressor.cname.value)
+                self.assertEqual(3, compressor.clevel)
+            path = os.path.join(self.temp_dir, f"{compression}.zarr")
+            ds.to_zarr(path, encoding=encoding, zarr_format=3)
+            xr.testing.assert_equal(ds, xr.open_zarr(path))
+
+        encoding = get_encoding(ds, compression="none", zarr_format=3)
+        self.assertEqual(dict(compressors=None), encoding["NEE"])
+
+    def test_get_encoding_netcdf(self):
+        ds = get_dataset()
+        encoding = get_encoding(ds, "netcdf", compression="zlib", shuffle=False)
+        self.assertEqual(dict(zlib=True, complevel=5, shuffle=False), encoding["NEE"])
+        self.assertEqual(
+            dict(zlib=False), get_encoding(ds, "netcdf", compression="none")["NEE"]
+        )
+        with self.assertRaises(ValueError) as cm:
+            get_encoding(ds, "netcdf", compression="zstd")
+        self.assertIn("not available for NetCDF", f"{cm.exception}")
+
+    def test_get_encoding_pack_int16(self):
+        ds = get_dataset()
+        encoding = get_encoding(ds, pack_int16=("NEE", "GPP"))
+        self.assertEqual("int16", encoding["NEE"]["dtype"])
+        self.assertEqual(PACKED_FILL_VALUE, encoding["NEE"]["_FillValue"])
+        self.assertEqual(np.float32, encoding["NEE"]["scale_factor"].dtype)
+        self.assertNotIn("dtype", encoding["mask"])
+        path = os.path.join(self.temp_dir, "packed.zarr")
+        ds.to_zarr(path, encoding=encoding, zarr_format=2)
+        ds_packed = xr.open_zarr(path)
+        for name in ("NEE", "GPP"):
+            value_range = float(ds[name].max() - ds[name].min())
+            np.testing.assert_allclose(
+                ds[name].values,
+                ds_packed[name].values,
+                atol=value_range / 65533,
+            )
+        self.assertTrue(np.isnan(ds_packed["NEE"].values[0, 0, 0]))
+
+        with self.assertRaises(ValueError) as cm:
+            get_encoding(ds, pack_int16=("mask",))
+        self.assertIn("Packing requires a floating-point variable", f"{cm.exception}")
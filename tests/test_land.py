@@ -0,0 +1,87 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+
+import unittest
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from xcube_icosdp.land import (
+    CELL_DIM,
+    from_land_cells,
+    is_land_only,
+    to_land_cells,
+)
+
+
+def get_dataset() -> xr.Dataset:
+    rng = np.random.default_rng(0)
+    land_fraction = np.where(rng.random((9, 12)) > 0.6, rng.random((9, 12)), 0.0)
+    land_fraction[0, 0] = np.nan
+    land_fraction[4:, 10:] = 0.0
+    return xr.Dataset(
+        dict(
+            NEE=(
+                ("time", "hour", "lat", "lon"),
+                rng.random((5, 2, 9, 12)).astype("float32"),
+            ),
+            land_fraction=(("lat", "lon"), land_fraction),
+        ),
+        coords=dict(
+            time=pd.date_range("2001-01-01", periods=5),
+            hour=[0, 12],
+            lat=np.arange(9.0),
+            lon=np.arange(12.0),
+        ),
+    ).chunk(dict(time=2, lat=4, lon=5))
+
+
+class LandCellsTest(unittest.TestCase):
+
+    def test_to_land_cells(self):
+        ds = get_dataset()
+        land = ds["land_fraction"].fillna(0).values > 0
+        ds_cells = to_land_cells(ds, cell_chunk=10)
+        self.assertTrue(is_land_only(ds_cells))
+        self.assertFalse(is_land_only(ds))
+        self.assertEqual(("time", "hour", CELL_DIM), ds_cells["NEE"].dims)
+        self.assertEqual(np.count_nonzero(land), ds_cells.sizes[CELL_DIM])
+        self.assertEqual(10, ds_cells["NEE"].chunksizes[CELL_DIM][0])
+        self.assertEqual(("lat", "lon"), ds_cells["land_fraction"].dims)
+        # the cells of each tile are contiguous
+        lat_index = ds_cells["lat_index"].values
+        lon_index = ds_cells["lon_index"].values
+        tile_ids = (lat_index // 4) * 3 + lon_index // 5
+        np.testing.assert_equal(np.sort(tile_ids), tile_ids)
+        np.testing.assert_equal(
+            ds["NEE"].values[..., lat_index, lon_index], ds_cells["NEE"].values
+        )
+
+    def test_from_land_cells(self):
+        ds = get_dataset()
+        ds_grid = from_land_cells(to_land_cells(ds).compute())
+        self.assertFalse(is_land_only(ds_grid))
+        self.assertEqual(((4, 4, 1), (5, 5, 2)), ds_grid["NEE"].chunks[2:])
+        expected = ds["NEE"].where(ds["land_fraction"].fillna(0) > 0)
+        xr.testing.assert_identical(expected.compute(), ds_grid["NEE"].compute())
+        xr.testing.assert_identical(ds["land_fraction"], ds_grid["land_fraction"])
+
+    def test_to_land_cells_invalid(self):
+        with self.assertRaises(ValueError) as cm:
+            to_land_cells(get_dataset().drop_vars("land_fraction"))
+        self.assertIn("requires the variable 'land_fraction'", f"{cm.exception}")
@@ -0,0 +1,97 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+
+import time
+import unittest
+
+import numpy as np
+
+from xcube_icosdp.memory import (
+    MemoryBudget,
+    MemoryMonitor,
+    get_memory_budget,
+    get_resident_memory,
+)
+
+MiB = 1024**2
+
+
+class MemoryBudgetTest(unittest.TestCase):
+
+    def test_get_memory_budget(self):
+        budget = get_memory_budget(1024 * MiB, num_workers=4)
+        self.assertEqual(
+            MemoryBudget(
+                max_memory=1024 * MiB,
+                write_memory=1024 * MiB,
+                num_workers=4,
+                chunk_size=1024 * MiB // 12,
+                download_concurrency=4,
+            ),
+            budget,
+        )
+        self.assertEqual(256 * MiB, budget.task_memory)
+        # large budgets keep the chunks at a moderate size
+        budget = get_memory_budget(16 * 1024 * MiB, num_workers=4)
+        self.assertEqual(128 * MiB, budget.chunk_size)
+
+    def test_get_memory_budget_overlap(self):
+        budget = get_memory_budget(
+            64 * MiB, download_size=8 * MiB, overlap=True, num_workers=4
+        )
+        # downloads get a quarter of the budget
+        self.assertEqual(2, budget.download_concurrency)
+        self.assertEqual(48 * MiB, budget.write_memory)
+        self.assertEqual(4 * MiB, budget.chunk_size)
+
+        budget = get_memory_budget(
+            64 * MiB, download_size=8 * MiB, overlap=False, num_workers=4
+        )
+        self.assertEqual(4, budget.download_concurrency)
+        self.assertEqual(64 * MiB, budget.write_memory)
+
+    def test_get_memory_budget_small(self):
+        # fewer workers, so that the chunks do not get smaller than 1 MiB
+        budget = get_memory_budget(6 * MiB, download_size=MiB, num_workers=8)
+        self.assertEqual(2, budget.num_workers)
+        self.assertEqual(MiB, budget.chunk_size)
+
+        with self.assertRaises(ValueError) as cm:
+            get_memory_budget(2 * MiB, download_size=MiB)
+        self.assertIn("is too small", f"{cm.exception}")
+        with self.assertRaises(ValueError) as cm:
+            get_memory_budget(16 * MiB, download_size=32 * MiB)
+        self.assertIn("is too small", f"{cm.exception}")
+
+    def test_get_num_workers(self):
+        budget = get_memory_budget(96 * MiB, num_workers=4)
+        self.assertEqual(4, budget.get_num_workers(MiB))
+        self.assertEqual(2, budget.get_num_workers(16 * MiB))
+        self.assertEqual(0, budget.get_num_workers(64 * MiB))
+        self.assertEqual(4, budget.get_num_workers(0))
+
+
+class MemoryMonitorTest(unittest.TestCase):
+
+    def test_memory_monitor(self):
+        if get_resident_memory() is None:
+            self.skipTest("Resident memory is not available.")
+        with MemoryMonitor(interval=0.01) as monitor:
+            array = np.ones(64 * MiB, dtype=np.uint8)
+            time.sleep(0.1)
+            del array
+        self.assertGreaterEqual(monitor.peak_memory, 32 * MiB)
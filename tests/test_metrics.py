@@ -0,0 +1,118 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import json
+import unittest
+from unittest.mock import patch
+
+from xcube.core.store.preload import PreloadState, PreloadStatus
+
+from xcube_icosdp.metrics import (
+    IcosdpPreloadState,
+    PreloadMetrics,
+    StageMetrics,
+    add_metrics_hook,
+    remove_metrics_hook,
+    report_metrics,
+)
+
+
+class PreloadMetricsTest(unittest.TestCase):
+
+    def test_measure(self):
+        metrics = PreloadMetrics("FLUXCOM-X-BASE_NEE")
+        with patch("time.perf_counter", side_effect=[1.0, 3.0, 4.0, 4.5]):
+            with metrics.measure("download") as stage:
+                stage.num_bytes += 4_000_000
+                stage.num_files += 1
+            with metrics.measure("download") as stage:
+                stage.num_files += 1
+        download = metrics.stages["download"]
+        self.assertEqual(StageMetrics(2.5, 4_000_000, 2, 0, 0), download)
+        self.assertAlmostEqual(1.6, download.throughput)
+        self.assertEqual(2.5, metrics.duration)
+
+    def test_measure_failure(self):
+        metrics = PreloadMetrics("FLUXCOM-X-BASE_NEE")
+        with self.assertRaises(OSError):
+            with metrics.measure("write"):
+                raise OSError("Disk full")
+        self.assertGreaterEqual(metrics.stages["write"].duration, 0.0)
+        self.assertIsNone(metrics.stages["write"].throughput)
+
+    def test_to_dict(self):
+        metrics = PreloadMetrics("FLUXCOM-X-BASE_NEE", status=PreloadStatus.completed)
+        metrics.stages["write"] = StageMetrics(2.0, 1_000_000, 1, 10, 3_000_000)
+        d = metrics.to_dict()
+        self.assertEqual(
+            dict(
+                data_id="FLUXCOM-X-BASE_NEE",
+                status="completed",
+                duration=2.0,
+                peak_memory=None,
+                stages=dict(
+                    write=dict(
+                        duration=2.0,
+                        num_bytes=1_000_000,
+                        num_files=1,
+                        num_tasks=10,
+                        throughput=0.5,
+                        num_bytes_raw=3_000_000,
+                        compression_ratio=3.0,
+                    )
+                ),
+            ),
+            d,
+        )
+        json.dumps(d)
+
+    def test_state_update(self):
+        state = PreloadState("FLUXCOM-X-BASE_NEE")
+        metrics = PreloadMetrics("FLUXCOM-X-BASE_NEE")
+        event = IcosdpPreloadState("FLUXCOM-X-BASE_NEE", progress=0.5, metrics=metrics)
+        state.update(event)
+        self.assertEqual(0.5, state.progress)
+
+        state = IcosdpPreloadState("FLUXCOM-X-BASE_NEE")
+        state.update(event)
+        self.assertIs(metrics, state.metrics)
+        state.update(PreloadState("FLUXCOM-X-BASE_NEE", progress=0.6))
+        self.assertIs(metrics, state.metrics)
+
+
+class MetricsHookTest(unittest.TestCase):
+
+    def test_hooks(self):
+        reported = []
+
+        def failing_hook(_metrics):
+            raise RuntimeError("Monitoring unavailable")
+
+        remove_hook = add_metrics_hook(reported.append)
+        add_metrics_hook(failing_hook)
+        metrics = PreloadMetrics("FLUXCOM-X-BASE_NEE")
+        try:
+            with self.assertLogs("xcube.icosdp", level="ERROR"):
+                report_metrics(metrics)
+        finally:
+            remove_hook()
+            remove_metrics_hook(failing_hook)
+        self.assertEqual([metrics], reported)
+
+        report_metrics(metrics)
+        self.assertEqual([metrics], reported)
+        # removing twice is a no-op
+        remove_hook()
@@ -0,0 +1,164 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import fsspec
+import numpy as np
+import pandas as pd
+import xarray as xr
+import zarr
+
+from xcube_icosdp.mirror import (
+    MIRROR_ATTR,
+    build_mirror,
+    get_mirror_chunks,
+    get_read_size,
+    is_mirror_complete,
+)
+
+
+def get_chunked_dataset() -> xr.Dataset:
+    shape = (20, 4, 8, 8)
+    ds = xr.Dataset(
+        data_vars=dict(
+            NEE=(
+                ("time", "hour", "lat", "lon"),
+                np.arange(np.prod(shape), dtype="float32").reshape(shape),
+            ),
+            land_fraction=(("lat", "lon"), np.ones((8, 8))),
+        ),
+        coords=dict(
+            time=pd.date_range("2001-01-01", periods=20, freq="D"),
+            hour=np.arange(4),
+            lat=np.linspace(3.5, -3.5, 8),
+            lon=np.linspace(-3.5, 3.5, 8),
+        ),
+    )
+    return ds.chunk(dict(time=5, hour=4, lat=4, lon=4))
+
+
+class MirrorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "NEE_hourly_mirror.zarr")
+        self.temp_path = os.path.join(self.temp_dir, "temp")
+        self.fs = fsspec.filesystem("file")
+        self.ds = get_chunked_dataset()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_get_mirror_chunks(self):
+        chunks = get_mirror_chunks(self.ds)
+        self.assertEqual(dict(time=20, hour=4, lat=4, lon=4), chunks)
+        # small budgets shrink the tiles to divisors of the source chunks
+        chunks = get_mirror_chunks(self.ds, max_mem=20 * 4 * 4 * 4 * 4)
+        self.assertEqual(dict(time=20, hour=4, lat=2, lon=2), chunks)
+
+    def test_build_mirror(self):
+        progress = []
+        build_mirror(
+            self.ds,
+            self.fs,
+            self.path,
+            [-1, -1, 1, 1],
+            self.fs,
+            self.temp_path,
+            progress_callback=lambda done, total: progress.append((done, total)),
+        )
+        self.assertEqual([(1, 4), (2, 4), (3, 4), (4, 4)], progress)
+        # the intermediate datasets of the tiles are removed
+        self.assertEqual([], self.fs.glob(f"{self.temp_path}/tile_*"))
+        ds_mirror = xr.open_zarr(self.path)
+        self.assertTrue(is_mirror_complete(ds_mirror))
+        self.assertEqual(2, zarr.open_group(self.path).metadata.zarr_format)
+        # the bbox is widened to the spatial chunks of the source
+        self.assertEqual((20, 4, 8, 8), ds_mirror["NEE"].shape)
+        self.assertEqual((20, 4, 4, 4), ds_mirror["NEE"].encoding["chunks"])
+        xr.testing.assert_equal(self.ds["NEE"].compute(), ds_mirror["NEE"].compute())
+
+        # a time series touches a single chunk of the mirror
+        selected = ds_mirror["NEE"].isel(lat=[1], lon=[1])
+        self.assertEqual(20 * 4 * 4 * 4 * 4, get_read_size(ds_mirror["NEE"], selected))
+        selected = self.ds["NEE"].isel(lat=[1], lon=[1])
+        self.assertEqual(4 * 5 * 4 * 4 * 4 * 4, get_read_size(self.ds["NEE"], selected))
+
+    def test_build_mirror_partial_bbox(self):
+        build_mirror(
+            self.ds, self.fs, self.path, [0.5, 0.5, 2, 2], self.fs, self.temp_path
+        )
+        ds_mirror = xr.open_zarr(self.path)
+        self.assertEqual((20, 4, 4, 4), ds_mirror["NEE"].shape)
+        xr.testing.assert_equal(
+            self.ds["NEE"].isel(lat=slice(0, 4), lon=slice(4, 8)).compute(),
+            ds_mirror["NEE"].compute(),
+        )
+
+        with self.assertRaises(ValueError) as cm:
+            build_mirror(
+                self.ds, self.fs, self.path, [10, 10, 12, 12], self.fs, self.temp_path
+            )
+        self.assertIn("does not contain any grid cell", f"{cm.exception}")
+
+    def test_build_mirror_resumes(self):
+        from xcube_icosdp import mirror
+
+        rechunk_dataset = mirror.rechunk_dataset
+        calls = []
+
+        def fail_third_tile(*args, **kwargs):
+            calls.append(args[-1])
+            if len(calls) == 3:
+                raise RuntimeError("interrupted")
+            return rechunk_dataset(*args, **kwargs)
+
+        with patch("xcube_icosdp.mirror.rechunk_dataset", new=fail_third_tile):
+            with self.assertRaises(RuntimeError):
+                build_mirror(
+                    self.ds, self.fs, self.path, [-1, -1, 1, 1], self.fs, self.temp_path
+                )
+        ds_mirror = xr.open_zarr(self.path)
+        self.assertFalse(is_mirror_complete(ds_mirror))
+        self.assertEqual([0, 1], ds_mirror.attrs[MIRROR_ATTR]["tiles_done"])
+
+        calls.clear()
+        with patch("xcube_icosdp.mirror.rechunk_dataset", new=fail_third_tile):
+            build_mirror(
+                self.ds, self.fs, self.path, [-1, -1, 1, 1], self.fs, self.temp_path
+            )
+        # only the missing tiles are written
+        self.assertEqual(2, len(calls))
+        ds_mirror = xr.open_zarr(self.path)
+        self.assertTrue(is_mirror_complete(ds_mirror))
+        xr.testing.assert_equal(self.ds["NEE"].compute(), ds_mirror["NEE"].compute())
+
+    def test_build_mirror_replaces_other_extent(self):
+        build_mirror(
+            self.ds, self.fs, self.path, [-1, -1, 1, 1], self.fs, self.temp_path
+        )
+        ds = self.ds.isel(time=slice(0, 10))
+        build_mirror(ds, self.fs, self.path, [-1, -1, 1, 1], self.fs, self.temp_path)
+        ds_mirror = xr.open_zarr(self.path)
+        self.assertTrue(is_mirror_complete(ds_mirror))
+        self.assertEqual((10, 4, 8, 8), ds_mirror["NEE"].shape)
+        xr.testing.assert_equal(ds["NEE"].compute(), ds_mirror["NEE"].compute())
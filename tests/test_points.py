@@ -0,0 +1,139 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import threading
+import unittest
+
+import dask.array as da
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from xcube_icosdp.points import extract_points
+
+
+class CountingArray:
+    """Array recording the slices it is read with."""
+
+    def __init__(self, data: np.ndarray):
+        self.data = data
+        self.shape = data.shape
+        self.dtype = data.dtype
+        self.ndim = data.ndim
+        self.reads = []
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            self.reads.append(key)
+        return self.data[key]
+
+
+def get_dataset(source: CountingArray | None = None, hourly: bool = False):
+    time = pd.date_range("2020-01-01", periods=10, freq="D")
+    lat = np.arange(89.75, -90, -0.5)
+    lon = np.arange(-179.75, 180, 0.5)
+    shape = (10, 24, 360, 720) if hourly else (10, 360, 720)
+    if source is None:
+        source = np.arange(np.prod(shape), dtype="float64").reshape(shape)
+    chunks = (5, 24, 90, 90) if hourly else (5, 90, 90)
+    dims = ("time", "hour", "lat", "lon") if hourly else ("time", "lat", "lon")
+    ds = xr.Dataset(
+        dict(
+            NEE=(dims, da.from_array(source, chunks=chunks)),
+            land_fraction=(("lat", "lon"), da.ones((360, 720), chunks=(90, 90))),
+        ),
+        coords=dict(time=time, lat=lat, lon=lon),
+    )
+    if hourly:
+        ds = ds.assign_coords(hour=np.arange(24))
+    return ds
+
+
+class ExtractPointsTest(unittest.TestCase):
+
+    def test_extract_points(self):
+        ds = get_dataset()
+        lat = [50.9, -33.1, 0.1]
+        lon = [11.2, 151.3, -179.9]
+        result = extract_points(ds, lat, lon, site_ids=["DE-Hai", "AU-X", "Edge"])
+        self.assertEqual(("site", "time"), result["NEE"].dims)
+        self.assertEqual((3, 10), result["NEE"].shape)
+        self.assertEqual(("site",), result["land_fraction"].dims)
+        self.assertEqual(["DE-Hai", "AU-X", "Edge"], list(result.site.values))
+        np.testing.assert_equal([50.75, -33.25, 0.25], result.lat.values)
+        np.testing.assert_equal([11.25, 151.25, -179.75], result.lon.values)
+        for i in range(3):
+            expected = ds["NEE"].sel(lat=lat[i], lon=lon[i], method="nearest").values
+            np.testing.assert_equal(expected, result["NEE"][i].values)
+
+    def test_extract_points_reads_chunks_once(self):
+        source = CountingArray(np.zeros((10, 360, 720)))
+        ds = get_dataset(source)
+        # four points in one spatial chunk, one point in another
+        lat = [50.1, 51.2, 52.3, 53.4, -60.0]
+        lon = [10.1, 11.2, 12.3, 13.4, 100.0]
+        extract_points(ds, lat, lon).compute()
+        # two spatial chunks times two time chunks, ignoring empty reads
+        # dask uses to probe the array type
+        reads = [key for key in source.reads if source.data[key].size]
+        self.assertEqual(4, len(reads))
+        self.assertEqual(4, len(set(map(str, reads))))
+
+    def test_extract_points_time_ranges(self):
+        ds = get_dataset()
+        result = extract_points(
+            ds,
+            [10.0, 20.0],
+            [10.0, 20.0],
+            time_ranges=[("2020-01-02", "2020-01-04"), ("2020-01-03", "2020-01-06")],
+        )
+        self.assertEqual(5, result.sizes["time"])
+        self.assertEqual(
+            pd.Timestamp("2020-01-02"), pd.Timestamp(result.time.values[0])
+        )
+        nee = result["NEE"].values
+        np.testing.assert_equal([False, False, False, True, True], np.isnan(nee[0]))
+        np.testing.assert_equal([True, False, False, False, False], np.isnan(nee[1]))
+        self.assertEqual(("site",), result["land_fraction"].dims)
+
+    def test_extract_points_flatten_time(self):
+        ds = get_dataset(hourly=True)
+        result = extract_points(ds, [10.0], [10.0])
+        self.assertEqual(("site", "time"), result["NEE"].dims)
+        self.assertEqual((1, 240), result["NEE"].shape)
+        self.assertEqual(
+            pd.Timestamp("2020-01-01T01:00"), pd.Timestamp(result.time.values[1])
+        )
+        result = extract_points(ds, [10.0], [10.0], flatten_time=False)
+        self.assertEqual(("site", "time", "hour"), result["NEE"].dims)
+
+    def test_extract_points_invalid(self):
+        ds = get_dataset()
+        with self.assertRaises(ValueError) as cm:
+            extract_points(ds, [10.0, 95.0], [10.0, 10.0])
+        self.assertIn("outside of the grid", f"{cm.exception}")
+        with self.assertRaises(ValueError):
+            extract_points(ds, [10.0, float("nan")], [10.0, 10.0])
+        with self.assertRaises(ValueError) as cm:
+            extract_points(ds, [10.0, 20.0], [10.0])
+        self.assertIn("equal length", f"{cm.exception}")
+        with self.assertRaises(ValueError):
+            extract_points(ds, [10.0], [10.0], site_ids=["a", "b"])
+        with self.assertRaises(ValueError):
+            extract_points(
+                ds, [10.0], [10.0], time_ranges=[("2020-01-05", "2020-01-01")]
+            )
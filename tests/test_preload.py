@@ -0,0 +1,957 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import importlib.util
+import math
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import numpy as np
+import xarray as xr
+import zarr
+from xcube.core.store import DataStoreError, new_data_store
+from xcube.core.store.preload import PreloadStatus
+
+from xcube_icosdp.cache import CacheStats, CubeIndex, ObjectCache
+from xcube_icosdp.metrics import add_metrics_hook
+from xcube_icosdp.preload import IcosdpPreloadHandle
+from xcube_icosdp.virtual import REFERENCES_FILE_NAME, open_virtual_cube
+
+from .helpers import (
+    MockIcosDataClient,
+    MockIcosMetaClient,
+    RangeHttpServer,
+    get_yearly_dataset,
+)
+
+HAS_DISTRIBUTED = importlib.util.find_spec("distributed") is not None
+
+
+class IcosdpPreloadHandleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_store = new_data_store(
+            "file", root=os.path.join(self.temp_dir, "cache"), max_depth=10
+        )
+        self.icos_meta = MockIcosMetaClient("NEE", range(2019, 2022))
+        self.icos_data = MockIcosDataClient()
+        # each test downloads into its own scratch folder, so that tests
+        # never touch the default scratch folder in the working directory
+        self.scratch_dir = os.path.join(self.temp_dir, "scratch")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def preload(self, *data_ids: str, **preload_params) -> IcosdpPreloadHandle:
+        handle = IcosdpPreloadHandle(
+            self.cache_store,
+            self.icos_meta,
+            self.icos_data,
+            *(data_ids or ("FLUXCOM-X-BASE_NEE",)),
+            silent=True,
+            **{"scratch_dir": self.scratch_dir, **preload_params},
+        )
+        for data_id in data_ids or ("FLUXCOM-X-BASE_NEE",):
+            state = handle.get_state(data_id)
+            self.assertIsNone(state.exception)
+            self.assertEqual(PreloadStatus.completed, state.status)
+        return handle
+
+    def test_preload_data_streaming(self):
+        self.preload(agg_mode="025_daily", chunks=[50, 45, 45])
+        ds_concat = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_daily.zarr").load()
+        self.cache_store.delete_data("FLUXCOM-X-BASE_NEE_daily.zarr")
+
+        self.preload(agg_mode="025_daily", chunks=[50, 45, 45], streaming=True)
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_daily.zarr")
+        self.assertEqual((1096, 90, 180), ds["NEE"].shape)
+        self.assertEqual((90, 180), ds["land_fraction"].shape)
+        self.assertEqual((50, 45, 45), ds["NEE"].encoding["chunks"])
+        # streamed cubes are written in the format of the concatenated ones
+        path = os.path.join(self.temp_dir, "cache", "FLUXCOM-X-BASE_NEE_daily.zarr")
+        self.assertEqual(2, zarr.open_group(path, mode="r").metadata.zarr_format)
+        np.testing.assert_equal(ds_concat.time.values, ds.time.values)
+        np.testing.assert_equal(ds_concat["NEE"].values, ds["NEE"].values)
+
+    def test_preload_data_rechunk(self):
+        self.preload(
+            agg_mode="050_monthly",
+            chunks=dict(time=-1, lat=10, lon=10),
+            rechunk_max_mem=1024**2,
+        )
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_monthly.zarr")
+        self.assertEqual((36, 10, 10), ds["NEE"].encoding["chunks"])
+        self.assertEqual((10, 10), ds["land_fraction"].encoding["chunks"])
+        np.testing.assert_equal(
+            [2019] * 12 + [2020] * 12 + [2021] * 12,
+            ds["NEE"].isel(lat=0, lon=0).values,
+        )
+
+    def test_preload_data_chunk_layout(self):
+        self.preload(agg_mode="050_monthly", chunk_layout="timeseries-optimized")
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_monthly.zarr")
+        self.assertEqual((36, 90, 180), ds["NEE"].encoding["chunks"])
+        self.cache_store.delete_data("FLUXCOM-X-BASE_NEE_monthly.zarr")
+
+        self.preload(agg_mode="050_monthly", chunk_layout="map-optimized")
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_monthly.zarr")
+        self.assertEqual((1, 90, 180), ds["NEE"].encoding["chunks"])
+
+    def test_preload_data_chunks_invalid(self):
+        for preload_params, message in (
+            (dict(chunks=dict(depth=10)), "Invalid dimensions ['depth']"),
+            (
+                dict(chunks=[12, 10, 10], chunk_layout="map-optimized"),
+                "Only one of `chunks` and `chunk_layout`",
+            ),
+        ):
+            handle = IcosdpPreloadHandle(
+                self.cache_store,
+                self.icos_meta,
+                self.icos_data,
+                "FLUXCOM-X-BASE_NEE",
+                agg_mode="050_monthly",
+                silent=True,
+                scratch_dir=self.scratch_dir,
+                **preload_params,
+            )
+            state = handle.get_state("FLUXCOM-X-BASE_NEE")
+            self.assertEqual(PreloadStatus.failed, state.status)
+            self.assertIn(message, f"{state.exception}")
+
+    def test_preload_data_streaming_bbox_time_range(self):
+        self.preload(
+            agg_mode="050_monthly",
+            time_range=("2020-01-01", "2021-12-31"),
+            bbox=[0, 40, 10, 50],
+            streaming=True,
+        )
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_monthly_2020_2021.zarr")
+        self.assertEqual((24, 5, 5), ds["NEE"].shape)
+        np.testing.assert_equal(
+            [2020] * 12 + [2021] * 12, ds["NEE"].isel(lat=0, lon=0).values
+        )
+
+    def test_preload_data_partial_download(self):
+        server_dir = os.path.join(self.temp_dir, "server")
+        os.mkdir(server_dir)
+        for year in range(2019, 2022):
+            get_yearly_dataset("NEE", year, "050_monthly", 0.5).to_netcdf(
+                os.path.join(server_dir, f"NEE_{year}_050_monthly.nc"),
+                encoding=dict(NEE=dict(chunksizes=(12, 36, 36))),
+            )
+        with RangeHttpServer(server_dir) as server:
+            self.icos_data = MockIcosDataClient(base_url=server.base_url)
+            for streaming in (False, True):
+                self.preload(
+                    agg_mode="050_monthly",
+                    bbox=[0, 40, 10, 50],
+                    partial_download=True,
+                    streaming=streaming,
+                )
+                ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_monthly.zarr")
+                self.assertEqual((36, 20, 20), ds["NEE"].shape)
+                np.testing.assert_equal(
+                    [2019] * 12 + [2020] * 12 + [2021] * 12,
+                    ds["NEE"].isel(lat=0, lon=0).values,
+                )
+                self.cache_store.delete_data("FLUXCOM-X-BASE_NEE_monthly.zarr")
+        # the files are not downloaded completely
+        self.assertEqual(0, self.icos_data.num_calls)
+        size = sum(
+            os.path.getsize(os.path.join(server_dir, name))
+            for name in os.listdir(server_dir)
+        )
+        # both preloads together transfer less than the files once
+        self.assertLess(server.num_bytes_sent, size)
+
+    def test_preload_data_object_cache(self):
+        object_cache = ObjectCache(os.path.join(self.temp_dir, "raw"))
+        self.preload(agg_mode="050_monthly", object_cache=object_cache)
+        self.assertEqual(3, self.icos_data.num_calls)
+
+        # another subset of the same files is preloaded without downloads
+        self.preload(
+            agg_mode="050_monthly",
+            bbox=[0, 40, 10, 50],
+            streaming=True,
+            object_cache=object_cache,
+        )
+        self.assertEqual(3, self.icos_data.num_calls)
+        self.assertEqual(
+            CacheStats(hits=3, misses=3, evictions=0, size=3), object_cache.stats
+        )
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_monthly.zarr")
+        self.assertEqual((36, 5, 5), ds["NEE"].shape)
+        np.testing.assert_equal(
+            [2019] * 12 + [2020] * 12 + [2021] * 12,
+            ds["NEE"].isel(lat=0, lon=0).values,
+        )
+
+    def test_preload_data_extend_existing(self):
+        cache_index = self.new_cache_index()
+        self.preload(
+            agg_mode="050_monthly",
+            time_range=("2019-01-01", "2020-12-31"),
+            cache_index=cache_index,
+        )
+        self.assertEqual(2, self.icos_data.num_calls)
+
+        self.preload(
+            agg_mode="050_monthly",
+            time_range=("2019-01-01", "2021-12-31"),
+            extend_existing=True,
+            cache_index=cache_index,
+        )
+        self.assertEqual(3, self.icos_data.num_calls)
+        self.assertEqual(
+            ["FLUXCOM-X-BASE_NEE_monthly_2019_2021.zarr"],
+            self.cache_store.list_data_ids(),
+        )
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_monthly_2019_2021.zarr")
+        self.assertEqual((36, 90, 180), ds["NEE"].shape)
+        np.testing.assert_equal(
+            [2019] * 12 + [2020] * 12 + [2021] * 12,
+            ds["NEE"].isel(lat=0, lon=0).values,
+        )
+
+        # nothing to download if the cube is up to date
+        self.preload(
+            agg_mode="050_monthly",
+            time_range=("2020-01-01", "2021-12-31"),
+            extend_existing=True,
+            cache_index=cache_index,
+        )
+        self.assertEqual(3, self.icos_data.num_calls)
+
+        # cubes with other subsetting parameters are not extended, but the
+        # requested cube is subset from them
+        handle = self.preload(
+            agg_mode="050_monthly",
+            time_range=("2019-01-01", "2021-12-31"),
+            bbox=[0, 40, 10, 50],
+            extend_existing=True,
+            cache_index=cache_index,
+        )
+        self.assertEqual(3, self.icos_data.num_calls)
+        self.assertRegex(
+            self.get_data_id_out(handle),
+            r"^FLUXCOM-X-BASE_NEE_monthly_2019_2021_[0-9a-f]{8}\.zarr$",
+        )
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_monthly_2019_2021.zarr")
+        self.assertEqual((36, 90, 180), ds["NEE"].shape)
+
+    def test_preload_data_extend_existing_without_index(self):
+        self.preload(agg_mode="050_monthly", time_range=("2019-01-01", "2020-12-31"))
+        self.preload(
+            agg_mode="050_monthly",
+            time_range=("2019-01-01", "2021-12-31"),
+            extend_existing=True,
+        )
+        self.assertEqual(5, self.icos_data.num_calls)
+
+    def test_preload_data_extend_existing_hashed_id(self):
+        cache_index = self.new_cache_index()
+        self.preload(
+            agg_mode="050_monthly",
+            time_range=("2019-01-01", "2020-12-31"),
+            cache_index=cache_index,
+        )
+        handle = self.preload(
+            agg_mode="050_monthly",
+            time_range=("2019-01-01", "2020-12-31"),
+            bbox=[0, 40, 10, 50],
+            cache_index=cache_index,
+        )
+        hashed_id = self.get_data_id_out(handle)
+        self.assertRegex(
+            hashed_id, r"^FLUXCOM-X-BASE_NEE_monthly_2019_2020_[0-9a-f]{8}\.zarr$"
+        )
+        self.assertEqual(2, self.icos_data.num_calls)
+
+        handle = self.preload(
+            agg_mode="050_monthly",
+            time_range=("2019-01-01", "2021-12-31"),
+            bbox=[0, 40, 10, 50],
+            extend_existing=True,
+            cache_index=cache_index,
+        )
+        self.assertEqual(3, self.icos_data.num_calls)
+        self.assertEqual(
+            "FLUXCOM-X-BASE_NEE_monthly_2019_2021.zarr", self.get_data_id_out(handle)
+        )
+        self.assertEqual(
+            [
+                "FLUXCOM-X-BASE_NEE_monthly_2019_2020.zarr",
+                "FLUXCOM-X-BASE_NEE_monthly_2019_2021.zarr",
+            ],
+            sorted(self.cache_store.list_data_ids()),
+        )
+        self.assertIsNone(cache_index.get(hashed_id))
+        entry = cache_index.get("FLUXCOM-X-BASE_NEE_monthly_2019_2021.zarr")
+        self.assertEqual([2019, 2020, 2021], entry["years"])
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_monthly_2019_2021.zarr")
+        self.assertEqual((36, 5, 5), ds["NEE"].shape)
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_monthly_2019_2020.zarr")
+        self.assertEqual((24, 90, 180), ds["NEE"].shape)
+
+    def test_preload_data_extend_existing_rollback(self):
+        cache_index = self.new_cache_index()
+        self.preload(
+            agg_mode="050_monthly",
+            time_range=("2019-01-01", "2020-12-31"),
+            cache_index=cache_index,
+        )
+        self.icos_data.fail_on = "2021"
+        handle = IcosdpPreloadHandle(
+            self.cache_store,
+            self.icos_meta,
+            self.icos_data,
+            "FLUXCOM-X-BASE_NEE",
+            agg_mode="050_monthly",
+            time_range=("2019-01-01", "2021-12-31"),
+            extend_existing=True,
+            download_retries=0,
+            cache_index=cache_index,
+            silent=True,
+            scratch_dir=self.scratch_dir,
+        )
+        state = handle.get_state("FLUXCOM-X-BASE_NEE")
+        self.assertEqual(PreloadStatus.failed, state.status)
+        self.assertEqual(
+            ["FLUXCOM-X-BASE_NEE_monthly_2019_2020.zarr"],
+            self.cache_store.list_data_ids(),
+        )
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_monthly_2019_2020.zarr")
+        self.assertEqual((24, 90, 180), ds["NEE"].shape)
+
+    def test_preload_data_streaming_failure(self):
+        scratch_dir = self.scratch_dir
+        icos_data = MockIcosDataClient(delay=0.2)
+        with patch.object(
+            IcosdpPreloadHandle,
+            "_prepare_dataset",
+            side_effect=ValueError("Mock failure"),
+        ):
+            handle = IcosdpPreloadHandle(
+                self.cache_store,
+                self.icos_meta,
+                icos_data,
+                "FLUXCOM-X-BASE_NEE",
+                agg_mode="050_monthly",
+                streaming=True,
+                scratch_dir=scratch_dir,
+                silent=True,
+            )
+        state = handle.get_state("FLUXCOM-X-BASE_NEE")
+        self.assertEqual(PreloadStatus.failed, state.status)
+        # the downloads ahead are stopped before the scratch folder is removed
+        self.assertEqual(0, icos_data._concurrency)
+        self.assertEqual([], os.listdir(scratch_dir))
+
+    def test_preload_data_streaming_netcdf(self):
+        handle = IcosdpPreloadHandle(
+            self.cache_store,
+            self.icos_meta,
+            self.icos_data,
+            "FLUXCOM-X-BASE_NEE",
+            agg_mode="050_monthly",
+            target_format="netcdf",
+            streaming=True,
+            silent=True,
+            scratch_dir=self.scratch_dir,
+        )
+        state = handle.get_state("FLUXCOM-X-BASE_NEE")
+        self.assertEqual(PreloadStatus.failed, state.status)
+        self.assertIn("only supported for", f"{state.exception}")
+
+    def test_preload_data_compression(self):
+        handle = self.preload(
+            agg_mode="050_monthly",
+            compression="zstd",
+            compression_level=3,
+            keepbits=dict(NEE=7),
+            pack_int16=["land_fraction"],
+        )
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_monthly.zarr")
+        (compressor,) = ds["NEE"].encoding["compressors"]
+        self.assertEqual("zstd", compressor.cname)
+        self.assertEqual(3, compressor.clevel)
+        self.assertEqual(7, ds["NEE"].attrs["bitround_keepbits"])
+        self.assertIn('"keepbits": {"NEE": 7}', ds.attrs["icosdp_preload_params"])
+        np.testing.assert_allclose(
+            [2019] * 12 + [2020] * 12 + [2021] * 12,
+            ds["NEE"].isel(lat=0, lon=0).values,
+            rtol=2**-8,
+        )
+        self.assertEqual(np.int16, ds["land_fraction"].encoding["dtype"])
+        self.assertLess(float(abs(ds["land_fraction"] - 1.0).max()), 1e-3)
+        write = handle.get_metrics("FLUXCOM-X-BASE_NEE").stages["write"]
+        self.assertGreater(write.compression_ratio, 1.0)
+
+    def test_preload_data_compression_streaming(self):
+        self.preload(
+            agg_mode="050_monthly", compression="lz4", keepbits=7, streaming=True
+        )
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_monthly.zarr")
+        self.assertEqual((36, 90, 180), ds["NEE"].shape)
+        (compressor,) = ds["NEE"].encoding["compressors"]
+        self.assertEqual("lz4", compressor.cname)
+
+    def test_preload_data_compression_invalid(self):
+        for preload_params, message in (
+            (
+                dict(compression="zstd", target_format="netcdf"),
+                "Compression with `zstd` or `lz4` is only supported",
+            ),
+            (
+                dict(pack_int16=["NEE"], streaming=True),
+                "cannot be combined with `streaming`",
+            ),
+            (dict(pack_int16=["GPP"]), "Invalid variables ['GPP']"),
+            (dict(keepbits=dict(time=7)), "requires a floating-point variable"),
+        ):
+            handle = IcosdpPreloadHandle(
+                self.cache_store,
+                self.icos_meta,
+                self.icos_data,
+                "FLUXCOM-X-BASE_NEE",
+                agg_mode="050_monthly",
+                silent=True,
+                scratch_dir=self.scratch_dir,
+                **preload_params,
+            )
+            state = handle.get_state("FLUXCOM-X-BASE_NEE")
+            self.assertEqual(PreloadStatus.failed, state.status)
+            self.assertIn(message, f"{state.exception}")
+
+    def new_cache_index(self, max_size: int | None = None) -> CubeIndex:
+        return CubeIndex(
+            self.cache_store.fs,
+            self.cache_store.root,
+            os.path.join(self.temp_dir, "index.json"),
+            max_size=max_size,
+        )
+
+    def get_data_id_out(self, handle: IcosdpPreloadHandle) -> str:
+        message = handle.get_state("FLUXCOM-X-BASE_NEE").message
+        return re.match(r"Datacube (?:written to )?'(.*)'", message).group(1)
+
+    def test_preload_data_cache_index_identical(self):
+        cache_index = self.new_cache_index()
+        self.preload(agg_mode="050_monthly", cache_index=cache_index)
+        self.assertEqual(3, self.icos_data.num_calls)
+        entry = cache_index.get("FLUXCOM-X-BASE_NEE_monthly.zarr")
+        self.assertEqual([2019, 2020, 2021], entry["years"])
+        self.assertEqual("years/2019", entry["sources"]["2019"])
+        self.assertGreater(entry["size"], 0)
+
+        handle = self.preload(agg_mode="050_monthly", cache_index=cache_index)
+        self.assertEqual(3, self.icos_data.num_calls)
+        state = handle.get_state("FLUXCOM-X-BASE_NEE")
+        self.assertIn("is up to date", state.message)
+
+        # a new version of a source object invalidates the cube
+        entry["sources"]["2021"] = "years/2021-v0"
+        cache_index.put("FLUXCOM-X-BASE_NEE_monthly.zarr", entry, entry["size"])
+        self.preload(agg_mode="050_monthly", cache_index=cache_index)
+        self.assertEqual(6, self.icos_data.num_calls)
+
+    def test_preload_data_cache_index_subset(self):
+        cache_index = self.new_cache_index()
+        self.preload(agg_mode="050_monthly", cache_index=cache_index)
+        handle = self.preload(
+            agg_mode="050_monthly",
+            time_range=("2020-01-01", "2021-12-31"),
+            bbox=[0, 40, 10, 50],
+            chunks=dict(time=12, lat=5, lon=5),
+            cache_index=cache_index,
+        )
+        self.assertEqual(3, self.icos_data.num_calls)
+        self.assertNotIn("download", handle.get_metrics("FLUXCOM-X-BASE_NEE").stages)
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_monthly_2020_2021.zarr")
+        self.assertEqual((24, 5, 5), ds["NEE"].shape)
+        self.assertEqual((12, 5, 5), ds["NEE"].encoding["chunks"])
+        np.testing.assert_equal(
+            [2020] * 12 + [2021] * 12, ds["NEE"].isel(lat=0, lon=0).values
+        )
+        self.assertIn('"bbox": [0, 40, 10, 50]', ds.attrs["icosdp_preload_params"])
+
+        # the covering cube of the same name is kept, the covered cube gets
+        # the parameter hash appended to its name
+        handle = self.preload(
+            agg_mode="050_monthly", bbox=[0, 40, 10, 50], cache_index=cache_index
+        )
+        self.assertEqual(3, self.icos_data.num_calls)
+        data_id_out = self.get_data_id_out(handle)
+        self.assertRegex(data_id_out, r"^FLUXCOM-X-BASE_NEE_monthly_[0-9a-f]{8}\.zarr$")
+        ds = self.cache_store.open_data(data_id_out)
+        self.assertEqual((36, 5, 5), ds["NEE"].shape)
+        self.assertEqual(
+            [0, 40, 10, 50], cache_index.get(data_id_out)["params"]["bbox"]
+        )
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_monthly.zarr")
+        self.assertEqual((36, 90, 180), ds["NEE"].shape)
+        self.assertIsNone(
+            cache_index.get("FLUXCOM-X-BASE_NEE_monthly.zarr")["params"]["bbox"]
+        )
+
+        # a repeated request finds the cube under its name
+        handle = self.preload(
+            agg_mode="050_monthly", bbox=[0, 40, 10, 50], cache_index=cache_index
+        )
+        state = handle.get_state("FLUXCOM-X-BASE_NEE")
+        self.assertIn(f"Datacube {data_id_out!r} is up to date", state.message)
+
+    def test_preload_data_cache_index_other_params(self):
+        cache_index = self.new_cache_index()
+        self.preload(agg_mode="050_monthly", cache_index=cache_index)
+        handle = self.preload(
+            agg_mode="050_monthly", compression="zlib", cache_index=cache_index
+        )
+        data_id_out = self.get_data_id_out(handle)
+        self.assertNotEqual("FLUXCOM-X-BASE_NEE_monthly.zarr", data_id_out)
+        self.assertCountEqual(
+            ["FLUXCOM-X-BASE_NEE_monthly.zarr", data_id_out],
+            self.cache_store.list_data_ids(),
+        )
+        self.assertNotEqual(
+            cache_index.get("FLUXCOM-X-BASE_NEE_monthly.zarr")["key"],
+            cache_index.get(data_id_out)["key"],
+        )
+        ds = self.cache_store.open_data(data_id_out)
+        (compressor,) = ds["NEE"].encoding["compressors"]
+        self.assertEqual("zlib", compressor.codec_id)
+
+    def test_preload_data_cache_index_eviction(self):
+        cache_index = self.new_cache_index(max_size=1)
+        self.preload(agg_mode="050_monthly", cache_index=cache_index)
+        self.preload(agg_mode="025_daily", chunks=[50, 45, 45], cache_index=cache_index)
+        self.assertEqual(
+            ["FLUXCOM-X-BASE_NEE_daily.zarr"], self.cache_store.list_data_ids()
+        )
+        self.assertIsNone(cache_index.get("FLUXCOM-X-BASE_NEE_monthly.zarr"))
+
+    def test_preload_data_land_only(self):
+        cache_index = self.new_cache_index()
+        self.preload(
+            agg_mode="050_monthly",
+            chunks=dict(time=12, lat=30, lon=60),
+            land_only=True,
+            cache_index=cache_index,
+        )
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_monthly.zarr")
+        self.assertEqual("land_only", ds.attrs["icosdp_layout"])
+        self.assertEqual((36, 90 * 180), ds["NEE"].shape)
+        self.assertEqual((12, 1800), ds["NEE"].encoding["chunks"])
+
+        # a gridded cube is served from the land-only cube
+        handle = self.preload(
+            agg_mode="050_monthly", bbox=[0, 40, 10, 50], cache_index=cache_index
+        )
+        self.assertEqual(3, self.icos_data.num_calls)
+        ds = self.cache_store.open_data(self.get_data_id_out(handle))
+        self.assertEqual((36, 5, 5), ds["NEE"].shape)
+        np.testing.assert_equal(
+            [2019] * 12 + [2020] * 12 + [2021] * 12,
+            ds["NEE"].isel(lat=0, lon=0).values,
+        )
+
+    def test_preload_data_land_only_invalid(self):
+        for preload_params in (
+            dict(target_format="netcdf"),
+            dict(streaming=True),
+            dict(extend_existing=True),
+        ):
+            handle = IcosdpPreloadHandle(
+                self.cache_store,
+                self.icos_meta,
+                self.icos_data,
+                "FLUXCOM-X-BASE_NEE",
+                agg_mode="050_monthly",
+                land_only=True,
+                silent=True,
+                scratch_dir=self.scratch_dir,
+                **preload_params,
+            )
+            state = handle.get_state("FLUXCOM-X-BASE_NEE")
+            self.assertEqual(PreloadStatus.failed, state.status)
+            self.assertIn(
+                "The land-only layout is only supported", f"{state.exception}"
+            )
+
+    def test_preload_data_pyramid(self):
+        cache_index = self.new_cache_index()
+        handle = self.preload(
+            agg_mode="050_monthly",
+            chunks=dict(time=12, lat=30, lon=60),
+            pyramid=True,
+            cache_index=cache_index,
+        )
+        self.assertIn("pyramid", handle.get_metrics("FLUXCOM-X-BASE_NEE").stages)
+        path = os.path.join(self.cache_store.root, "FLUXCOM-X-BASE_NEE_monthly.levels")
+        self.assertEqual(
+            [".zlevels", "0.link", "1.zarr", "2.zarr"], sorted(os.listdir(path))
+        )
+        ds = xr.open_zarr(os.path.join(path, "2.zarr"))
+        self.assertEqual((36, 22, 45), ds["NEE"].shape)
+        np.testing.assert_equal(
+            [2019] * 12 + [2020] * 12 + [2021] * 12,
+            ds["NEE"].isel(lat=0, lon=0).values,
+        )
+        entry = cache_index.get("FLUXCOM-X-BASE_NEE_monthly.zarr")
+        self.assertEqual("FLUXCOM-X-BASE_NEE_monthly.levels", entry["pyramid"])
+
+        # a cached cube gets a pyramid without being preloaded again
+        self.preload(
+            agg_mode="050_monthly",
+            chunks=dict(time=12, lat=30, lon=60),
+            pyramid=True,
+            pyramid_levels=2,
+            cache_index=cache_index,
+        )
+        self.assertEqual(3, self.icos_data.num_calls)
+        self.assertEqual([".zlevels", "0.link", "1.zarr"], sorted(os.listdir(path)))
+
+        # the pyramid of a replaced cube is removed
+        self.preload(agg_mode="050_monthly", bbox=[0, 40, 10, 50])
+        self.assertFalse(os.path.exists(path))
+
+    def test_preload_data_pyramid_invalid(self):
+        for preload_params, message in (
+            (
+                dict(target_format="netcdf", pyramid=True),
+                "The pyramid is only supported for `target_format='zarr'`",
+            ),
+            (dict(pyramid=True, pyramid_levels=9), "allows at most 7"),
+        ):
+            handle = IcosdpPreloadHandle(
+                self.cache_store,
+                self.icos_meta,
+                self.icos_data,
+                "FLUXCOM-X-BASE_NEE",
+                agg_mode="050_monthly",
+                silent=True,
+                scratch_dir=self.scratch_dir,
+                **preload_params,
+            )
+            state = handle.get_state("FLUXCOM-X-BASE_NEE")
+            self.assertEqual(PreloadStatus.failed, state.status)
+            self.assertIn(message, f"{state.exception}")
+        self.assertNotIn(
+            "FLUXCOM-X-BASE_NEE_monthly.levels", os.listdir(self.cache_store.root)
+        )
+
+    def test_preload_data_concurrent_jobs(self):
+        scratch_dir = self.scratch_dir
+        handle = self.preload(
+            "FLUXCOM-X-BASE_NEE",
+            "FLUXCOM-X-BASE_GPP",
+            agg_mode="050_monthly",
+            scratch_dir=scratch_dir,
+        )
+        for data_id in ("FLUXCOM-X-BASE_NEE", "FLUXCOM-X-BASE_GPP"):
+            self.assertEqual(
+                3, handle.get_metrics(data_id).stages["download"].num_files
+            )
+            ds = self.cache_store.open_data(f"{data_id}_monthly.zarr")
+            self.assertEqual((36, 90, 180), ds["NEE"].shape)
+        # the scratch folders of the jobs are removed, other content is kept
+        os.makedirs(os.path.join(scratch_dir, "other"))
+        with ThreadPoolExecutor() as executor:
+            futures = [
+                executor.submit(
+                    self.preload,
+                    agg_mode=agg_mode,
+                    chunks=[50, 45, 45],
+                    streaming=streaming,
+                    scratch_dir=scratch_dir,
+                )
+                for agg_mode, streaming in (
+                    ("050_monthly", False),
+                    ("025_daily", True),
+                )
+            ]
+            for future in futures:
+                future.result()
+        self.assertIn("FLUXCOM-X-BASE_NEE_daily.zarr", self.cache_store.list_data_ids())
+        self.assertEqual(["other"], os.listdir(scratch_dir))
+
+    def test_preload_data_virtual(self):
+        self.preload(agg_mode="050_monthly", bbox=[0, 40, 10, 50])
+        expected = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_monthly.zarr")
+
+        handle = self.preload(
+            agg_mode="050_monthly", bbox=[0, 40, 10, 50], target_format="virtual"
+        )
+        self.assertEqual(
+            ["metadata", "download", "write"],
+            list(handle.get_metrics("FLUXCOM-X-BASE_NEE").stages),
+        )
+        path = os.path.join(self.cache_store.root, "FLUXCOM-X-BASE_NEE_monthly.virtual")
+        self.assertEqual(
+            [
+                "NEE_2019_050_monthly.nc",
+                "NEE_2020_050_monthly.nc",
+                "NEE_2021_050_monthly.nc",
+                REFERENCES_FILE_NAME,
+            ],
+            sorted(os.listdir(path)),
+        )
+        ds = open_virtual_cube(self.cache_store.fs, path)
+        self.assertEqual((36, 5, 5), ds["NEE"].shape)
+        xr.testing.assert_equal(expected["NEE"], ds["NEE"])
+
+    def test_preload_data_virtual_invalid(self):
+        for preload_params, message in (
+            (
+                dict(agg_mode="050_monthly", chunks=[12, 10, 10]),
+                "The parameters ['chunks'] are not supported",
+            ),
+            (
+                dict(agg_mode="025_daily"),
+                "The aggregation mode '025_daily' is not supported",
+            ),
+        ):
+            handle = IcosdpPreloadHandle(
+                self.cache_store,
+                self.icos_meta,
+                self.icos_data,
+                "FLUXCOM-X-BASE_NEE",
+                target_format="virtual",
+                silent=True,
+                scratch_dir=self.scratch_dir,
+                **preload_params,
+            )
+            state = handle.get_state("FLUXCOM-X-BASE_NEE")
+            self.assertEqual(PreloadStatus.failed, state.status)
+            self.assertIn(message, f"{state.exception}")
+        # invalid parameters are rejected before downloading
+        self.assertEqual(0, self.icos_data.num_calls)
+
+        # incomplete virtual cubes are removed
+        self.icos_data.fail_on = "2021"
+        handle = IcosdpPreloadHandle(
+            self.cache_store,
+            self.icos_meta,
+            self.icos_data,
+            "FLUXCOM-X-BASE_NEE",
+            agg_mode="050_monthly",
+            target_format="virtual",
+            download_retries=0,
+            silent=True,
+            scratch_dir=self.scratch_dir,
+        )
+        state = handle.get_state("FLUXCOM-X-BASE_NEE")
+        self.assertEqual(PreloadStatus.failed, state.status)
+        self.assertEqual([], self.cache_store.list_data_ids())
+
+    def test_preload_data_metrics(self):
+        reported = []
+        remove_hook = add_metrics_hook(reported.append)
+        try:
+            handle = self.preload(
+                agg_mode="050_monthly", chunks=dict(time=-1, lat=10, lon=10)
+            )
+            self.preload(agg_mode="050_monthly", streaming=True)
+        finally:
+            remove_hook()
+
+        metrics = handle.get_metrics("FLUXCOM-X-BASE_NEE")
+        self.assertIs(metrics, reported[0])
+        self.assertEqual(PreloadStatus.completed, metrics.status)
+        self.assertEqual(
+            ["metadata", "download", "prepare", "rechunk", "write"],
+            list(metrics.stages),
+        )
+        download = metrics.stages["download"]
+        self.assertEqual(3, download.num_files)
+        self.assertGreater(download.num_bytes, 0)
+        write = metrics.stages["write"]
+        self.assertEqual(1, write.num_files)
+        self.assertGreater(write.num_bytes, 0)
+        self.assertGreater(write.num_tasks, 0)
+        self.assertGreater(write.throughput, 0)
+
+        streaming = reported[1]
+        self.assertEqual(
+            ["metadata", "download", "prepare", "write"], list(streaming.stages)
+        )
+        self.assertEqual(3, streaming.stages["download"].num_files)
+        self.assertEqual(3, streaming.stages["write"].num_files)
+
+    def test_preload_data_metrics_failed(self):
+        reported = []
+        remove_hook = add_metrics_hook(reported.append)
+        try:
+            IcosdpPreloadHandle(
+                self.cache_store,
+                self.icos_meta,
+                MockIcosDataClient(num_failures=10),
+                "FLUXCOM-X-BASE_NEE",
+                agg_mode="050_monthly",
+                download_retries=0,
+                silent=True,
+                scratch_dir=self.scratch_dir,
+            )
+        finally:
+            remove_hook()
+        self.assertEqual(1, len(reported))
+        self.assertEqual(PreloadStatus.failed, reported[0].status)
+        self.assertEqual(0, reported[0].stages["download"].num_files)
+
+    def test_preload_data_max_memory(self):
+        max_memory = 16 * 1024**2
+        handle = self.preload(agg_mode="025_daily", max_memory=max_memory)
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_daily.zarr")
+        self.assertEqual((1096, 90, 180), ds["NEE"].shape)
+        # uniform chunks within the budget
+        chunks = ds["NEE"].encoding["chunks"]
+        self.assertLessEqual(4 * math.prod(chunks), max_memory // 3)
+        np.testing.assert_equal(
+            [2019] * 365 + [2020] * 366 + [2021] * 365,
+            ds["NEE"].isel(lat=0, lon=0).values,
+        )
+        metrics = handle.get_metrics("FLUXCOM-X-BASE_NEE")
+        self.assertIsNotNone(metrics.peak_memory)
+        self.assertEqual(metrics.peak_memory, metrics.to_dict()["peak_memory"])
+        self.cache_store.delete_data("FLUXCOM-X-BASE_NEE_daily.zarr")
+
+        self.preload(agg_mode="025_daily", max_memory=max_memory, streaming=True)
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_daily.zarr")
+        self.assertEqual((1096, 90, 180), ds["NEE"].shape)
+        chunks = ds["NEE"].encoding["chunks"]
+        self.assertLessEqual(4 * math.prod(chunks), max_memory // 3)
+
+    def test_preload_data_max_memory_shared(self):
+        max_memory = 32 * 1024**2
+        handle = self.preload(
+            "FLUXCOM-X-BASE_NEE",
+            "FLUXCOM-X-BASE_GPP",
+            agg_mode="025_daily",
+            max_memory=max_memory,
+        )
+        # the jobs share the budget and release it when done
+        self.assertEqual(max_memory, handle._free_memory)
+        for data_id in ("FLUXCOM-X-BASE_NEE", "FLUXCOM-X-BASE_GPP"):
+            ds = self.cache_store.open_data(f"{data_id}_daily.zarr")
+            chunks = ds["NEE"].encoding["chunks"]
+            self.assertLessEqual(4 * math.prod(chunks), max_memory // 2 // 3)
+
+        self.preload(
+            agg_mode="050_monthly", max_memory=max_memory, target_format="netcdf"
+        )
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_monthly.nc")
+        np.testing.assert_equal(
+            [2019] * 12 + [2020] * 12 + [2021] * 12,
+            ds["NEE"].isel(lat=0, lon=0).values,
+        )
+
+    def test_preload_data_max_memory_invalid(self):
+        for preload_params, message in (
+            (dict(chunks=[-1, -1, -1]), "exceed the memory budget"),
+            (
+                dict(streaming=True, bbox=[-180, -90, 180, 90], partial_download=True),
+                "is too small",
+            ),
+        ):
+            handle = IcosdpPreloadHandle(
+                self.cache_store,
+                self.icos_meta,
+                self.icos_data,
+                "FLUXCOM-X-BASE_NEE",
+                agg_mode="025_daily",
+                max_memory=16 * 1024**2,
+                silent=True,
+                scratch_dir=self.scratch_dir,
+                **preload_params,
+            )
+            state = handle.get_state("FLUXCOM-X-BASE_NEE")
+            self.assertEqual(PreloadStatus.failed, state.status)
+            self.assertIn(message, f"{state.exception}")
+
+    @unittest.skipUnless(HAS_DISTRIBUTED, "requires distributed")
+    def test_preload_data_dask_workers(self):
+        handle = self.preload(
+            "FLUXCOM-X-BASE_NEE",
+            "FLUXCOM-X-BASE_GPP",
+            agg_mode="050_monthly",
+            chunks=dict(time=-1, lat=10, lon=10),
+            dask_workers=2,
+        )
+        # the local cluster is shut down after the last preload
+        self.assertIsNone(handle._dask_cluster)
+        # the memory of the workers is not monitored
+        self.assertIsNone(handle.get_metrics("FLUXCOM-X-BASE_NEE").peak_memory)
+        for data_id in ("FLUXCOM-X-BASE_NEE", "FLUXCOM-X-BASE_GPP"):
+            ds = self.cache_store.open_data(f"{data_id}_monthly.zarr")
+            self.assertEqual((36, 10, 10), ds["NEE"].encoding["chunks"])
+            np.testing.assert_equal(
+                [2019] * 12 + [2020] * 12 + [2021] * 12,
+                ds["NEE"].isel(lat=0, lon=0).values,
+            )
+
+    @unittest.skipUnless(HAS_DISTRIBUTED, "requires distributed")
+    def test_preload_data_dask_client(self):
+        from distributed import Client, LocalCluster, get_task_stream
+
+        with LocalCluster(n_workers=2, threads_per_worker=1) as cluster:
+            with Client(cluster) as client:
+                with get_task_stream(client) as task_stream:
+                    self.preload(
+                        agg_mode="050_monthly", streaming=True, dask_client=client
+                    )
+                # the given client is left open
+                self.assertEqual("running", client.status)
+        self.assertGreater(len(task_stream.data), 0)
+        ds = self.cache_store.open_data("FLUXCOM-X-BASE_NEE_monthly.zarr")
+        self.assertEqual((36, 90, 180), ds["NEE"].shape)
+
+    def test_preload_data_dask_invalid(self):
+        with self.assertRaises(DataStoreError) as cm:
+            IcosdpPreloadHandle(
+                self.cache_store,
+                self.icos_meta,
+                self.icos_data,
+                "FLUXCOM-X-BASE_NEE",
+                agg_mode="050_monthly",
+                dask_scheduler="tcp://localhost:8786",
+                dask_workers=2,
+                silent=True,
+                scratch_dir=self.scratch_dir,
+            )
+        self.assertIn("Exactly one of `dask_client`", f"{cm.exception}")
+
+    def test_preload_data_dask_max_memory(self):
+        with self.assertRaises(DataStoreError) as cm:
+            IcosdpPreloadHandle(
+                self.cache_store,
+                self.icos_meta,
+                self.icos_data,
+                "FLUXCOM-X-BASE_NEE",
+                agg_mode="050_monthly",
+                dask_workers=2,
+                max_memory=1024**3,
+                silent=True,
+                scratch_dir=self.scratch_dir,
+            )
+        self.assertIn("`max_memory` cannot be combined", f"{cm.exception}")
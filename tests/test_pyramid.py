@@ -0,0 +1,107 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import fsspec
+import numpy as np
+import xarray as xr
+import zarr
+
+from benchmarks.datasets import get_yearly_dataset
+from xcube_icosdp.pyramid import (
+    LEVELS_META_FILE_NAME,
+    get_num_levels,
+    write_pyramid,
+)
+
+
+class PyramidTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "cube.levels")
+        self.fs = fsspec.filesystem("file")
+        ds = get_yearly_dataset("NEE", 2020, "050_monthly")
+        # left half is water, the right half alternates between 1 and 3
+        land_fraction = np.ones((90, 180))
+        land_fraction[:, :90] = 0.0
+        ds["NEE"][:] = np.where(np.arange(180) % 2, 3.0, 1.0)
+        ds["land_fraction"][:] = land_fraction
+        self.ds = ds.chunk(dict(time=4, lat=30, lon=60))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_get_num_levels(self):
+        self.assertEqual(3, get_num_levels(self.ds))
+        self.assertEqual(1, get_num_levels(self.ds.chunk(dict(lat=90, lon=180))))
+        self.assertEqual(1, get_num_levels(self.ds.compute()))
+
+    def test_write_pyramid(self):
+        num_levels = write_pyramid(self.fs, self.path, self.ds)
+        self.assertEqual(3, num_levels)
+        self.assertEqual(
+            [LEVELS_META_FILE_NAME, "0.zarr", "1.zarr", "2.zarr"],
+            sorted(os.listdir(self.path)),
+        )
+        with open(os.path.join(self.path, LEVELS_META_FILE_NAME)) as fp:
+            meta = json.load(fp)
+        self.assertEqual(3, meta["num_levels"])
+        self.assertEqual([60, 30], meta["tile_size"])
+        for index in range(3):
+            group = zarr.open_group(os.path.join(self.path, f"{index}.zarr"))
+            self.assertEqual(2, group.metadata.zarr_format)
+
+        ds_1 = xr.open_zarr(os.path.join(self.path, "1.zarr"))
+        self.assertEqual((12, 45, 90), ds_1["NEE"].shape)
+        self.assertEqual((4, 30, 60), ds_1["NEE"].encoding["chunks"])
+        # the land fraction is averaged, the values are weighted by it
+        np.testing.assert_equal(0.0, ds_1["land_fraction"][:, :45].values)
+        np.testing.assert_equal(1.0, ds_1["land_fraction"][:, 45:].values)
+        np.testing.assert_equal(np.nan, ds_1["NEE"][:, :, :45].values)
+        np.testing.assert_equal(2.0, ds_1["NEE"][:, :, 45:].values)
+
+        ds_2 = xr.open_zarr(os.path.join(self.path, "2.zarr"))
+        self.assertEqual((12, 22, 45), ds_2["NEE"].shape)
+        np.testing.assert_equal(
+            ds_1.lat.values[:44].reshape(-1, 2).mean(axis=1), ds_2.lat.values
+        )
+
+    def test_write_pyramid_link(self):
+        num_levels = write_pyramid(
+            self.fs, self.path, self.ds, num_levels=2, base_name="cube.zarr"
+        )
+        self.assertEqual(2, num_levels)
+        self.assertEqual(
+            [LEVELS_META_FILE_NAME, "0.link", "1.zarr"],
+            sorted(os.listdir(self.path)),
+        )
+        with open(os.path.join(self.path, "0.link")) as fp:
+            self.assertEqual("cube.zarr", fp.read())
+
+    def test_write_pyramid_invalid(self):
+        with self.assertRaises(ValueError) as cm:
+            write_pyramid(self.fs, self.path, self.ds, num_levels=8)
+        self.assertIn("allows at most 7 pyramid levels", f"{cm.exception}")
+        with self.assertRaises(ValueError) as cm:
+            write_pyramid(self.fs, self.path, self.ds.drop_vars("land_fraction"))
+        self.assertIn("requires the variable 'land_fraction'", f"{cm.exception}")
@@ -0,0 +1,122 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import dask.array as da
+import fsspec
+import numpy as np
+import xarray as xr
+import zarr
+
+from xcube_icosdp.rechunk import get_layout_chunks, plan_rechunk, rechunk_dataset
+
+MiB = 1024**2
+
+
+class PlanRechunkTest(unittest.TestCase):
+
+    def test_direct(self):
+        self.assertEqual(
+            [(1, 900, 900)],
+            plan_rechunk(
+                (252, 3600, 7200), (12, 3600, 7200), (1, 900, 900), 4, 2048 * MiB
+            ),
+        )
+
+    def test_intermediate(self):
+        # spatial slabs to time series
+        stages = plan_rechunk(
+            (252, 3600, 7200), (1, 3600, 7200), (252, 100, 100), 4, 512 * MiB
+        )
+        self.assertEqual(2, len(stages))
+        self.assertEqual((252, 100, 100), stages[-1])
+        inter = stages[0]
+        self.assertLessEqual(np.prod(inter) * 4, 256 * MiB)
+        self.assertEqual(0, inter[2] % 100)
+
+    def test_full_dims(self):
+        self.assertEqual([(10, 20)], plan_rechunk((10, 20), (5, 5), (-1, -1), 4, MiB))
+
+    def test_exceeds_budget(self):
+        with self.assertRaises(ValueError) as cm:
+            plan_rechunk(
+                (252, 3600, 7200), (1, 360, 720), (252, 1000, 1000), 4, 512 * MiB
+            )
+        self.assertIn("target chunks", f"{cm.exception}")
+        with self.assertRaises(ValueError) as cm:
+            plan_rechunk((252, 3600, 7200), (1, 3600, 7200), (252, 10, 10), 4, MiB)
+        self.assertIn("source chunks", f"{cm.exception}")
+
+
+class GetLayoutChunksTest(unittest.TestCase):
+
+    def test_layouts(self):
+        sizes = dict(time=252, lat=3600, lon=7200)
+        self.assertEqual(
+            dict(time=1, lat=3600, lon=3600),
+            get_layout_chunks(sizes, 4, "map-optimized", 1024 * MiB),
+        )
+        self.assertEqual(
+            dict(time=252, lat=258, lon=258),
+            get_layout_chunks(sizes, 4, "timeseries-optimized", 1024 * MiB),
+        )
+        sizes = dict(time=12, hour=24, lat=720, lon=1440)
+        self.assertEqual(
+            dict(time=1, hour=24, lat=720, lon=720),
+            get_layout_chunks(sizes, 4, "map-optimized", 200 * MiB),
+        )
+        with self.assertRaises(ValueError):
+            get_layout_chunks(sizes, 4, "cube-optimized", MiB)
+
+
+class RechunkDatasetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        data = np.arange(48 * 64 * 64, dtype="float32").reshape((48, 64, 64))
+        self.ds = xr.Dataset(
+            dict(
+                NEE=(("time", "lat", "lon"), da.from_array(data, chunks=(1, 64, 64))),
+                land_fraction=(("lat", "lon"), np.ones((64, 64))),
+            )
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_rechunk_dataset(self):
+        fs = fsspec.filesystem("file")
+        ds = rechunk_dataset(
+            self.ds, dict(time=-1, lat=8, lon=8), 256 * 1024, fs, self.temp_dir
+        )
+        self.assertEqual((48, 8, 8), ds["NEE"].data.chunksize)
+        self.assertEqual((8, 8), ds["land_fraction"].data.chunksize)
+        # the intermediate stage is stored
+        self.assertEqual(["rechunk_stage_0.zarr"], os.listdir(self.temp_dir))
+        # in the Zarr format of the cache store
+        group = zarr.open_group(os.path.join(self.temp_dir, "rechunk_stage_0.zarr"))
+        self.assertEqual(2, group.metadata.zarr_format)
+        np.testing.assert_equal(self.ds["NEE"].values, ds["NEE"].values)
+
+    def test_rechunk_dataset_direct(self):
+        fs = fsspec.filesystem("file")
+        ds = rechunk_dataset(self.ds, dict(time=4), 4 * 1024**2, fs, self.temp_dir)
+        self.assertEqual((4, 64, 64), ds["NEE"].data.chunksize)
+        self.assertEqual([], os.listdir(self.temp_dir))
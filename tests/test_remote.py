@@ -0,0 +1,74 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import os
+import tempfile
+import unittest
+
+from xcube_icosdp.remote import HttpRangeFile, open_data_object
+
+from .helpers import MockIcosDataClient, RangeHttpServer
+
+
+class HttpRangeFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.content = os.urandom(100_000)
+        with open(os.path.join(self.temp_dir.name, "data.nc"), "wb") as fp:
+            fp.write(self.content)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_read(self):
+        with RangeHttpServer(self.temp_dir.name) as server:
+            icos_data = MockIcosDataClient(base_url=server.base_url)
+            with open_data_object(
+                icos_data, "https://meta.icos-cp.eu/objects/data.nc", block_size=1024
+            ) as fp:
+                self.assertIsInstance(fp, HttpRangeFile)
+                self.assertEqual("data.nc", fp.file_name)
+                self.assertEqual(100_000, fp.size)
+                fp.seek(50_000)
+                self.assertEqual(self.content[50_000:52_000], fp.read(2000))
+                fp.seek(99_990)
+                self.assertEqual(self.content[99_990:], fp.read())
+                # cached blocks are not fetched again
+                fp.seek(50_100)
+                self.assertEqual(self.content[50_100:50_200], fp.read(100))
+                self.assertEqual(4, fp.num_requests)
+                self.assertEqual(2 * 1024 + 1024 + 100_000 % 1024, fp.num_bytes_fetched)
+        self.assertLess(server.num_bytes_sent, 5000)
+
+    def test_no_range_support(self):
+        with RangeHttpServer(self.temp_dir.name, ranges=False) as server:
+            icos_data = MockIcosDataClient(base_url=server.base_url)
+            with self.assertRaises(OSError) as cm:
+                open_data_object(icos_data, "https://meta.icos-cp.eu/objects/data.nc")
+            self.assertIn("does not support range requests", f"{cm.exception}")
+
+    def test_no_access_url(self):
+        with self.assertRaises(OSError) as cm:
+            open_data_object(
+                MockIcosDataClient(), "https://meta.icos-cp.eu/objects/data.nc"
+            )
+        self.assertIn("has no access URL", f"{cm.exception}")
+
+    def test_unauthorized(self):
+        with RangeHttpServer(self.temp_dir.name) as server:
+            with self.assertRaises(OSError):
+                HttpRangeFile(f"{server.base_url}/objects/data.nc")
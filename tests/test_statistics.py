@@ -0,0 +1,185 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from xcube_icosdp import statistics
+from xcube_icosdp.statistics import PixelAccumulator, compute_statistics
+
+
+def get_dataset() -> xr.Dataset:
+    rng = np.random.default_rng(42)
+    data = rng.normal(5.0, 2.0, (40, 2, 6, 8)).astype("float32")
+    data[:, :, 0, 0] = np.nan
+    data[:10, :, 1, 1] = np.nan
+    return xr.Dataset(
+        dict(
+            NEE=(("time", "hour", "lat", "lon"), data),
+            land_fraction=(("lat", "lon"), np.ones((6, 8))),
+        ),
+        coords=dict(
+            time=pd.date_range("2001-01-01", periods=40),
+            hour=[0, 12],
+            lat=np.arange(6.0),
+            lon=np.arange(8.0),
+        ),
+    ).chunk(dict(time=15, lat=3, lon=4))
+
+
+class PixelAccumulatorTest(unittest.TestCase):
+
+    def test_merge(self):
+        values = get_dataset()["NEE"].values.reshape((80, 6, 8))
+        accumulator = PixelAccumulator.empty((6, 8), num_bins=10)
+        accumulator.update(values[:30], (0.0, 10.0))
+        other = PixelAccumulator.empty((6, 8), num_bins=10)
+        other.update(values[30:], (0.0, 10.0))
+        accumulator.merge(other)
+
+        expected = PixelAccumulator.empty((6, 8), num_bins=10)
+        expected.update(values, (0.0, 10.0))
+        for name, array in expected.to_arrays().items():
+            np.testing.assert_allclose(array, accumulator.to_arrays()[name])
+        np.testing.assert_equal(
+            np.count_nonzero(~np.isnan(values), axis=0),
+            accumulator.histogram.sum(axis=0),
+        )
+
+    def test_get_statistic(self):
+        values = np.array([[1.0, np.nan], [3.0, np.nan]])
+        accumulator = PixelAccumulator.empty((2,))
+        accumulator.update(values)
+        np.testing.assert_equal([2, 0], accumulator.get_statistic("count"))
+        np.testing.assert_equal([2.0, np.nan], accumulator.get_statistic("mean"))
+        np.testing.assert_equal([1.0, np.nan], accumulator.get_statistic("std"))
+        np.testing.assert_equal([1.0, np.nan], accumulator.get_statistic("min"))
+        with self.assertRaises(ValueError):
+            accumulator.get_statistic("median")
+
+
+class ComputeStatisticsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_compute_statistics(self):
+        ds = get_dataset()
+        result = compute_statistics(
+            ds, quantiles=[0.0, 0.5, 0.9], value_range=(-5.0, 15.0), num_bins=200
+        )
+        self.assertEqual(
+            [
+                "NEE_count",
+                "NEE_mean",
+                "NEE_std",
+                "NEE_min",
+                "NEE_max",
+                "NEE_quantile",
+            ],
+            list(result.data_vars),
+        )
+        self.assertEqual(("lat", "lon"), result["NEE_mean"].dims)
+        self.assertEqual(np.float32, result["NEE_mean"].dtype)
+        nee = ds["NEE"]
+        np.testing.assert_equal(
+            nee.count(["time", "hour"]).values, result["NEE_count"].values
+        )
+        np.testing.assert_allclose(
+            nee.mean(["time", "hour"]).values, result["NEE_mean"].values, rtol=1e-5
+        )
+        np.testing.assert_allclose(
+            nee.std(["time", "hour"]).values, result["NEE_std"].values, rtol=1e-5
+        )
+        np.testing.assert_equal(
+            nee.min(["time", "hour"]).values, result["NEE_min"].values
+        )
+        np.testing.assert_equal(
+            nee.max(["time", "hour"]).values, result["NEE_max"].values
+        )
+        # the quantiles are exact up to the bin width of 0.1
+        expected = nee.quantile([0.0, 0.5, 0.9], dim=["time", "hour"])
+        np.testing.assert_allclose(
+            expected.values, result["NEE_quantile"].values, atol=0.1
+        )
+
+    def test_compute_statistics_checkpoint(self):
+        ds = get_dataset()
+        checkpoint_dir = os.path.join(self.temp_dir, "checkpoint")
+        expected = compute_statistics(ds, statistics=["mean", "max"])
+
+        read_block = statistics._read_block
+        num_calls = 0
+
+        def fail_after_read(*args):
+            nonlocal num_calls
+            num_calls += 1
+            if num_calls > 10:
+                raise OSError("Connection lost")
+            return read_block(*args)
+
+        # 4 tiles with 3 time blocks each
+        with patch.object(statistics, "_read_block", side_effect=fail_after_read):
+            with self.assertRaises(OSError):
+                compute_statistics(
+                    ds,
+                    statistics=["mean", "max"],
+                    checkpoint_dir=checkpoint_dir,
+                    max_workers=1,
+                )
+        self.assertIn("tile_0.npz", os.listdir(checkpoint_dir))
+
+        with self.assertRaises(ValueError) as cm:
+            compute_statistics(
+                ds, quantiles=[0.5], value_range=(0, 10), checkpoint_dir=checkpoint_dir
+            )
+        self.assertIn("was written for other arguments", f"{cm.exception}")
+
+        num_calls = 0
+        with patch.object(statistics, "_read_block", side_effect=fail_after_read):
+            result = compute_statistics(
+                ds,
+                statistics=["mean", "max"],
+                checkpoint_dir=checkpoint_dir,
+                max_workers=1,
+            )
+        self.assertEqual(2, num_calls)
+        xr.testing.assert_allclose(expected, result)
+        self.assertFalse(os.path.exists(checkpoint_dir))
+
+    def test_compute_statistics_invalid(self):
+        ds = get_dataset()
+        for kwargs, message in (
+            (dict(var_names=["land_fraction"]), "Invalid variables ['land_fraction']"),
+            (dict(statistics=["median"]), "Invalid statistics ['median']"),
+            (dict(quantiles=[0.5]), "`value_range` is required"),
+            (dict(quantiles=[1.5], value_range=(0, 1)), "between 0 and 1"),
+            (dict(quantiles=[0.5], value_range=(1, 0)), "Invalid value range"),
+        ):
+            with self.assertRaises(ValueError) as cm:
+                compute_statistics(ds, **kwargs)
+            self.assertIn(message, f"{cm.exception}")
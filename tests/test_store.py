@@ -14,10 +14,15 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
 
-import pytest
+import os
+import shutil
+import tempfile
 import unittest
+from types import SimpleNamespace
 from unittest.mock import patch
 
+import numpy as np
+import pytest
 import xarray as xr
 from xcube.core.store import (
     DatasetDescriptor,
@@ -27,9 +32,10 @@ from xcube.core.store import (
 )
 from xcube.util.jsonschema import JsonObjectSchema
 
+from benchmarks.datasets import get_hourly_005_dataset
 from xcube_icosdp.constants import DATA_STORE_ID
-
-from .helpers import get_hourly_005_dataseet
+from xcube_icosdp.land import to_land_cells
+from xcube_icosdp.store import _get_sidecar_path
 
 
 class IcosdpDataStoreTest(unittest.TestCase):
@@ -70,25 +76,87 @@ class IcosdpDataStoreTest(unittest.TestCase):
 
     @patch("xarray.open_dataset")
     def test_describe_data(self, mock_open_dataset):
-        mock_open_dataset.return_value = get_hourly_005_dataseet()
-        store = new_data_store(DATA_STORE_ID)
-        descriptor = store.describe_data("FLUXCOM-X-BASE_NEE")
-        mock_open_dataset.assert_called_once_with(
-            (
-                "https://swift.dkrz.de/v1/dkrz_a1e106384d7946408b9724b59858a536/"
-                "fluxcom-x/FLUXCOMxBase/NEE"
-            ),
-            engine="zarr",
-            chunks={},
-        )
-        self.assertIsInstance(descriptor, DatasetDescriptor)
-        self.assertEqual("FLUXCOM-X-BASE_NEE", descriptor.data_id)
-        self.assertEqual("dataset", descriptor.data_type.alias)
-        self.assertEqual("EPSG:4326", descriptor.crs)
-        self.assertEqual((-180, -90, 180, 90), descriptor.bbox)
-        self.assertEqual(
-            ("2001-01-01T00:00:00Z", "2021-12-31T00:00:00Z"), descriptor.time_range
+        mock_open_dataset.return_value = get_hourly_005_dataset()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache_root = os.path.join(temp_dir, "cache")
+            store = new_data_store(
+                DATA_STORE_ID, cache_store_params=dict(root=cache_root)
+            )
+            descriptor = store.describe_data("FLUXCOM-X-BASE_NEE")
+            mock_open_dataset.assert_called_once_with(
+                (
+                    "https://swift.dkrz.de/v1/dkrz_a1e106384d7946408b9724b59858a536/"
+                    "fluxcom-x/FLUXCOMxBase/NEE"
+                ),
+                engine="zarr",
+                chunks={},
+            )
+            self.assertIsInstance(descriptor, DatasetDescriptor)
+            self.assertEqual("FLUXCOM-X-BASE_NEE", descriptor.data_id)
+            self.assertEqual("dataset", descriptor.data_type.alias)
+            self.assertEqual("EPSG:4326", descriptor.crs)
+            self.assertEqual((-180, -90, 180, 90), descriptor.bbox)
+            self.assertEqual(
+                ("2001-01-01T00:00:00Z", "2021-12-31T00:00:00Z"),
+                descriptor.time_range,
+            )
+            self.assertEqual(
+                dict(time=7670, hour=24, lat=3600, lon=7200, nbnds=2),
+                descriptor.dims,
+            )
+            self.assertTrue(
+                os.path.isfile(os.path.join(temp_dir, "icosdp_catalog.json"))
+            )
+
+            # a new store instance reads the persisted catalog
+            store = new_data_store(
+                DATA_STORE_ID, cache_store_params=dict(root=cache_root)
+            )
+            descriptor2 = store.describe_data("FLUXCOM-X-BASE_NEE")
+            mock_open_dataset.assert_called_once()
+            self.assertEqual(descriptor.to_dict(), descriptor2.to_dict())
+
+            # refresh opens the remote dataset again
+            store.refresh_catalog("FLUXCOM-X-BASE_NEE", agg_modes=["005_hourly"])
+            self.assertEqual(2, mock_open_dataset.call_count)
+
+            # invalid aggregation mode
+            with self.assertRaises(DataStoreError) as cm:
+                _ = store.describe_data("FLUXCOM-X-BASE_NEE", agg_mode="010_daily")
+            self.assertIn("Aggregation mode must be one of ", f"{cm.exception}")
+
+    @patch("icoscp_core.icos.meta")
+    def test_describe_data_agg_mode(self, mock_meta):
+        mock_meta.get_collection_meta.return_value = SimpleNamespace(
+            title="FLUXCOM-X-BASE NEE",
+            description="Mock description",
+            doi="10.18160/mock",
+            members=[
+                SimpleNamespace(title=f"FLUXCOM-X-BASE NEE {year}")
+                for year in range(2001, 2022)
+            ],
         )
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = new_data_store(
+                DATA_STORE_ID,
+                cache_store_params=dict(root=os.path.join(temp_dir, "cache")),
+            )
+            descriptor = store.describe_data(
+                "FLUXCOM-X-BASE_NEE", agg_mode="050_monthly"
+            )
+            self.assertEqual(
+                ("2001-01-01T00:00:00Z", "2021-12-31T00:00:00Z"),
+                descriptor.time_range,
+            )
+            self.assertEqual(dict(time=252, lat=360, lon=720), descriptor.dims)
+            self.assertEqual("10.18160/mock", descriptor.attrs["doi"])
+            descriptor = store.describe_data(
+                "FLUXCOM-X-BASE_NEE", agg_mode="025_monthlycycle"
+            )
+            self.assertEqual(
+                dict(time=252, hour=24, lat=720, lon=1440), descriptor.dims
+            )
+            self.assertEqual(2, mock_meta.get_collection_meta.call_count)
 
     def test_get_data_opener_ids(self):
         store = new_data_store(DATA_STORE_ID)
@@ -103,7 +171,7 @@ class IcosdpDataStoreTest(unittest.TestCase):
 
     @patch("xarray.open_dataset")
     def test_open_data(self, mock_open_dataset):
-        mock_open_dataset.return_value = get_hourly_005_dataseet()
+        mock_open_dataset.return_value = get_hourly_005_dataset()
         store = new_data_store(DATA_STORE_ID)
 
         # default
@@ -133,6 +201,41 @@ class IcosdpDataStoreTest(unittest.TestCase):
         self.assertEqual((365 * 24, 200, 200), ds["NEE"].shape)
         self.assertEqual((200, 200), ds["land_fraction"].shape)
 
+        # temporal aggregation
+        ds = store.open_data(
+            "FLUXCOM-X-BASE_NEE",
+            time_range=("2002-01-01", "2002-12-31"),
+            bbox=[0, 40, 10, 50],
+            agg_freq="monthly",
+            agg_method="sum",
+        )
+        self.assertEqual(("time", "lat", "lon"), ds["NEE"].dims)
+        self.assertEqual((12, 200, 200), ds["NEE"].shape)
+        ds = store.open_data(
+            "FLUXCOM-X-BASE_NEE",
+            time_range=("2002-01-01", "2002-12-31"),
+            agg_freq="monthlycycle",
+            flatten_time=True,
+        )
+        self.assertEqual((12 * 24, 3600, 7200), ds["NEE"].shape)
+        with self.assertRaises(DataStoreError) as cm:
+            _ = store.open_data(
+                "FLUXCOM-X-BASE_NEE", agg_freq="daily", flatten_time=True
+            )
+        self.assertIn("`flatten_time` is not available", f"{cm.exception}")
+
+        # spatial coarsening
+        ds = store.open_data("FLUXCOM-X-BASE_NEE", spatial_res=0.5)
+        self.assertEqual((7670, 24, 360, 720), ds["NEE"].shape)
+        self.assertEqual((360, 720), ds["land_fraction"].shape)
+        ds = store.open_data(
+            "FLUXCOM-X-BASE_NEE", bbox=[0.1, 40, 10, 50.1], spatial_res=0.5
+        )
+        self.assertEqual((7670, 24, 21, 20), ds["NEE"].shape)
+        with self.assertRaises(DataStoreError) as cm:
+            _ = store.open_data("FLUXCOM-X-BASE_NEE", spatial_res=0.07)
+        self.assertIn("must be an integer multiple of 0.05", f"{cm.exception}")
+
         # invalid time_range
         with self.assertRaises(DataStoreError) as cm:
             _ = store.open_data(
@@ -145,6 +248,269 @@ class IcosdpDataStoreTest(unittest.TestCase):
             _ = store.open_data("FLUXCOM-X-BASE_NEE", bbox=(0, 45, 10, 40))
         self.assertIn("Invalid bbox ", f"{cm.exception}")
 
+    @patch("xarray.open_dataset")
+    def test_open_data_dataset_cache(self, mock_open_dataset):
+        mock_open_dataset.return_value = get_hourly_005_dataset()
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        store = new_data_store(
+            DATA_STORE_ID, cache_store_params=dict(root=f"{temp_dir}/cache")
+        )
+
+        ds1 = store.open_data("FLUXCOM-X-BASE_NEE")
+        ds2 = store.open_data("FLUXCOM-X-BASE_NEE", bbox=[0, 40, 10, 50])
+        _ = store.describe_data("FLUXCOM-X-BASE_NEE")
+        mock_open_dataset.assert_called_once()
+        self.assertEqual((7670, 24, 3600, 7200), ds1["NEE"].shape)
+        self.assertEqual((7670, 24, 200, 200), ds2["NEE"].shape)
+        stats = store.get_dataset_cache_stats()
+        self.assertEqual(1, stats.misses)
+        self.assertEqual(2, stats.hits)
+
+        # returned datasets do not alter the cached one
+        ds1.attrs["title"] = "altered"
+        ds3 = store.open_data("FLUXCOM-X-BASE_NEE")
+        self.assertNotIn("title", ds3.attrs)
+
+        store.clear_dataset_cache()
+        _ = store.open_data("FLUXCOM-X-BASE_NEE")
+        self.assertEqual(2, mock_open_dataset.call_count)
+
+        # cache disabled
+        store = new_data_store(DATA_STORE_ID, dataset_cache_size=0)
+        _ = store.open_data("FLUXCOM-X-BASE_NEE")
+        _ = store.open_data("FLUXCOM-X-BASE_NEE")
+        self.assertEqual(4, mock_open_dataset.call_count)
+
+    @patch("xarray.open_dataset")
+    def test_open_data_variables(self, mock_open_dataset):
+        def open_dataset(uri, drop_variables=None, **kwargs):
+            ds = get_hourly_005_dataset().rename(NEE=uri.split("/")[-1])
+            if drop_variables:
+                ds = ds.drop_vars([n for n in drop_variables if n in ds.variables])
+            return ds
+
+        mock_open_dataset.side_effect = open_dataset
+        store = new_data_store(DATA_STORE_ID)
+        ds = store.open_data(
+            "FLUXCOM-X-BASE_NEE",
+            variables=["NEE", "GPP", "ET", "ET_T", "GPP"],
+            bbox=[0, 40, 10, 50],
+            agg_freq="daily",
+        )
+        self.assertEqual(
+            ["NEE", "land_fraction", "GPP", "ET", "ET_T"], list(ds.data_vars)
+        )
+        for name in ("NEE", "GPP", "ET", "ET_T"):
+            self.assertEqual(("time", "lat", "lon"), ds[name].dims)
+            self.assertEqual((7670, 200, 200), ds[name].shape)
+        self.assertEqual(4, mock_open_dataset.call_count)
+        # coordinates are read from the first dataset only
+        drop_variables = [
+            call.kwargs.get("drop_variables")
+            for call in mock_open_dataset.call_args_list
+        ]
+        self.assertEqual(1, drop_variables.count(None))
+
+        # the merged dataset is cached
+        ds = store.open_data(
+            "FLUXCOM-X-BASE_NEE", variables=["NEE", "GPP", "ET", "ET_T"]
+        )
+        self.assertEqual(4, mock_open_dataset.call_count)
+        self.assertEqual((7670, 24, 3600, 7200), ds["ET_T"].shape)
+
+        # the variables replace the variable of the data ID
+        ds = store.open_data("FLUXCOM-X-BASE_NEE", variables=["GPP"])
+        self.assertEqual(["GPP", "land_fraction"], list(ds.data_vars))
+
+        def open_dataset_coarse(uri, drop_variables=None, **kwargs):
+            ds = open_dataset(uri, drop_variables=drop_variables)
+            return ds.isel(lat=slice(0, 100)) if drop_variables else ds
+
+        mock_open_dataset.side_effect = open_dataset_coarse
+        store.clear_dataset_cache()
+        with self.assertRaises(DataStoreError) as cm:
+            store.open_data("FLUXCOM-X-BASE_NEE", variables=["NEE", "ET"])
+        self.assertIn("does not match the grid", f"{cm.exception}")
+
+    @patch("xarray.open_dataset")
+    def test_extract_points(self, mock_open_dataset):
+        mock_open_dataset.return_value = get_hourly_005_dataset()
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        store = new_data_store(
+            DATA_STORE_ID, cache_store_params=dict(root=f"{temp_dir}/cache")
+        )
+
+        # full-resolution cube
+        ds = store.extract_points(
+            "FLUXCOM-X-BASE_NEE",
+            [50.95, -33.6],
+            [11.32, 150.72],
+            site_ids=["DE-Hai", "AU-Cum"],
+            time_range=("2002-01-01", "2002-01-02"),
+        )
+        self.assertEqual(("site", "time"), ds["NEE"].dims)
+        self.assertEqual((2, 48), ds["NEE"].shape)
+        self.assertEqual(["DE-Hai", "AU-Cum"], list(ds.site.values))
+        self.assertEqual((2,), ds["land_fraction"].shape)
+
+        # preloaded cube in the cache store
+        ds_cube = (
+            get_hourly_005_dataset()
+            .isel(time=slice(0, 3), hour=0, lat=slice(0, 40), lon=slice(0, 40))
+            .drop_vars(["hour", "hour_bnds"])
+        )
+        store.cache_store.write_data(ds_cube, "FLUXCOM-X-BASE_NEE_daily.zarr")
+        ds = store.extract_points(
+            "FLUXCOM-X-BASE_NEE_daily.zarr",
+            [89.9],
+            [-179.9],
+            time_ranges=[("2001-01-02", "2001-01-03")],
+        )
+        self.assertEqual((1, 2), ds["NEE"].shape)
+
+        with self.assertRaises(DataStoreError) as cm:
+            store.extract_points("FLUXCOM-X-BASE_NEE_daily.zarr", [10.0], [10.0])
+        self.assertIn("outside of the grid", f"{cm.exception}")
+        with self.assertRaises(DataStoreError) as cm:
+            store.extract_points("FLUXCOM-X-BASE_GPP_daily.zarr", [10.0], [10.0])
+        self.assertIn("is neither available", f"{cm.exception}")
+        with self.assertRaises(DataStoreError):
+            store.extract_points(
+                "FLUXCOM-X-BASE_NEE",
+                [10.0],
+                [10.0],
+                time_range=("2002-01-01", "2002-01-02"),
+                time_ranges=[("2002-01-01", "2002-01-02")],
+            )
+
+    @patch("xarray.open_dataset")
+    def test_build_mirror(self, mock_open_dataset):
+        mock_open_dataset.return_value = get_hourly_005_dataset()
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        store = new_data_store(
+            DATA_STORE_ID, cache_store_params=dict(root=f"{temp_dir}/cache")
+        )
+        time_range = ("2001-01-01", "2001-01-10")
+        bbox = [11.1, 50.1, 11.3, 50.3]
+
+        # without a mirror, the full-resolution cube is read
+        ds = store.open_data("FLUXCOM-X-BASE_NEE", time_range=time_range, bbox=bbox)
+        self.assertNotIn("chunks", ds["NEE"].encoding)
+
+        mirror_id = store.build_mirror(
+            "FLUXCOM-X-BASE_NEE",
+            [11, 50, 11.5, 50.5],
+            time_range=time_range,
+            scratch_dir=f"{temp_dir}/scratch",
+        )
+        self.assertEqual("FLUXCOM-X-BASE_NEE_hourly_mirror.zarr", mirror_id)
+        self.assertTrue(store.cache_store.has_data(mirror_id))
+        self.assertEqual([], os.listdir(f"{temp_dir}/scratch"))
+
+        # requests covered by the mirror are read from it
+        ds = store.open_data("FLUXCOM-X-BASE_NEE", time_range=time_range, bbox=bbox)
+        self.assertEqual((10, 24, 4, 4), ds["NEE"].shape)
+        self.assertEqual((10, 24, 40, 40), ds["NEE"].encoding["chunks"])
+        self.assertNotIn("icosdp_mirror", ds.attrs)
+        ds = store.open_data(
+            "FLUXCOM-X-BASE_NEE", time_range=("2001-01-01", "2001-01-12"), bbox=bbox
+        )
+        self.assertNotIn("chunks", ds["NEE"].encoding)
+        ds = store.open_data("FLUXCOM-X-BASE_NEE", time_range=time_range)
+        self.assertNotIn("chunks", ds["NEE"].encoding)
+
+        ds = store.extract_points(
+            "FLUXCOM-X-BASE_NEE",
+            [50.2, -33.6],
+            [11.2, 150.72],
+            time_range=("2001-01-02", "2001-01-03"),
+        )
+        self.assertEqual((2, 48), ds["NEE"].shape)
+        ds = store.extract_points(
+            "FLUXCOM-X-BASE_NEE", [50.2], [11.2], time_range=time_range
+        )
+        self.assertEqual((1, 240), ds["NEE"].shape)
+
+        with self.assertRaises(DataStoreError) as cm:
+            store.build_mirror("FLUXCOM-X-BASE_NEE", [11, 50, 10, 51])
+        self.assertIn("Invalid bbox ", f"{cm.exception}")
+        with self.assertRaises(DataStoreError) as cm:
+            store.build_mirror(
+                "FLUXCOM-X-BASE_NEE",
+                [11, 50, 11.5, 50.5],
+                time_range=("1990-01-01", "1990-01-02"),
+            )
+        self.assertIn("does not contain any time step", f"{cm.exception}")
+
+    @patch("xarray.open_dataset")
+    def test_compute_statistics(self, mock_open_dataset):
+        mock_open_dataset.return_value = get_hourly_005_dataset()
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        store = new_data_store(
+            DATA_STORE_ID, cache_store_params=dict(root=f"{temp_dir}/cache")
+        )
+
+        ds = store.compute_statistics(
+            "FLUXCOM-X-BASE_NEE",
+            time_range=("2002-01-01", "2002-01-10"),
+            bbox=[10.0, 50.0, 12.0, 52.0],
+            quantiles=[0.5],
+            value_range=(-1.0, 1.0),
+        )
+        self.assertEqual((40, 40), ds["NEE_mean"].shape)
+        self.assertEqual((1, 40, 40), ds["NEE_quantile"].shape)
+        np.testing.assert_equal(240, ds["NEE_count"].values)
+        np.testing.assert_equal(0.0, ds["NEE_mean"].values)
+
+        # preloaded cube in the cache store
+        ds_cube = (
+            get_hourly_005_dataset()
+            .isel(time=slice(0, 3), hour=0, lat=slice(0, 40), lon=slice(0, 40))
+            .drop_vars(["hour", "hour_bnds"])
+        )
+        store.cache_store.write_data(ds_cube, "FLUXCOM-X-BASE_NEE_daily.zarr")
+        ds = store.compute_statistics(
+            "FLUXCOM-X-BASE_NEE_daily.zarr", statistics=["count", "max"]
+        )
+        self.assertEqual(["NEE_count", "NEE_max"], list(ds.data_vars))
+        np.testing.assert_equal(3, ds["NEE_count"].values)
+
+        with self.assertRaises(DataStoreError) as cm:
+            store.compute_statistics("FLUXCOM-X-BASE_NEE", quantiles=[0.5])
+        self.assertIn("`value_range` is required", f"{cm.exception}")
+
+    def test_open_preloaded_data(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        store = new_data_store(
+            DATA_STORE_ID, cache_store_params=dict(root=f"{temp_dir}/cache")
+        )
+        ds_cube = (
+            get_hourly_005_dataset()
+            .isel(time=slice(0, 3), hour=0, lat=slice(0, 40), lon=slice(0, 40))
+            .drop_vars(["hour", "hour_bnds"])
+        )
+        store.cache_store.write_data(ds_cube, "FLUXCOM-X-BASE_NEE_daily.zarr")
+        ds = store.open_preloaded_data("FLUXCOM-X-BASE_NEE_daily.zarr")
+        self.assertIsInstance(ds, xr.Dataset)
+        self.assertEqual((3, 40, 40), ds["NEE"].shape)
+
+        # land-only cubes are opened as gridded view
+        store.cache_store.write_data(
+            to_land_cells(ds_cube), "FLUXCOM-X-BASE_NEE_daily_land.zarr"
+        )
+        ds = store.open_preloaded_data("FLUXCOM-X-BASE_NEE_daily_land.zarr")
+        self.assertEqual(("time", "lat", "lon"), ds["NEE"].dims)
+        self.assertEqual((3, 40, 40), ds["NEE"].shape)
+
+        with self.assertRaises(DataStoreError) as cm:
+            store.open_preloaded_data("FLUXCOM-X-BASE_GPP_daily.zarr")
+        self.assertIn("is not available in the cache store", f"{cm.exception}")
+
     def test_preload_data_error(self):
         # raise error if no email and password
         with self.assertRaises(DataStoreError) as cm:
@@ -237,3 +603,18 @@ class IcosdpDataStoreTest(unittest.TestCase):
         with self.assertRaises(DataStoreError) as cm:
             _ = store._assert_valid_opener_id("dataset:zarr:https")
         self.assertIn("Data opener identifier must be one of ", f"{cm.exception}")
+
+    def test_get_sidecar_path(self):
+        self.assertEqual(
+            "/data/icosdp_catalog.json",
+            _get_sidecar_path("/data/cache/", "icosdp_catalog.json"),
+        )
+        # a root without parent, e.g. a bucket, keeps the file within it
+        self.assertEqual(
+            "bucket/icosdp_catalog.json",
+            _get_sidecar_path("bucket", "icosdp_catalog.json"),
+        )
+        self.assertEqual(
+            "cache/icosdp_cache_index.json",
+            _get_sidecar_path("cache/", "icosdp_cache_index.json"),
+        )
@@ -0,0 +1,119 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import unittest
+
+import dask.array as da
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from xcube_icosdp.utils import (
+    _flatten_time_hour,
+    _get_agg_mode_sizes,
+    _get_aligned_chunks,
+    _get_coarsen_factor,
+    _get_snapped_slice,
+    _parse_agg_mode,
+)
+
+
+class UtilsTest(unittest.TestCase):
+
+    def test_parse_agg_mode(self):
+        self.assertEqual((0.5, "monthly"), _parse_agg_mode("050_monthly"))
+        self.assertEqual((0.05, "hourly"), _parse_agg_mode("005_hourly"))
+
+    def test_get_agg_mode_sizes(self):
+        self.assertEqual(
+            dict(time=24, lat=360, lon=720),
+            _get_agg_mode_sizes("050_monthly", [2020, 2021]),
+        )
+        self.assertEqual(
+            dict(time=731, lat=720, lon=1440),
+            _get_agg_mode_sizes("025_daily", [2020, 2021]),
+        )
+        self.assertEqual(
+            dict(time=12, hour=24, lat=720, lon=1440),
+            _get_agg_mode_sizes("025_monthlycycle", [2021]),
+        )
+        self.assertEqual(
+            dict(time=7670, hour=24, lat=3600, lon=7200),
+            _get_agg_mode_sizes("005_hourly", list(range(2001, 2022))),
+        )
+
+    def test_get_aligned_chunks(self):
+        self.assertEqual((10, 10, 5), _get_aligned_chunks(0, 10, 25))
+        self.assertEqual((4, 10, 10, 1), _get_aligned_chunks(36, 10, 25))
+        self.assertEqual((3,), _get_aligned_chunks(36, 10, 3))
+        self.assertEqual((12, 12), _get_aligned_chunks(24, 12, 24))
+
+    def test_get_coarsen_factor(self):
+        self.assertEqual(5, _get_coarsen_factor(0.25))
+        self.assertEqual(10, _get_coarsen_factor(0.5))
+        self.assertEqual(1, _get_coarsen_factor(0.05))
+        with self.assertRaises(ValueError):
+            _get_coarsen_factor(0.12)
+
+    def test_get_snapped_slice(self):
+        lat = np.linspace(89.975, -89.975, 3600)
+        self.assertEqual(slice(790, 1000), _get_snapped_slice(lat, 40, 50.3, 10))
+        lon = np.linspace(-179.975, 179.975, 7200)
+        self.assertEqual(slice(3600, 3800), _get_snapped_slice(lon, 0, 10, 10))
+        self.assertEqual(slice(0, 0), _get_snapped_slice(lon, 190, 200, 10))
+
+    def test_flatten_time_hour(self):
+        time = pd.date_range("2020-01-01", periods=6, freq="D")
+        hour = np.arange(24)
+        lat = np.linspace(45, 40, 4)
+        lon = np.linspace(5, 10, 5)
+        data = np.arange(6 * 24 * 4 * 5, dtype="float32").reshape((6, 24, 4, 5))
+        ds = xr.Dataset(
+            data_vars=dict(
+                NEE=(
+                    ("time", "hour", "lat", "lon"),
+                    da.from_array(data, chunks=(2, 12, 2, 5)),
+                    dict(units="gC m-2 d-1"),
+                ),
+                land_fraction=(("lat", "lon"), np.ones((4, 5))),
+                time_weight=(("time",), np.arange(6.0)),
+            ),
+            coords=dict(
+                time=time,
+                hour=hour,
+                lat=lat,
+                lon=lon,
+                hour_bnds=(("hour", "nbnds"), np.zeros((24, 2), dtype=int)),
+            ),
+            attrs=dict(title="test"),
+        )
+        ds_flat = _flatten_time_hour(ds)
+
+        self.assertEqual(dict(time=144, lat=4, lon=5), dict(ds_flat.sizes))
+        self.assertNotIn("hour", ds_flat.coords)
+        self.assertNotIn("hour_bnds", ds_flat.coords)
+        np.testing.assert_equal(
+            pd.date_range("2020-01-01", periods=144, freq="h").values,
+            ds_flat.time.values,
+        )
+        self.assertEqual(("time", "lat", "lon"), ds_flat["NEE"].dims)
+        # chunks along time are kept and span all hours of their days
+        self.assertEqual(((48, 48, 48), (2, 2), (5,)), ds_flat["NEE"].chunks)
+        np.testing.assert_equal(data.reshape((144, 4, 5)), ds_flat["NEE"].values)
+        self.assertEqual(dict(units="gC m-2 d-1"), ds_flat["NEE"].attrs)
+        np.testing.assert_equal(np.repeat(np.arange(6.0), 24), ds_flat.time_weight)
+        self.assertEqual(ds["land_fraction"].dims, ds_flat["land_fraction"].dims)
+        self.assertEqual(dict(title="test"), ds_flat.attrs)
@@ -0,0 +1,103 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import fsspec
+import numpy as np
+import xarray as xr
+
+from xcube_icosdp.virtual import (
+    REFERENCES_FILE_NAME,
+    open_virtual_cube,
+    write_references,
+)
+
+from .helpers import write_yearly_file
+
+
+class VirtualCubeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "cube.virtual")
+        os.makedirs(self.path)
+        self.fs = fsspec.filesystem("file")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def write_files(self, agg_mode: str, years: list[int]) -> list[str]:
+        file_names = []
+        for year in years:
+            file_name = f"NEE_{year}_{agg_mode}.nc"
+            write_yearly_file("NEE", year, agg_mode, os.path.join(self.path, file_name))
+            file_names.append(file_name)
+        return file_names
+
+    def test_write_and_open(self):
+        file_names = self.write_files("050_monthly", [2019, 2020, 2021])
+        params = json.dumps(dict(bbox=[0, 40, 10, 50], flatten_time=False))
+        refs = write_references(
+            self.fs,
+            self.path,
+            file_names,
+            attrs=dict(icosdp_preload_params=params),
+        )
+        # the files are referenced relative to the folder
+        self.assertEqual("NEE_2019_050_monthly.nc", refs["refs"]["NEE/0.0.0"][0])
+        self.assertTrue(os.path.exists(os.path.join(self.path, REFERENCES_FILE_NAME)))
+
+        # the folder can be moved
+        moved_path = os.path.join(self.temp_dir, "moved.virtual")
+        os.rename(self.path, moved_path)
+        ds = open_virtual_cube(self.fs, moved_path)
+        self.assertEqual((36, 5, 5), ds["NEE"].shape)
+        self.assertEqual(params, ds.attrs["icosdp_preload_params"])
+        np.testing.assert_equal(
+            [2019] * 12 + [2020] * 12 + [2021] * 12,
+            ds["NEE"].isel(lat=0, lon=0).values,
+        )
+        self.assertEqual(np.datetime64("2021-12-01"), ds.time.values[-1])
+        np.testing.assert_equal(np.ones((5, 5)), ds["land_fraction"].values)
+
+    def test_open_flatten_time(self):
+        file_names = self.write_files("025_monthlycycle", [2020])
+        params = json.dumps(dict(bbox=None, flatten_time=True))
+        write_references(
+            self.fs,
+            self.path,
+            file_names,
+            attrs=dict(icosdp_preload_params=params),
+        )
+        ds = open_virtual_cube(self.fs, self.path)
+        self.assertNotIn("hour", ds.dims)
+        self.assertEqual(12 * 24, ds.sizes["time"])
+        expected = xr.open_dataset(os.path.join(self.path, file_names[0]))
+        np.testing.assert_equal(
+            expected["NEE"].values.reshape((-1, 90, 180)), ds["NEE"].values
+        )
+
+    def test_write_irregular_chunks(self):
+        # daily files have 365 or 366 time steps stored as one chunk
+        file_names = self.write_files("025_daily", [2019, 2020])
+        with self.assertRaises(ValueError) as cm:
+            write_references(self.fs, self.path, file_names)
+        self.assertIn("are not regular", f"{cm.exception}")
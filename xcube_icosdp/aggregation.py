@@ -0,0 +1,302 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import dask.array as da
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+AGG_FREQS = ("daily", "monthly", "monthlycycle")
+SPATIAL_DIMS = ("lat", "lon")
+AGG_METHODS = ("mean", "sum", "min", "max")
+
+
+def aggregate_time(ds: xr.Dataset, freq: str, method: str = "mean") -> xr.Dataset:
+    """Aggregate the hourly dataset along time lazily.
+
+    For "daily", each variable is reduced over the ``hour`` dimension. For
+    "monthly", it is reduced over the hours of all days of a month, and for
+    "monthlycycle" over all days of a month separately for each hour, which
+    gives the mean diurnal cycle per month if *method* is "mean".
+
+    Monthly aggregates are computed block-wise: the time chunks are aligned
+    to month boundaries first, so that each chunk is reduced on its own and
+    the hourly data is never materialized beyond one chunk per task.
+    Missing values are skipped; aggregates without any valid value are NaN.
+
+    Args:
+        ds: Dataset with dimensions ``time`` (days) and ``hour``.
+        freq: The target frequency, one of "daily", "monthly",
+            "monthlycycle".
+        method: The reduction, one of "mean", "sum", "min", "max".
+
+    Returns:
+        The aggregated dataset. The time coordinate of monthly aggregates
+        labels the first day of the month.
+    """
+    if freq not in AGG_FREQS:
+        raise ValueError(f"Invalid aggregation frequency {freq!r}.")
+    if method not in AGG_METHODS:
+        raise ValueError(f"Invalid aggregation method {method!r}.")
+
+    keep_hour = freq == "monthlycycle"
+    if freq == "daily":
+        data_vars = {
+            name: _reduce_hour(var, method) for name, var in ds.data_vars.items()
+        }
+        time = ds["time"].values
+    else:
+        periods = pd.DatetimeIndex(ds["time"].values).to_period("M")
+        month_starts = np.flatnonzero(
+            np.concatenate([[True], periods[1:] != periods[:-1]])
+        )
+        data_vars = {
+            name: _reduce_months(var, month_starts, method, not keep_hour)
+            for name, var in ds.data_vars.items()
+        }
+        time = periods[month_starts].to_timestamp().values.astype("datetime64[ns]")
+    coords = {
+        name: coord.variable
+        for name, coord in ds.coords.items()
+        if "time" not in coord.dims and (keep_hour or "hour" not in coord.dims)
+    }
+    ds_agg = xr.Dataset(data_vars, coords=coords, attrs=ds.attrs)
+    ds_agg = ds_agg.assign_coords(time=("time", time, ds["time"].attrs))
+    for var in ds_agg.data_vars.values():
+        if "time" in var.dims:
+            var.attrs["cell_methods"] = f"time: {method}"
+    return ds_agg
+
+
+def _reduce_hour(var: xr.DataArray, method: str) -> xr.DataArray:
+    if "hour" not in var.dims:
+        return var
+    kwargs = dict(min_count=1) if method == "sum" else {}
+    return getattr(var, method)(dim="hour", skipna=True, keep_attrs=True, **kwargs)
+
+
+def _reduce_months(
+    var: xr.DataArray, month_starts: np.ndarray, method: str, reduce_hour: bool
+) -> xr.DataArray:
+    if "time" not in var.dims:
+        return var
+    reduce_hour = reduce_hour and "hour" in var.dims
+    lead_dims = ("time", "hour") if "hour" in var.dims else ("time",)
+    other_dims = [dim for dim in var.dims if dim not in lead_dims]
+    var = var.transpose(*lead_dims, *other_dims)
+    dims = ("time", *var.dims[2 if reduce_hour else 1 :])
+    # aggregates without valid values are NaN
+    dtype = var.dtype if np.issubdtype(var.dtype, np.floating) else np.float64
+
+    data = var.data
+    if isinstance(data, da.Array):
+        day_chunks, month_chunks = _get_month_aligned_chunks(
+            month_starts, var.sizes["time"], data.chunks[0][0]
+        )
+        if "hour" in var.dims:
+            data = data.rechunk({0: day_chunks, 1: -1})
+        else:
+            data = data.rechunk({0: day_chunks})
+        chunks = (month_chunks, *data.chunks[2 if reduce_hour else 1 :])
+        data = da.map_blocks(
+            _reduce_months_block,
+            data,
+            month_starts=month_starts,
+            method=method,
+            reduce_hour=reduce_hour,
+            dtype=dtype,
+            chunks=chunks,
+            drop_axis=1 if reduce_hour else [],
+        )
+    else:
+        data = _reduce_months_block(data, month_starts, method, reduce_hour)
+    return xr.DataArray(
+        data.astype(dtype, copy=False),
+        dims=dims,
+        coords={
+            name: coord
+            for name, coord in var.coords.items()
+            if "time" not in coord.dims
+            and (not reduce_hour or "hour" not in coord.dims)
+        },
+        attrs=var.attrs,
+        name=var.name,
+    )
+
+
+def _get_month_aligned_chunks(
+    month_starts: np.ndarray, num_days: int, chunk_size: int
+) -> tuple[tuple[int, ...], tuple[int, ...]]:
+    """Group consecutive months into chunks of at most *chunk_size* days, or
+    a single month if it is longer. Returns the chunks in days and in
+    months."""
+    month_ends = np.append(month_starts[1:], num_days)
+    day_chunks = []
+    month_chunks = []
+    for start, end in zip(month_starts, month_ends):
+        if month_chunks and day_chunks[-1] + (end - start) <= chunk_size:
+            day_chunks[-1] += int(end - start)
+            month_chunks[-1] += 1
+        else:
+            day_chunks.append(int(end - start))
+            month_chunks.append(1)
+    return tuple(day_chunks), tuple(month_chunks)
+
+
+def _reduce_months_block(
+    block: np.ndarray,
+    month_starts: np.ndarray,
+    method: str,
+    reduce_hour: bool,
+    block_info: dict | None = None,
+) -> np.ndarray:
+    if block_info is not None:
+        start, stop = block_info[0]["array-location"][0]
+        offsets = month_starts[(month_starts >= start) & (month_starts < stop)]
+        offsets = offsets - start
+    else:
+        offsets = month_starts
+    if method in ("min", "max"):
+        ufunc = np.fmin if method == "min" else np.fmax
+        if reduce_hour:
+            block = ufunc.reduce(block, axis=1)
+        return ufunc.reduceat(block, offsets, axis=0)
+
+    if np.issubdtype(block.dtype, np.floating):
+        valid = ~np.isnan(block)
+        values = np.where(valid, block, 0)
+    else:
+        valid = np.ones(block.shape, dtype=bool)
+        values = block
+    if reduce_hour:
+        sums = values.sum(axis=1, dtype=np.float64)
+        counts = valid.sum(axis=1)
+    else:
+        sums = values.astype(np.float64)
+        counts = valid.astype(np.int64)
+    sums = np.add.reduceat(sums, offsets, axis=0)
+    counts = np.add.reduceat(counts, offsets, axis=0)
+    if method == "sum":
+        return np.where(counts > 0, sums, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def coarsen_spatial(ds: xr.Dataset, factor: int) -> xr.Dataset:
+    """Coarsen the spatial grid lazily by an integer factor, weighting each
+    grid cell by its ``land_fraction``.
+
+    Each coarse cell is the weighted mean of the ``factor x factor`` source
+    cells it covers, skipping missing values; ``land_fraction`` itself is
+    averaged without weights. Spatial chunks are kept if they are multiples
+    of *factor*, so that each source chunk is read only once. Otherwise, they
+    are rechunked to the next smaller multiple of *factor*. Trailing rows and
+    columns which do not fill a coarse cell are dropped. Variables with one
+    spatial dimension, such as ``lat_bnds``, are coarsened along it, and
+    data variables which cannot be coarsened are dropped.
+
+    Args:
+        ds: Dataset with dimensions ``lat`` and ``lon`` and a
+            ``land_fraction`` variable.
+        factor: The coarsening factor along both dimensions.
+
+    Returns:
+        The coarsened dataset.
+    """
+    if factor == 1:
+        return ds
+    sizes = {dim: ds.sizes[dim] // factor * factor for dim in SPATIAL_DIMS}
+    if not all(sizes.values()):
+        raise ValueError(
+            f"Spatial extent of {dict(ds.sizes)} is smaller than "
+            f"the coarsening factor {factor}."
+        )
+    ds = ds.isel({dim: slice(0, size) for dim, size in sizes.items()})
+    weights = ds["land_fraction"].fillna(0)
+
+    data_vars = {}
+    for name, var in ds.data_vars.items():
+        if not any(dim in var.dims for dim in SPATIAL_DIMS):
+            data_vars[name] = var
+        elif not all(dim in var.dims for dim in SPATIAL_DIMS):
+            # e.g. bounds stored as data variables
+            variable = _coarsen_single_dim(var.variable, factor)
+            if variable is None:
+                continue
+            data_vars[name] = xr.DataArray(variable)
+        elif name == "land_fraction":
+            data_vars[name] = _coarsen_sum(var, factor) / factor**2
+        else:
+            valid = var.notnull()
+            num = _coarsen_sum(var.fillna(0) * weights, factor)
+            den = _coarsen_sum(weights.where(valid, 0), factor)
+            data_vars[name] = (num / den.where(den > 0)).astype(var.dtype)
+        data_vars[name].attrs = var.attrs
+
+    coords = {}
+    for name, coord in ds.coords.items():
+        if not any(dim in coord.dims for dim in SPATIAL_DIMS):
+            coords[name] = coord.variable
+        else:
+            variable = _coarsen_single_dim(coord.variable, factor)
+            if variable is not None:
+                coords[name] = variable
+    return xr.Dataset(data_vars, coords=coords, attrs=ds.attrs)
+
+
+def _coarsen_single_dim(var: xr.Variable, factor: int) -> xr.Variable | None:
+    """Coarsen a variable along its only spatial dimension: cell centers are
+    averaged, and cell bounds span from the first to the last source cell.
+    Returns None for other variables, which cannot be coarsened."""
+    if var.dims in (("lat",), ("lon",)):
+        values = var.values.reshape((-1, factor)).mean(axis=1)
+    elif (
+        var.ndim == 2
+        and var.dims[0] in SPATIAL_DIMS
+        and var.dims[1] not in SPATIAL_DIMS
+    ):
+        values = var.values.reshape((-1, factor, var.shape[1]))
+        values = np.stack([values[:, 0, 0], values[:, -1, -1]], axis=1)
+    else:
+        return None
+    return xr.Variable(var.dims, values, var.attrs)
+
+
+def _coarsen_sum(var: xr.DataArray, factor: int) -> xr.DataArray:
+    axes = {var.get_axis_num(dim): factor for dim in SPATIAL_DIMS}
+    data = var.data
+    if isinstance(data, da.Array):
+        data = data.rechunk(
+            {axis: _get_multiple_chunks(data.chunks[axis], factor) for axis in axes}
+        )
+        data = da.coarsen(np.sum, data, axes)
+    else:
+        data = da.chunk.coarsen(np.sum, data, axes)
+    return xr.DataArray(
+        data,
+        dims=var.dims,
+        coords={
+            name: coord
+            for name, coord in var.coords.items()
+            if not any(dim in coord.dims for dim in SPATIAL_DIMS)
+        },
+    )
+
+
+def _get_multiple_chunks(chunks: tuple[int, ...], factor: int) -> tuple[int, ...] | int:
+    if all(chunk % factor == 0 for chunk in chunks):
+        return chunks
+    return max(factor, chunks[0] // factor * factor)
@@ -0,0 +1,592 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import base64
+import binascii
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Generic, Hashable, Iterator, TypeVar
+
+import fsspec
+
+from .catalog import _to_json_value
+from .constants import LOG
+
+T = TypeVar("T")
+
+CUBE_INDEX_VERSION = 1
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    """Snapshot of the counters of a :class:`DatasetCache` or
+    :class:`ObjectCache`. Requests which waited for a concurrent open of the
+    same key are counted as ``coalesced``, neither as hit nor as miss."""
+
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    coalesced: int = 0
+
+
+class DatasetCache(Generic[T]):
+    """Thread-safe, bounded cache of opened datasets with time-to-live eviction.
+
+    Concurrent requests for a key which is not cached yet are deduplicated
+    (single-flight): only the first caller runs the opener, all others wait
+    for its result. Failed opens are not cached.
+
+    Args:
+        max_size: Maximum number of cached entries. The least recently used
+            entry is evicted if the limit is exceeded. If 0, caching is
+            disabled.
+        ttl: Time-to-live of an entry in seconds. If None, entries never
+            expire.
+        timer: Clock used to determine the age of entries.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 8,
+        ttl: float | None = 3600.0,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._timer = timer
+        self._entries: OrderedDict[Hashable, tuple[float, T]] = OrderedDict()
+        self._pending: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                size=len(self._entries),
+                coalesced=self._coalesced,
+            )
+
+    def get(self, key: Hashable, opener: Callable[[], T]) -> T:
+        """Get the cached value for *key*, calling *opener* on a cache miss.
+
+        Args:
+            key: The cache key.
+            opener: Function without arguments which opens the value.
+
+        Returns:
+            The cached or newly opened value.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._is_expired(entry):
+                    del self._entries[key]
+                    self._evictions += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry[1]
+            pending = self._pending.get(key)
+            if pending is not None:
+                self._coalesced += 1
+            else:
+                self._misses += 1
+                future = Future()
+                self._pending[key] = future
+        if pending is not None:
+            # another thread is opening the value, wait for its result
+            return pending.result()
+
+        try:
+            value = opener()
+        except BaseException as e:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._pending[key]
+            if self._max_size > 0:
+                self._entries[key] = (self._timer(), value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._max_size:
+                    self._entries.popitem(last=False)
+                    self._evictions += 1
+        future.set_result(value)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        """Remove the entry for *key*, if any."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+            self._coalesced = 0
+            self._evictions = 0
+
+    def _is_expired(self, entry: tuple[float, T]) -> bool:
+        return self._ttl is not None and self._timer() - entry[0] > self._ttl
+
+
+class ObjectCache:
+    """Persistent, size-bounded cache of raw ICOS data objects on the local
+    filesystem, addressed by the SHA-256 hash of their content.
+
+    Each object is stored as ``<root>/<hash[:2]>/<hash>/<file_name>``. New
+    objects are downloaded into a temporary folder below *root*, verified
+    against their hash, and moved into place with an atomic rename, so that
+    several processes can share the same cache without locking. If two
+    processes download the same object concurrently, the first rename wins
+    and the other copy is discarded.
+
+    Cached objects are handed out as hard links, or copies if linking is not
+    possible, so that callers may delete them without affecting the cache.
+    If the total size exceeds *max_size*, the least recently used objects are
+    evicted; the modification time of an entry records its last use.
+
+    Args:
+        root: Local folder of the cache.
+        max_size: Maximum total size of the cached objects in bytes. If
+            None, the cache is unbounded.
+        verify_hits: Whether the content of cached objects is verified
+            against their hash on every hit. Objects are always verified
+            when they are added.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_size: int | None = 20 * 1024**3,
+        verify_hits: bool = False,
+    ):
+        self._root = os.path.abspath(root)
+        self._max_size = max_size
+        self._verify_hits = verify_hits
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def root(self) -> str:
+        return self._root
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            hits, misses, evictions = self._hits, self._misses, self._evictions
+        return CacheStats(
+            hits=hits,
+            misses=misses,
+            evictions=evictions,
+            size=len(self._list_entries()),
+        )
+
+    def get(
+        self,
+        object_hash: str,
+        fetch: Callable[[str], str],
+        folder_path: str,
+    ) -> str:
+        """Provide the object with the given hash in *folder_path*, calling
+        *fetch* on a cache miss.
+
+        Args:
+            object_hash: SHA-256 hash of the object, either hex or base64
+                encoded as published in the ICOS metadata. A truncated
+                base64 hash, as used in ICOS PIDs, is accepted as well.
+            fetch: Function which downloads the object into the folder
+                passed as its only argument and returns the file name.
+            folder_path: Folder where the object is linked to.
+
+        Returns:
+            The file name of the object in *folder_path*.
+
+        Raises:
+            ValueError: If the hash is malformed or the downloaded content
+                does not match it.
+        """
+        digest = _decode_hash(object_hash)
+        key = digest.hex()
+        entry_path = self._get_entry_path(key)
+        try:
+            file_name = self._link_entry(entry_path, digest, folder_path)
+        except FileNotFoundError:
+            # not cached, or evicted concurrently
+            pass
+        else:
+            with self._lock:
+                self._hits += 1
+            return file_name
+
+        with self._lock:
+            self._misses += 1
+        tmp_path = self._new_tmp_folder()
+        try:
+            file_name = fetch(tmp_path)
+            actual = _hash_file(os.path.join(tmp_path, file_name))
+            if not actual.startswith(digest):
+                raise ValueError(
+                    f"Checksum mismatch of {file_name!r}: expected "
+                    f"{object_hash!r}, got {actual.hex()!r}."
+                )
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+            try:
+                os.rename(tmp_path, entry_path)
+            except OSError:
+                # another process has added the object in the meantime
+                if not os.path.isdir(entry_path):
+                    raise
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        self._evict(keep=entry_path)
+        return self._link_entry(entry_path, digest, folder_path, verify=False)
+
+    def clear(self) -> None:
+        """Remove all cached objects and reset the counters."""
+        for entry_path, _, _ in self._list_entries():
+            self._remove_entry(entry_path)
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+    def _new_tmp_folder(self) -> str:
+        # temporary folders are below the root, so that renames are atomic
+        tmp_root = os.path.join(self._root, "tmp")
+        os.makedirs(tmp_root, exist_ok=True)
+        return tempfile.mkdtemp(dir=tmp_root)
+
+    def _get_entry_path(self, key: str) -> str:
+        return os.path.join(self._root, key[:2], key)
+
+    def _link_entry(
+        self,
+        entry_path: str,
+        digest: bytes,
+        folder_path: str,
+        verify: bool | None = None,
+    ) -> str:
+        file_names = os.listdir(entry_path)
+        if len(file_names) != 1:
+            raise FileNotFoundError(entry_path)
+        file_name = file_names[0]
+        src_path = os.path.join(entry_path, file_name)
+        if self._verify_hits if verify is None else verify:
+            if not _hash_file(src_path).startswith(digest):
+                LOG.warning(f"Removing corrupted cache entry {entry_path!r}.")
+                self._remove_entry(entry_path)
+                raise FileNotFoundError(entry_path)
+        dst_path = os.path.join(folder_path, file_name)
+        if os.path.lexists(dst_path):
+            os.remove(dst_path)
+        try:
+            os.link(src_path, dst_path)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            # hard links are not supported or cross filesystems
+            shutil.copyfile(src_path, dst_path)
+        # mark as recently used
+        os.utime(entry_path)
+        return file_name
+
+    def _list_entries(self) -> list[tuple[str, float, int]]:
+        entries = []
+        if not os.path.isdir(self._root):
+            return entries
+        for prefix in os.listdir(self._root):
+            prefix_path = os.path.join(self._root, prefix)
+            if len(prefix) != 2 or not os.path.isdir(prefix_path):
+                continue
+            for key in os.listdir(prefix_path):
+                entry_path = os.path.join(prefix_path, key)
+                try:
+                    mtime = os.stat(entry_path).st_mtime
+                    size = sum(
+                        os.stat(os.path.join(entry_path, name)).st_size
+                        for name in os.listdir(entry_path)
+                    )
+                except FileNotFoundError:
+                    continue
+                entries.append((entry_path, mtime, size))
+        return entries
+
+    def _evict(self, keep: str) -> None:
+        if self._max_size is None:
+            return
+        entries = sorted(self._list_entries(), key=lambda entry: entry[1])
+        total_size = sum(size for _, _, size in entries)
+        for entry_path, _, size in entries:
+            if total_size <= self._max_size:
+                break
+            if entry_path == keep:
+                continue
+            self._remove_entry(entry_path)
+            total_size -= size
+            with self._lock:
+                self._evictions += 1
+
+    def _remove_entry(self, entry_path: str) -> None:
+        # move the entry out of place first, so that no other process sees
+        # it partially removed
+        trash_path = self._new_tmp_folder()
+        try:
+            os.rename(entry_path, os.path.join(trash_path, "entry"))
+        except FileNotFoundError:
+            pass
+        shutil.rmtree(trash_path, ignore_errors=True)
+
+
+class CubeIndex:
+    """Persisted, size-bounded index of the datacubes preloaded into a cache
+    store.
+
+    Each entry maps the data ID of a cube to a JSON-serializable record of
+    the canonical preload parameters which determine its content, their hash
+    ``key``, the covered ``years`` and the URIs of the ICOS source objects
+    per year. An entry may name a ``pyramid`` of the cube, which is deleted
+    together with it. The index adds the size of the cube and the time of
+    its last access, which is used to evict the least recently used cubes if
+    the total size exceeds *max_size*. Entries of cubes which have been
+    deleted from the cache store by other means are dropped when they are
+    accessed.
+
+    Like the catalog of dataset descriptions, the index is stored as a
+    single JSON file and loaded lazily on the first access.
+
+    Args:
+        fs: Filesystem of the cache store.
+        root: Root folder of the cache store.
+        path: Path of the index file.
+        max_size: Maximum total size of the indexed cubes in bytes. If None,
+            the index is unbounded.
+        timer: Clock used to record the last access of entries.
+    """
+
+    def __init__(
+        self,
+        fs: fsspec.AbstractFileSystem,
+        root: str,
+        path: str,
+        max_size: int | None = None,
+        timer: Callable[[], float] = time.time,
+    ):
+        self._fs = fs
+        self._root = root.rstrip("/")
+        self._path = path
+        self._max_size = max_size
+        self._timer = timer
+        self._entries: dict[str, dict[str, Any]] | None = None
+        self._lock = threading.RLock()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def total_size(self) -> int:
+        with self._lock:
+            return sum(entry["size"] for entry in self._get_entries().values())
+
+    def get(self, data_id: str) -> dict[str, Any] | None:
+        """Get the entry of *data_id*, if any, without marking it as used."""
+        with self._lock:
+            entries = self._get_entries()
+            entry = entries.get(data_id)
+            if entry is not None and not self._fs.exists(self._get_path(data_id)):
+                del entries[data_id]
+                self._save()
+                return None
+            return None if entry is None else dict(entry)
+
+    def find(self, predicate: Callable[[str, dict], bool]) -> str | None:
+        """Find the data ID of an existing cube whose entry satisfies
+        *predicate*, preferring the most recently used one."""
+        for data_id, _ in self.find_all(predicate):
+            return data_id
+        return None
+
+    def find_all(
+        self, predicate: Callable[[str, dict], bool]
+    ) -> Iterator[tuple[str, dict[str, Any]]]:
+        """Iterate the data IDs and entries of the existing cubes whose entry
+        satisfies *predicate*, the most recently used first."""
+        with self._lock:
+            entries = sorted(
+                self._get_entries().items(),
+                key=lambda item: item[1]["last_access"],
+                reverse=True,
+            )
+        for data_id, entry in entries:
+            if predicate(data_id, dict(entry)):
+                entry = self.get(data_id)
+                if entry is not None:
+                    yield data_id, entry
+
+    def put(self, data_id: str, entry: dict[str, Any], size: int) -> None:
+        """Add or replace the entry of *data_id* and persist the index."""
+        with self._lock:
+            entries = self._get_entries()
+            previous = entries.get(data_id)
+            if previous is not None and previous["key"] != entry["key"]:
+                LOG.warning(
+                    f"Replacing cached datacube {data_id!r}, which was "
+                    f"preloaded with other parameters."
+                )
+            entries[data_id] = dict(
+                _to_json_value(entry), size=size, last_access=self._timer()
+            )
+            self._save()
+
+    def touch(self, data_id: str) -> None:
+        """Mark the cube *data_id* as recently used."""
+        with self._lock:
+            entry = self._get_entries().get(data_id)
+            if entry is not None:
+                entry["last_access"] = self._timer()
+                self._save()
+
+    def remove(self, data_id: str) -> None:
+        """Remove the entry of *data_id*, but not the cube itself."""
+        with self._lock:
+            if self._get_entries().pop(data_id, None) is not None:
+                self._save()
+
+    def evict(self, keep: str | None = None) -> list[str]:
+        """Delete the least recently used cubes until the total size is
+        within the limit.
+
+        Args:
+            keep: Data ID of a cube which is never evicted, e.g. the one
+                just written.
+
+        Returns:
+            The data IDs of the deleted cubes.
+        """
+        evicted = []
+        if self._max_size is None:
+            return evicted
+        with self._lock:
+            entries = self._get_entries()
+            total_size = sum(entry["size"] for entry in entries.values())
+            for data_id, entry in sorted(
+                entries.items(), key=lambda item: item[1]["last_access"]
+            ):
+                if total_size <= self._max_size:
+                    break
+                if data_id == keep:
+                    continue
+                for cached_id in filter(None, (data_id, entry.get("pyramid"))):
+                    path = self._get_path(cached_id)
+                    if self._fs.exists(path):
+                        self._fs.rm(path, recursive=True)
+                del entries[data_id]
+                total_size -= entry["size"]
+                evicted.append(data_id)
+            if evicted:
+                LOG.info(f"Evicted cached datacubes {evicted}.")
+                self._save()
+        return evicted
+
+    def clear(self) -> None:
+        """Remove all entries and delete the persisted index."""
+        with self._lock:
+            self._entries = {}
+            if self._fs.exists(self._path):
+                self._fs.rm(self._path)
+
+    def _get_path(self, data_id: str) -> str:
+        return f"{self._root}/{data_id}"
+
+    def _get_entries(self) -> dict[str, dict[str, Any]]:
+        if self._entries is None:
+            self._entries = self._load()
+        return self._entries
+
+    def _load(self) -> dict[str, dict[str, Any]]:
+        if not self._fs.exists(self._path):
+            return {}
+        with self._fs.open(self._path, "r") as fp:
+            content = json.load(fp)
+        if content.get("version") != CUBE_INDEX_VERSION:
+            # outdated index, the cubes are not reused
+            return {}
+        return content.get("entries", {})
+
+    def _save(self) -> None:
+        parent = posixpath.dirname(self._path)
+        if parent:
+            self._fs.makedirs(parent, exist_ok=True)
+        temp_path = f"{self._path}.tmp"
+        with self._fs.open(temp_path, "w") as fp:
+            json.dump(
+                dict(version=CUBE_INDEX_VERSION, entries=self._entries), fp, indent=2
+            )
+        self._fs.mv(temp_path, self._path)
+
+
+def get_params_key(params: dict[str, Any]) -> str:
+    """Get the SHA-256 hash of the canonical JSON representation of
+    *params*."""
+    canonical = json.dumps(_to_json_value(params), sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _decode_hash(object_hash: str) -> bytes:
+    if re.fullmatch(r"[0-9a-fA-F]{64}", object_hash):
+        return bytes.fromhex(object_hash)
+    try:
+        digest = base64.urlsafe_b64decode(
+            object_hash.replace("+", "-").replace("/", "_")
+            + "=" * (-len(object_hash) % 4)
+        )
+    except (binascii.Error, ValueError):
+        digest = b""
+    if not 12 <= len(digest) <= 32:
+        raise ValueError(f"Invalid SHA-256 hash {object_hash!r}.")
+    return digest
+
+
+def _hash_file(path: str) -> bytes:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as fp:
+        while block := fp.read(1 << 20):
+            sha256.update(block)
+    return sha256.digest()
@@ -0,0 +1,106 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import json
+import posixpath
+import threading
+from typing import Any
+
+import fsspec
+import numpy as np
+
+CATALOG_VERSION = 1
+
+
+class DescriptorCatalog:
+    """Persisted catalog of dataset descriptions.
+
+    The catalog maps a data ID and an aggregation mode to a JSON-serializable
+    entry holding the time range, the dimension sizes and the attributes of
+    the dataset. It is stored as a single JSON file and loaded lazily on the
+    first access.
+
+    Args:
+        fs: Filesystem where the catalog file is stored.
+        path: Path of the catalog file.
+    """
+
+    def __init__(self, fs: fsspec.AbstractFileSystem, path: str):
+        self._fs = fs
+        self._path = path
+        self._entries: dict[str, dict[str, dict]] | None = None
+        self._lock = threading.RLock()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def get(self, data_id: str, agg_mode: str) -> dict | None:
+        """Get the catalog entry for *data_id* and *agg_mode*, if any."""
+        with self._lock:
+            return self._get_entries().get(data_id, {}).get(agg_mode)
+
+    def put(self, data_id: str, agg_mode: str, entry: dict) -> None:
+        """Add or replace a catalog entry and persist the catalog."""
+        with self._lock:
+            entries = self._get_entries()
+            entries.setdefault(data_id, {})[agg_mode] = _to_json_value(entry)
+            self._save()
+
+    def clear(self) -> None:
+        """Remove all entries and delete the persisted catalog."""
+        with self._lock:
+            self._entries = {}
+            if self._fs.exists(self._path):
+                self._fs.rm(self._path)
+
+    def _get_entries(self) -> dict[str, dict[str, dict]]:
+        if self._entries is None:
+            self._entries = self._load()
+        return self._entries
+
+    def _load(self) -> dict[str, dict[str, dict]]:
+        if not self._fs.exists(self._path):
+            return {}
+        with self._fs.open(self._path, "r") as fp:
+            content = json.load(fp)
+        if content.get("version") != CATALOG_VERSION:
+            # outdated catalog, it will be rebuilt on demand
+            return {}
+        return content.get("entries", {})
+
+    def _save(self) -> None:
+        parent = posixpath.dirname(self._path)
+        if parent:
+            self._fs.makedirs(parent, exist_ok=True)
+        temp_path = f"{self._path}.tmp"
+        with self._fs.open(temp_path, "w") as fp:
+            json.dump(
+                dict(version=CATALOG_VERSION, entries=self._entries), fp, indent=2
+            )
+        self._fs.mv(temp_path, self._path)
+
+
+def _to_json_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {str(k): _to_json_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json_value(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return _to_json_value(value.tolist())
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
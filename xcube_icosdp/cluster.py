@@ -0,0 +1,121 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+
+import threading
+from contextlib import ExitStack, contextmanager
+from typing import Any, Iterator
+
+import dask
+
+from .constants import LOG
+
+
+class DaskCluster:
+    """Dask distributed backend shared by the preload jobs of a handle.
+
+    Exactly one of *client*, *scheduler_address* and *num_workers* must be
+    given. A client connected to *scheduler_address* or to a new
+    ``LocalCluster`` with *num_workers* worker processes is owned by this
+    object. It is the default client of the process until :meth:`close`
+    closes it, so that the distributed locks of xarray's file backends are
+    available in all threads. A given *client* is left open and should be
+    the default client as well, which it is unless created with
+    ``set_as_default=False``.
+
+    The cache store and the scratch folder must be accessible from all
+    workers under the same paths, e.g. on a single machine or a shared
+    filesystem.
+
+    Args:
+        client: A ``distributed.Client``.
+        scheduler_address: Address of a running dask scheduler, e.g.
+            "tcp://10.0.0.1:8786".
+        num_workers: Number of worker processes of a new ``LocalCluster``.
+
+    Raises:
+        ImportError: If the package ``distributed`` is not installed.
+        ValueError: If not exactly one of the arguments is given.
+    """
+
+    def __init__(
+        self,
+        client: Any = None,
+        scheduler_address: str | None = None,
+        num_workers: int | None = None,
+    ):
+        num_args = sum(
+            arg is not None for arg in (client, scheduler_address, num_workers)
+        )
+        if num_args != 1:
+            raise ValueError(
+                "Exactly one of `dask_client`, `dask_scheduler` and "
+                "`dask_workers` must be given."
+            )
+        try:
+            import distributed
+        except ImportError as e:
+            raise ImportError(
+                "The dask distributed backend requires the package "
+                "`distributed`, install it e.g. via `pip install distributed`."
+            ) from e
+
+        self._cluster = None
+        self._owns_client = client is None
+        if scheduler_address is not None:
+            client = distributed.Client(scheduler_address)
+        elif num_workers is not None:
+            self._cluster = distributed.LocalCluster(
+                n_workers=num_workers, threads_per_worker=1, processes=True
+            )
+            client = distributed.Client(self._cluster)
+        self.client = client
+        self._lock = threading.Lock()
+        self._num_users = 0
+        self._config: ExitStack | None = None
+        LOG.info(f"Preloading with the dask cluster at {self.client.dashboard_link}")
+
+    @contextmanager
+    def use(self) -> Iterator[None]:
+        """Run dask computations on the cluster.
+
+        Can be entered by several threads at the same time. Since the dask
+        scheduler is configured per process, all dask computations of the
+        process run on the cluster while at least one thread uses it.
+        """
+        with self._lock:
+            if self._num_users == 0:
+                self._config = ExitStack()
+                self._config.enter_context(dask.config.set(scheduler=self.client))
+            self._num_users += 1
+        try:
+            with self.client.as_current():
+                yield
+        finally:
+            with self._lock:
+                self._num_users -= 1
+                if self._num_users == 0:
+                    self._config.close()
+                    self._config = None
+
+    def close(self) -> None:
+        """Close the client and the cluster, if owned by this object."""
+        if self._owns_client:
+            self.client.close()
+            self._owns_client = False
+        if self._cluster is not None:
+            self._cluster.close()
+            self._cluster = None
@@ -25,6 +25,25 @@ ICOSDP_DATA_OPENER_ID = "dataset:zarr:icosdp"
 
 CACHE_FOLDER_NAME = "icosdp_cache"
 TEMP_PROCESSING_FOLDER = "icosdp_temp"
+RAW_CACHE_FOLDER_NAME = "icosdp_raw_cache"
+CATALOG_FILE_NAME = "icosdp_catalog.json"
+CACHE_INDEX_FILE_NAME = "icosdp_cache_index.json"
+# Zarr format of the cubes in the cache store, the default of xcube's zarr writer
+ZARR_FORMAT = 2
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+DATA_ID_PREFIX = "FLUXCOM-X-BASE_"
+# coordinates and variables which are identical in the cubes of all variables
+SHARED_VARIABLE_NAMES = (
+    "time",
+    "hour",
+    "lat",
+    "lon",
+    "time_bnds",
+    "hour_bnds",
+    "lat_bnds",
+    "lon_bnds",
+    "land_fraction",
+)
 
 
 @dataclass
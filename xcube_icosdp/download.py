@@ -0,0 +1,352 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from itertools import islice
+from typing import Any, Callable, Iterator, Sequence, TypeVar
+
+import icoscp_core.dataclient
+import icoscp_core.metaclient
+import xarray as xr
+
+from .cache import ObjectCache
+from .constants import LOG
+from .remote import open_data_object
+from .utils import _drop_chunk_encoding, _parse_agg_mode
+
+T = TypeVar("T")
+
+
+def call_with_retries(
+    func: Callable[..., T],
+    *args: Any,
+    retries: int = 3,
+    retry_backoff: float = 1.0,
+    **kwargs: Any,
+) -> T:
+    """Call *func* and retry it on failure with exponential backoff.
+
+    Args:
+        func: The function to call.
+        args: Positional arguments passed to *func*.
+        retries: Maximum number of retries after the first failed call.
+        retry_backoff: Waiting time in seconds before the first retry.
+            It is doubled for every further retry.
+        kwargs: Keyword arguments passed to *func*.
+
+    Returns:
+        The return value of *func*.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = retry_backoff * 2**attempt
+            LOG.warning(
+                f"Attempt {attempt + 1} of {retries + 1} failed: {e}. "
+                f"Retrying in {delay:.1f} seconds."
+            )
+            time.sleep(delay)
+
+
+# noinspection PyUnresolvedReferences
+def find_year_object(
+    icos_meta: icoscp_core.metaclient.MetadataClient,
+    meta_year: Any,
+    agg_mode: str,
+    retries: int = 3,
+    retry_backoff: float = 1.0,
+) -> Any:
+    """Find the data object of an aggregation mode in a yearly collection.
+
+    Args:
+        icos_meta: The ICOS metadata client.
+        meta_year: Member of a FLUXCOM-X-BASE collection holding the
+            data objects of one year.
+        agg_mode: The aggregation mode, e.g. "050_monthly".
+        retries: Maximum number of retries of the metadata request.
+        retry_backoff: Waiting time in seconds before the first retry.
+
+    Returns:
+        The data object of the aggregation mode.
+    """
+    year_objs = call_with_retries(
+        icos_meta.get_collection_meta,
+        meta_year.res,
+        retries=retries,
+        retry_backoff=retry_backoff,
+    ).members
+    spatial_res, freq = _parse_agg_mode(agg_mode)
+    spatial_res = str(spatial_res)
+    if freq == "monthlycycle":
+        freq_sel = "monthly diurnal cycle"
+    else:
+        freq_sel = freq
+    year_objs_sel = [
+        year_obj
+        for year_obj in year_objs
+        if spatial_res in year_obj.name and freq_sel in year_obj.name
+    ]
+    assert len(year_objs_sel) == 1
+    return year_objs_sel[0]
+
+
+# noinspection PyUnresolvedReferences
+def download_year_object(
+    icos_meta: icoscp_core.metaclient.MetadataClient,
+    icos_data: icoscp_core.dataclient.DataClient,
+    meta_year: Any,
+    agg_mode: str,
+    folder_path: str,
+    retries: int = 3,
+    retry_backoff: float = 1.0,
+    object_cache: ObjectCache | None = None,
+    subset: Callable[[xr.Dataset], xr.Dataset] | None = None,
+) -> str:
+    """Download the data object of an aggregation mode for one year.
+
+    If an object cache is given, the data object is taken from the cache if
+    it has been downloaded before, otherwise it is downloaded into the cache.
+    If *subset* is given, only the subset is read from the remote object,
+    see :func:`read_year_subset`, and the object cache is not used.
+
+    Args:
+        icos_meta: The ICOS metadata client.
+        icos_data: The ICOS data client.
+        meta_year: Member of a FLUXCOM-X-BASE collection holding the
+            data objects of one year.
+        agg_mode: The aggregation mode, e.g. "050_monthly".
+        folder_path: Folder where the downloaded file is saved.
+        retries: Maximum number of retries per request.
+        retry_backoff: Waiting time in seconds before the first retry.
+        object_cache: Optional cache of raw data objects.
+        subset: Optional function selecting the subset of the yearly dataset
+            to download.
+
+    Returns:
+        The name of the downloaded file.
+    """
+    year_obj = find_year_object(
+        icos_meta,
+        meta_year,
+        agg_mode,
+        retries=retries,
+        retry_backoff=retry_backoff,
+    )
+    if subset is not None:
+        return call_with_retries(
+            read_year_subset,
+            icos_data,
+            year_obj.res,
+            folder_path,
+            subset,
+            retries=retries,
+            retry_backoff=retry_backoff,
+        )
+    if object_cache is None or not getattr(year_obj, "hash", None):
+        return call_with_retries(
+            icos_data.save_to_folder,
+            year_obj.res,
+            folder_path,
+            retries=retries,
+            retry_backoff=retry_backoff,
+        )
+    # downloads failing the integrity check are retried as well
+    return call_with_retries(
+        object_cache.get,
+        year_obj.hash,
+        lambda tmp_path: icos_data.save_to_folder(year_obj.res, tmp_path),
+        folder_path,
+        retries=retries,
+        retry_backoff=retry_backoff,
+    )
+
+
+# noinspection PyUnresolvedReferences
+def read_year_subset(
+    icos_data: icoscp_core.dataclient.DataClient,
+    dobj_uri: str,
+    folder_path: str,
+    subset: Callable[[xr.Dataset], xr.Dataset],
+) -> str:
+    """Read a subset of a yearly NetCDF data object and save it.
+
+    The data object is opened remotely and read with authenticated HTTP range
+    requests, so that only the metadata and the chunks of the subset are
+    transferred instead of the whole global file.
+
+    Args:
+        icos_data: The ICOS data client.
+        dobj_uri: The landing page URI of the data object.
+        folder_path: Folder where the subset is saved.
+        subset: Function selecting the subset of the dataset.
+
+    Returns:
+        The name of the saved file, which is the name of the data object.
+    """
+    with open_data_object(icos_data, dobj_uri) as fp:
+        with xr.open_dataset(fp, engine="h5netcdf") as ds:
+            ds = subset(ds).load()
+        LOG.debug(
+            f"Read {fp.num_bytes_fetched} of {fp.size} bytes of "
+            f"{fp.file_name!r} in {fp.num_requests} requests."
+        )
+    file_path = os.path.join(folder_path, fp.file_name)
+    _drop_chunk_encoding(ds).to_netcdf(file_path, engine="h5netcdf")
+    return fp.file_name
+
+
+# noinspection PyUnresolvedReferences
+def download_year_objects(
+    icos_meta: icoscp_core.metaclient.MetadataClient,
+    icos_data: icoscp_core.dataclient.DataClient,
+    meta_years: Sequence[Any],
+    agg_mode: str,
+    folder_path: str,
+    max_workers: int = 4,
+    retries: int = 3,
+    retry_backoff: float = 1.0,
+    progress_callback: Callable[[int, int], None] | None = None,
+    object_cache: ObjectCache | None = None,
+    subset: Callable[[xr.Dataset], xr.Dataset] | None = None,
+) -> list[str]:
+    """Download the yearly data objects of an aggregation mode concurrently.
+
+    The metadata lookup and the download of each year run in a thread pool
+    with bounded concurrency. Failed requests are retried.
+
+    Args:
+        icos_meta: The ICOS metadata client.
+        icos_data: The ICOS data client.
+        meta_years: Members of a FLUXCOM-X-BASE collection, one per year.
+        agg_mode: The aggregation mode, e.g. "050_monthly".
+        folder_path: Folder where the downloaded files are saved.
+        max_workers: Maximum number of concurrent downloads.
+        retries: Maximum number of retries per request.
+        retry_backoff: Waiting time in seconds before the first retry.
+        progress_callback: Called in the calling thread with the number of
+            finished and the total number of downloads after each finished
+            download.
+        object_cache: Optional cache of raw data objects.
+        subset: Optional function selecting the subset of each yearly
+            dataset to download.
+
+    Returns:
+        The names of the downloaded files in the order of *meta_years*.
+    """
+    num_files = len(meta_years)
+    file_names: list[str | None] = [None] * num_files
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                download_year_object,
+                icos_meta,
+                icos_data,
+                meta_year,
+                agg_mode,
+                folder_path,
+                retries=retries,
+                retry_backoff=retry_backoff,
+                object_cache=object_cache,
+                subset=subset,
+            ): index
+            for index, meta_year in enumerate(meta_years)
+        }
+        try:
+            for num_done, future in enumerate(as_completed(futures), start=1):
+                file_names[futures[future]] = future.result()
+                if progress_callback is not None:
+                    progress_callback(num_done, num_files)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return file_names
+
+
+# noinspection PyUnresolvedReferences
+def iter_year_objects(
+    icos_meta: icoscp_core.metaclient.MetadataClient,
+    icos_data: icoscp_core.dataclient.DataClient,
+    meta_years: Sequence[Any],
+    agg_mode: str,
+    folder_path: str,
+    max_workers: int = 4,
+    retries: int = 3,
+    retry_backoff: float = 1.0,
+    object_cache: ObjectCache | None = None,
+    subset: Callable[[xr.Dataset], xr.Dataset] | None = None,
+) -> Iterator[str]:
+    """Download the yearly data objects of an aggregation mode concurrently
+    and yield the file names in the order of *meta_years*.
+
+    At most *max_workers* downloads run ahead of the consumer, so that
+    downloading overlaps with the processing of the yielded files while the
+    number of files in *folder_path* stays bounded. Closing the generator,
+    e.g. with :func:`contextlib.closing`, cancels the pending downloads and
+    waits for the running ones, so that no files are written afterwards.
+
+    Args:
+        icos_meta: The ICOS metadata client.
+        icos_data: The ICOS data client.
+        meta_years: Members of a FLUXCOM-X-BASE collection, one per year.
+        agg_mode: The aggregation mode, e.g. "050_monthly".
+        folder_path: Folder where the downloaded files are saved.
+        max_workers: Maximum number of concurrent downloads.
+        retries: Maximum number of retries per request.
+        retry_backoff: Waiting time in seconds before the first retry.
+        object_cache: Optional cache of raw data objects.
+        subset: Optional function selecting the subset of each yearly
+            dataset to download.
+
+    Yields:
+        The names of the downloaded files.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        def submit(meta_year: Any) -> Future:
+            return executor.submit(
+                download_year_object,
+                icos_meta,
+                icos_data,
+                meta_year,
+                agg_mode,
+                folder_path,
+                retries=retries,
+                retry_backoff=retry_backoff,
+                object_cache=object_cache,
+                subset=subset,
+            )
+
+        remaining = iter(meta_years)
+        futures = deque(
+            submit(meta_year) for meta_year in islice(remaining, max_workers)
+        )
+        try:
+            while futures:
+                file_name = futures.popleft().result()
+                meta_year = next(remaining, None)
+                if meta_year is not None:
+                    futures.append(submit(meta_year))
+                yield file_name
+        finally:
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,218 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+from typing import Any, Mapping
+
+import dask
+import dask.array as da
+import numpy as np
+import xarray as xr
+import zarr
+
+from .constants import ZARR_FORMAT
+
+COMPRESSIONS = ("zstd", "lz4", "zlib", "none")
+DEFAULT_COMPRESSION_LEVEL = 5
+PACKED_FILL_VALUE = -32768
+
+# number of explicitly stored mantissa bits of the floating-point types
+_MANTISSA_BITS = {np.dtype("float32"): 23, np.dtype("float64"): 52}
+_UINT_TYPES = {np.dtype("float32"): np.uint32, np.dtype("float64"): np.uint64}
+
+
+def bitround(ds: xr.Dataset, keepbits: int | Mapping[str, int]) -> xr.Dataset:
+    """Round the mantissa of floating-point data variables to *keepbits*
+    bits, which makes the data much better compressible.
+
+    The rounding is lossy, to nearest with ties to even, and computed lazily
+    for dask arrays. NaN values are kept. The number of kept bits is stored
+    in the attribute ``bitround_keepbits`` of each rounded variable.
+
+    Args:
+        ds: The dataset.
+        keepbits: Number of mantissa bits to keep, either for all
+            floating-point data variables or per variable name.
+
+    Returns:
+        The dataset with rounded data variables.
+    """
+    if not isinstance(keepbits, Mapping):
+        keepbits = {
+            name: keepbits
+            for name, var in ds.data_vars.items()
+            if var.dtype in _MANTISSA_BITS
+        }
+    ds = ds.copy()
+    for name, bits in keepbits.items():
+        var = ds[name].variable
+        if var.dtype not in _MANTISSA_BITS:
+            raise ValueError(
+                f"Bit rounding requires a floating-point variable, "
+                f"but {name!r} has data type {var.dtype}."
+            )
+        if isinstance(var.data, da.Array):
+            data = var.data.map_blocks(_bitround, bits, dtype=var.dtype)
+        else:
+            data = _bitround(np.asarray(var.data), bits)
+        var = var.copy(data=data)
+        var.attrs["bitround_keepbits"] = bits
+        ds[name] = var
+    return ds
+
+
+def get_encoding(
+    ds: xr.Dataset,
+    format_id: str = "zarr",
+    compression: str | None = "zstd",
+    compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+    shuffle: bool = True,
+    pack_int16: tuple[str, ...] = (),
+    zarr_format: int = ZARR_FORMAT,
+    num_workers: int | None = None,
+) -> dict[str, dict[str, Any]]:
+    """Get the encoding of the data variables of *ds* for writing them
+    compressed and, optionally, packed into 16-bit integers.
+
+    Packing uses a linear scale and offset per variable, which maps the
+    value range of the variable to the range of int16. Determining the value
+    range requires a pass over the data.
+
+    Args:
+        ds: The dataset.
+        format_id: The target format, "zarr" or "netcdf".
+        compression: One of :data:`COMPRESSIONS`. "zstd" and "lz4" use the
+            Blosc meta-compressor and are only available for Zarr. If None,
+            the default compression of the format is kept.
+        compression_level: Compression level from 1 (fastest) to 9
+            (smallest).
+        shuffle: Whether the bytes of the values are shuffled before
+            compression.
+        pack_int16: Names of the data variables packed into 16-bit integers.
+        zarr_format: The Zarr format the dataset is written in, 2 or 3, which
+            determines the codecs. Defaults to the format of the cache store.
+        num_workers: Maximum number of dask tasks computing the value ranges
+            concurrently. Defaults to the one of the dask scheduler.
+
+    Returns:
+        Mapping of variable names to encodings.
+
+    Raises:
+        ValueError: If the compression is not available for the format or
+            a packed variable is not a floating-point variable.
+    """
+    if compression is None:
+        compressor_encoding = {}
+    elif format_id == "netcdf":
+        if compression not in ("zlib", "none"):
+            raise ValueError(
+                f"Compression {compression!r} is not available for NetCDF, "
+                f"use 'zlib' or 'none'."
+            )
+        compressor_encoding = dict(
+            zlib=compression == "zlib",
+            complevel=compression_level,
+            shuffle=shuffle,
+        )
+        if compression == "none":
+            compressor_encoding = dict(zlib=False)
+    else:
+        compressor_encoding = _get_zarr_compressor_encoding(
+            compression, compression_level, shuffle, zarr_format
+        )
+
+    encoding = {name: dict(compressor_encoding) for name in ds.data_vars}
+    packed_vars = [ds[name] for name in pack_int16]
+    for var in packed_vars:
+        if var.dtype not in _MANTISSA_BITS:
+            raise ValueError(
+                f"Packing requires a floating-point variable, "
+                f"but {var.name!r} has data type {var.dtype}."
+            )
+    ranges = dask.compute(
+        *[(var.min(), var.max()) for var in packed_vars], num_workers=num_workers
+    )
+    for var, (vmin, vmax) in zip(packed_vars, ranges):
+        encoding[var.name].update(_get_packing(var.dtype, vmin.item(), vmax.item()))
+    return encoding
+
+
+def _get_zarr_compressor_encoding(
+    compression: str, compression_level: int, shuffle: bool, zarr_format: int
+) -> dict[str, Any]:
+    if zarr_format == 2:
+        import numcodecs
+
+        if compression == "none":
+            compressor = None
+        elif compression == "zlib":
+            compressor = numcodecs.Zlib(level=compression_level)
+        else:
+            compressor = numcodecs.Blosc(
+                cname=compression,
+                clevel=compression_level,
+                shuffle=(
+                    numcodecs.Blosc.SHUFFLE if shuffle else numcodecs.Blosc.NOSHUFFLE
+                ),
+            )
+        if not hasattr(zarr, "config"):
+            # zarr-python 2 takes a single compressor
+            return dict(compressor=compressor)
+        return dict(compressors=(compressor,) if compressor is not None else None)
+
+    if compression == "none":
+        return dict(compressors=None)
+    if compression == "zlib":
+        compressors = (zarr.codecs.GzipCodec(level=compression_level),)
+    else:
+        compressors = (
+            zarr.codecs.BloscCodec(
+                cname=compression,
+                clevel=compression_level,
+                shuffle="shuffle" if shuffle else "noshuffle",
+            ),
+        )
+    return dict(compressors=compressors)
+
+
+def _get_packing(dtype: np.dtype, vmin: float, vmax: float) -> dict[str, Any]:
+    # the smallest int16 value is reserved as fill value of NaN, and one
+    # step is left as margin for rounding errors of the scale factor
+    num_steps = np.iinfo(np.int16).max - np.iinfo(np.int16).min - 2
+    if not np.isfinite(vmin) or not np.isfinite(vmax):
+        # only NaN values
+        vmin = vmax = 0.0
+    scale_factor = (vmax - vmin) / num_steps if vmax > vmin else 1.0
+    add_offset = vmin + np.iinfo(np.int16).max * scale_factor
+    return dict(
+        dtype="int16",
+        scale_factor=dtype.type(scale_factor),
+        add_offset=dtype.type(add_offset),
+        _FillValue=PACKED_FILL_VALUE,
+    )
+
+
+def _bitround(data: np.ndarray, keepbits: int) -> np.ndarray:
+    num_bits = _MANTISSA_BITS[data.dtype] - keepbits
+    if num_bits <= 0:
+        return data
+    uint = _UINT_TYPES[data.dtype]
+    bits = data.view(uint)
+    half = uint((1 << (num_bits - 1)) - 1)
+    # round to nearest, ties to even
+    odd = (bits >> uint(num_bits)) & uint(1)
+    rounded = (bits + half + odd) & ~uint((1 << num_bits) - 1)
+    result = rounded.view(data.dtype)
+    return np.where(np.isnan(data), data, result)
@@ -0,0 +1,261 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+
+from typing import Iterator
+
+import dask.array as da
+import numpy as np
+import xarray as xr
+from dask.array.core import normalize_chunks
+
+from .aggregation import SPATIAL_DIMS
+
+LAND_ONLY_LAYOUT = "land_only"
+LAYOUT_ATTR = "icosdp_layout"
+# spatial chunk sizes of the grid, which determine the order of the cells
+TILE_SIZE_ATTR = "icosdp_tile_size"
+CELL_DIM = "cell"
+
+
+def is_land_only(ds: xr.Dataset) -> bool:
+    """Whether *ds* is stored in the land-only layout."""
+    return ds.attrs.get(LAYOUT_ATTR) == LAND_ONLY_LAYOUT
+
+
+def to_land_cells(ds: xr.Dataset, cell_chunk: int | None = None) -> xr.Dataset:
+    """Convert a gridded dataset lazily into the land-only layout.
+
+    Data variables with further dimensions besides ``lat`` and ``lon`` are
+    stored for the land cells only, i.e. the cells with a positive
+    ``land_fraction``, along the dimension ``cell``. The grid indexes of the
+    cells are stored as coordinates ``lat_index`` and ``lon_index``, while
+    the coordinates of the grid and the variables with the dimensions
+    ``(lat, lon)`` only, such as ``land_fraction``, are kept. The cells are
+    ordered by spatial chunk, so that each chunk of the grid maps to a
+    contiguous range of cells, and vice versa.
+
+    Args:
+        ds: Gridded dataset with a ``land_fraction`` variable.
+        cell_chunk: Chunk size along ``cell``. Defaults to the number of
+            grid cells of a spatial chunk.
+
+    Returns:
+        The dataset in the land-only layout.
+
+    Raises:
+        ValueError: If *ds* has no ``land_fraction`` variable.
+    """
+    if "land_fraction" not in ds:
+        raise ValueError("The land-only layout requires the variable 'land_fraction'.")
+    land = ds["land_fraction"].fillna(0).values > 0
+    cell_vars = [
+        name for name, var in ds.data_vars.items() if set(SPATIAL_DIMS) < set(var.dims)
+    ]
+    if cell_vars:
+        lat_chunks, lon_chunks = _get_spatial_chunks(ds[cell_vars[0]])
+    else:
+        lat_chunks, lon_chunks = (ds.sizes["lat"],), (ds.sizes["lon"],)
+    tiles = list(_iter_tiles(lat_chunks, lon_chunks))
+    lat_index, lon_index = _get_cell_indexes(land, tiles)
+    num_cells = lat_index.size
+    if cell_chunk is None:
+        cell_chunk = lat_chunks[0] * lon_chunks[0]
+    cell_chunk = max(1, min(cell_chunk, num_cells))
+
+    data_vars = {}
+    for name, var in ds.data_vars.items():
+        if name not in cell_vars:
+            data_vars[name] = var
+            continue
+        var = var.transpose(..., *SPATIAL_DIMS)
+        data = da.asarray(var.data)
+        data = data.rechunk(data.chunks[:-2] + (lat_chunks, lon_chunks))
+        blocks = []
+        for (i, lat_block), (j, lon_block) in tiles:
+            mask = land[lat_block, lon_block]
+            num_tile_cells = int(np.count_nonzero(mask))
+            if not num_tile_cells:
+                continue
+            tile = data.blocks[(slice(None),) * (var.ndim - 2) + (i, j)]
+            blocks.append(
+                tile.map_blocks(
+                    _select_cells,
+                    mask,
+                    drop_axis=var.ndim - 1,
+                    chunks=tile.chunks[:-2] + ((num_tile_cells,),),
+                    dtype=var.dtype,
+                )
+            )
+        if blocks:
+            cells = da.concatenate(blocks, axis=-1)
+        else:
+            cells = da.empty(data.shape[:-2] + (0,), dtype=var.dtype)
+        data_vars[name] = xr.DataArray(
+            cells.rechunk({var.ndim - 2: cell_chunk}),
+            dims=var.dims[:-2] + (CELL_DIM,),
+            attrs=var.attrs,
+        )
+    coords = dict(ds.coords)
+    coords.update(
+        lat_index=(CELL_DIM, lat_index.astype(np.int32)),
+        lon_index=(CELL_DIM, lon_index.astype(np.int32)),
+    )
+    return xr.Dataset(
+        data_vars,
+        coords=coords,
+        attrs={
+            **ds.attrs,
+            LAYOUT_ATTR: LAND_ONLY_LAYOUT,
+            TILE_SIZE_ATTR: [lat_chunks[0], lon_chunks[0]],
+        },
+    )
+
+
+def from_land_cells(ds: xr.Dataset) -> xr.Dataset:
+    """Rebuild a lazy gridded view of a dataset in the land-only layout.
+
+    The grid cells which are not stored, i.e. water, are NaN. The view is
+    chunked spatially like the original grid, and each of its chunks reads
+    only the contiguous range of cells it covers.
+
+    Args:
+        ds: Dataset in the land-only layout, see :func:`to_land_cells`.
+
+    Returns:
+        The gridded dataset.
+    """
+    shape = (ds.sizes["lat"], ds.sizes["lon"])
+    grid_index = np.full(shape, -1, dtype=np.int64)
+    grid_index[ds["lat_index"].values, ds["lon_index"].values] = np.arange(
+        ds.sizes[CELL_DIM]
+    )
+    tile_size = ds.attrs.get(TILE_SIZE_ATTR, shape)
+    lat_chunks = _get_regular_chunks(tile_size[0], shape[0])
+    lon_chunks = _get_regular_chunks(tile_size[1], shape[1])
+
+    data_vars = {}
+    for name, var in ds.data_vars.items():
+        if CELL_DIM not in var.dims:
+            data_vars[name] = var
+            continue
+        data = da.asarray(var.data)
+        dtype = np.result_type(var.dtype, np.float32)
+        other_chunks = data.chunks[:-1]
+        rows = []
+        for _, lat_block in _iter_blocks(lat_chunks):
+            row = []
+            for _, lon_block in _iter_blocks(lon_chunks):
+                local_index = grid_index[lat_block, lon_block]
+                tile_shape = local_index.shape
+                valid = local_index >= 0
+                if not valid.any():
+                    row.append(
+                        da.full(
+                            data.shape[:-1] + tile_shape,
+                            np.nan,
+                            chunks=other_chunks + tuple((size,) for size in tile_shape),
+                            dtype=dtype,
+                        )
+                    )
+                    continue
+                start = int(local_index[valid].min())
+                stop = int(local_index[valid].max()) + 1
+                cells = data[..., start:stop].rechunk({var.ndim - 1: -1})
+                row.append(
+                    cells.map_blocks(
+                        _scatter_cells,
+                        np.where(valid, local_index - start, -1),
+                        drop_axis=var.ndim - 1,
+                        new_axis=[var.ndim - 1, var.ndim],
+                        chunks=other_chunks + tuple((size,) for size in tile_shape),
+                        dtype=dtype,
+                    )
+                )
+            rows.append(row)
+        data_vars[name] = xr.DataArray(
+            da.block(rows),
+            dims=var.dims[:-1] + SPATIAL_DIMS,
+            attrs=var.attrs,
+        )
+    coords = {
+        name: coord for name, coord in ds.coords.items() if CELL_DIM not in coord.dims
+    }
+    attrs = {
+        key: value
+        for key, value in ds.attrs.items()
+        if key not in (LAYOUT_ATTR, TILE_SIZE_ATTR)
+    }
+    return xr.Dataset(data_vars, coords=coords, attrs=attrs)
+
+
+def _get_spatial_chunks(
+    var: xr.DataArray,
+) -> tuple[tuple[int, ...], tuple[int, ...]]:
+    # regular chunks, as required by Zarr, from the first chunk of each dim
+    lat_chunks, lon_chunks = (
+        _get_regular_chunks(
+            var.chunksizes[dim][0] if dim in var.chunksizes else var.sizes[dim],
+            var.sizes[dim],
+        )
+        for dim in SPATIAL_DIMS
+    )
+    return lat_chunks, lon_chunks
+
+
+def _get_regular_chunks(chunk_size: int, size: int) -> tuple[int, ...]:
+    return normalize_chunks((chunk_size,), (size,))[0]
+
+
+def _iter_blocks(chunks: tuple[int, ...]) -> Iterator[tuple[int, slice]]:
+    start = 0
+    for index, chunk in enumerate(chunks):
+        yield index, slice(start, start + chunk)
+        start += chunk
+
+
+def _iter_tiles(
+    lat_chunks: tuple[int, ...], lon_chunks: tuple[int, ...]
+) -> Iterator[tuple[tuple[int, slice], tuple[int, slice]]]:
+    for lat_item in _iter_blocks(lat_chunks):
+        for lon_item in _iter_blocks(lon_chunks):
+            yield lat_item, lon_item
+
+
+def _get_cell_indexes(
+    land: np.ndarray, tiles: list[tuple[tuple[int, slice], tuple[int, slice]]]
+) -> tuple[np.ndarray, np.ndarray]:
+    """Get the grid indexes of the land cells, ordered by tile and row-major
+    within each tile."""
+    lat_indexes = []
+    lon_indexes = []
+    for (_, lat_block), (_, lon_block) in tiles:
+        lat_index, lon_index = np.nonzero(land[lat_block, lon_block])
+        lat_indexes.append(lat_index + lat_block.start)
+        lon_indexes.append(lon_index + lon_block.start)
+    return np.concatenate(lat_indexes), np.concatenate(lon_indexes)
+
+
+def _select_cells(block: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    return block[..., mask]
+
+
+def _scatter_cells(block: np.ndarray, local_index: np.ndarray) -> np.ndarray:
+    valid = local_index >= 0
+    dtype = np.result_type(block.dtype, np.float32)
+    result = np.full(block.shape[:-1] + local_index.shape, np.nan, dtype=dtype)
+    result[..., valid] = block[..., local_index[valid]]
+    return result
@@ -0,0 +1,181 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+
+import os
+import sys
+import threading
+from dataclasses import dataclass
+
+# copies of a chunk held by a dask task while it is written: the decoded
+# chunk, its encoded copy and the compressed buffer
+CHUNK_COPIES = 3
+# memory of a running download, which is streamed to the scratch folder
+DOWNLOAD_BUFFER_SIZE = 8 * 1024**2
+# share of the budget used by downloads overlapping with writing
+DOWNLOAD_FRACTION = 0.25
+MIN_CHUNK_SIZE = 1024**2
+MAX_CHUNK_SIZE = 128 * 1024**2
+
+
+@dataclass(frozen=True)
+class MemoryBudget:
+    """Memory budget of a preload job derived from its `max_memory`.
+
+    Attributes:
+        max_memory: Memory budget of the job in bytes.
+        write_memory: Part of the budget held by dask tasks, that is, the
+            budget without the memory of overlapping downloads.
+        num_workers: Maximum number of dask tasks computed concurrently.
+        chunk_size: Target size of the dask chunks in bytes.
+        download_concurrency: Maximum number of concurrent downloads.
+    """
+
+    max_memory: int
+    write_memory: int
+    num_workers: int
+    chunk_size: int
+    download_concurrency: int
+
+    @property
+    def task_memory(self) -> int:
+        """Memory of a single dask task in bytes."""
+        return self.write_memory // self.num_workers
+
+    def get_num_workers(self, chunk_size: int) -> int:
+        """Get the number of dask tasks on chunks of *chunk_size* bytes
+        which can be computed concurrently within the budget. It is 0 if
+        a single task exceeds the budget."""
+        if chunk_size <= 0:
+            return self.num_workers
+        return min(self.num_workers, self.write_memory // (CHUNK_COPIES * chunk_size))
+
+
+def get_memory_budget(
+    max_memory: int,
+    download_size: int = DOWNLOAD_BUFFER_SIZE,
+    download_concurrency: int = 4,
+    overlap: bool = False,
+    num_workers: int | None = None,
+) -> MemoryBudget:
+    """Derive chunk sizes and concurrency of a preload job from its
+    memory budget.
+
+    If downloads *overlap* with writing, they get up to a quarter of the
+    budget, otherwise all downloads finish before the first chunk is
+    written and share the budget with nothing. The rest is divided among
+    the dask tasks, each holding a few copies of a chunk. The number of
+    tasks is reduced if the chunks would otherwise get smaller than 1 MiB.
+
+    Args:
+        max_memory: Memory budget of the job in bytes.
+        download_size: Memory of a single download in bytes.
+        download_concurrency: Maximum number of concurrent downloads.
+        overlap: Whether downloads overlap with writing.
+        num_workers: Maximum number of dask tasks computed concurrently.
+            Defaults to the number of CPUs.
+
+    Returns:
+        The derived budget.
+
+    Raises:
+        ValueError: If the budget does not fit a single download and a
+            single task on chunks of 1 MiB.
+    """
+    download_memory = max_memory * DOWNLOAD_FRACTION if overlap else max_memory
+    download_concurrency = max(
+        1, min(download_concurrency, int(download_memory // download_size))
+    )
+    write_memory = max_memory
+    if overlap:
+        write_memory -= download_concurrency * download_size
+    max_num_workers = write_memory // (CHUNK_COPIES * MIN_CHUNK_SIZE)
+    if max_num_workers < 1 or download_size > max_memory:
+        raise ValueError(
+            f"The memory budget of {max_memory} bytes is too small, it must "
+            f"hold a download of {download_size} bytes and "
+            f"{CHUNK_COPIES} chunks of at least {MIN_CHUNK_SIZE} bytes."
+        )
+    num_workers = max(1, min(num_workers or os.cpu_count() or 1, max_num_workers))
+    return MemoryBudget(
+        max_memory=max_memory,
+        write_memory=write_memory,
+        num_workers=num_workers,
+        chunk_size=min(MAX_CHUNK_SIZE, write_memory // (CHUNK_COPIES * num_workers)),
+        download_concurrency=download_concurrency,
+    )
+
+
+class MemoryMonitor:
+    """Context manager recording the peak increase of the resident memory
+    of the process over its value when entering the context.
+
+    The memory is sampled in a background thread, so that short peaks
+    between two samples may be missed. Memory allocated by other threads
+    of the process, e.g. by concurrent preloads, is included. Where the
+    resident memory cannot be read, the peak stays None.
+
+    Args:
+        interval: Time between two samples in seconds.
+    """
+
+    def __init__(self, interval: float = 0.1):
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._baseline: int | None = None
+        self.peak_memory: int | None = None
+
+    def __enter__(self) -> "MemoryMonitor":
+        self._baseline = get_resident_memory()
+        self.peak_memory = None
+        self._sample()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            self._sample()
+
+    def _sample(self) -> None:
+        memory = get_resident_memory()
+        if memory is not None and self._baseline is not None:
+            self.peak_memory = max(self.peak_memory or 0, memory - self._baseline)
+
+
+def get_resident_memory() -> int | None:
+    """Get the resident memory of the process in bytes, or None if it is
+    unknown. Outside of Linux, the peak resident memory of the process is
+    returned instead."""
+    try:
+        with open("/proc/self/statm") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes, except on macOS
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
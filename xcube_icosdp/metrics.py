@@ -0,0 +1,183 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import copy
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator
+
+from xcube.core.store.preload import PreloadState, PreloadStatus
+
+from .constants import LOG
+
+PRELOAD_STAGES = ("metadata", "download", "prepare", "rechunk", "write", "pyramid")
+
+
+@dataclass
+class StageMetrics:
+    """Metrics of a single stage of a preload.
+
+    Attributes:
+        duration: Wall-clock time spent in the stage in seconds.
+        num_bytes: Number of bytes downloaded or written in the stage.
+        num_files: Number of files processed in the stage.
+        num_tasks: Number of dask tasks computed in the stage.
+        num_bytes_raw: Number of bytes of the uncompressed data written in
+            the stage.
+    """
+
+    duration: float = 0.0
+    num_bytes: int = 0
+    num_files: int = 0
+    num_tasks: int = 0
+    num_bytes_raw: int = 0
+
+    @property
+    def throughput(self) -> float | None:
+        """Throughput in MB/s, or None if no bytes were recorded."""
+        if not self.num_bytes or self.duration <= 0:
+            return None
+        return self.num_bytes / 1e6 / self.duration
+
+    @property
+    def compression_ratio(self) -> float | None:
+        """Ratio of the uncompressed to the written bytes, or None if
+        unknown."""
+        if not self.num_bytes or not self.num_bytes_raw:
+            return None
+        return self.num_bytes_raw / self.num_bytes
+
+
+@dataclass
+class PreloadMetrics:
+    """Per-stage metrics of the preload of a single data ID.
+
+    Stages are measured via :meth:`measure`; a stage entered several times,
+    e.g. once per year when streaming, accumulates its metrics.
+
+    Attributes:
+        data_id: The preloaded data ID.
+        status: Final status of the preload, None while it is running.
+        stages: Metrics of the stages in the order they were entered.
+        peak_memory: Peak increase of the resident memory of the local
+            process during the preload in bytes, None while it is running
+            or if unknown. The memory of dask workers is not included, so it
+            is None for preloads on a dask cluster.
+    """
+
+    data_id: str
+    status: PreloadStatus | None = None
+    stages: dict[str, StageMetrics] = field(default_factory=dict)
+    peak_memory: int | None = None
+
+    @property
+    def duration(self) -> float:
+        """Total time spent in all stages in seconds."""
+        return sum(stage.duration for stage in self.stages.values())
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[StageMetrics]:
+        """Measure the duration of a stage. The yielded
+        :class:`StageMetrics` can be used to record bytes, files and tasks."""
+        metrics = self.stages.setdefault(stage, StageMetrics())
+        start = time.perf_counter()
+        try:
+            yield metrics
+        finally:
+            metrics.duration += time.perf_counter() - start
+
+    def copy(self) -> "PreloadMetrics":
+        return copy.deepcopy(self)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Convert the metrics into a JSON-serializable dictionary."""
+        return dict(
+            data_id=self.data_id,
+            status=self.status.name if self.status is not None else None,
+            duration=self.duration,
+            peak_memory=self.peak_memory,
+            stages={
+                name: dict(
+                    duration=stage.duration,
+                    num_bytes=stage.num_bytes,
+                    num_files=stage.num_files,
+                    num_tasks=stage.num_tasks,
+                    throughput=stage.throughput,
+                    num_bytes_raw=stage.num_bytes_raw,
+                    compression_ratio=stage.compression_ratio,
+                )
+                for name, stage in self.stages.items()
+            },
+        )
+
+
+class IcosdpPreloadState(PreloadState):
+    """Preload state which carries a snapshot of the metrics of the preload
+    so far."""
+
+    def __init__(self, *args, metrics: PreloadMetrics | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics
+
+    def update(self, event: PreloadState):
+        super().update(event)
+        metrics = getattr(event, "metrics", None)
+        if metrics is not None:
+            self.metrics = metrics
+
+
+MetricsHook = Callable[[PreloadMetrics], None]
+
+_METRICS_HOOKS: list[MetricsHook] = []
+_METRICS_HOOKS_LOCK = threading.Lock()
+
+
+def add_metrics_hook(hook: MetricsHook) -> Callable[[], None]:
+    """Register a function which is called with the final
+    :class:`PreloadMetrics` of every preloaded data ID, whether the preload
+    succeeded or failed. Hooks can forward the metrics to a monitoring
+    system, e.g. a Prometheus registry.
+
+    Args:
+        hook: Function taking the metrics as its only argument. Exceptions
+            raised by the hook are logged and do not affect the preload.
+
+    Returns:
+        A function without arguments which removes the hook again.
+    """
+    with _METRICS_HOOKS_LOCK:
+        _METRICS_HOOKS.append(hook)
+    return lambda: remove_metrics_hook(hook)
+
+
+def remove_metrics_hook(hook: MetricsHook) -> None:
+    """Remove a hook registered via :func:`add_metrics_hook`, if present."""
+    with _METRICS_HOOKS_LOCK:
+        if hook in _METRICS_HOOKS:
+            _METRICS_HOOKS.remove(hook)
+
+
+def report_metrics(metrics: PreloadMetrics) -> None:
+    """Pass *metrics* to all registered hooks."""
+    with _METRICS_HOOKS_LOCK:
+        hooks = list(_METRICS_HOOKS)
+    for hook in hooks:
+        try:
+            hook(metrics)
+        except Exception:
+            LOG.exception(f"Metrics hook {hook!r} failed.")
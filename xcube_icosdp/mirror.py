@@ -0,0 +1,213 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+
+import math
+import posixpath
+from typing import Callable, Sequence
+
+import fsspec
+import xarray as xr
+import zarr
+
+from .aggregation import SPATIAL_DIMS
+from .constants import LOG, ZARR_FORMAT
+from .rechunk import DEFAULT_MAX_MEM, get_layout_chunks, rechunk_dataset
+from .utils import _drop_chunk_encoding, _get_snapped_slice, _get_zarr_store
+
+MIRROR_SUFFIX = "_hourly_mirror.zarr"
+# attribute recording the extent and progress of a mirror
+MIRROR_ATTR = "icosdp_mirror"
+
+
+def get_mirror_id(data_id: str) -> str:
+    """Get the data ID of the mirror of the full-resolution cube *data_id*
+    in the cache store."""
+    return f"{data_id}{MIRROR_SUFFIX}"
+
+
+def get_mirror_chunks(ds: xr.Dataset, max_mem: int = DEFAULT_MAX_MEM) -> dict[str, int]:
+    """Get time-series-optimized chunks of a mirror of *ds*.
+
+    The chunks span all time steps and hours, with spatial tiles sized like
+    the "timeseries-optimized" chunk layout, but shrunk to a divisor of the
+    spatial chunks of *ds*, so that each source chunk fills whole mirror
+    chunks.
+    """
+    var = max(ds.data_vars.values(), key=lambda v: v.size * v.dtype.itemsize)
+    chunks = get_layout_chunks(
+        var.sizes, var.dtype.itemsize, "timeseries-optimized", max_mem
+    )
+    for dim in SPATIAL_DIMS:
+        source_chunk = var.chunksizes[dim][0] if dim in var.chunksizes else None
+        if source_chunk is not None:
+            chunks[dim] = max(
+                divisor
+                for divisor in range(1, min(chunks[dim], source_chunk) + 1)
+                if source_chunk % divisor == 0
+            )
+    return chunks
+
+
+def build_mirror(
+    ds: xr.Dataset,
+    fs: fsspec.AbstractFileSystem,
+    path: str,
+    bbox: Sequence[float],
+    temp_fs: fsspec.AbstractFileSystem,
+    temp_path: str,
+    max_mem: int = DEFAULT_MAX_MEM,
+    progress_callback: Callable[[int, int], None] | None = None,
+) -> None:
+    """Build a local, time-series-optimized mirror of a bbox of a cube.
+
+    The bbox is widened to the spatial chunks of *ds*. The mirror is filled
+    tile by tile, where each tile covers one spatial chunk of *ds* over all
+    time steps and is transposed into the chunks of
+    :func:`get_mirror_chunks` within the memory budget *max_mem*. The
+    finished tiles are recorded in the attribute ``icosdp_mirror`` of the
+    mirror, so that an interrupted build resumes with the missing tiles
+    when called again for the same bbox and time steps. Otherwise, an
+    existing mirror is replaced.
+
+    Args:
+        ds: The cube, e.g. the full-resolution cube subset in time.
+        fs: Filesystem of the mirror.
+        path: Path of the mirror Zarr dataset.
+        bbox: Bounding box ``[west, south, east, north]`` of the mirror.
+        temp_fs: Filesystem of the intermediate datasets.
+        temp_path: Folder of the intermediate datasets of the rechunking.
+        max_mem: Maximum memory of a single copy task in bytes.
+        progress_callback: Called with the number of finished and the total
+            number of tiles after each finished tile.
+
+    Raises:
+        ValueError: If the bbox does not contain any grid cell.
+    """
+    var = max(ds.data_vars.values(), key=lambda v: v.size * v.dtype.itemsize)
+    source_chunks = {
+        dim: var.chunksizes[dim][0] if dim in var.chunksizes else ds.sizes[dim]
+        for dim in SPATIAL_DIMS
+    }
+    lat_slice = _get_snapped_slice(
+        ds.lat.values, bbox[1], bbox[3], source_chunks["lat"]
+    )
+    lon_slice = _get_snapped_slice(
+        ds.lon.values, bbox[0], bbox[2], source_chunks["lon"]
+    )
+    if lat_slice.stop <= lat_slice.start or lon_slice.stop <= lon_slice.start:
+        raise ValueError(f"The bbox {list(bbox)!r} does not contain any grid cell.")
+    ds = ds.isel(lat=lat_slice, lon=lon_slice)
+    chunks = get_mirror_chunks(ds, max_mem)
+    extent = dict(
+        lat=[lat_slice.start, lat_slice.stop],
+        lon=[lon_slice.start, lon_slice.stop],
+        time=[str(ds.time.values[0]), str(ds.time.values[-1])],
+        chunks=chunks,
+    )
+    tiles = [
+        (
+            slice(lat_start, lat_start + source_chunks["lat"]),
+            slice(lon_start, lon_start + source_chunks["lon"]),
+        )
+        for lat_start in range(0, ds.sizes["lat"], source_chunks["lat"])
+        for lon_start in range(0, ds.sizes["lon"], source_chunks["lon"])
+    ]
+
+    zarr_store = _get_zarr_store(fs, path)
+    tiles_done = _get_tiles_done(fs, path, zarr_store, extent)
+    if tiles_done is None:
+        tiles_done = []
+        template = _drop_chunk_encoding(ds).chunk(
+            {dim: chunks[dim] for dim in ds.dims if dim in chunks}
+        )
+        template.attrs[MIRROR_ATTR] = dict(extent, tiles_done=[], complete=False)
+        # writes the metadata and the coordinates without computing the data
+        template.to_zarr(zarr_store, mode="w", compute=False, zarr_format=ZARR_FORMAT)
+    elif tiles_done:
+        LOG.info(f"Resuming the mirror {path!r} after {len(tiles_done)} tiles.")
+
+    num_tiles = len(tiles)
+    for index, (lat_block, lon_block) in enumerate(tiles):
+        if index in tiles_done:
+            continue
+        tile_ds = ds.isel(lat=lat_block, lon=lon_block)
+        # a region can only be written with variables along its dimensions
+        tile_ds = tile_ds.drop_vars(
+            [
+                name
+                for name, tile_var in tile_ds.variables.items()
+                if not set(SPATIAL_DIMS) & set(tile_var.dims)
+            ]
+        )
+        tile_temp_path = posixpath.join(temp_path, f"tile_{index}")
+        tile_ds = rechunk_dataset(tile_ds, chunks, max_mem, temp_fs, tile_temp_path)
+        _drop_chunk_encoding(tile_ds).to_zarr(
+            zarr_store,
+            region=dict(
+                lat=slice(lat_block.start, min(lat_block.stop, ds.sizes["lat"])),
+                lon=slice(lon_block.start, min(lon_block.stop, ds.sizes["lon"])),
+            ),
+            zarr_format=ZARR_FORMAT,
+        )
+        if temp_fs.exists(tile_temp_path):
+            temp_fs.rm(tile_temp_path, recursive=True)
+        tiles_done.append(index)
+        _set_progress(zarr_store, extent, tiles_done, len(tiles_done) == num_tiles)
+        if progress_callback is not None:
+            progress_callback(len(tiles_done), num_tiles)
+
+
+def is_mirror_complete(ds: xr.Dataset) -> bool:
+    """Whether all tiles of the mirror *ds* have been written."""
+    return bool(ds.attrs.get(MIRROR_ATTR, {}).get("complete", False))
+
+
+def get_read_size(var: xr.DataArray, selected: xr.DataArray) -> int:
+    """Estimate the number of bytes read to compute *selected*, a subset of
+    the chunked variable *var*, i.e. the size of all chunks it touches."""
+    if not var.chunks:
+        return var.nbytes
+    chunk_size = math.prod(max(chunks) for chunks in var.chunks)
+    return selected.data.npartitions * chunk_size * var.dtype.itemsize
+
+
+def _get_tiles_done(
+    fs: fsspec.AbstractFileSystem,
+    path: str,
+    zarr_store: str | fsspec.FSMap,
+    extent: dict,
+) -> list[int] | None:
+    """Get the tiles written to an existing mirror of the same extent, or
+    None if there is no such mirror."""
+    if not fs.exists(path):
+        return None
+    try:
+        attrs = zarr.open_group(zarr_store, mode="r").attrs.get(MIRROR_ATTR)
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+    if not attrs or {key: attrs.get(key) for key in extent} != extent:
+        LOG.info(f"Replacing the mirror {path!r}, which has another extent.")
+        return None
+    return list(attrs["tiles_done"])
+
+
+def _set_progress(
+    zarr_store: str | fsspec.FSMap, extent: dict, tiles_done: list[int], complete: bool
+) -> None:
+    group = zarr.open_group(zarr_store, mode="r+")
+    group.attrs[MIRROR_ATTR] = dict(extent, tiles_done=tiles_done, complete=complete)
+    zarr.consolidate_metadata(zarr_store)
@@ -0,0 +1,138 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+from typing import Hashable, Sequence
+
+import numpy as np
+import xarray as xr
+
+from .utils import _flatten_time_hour
+
+SITE_DIM = "site"
+
+
+def extract_points(
+    ds: xr.Dataset,
+    lat: Sequence[float],
+    lon: Sequence[float],
+    site_ids: Sequence[Hashable] | None = None,
+    time_ranges: Sequence[tuple[str, str]] | None = None,
+    flatten_time: bool = True,
+) -> xr.Dataset:
+    """Extract the time series of the grid cells nearest to a set of points.
+
+    All points are mapped to grid indexes at once and selected by a single
+    pointwise (vectorized) indexing operation. For dask-backed datasets this
+    groups the points by chunk, so that each chunk containing at least one
+    point is read only once, however many points it contains, and all
+    chunks are read in parallel when the result is computed.
+
+    Args:
+        ds: Dataset with the dimensions ``lat`` and ``lon``, e.g. the
+            full-resolution cube or a preloaded cube.
+        lat: Latitudes of the points.
+        lon: Longitudes of the points.
+        site_ids: Identifiers of the points used as ``site`` coordinate.
+            Defaults to the positions of the points.
+        time_ranges: Optional time window ``(start, end)`` per point. Values
+            outside the window of a point are set to NaN, and the time axis
+            of the result is restricted to the union of all windows.
+        flatten_time: Whether the ``time`` and ``hour`` dimensions are merged
+            into a single datetime axis, if the dataset has an ``hour``
+            dimension.
+
+    Returns:
+        The lazily extracted dataset with the dimensions ``(site, time, ...)``
+        and the coordinates of the selected grid cells as ``lat`` and
+        ``lon`` along ``site``.
+
+    Raises:
+        ValueError: If the arguments have different lengths or a point lies
+            outside the grid of the dataset.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    num_sites = lat.size
+    if lat.ndim != 1 or lon.shape != lat.shape:
+        raise ValueError("`lat` and `lon` must be sequences of equal length.")
+    if site_ids is None:
+        site_ids = np.arange(num_sites)
+    elif len(site_ids) != num_sites:
+        raise ValueError("`site_ids` must have the same length as `lat`.")
+    if time_ranges is not None and len(time_ranges) != num_sites:
+        raise ValueError("`time_ranges` must have the same length as `lat`.")
+
+    lat_indexes = _get_nearest_indexes(ds["lat"].values, lat, "lat")
+    lon_indexes = _get_nearest_indexes(ds["lon"].values, lon, "lon")
+
+    if time_ranges is not None:
+        starts = np.array([t[0] for t in time_ranges], dtype="datetime64[ns]")
+        ends = np.array([t[1] for t in time_ranges], dtype="datetime64[ns]")
+        if np.any(ends < starts):
+            raise ValueError(
+                "Start dates of `time_ranges` must not be after end dates."
+            )
+        ds = ds.sel(time=slice(starts.min(), ends.max()))
+
+    ds = ds.isel(
+        lat=xr.DataArray(lat_indexes, dims=SITE_DIM),
+        lon=xr.DataArray(lon_indexes, dims=SITE_DIM),
+    )
+    ds = ds.assign_coords({SITE_DIM: site_ids})
+
+    if time_ranges is not None:
+        times = ds["time"].values.astype("datetime64[ns]")
+        mask = xr.DataArray(
+            (times >= starts[:, np.newaxis]) & (times <= ends[:, np.newaxis]),
+            dims=(SITE_DIM, "time"),
+        )
+        for name, var in ds.data_vars.items():
+            if "time" in var.dims:
+                ds[name] = var.where(mask)
+
+    if flatten_time and "hour" in ds.dims:
+        ds = _flatten_time_hour(ds)
+    dims = [dim for dim in (SITE_DIM, "time") if dim in ds.dims]
+    return ds.transpose(*dims, ...)
+
+
+def _get_nearest_indexes(
+    coords: np.ndarray, values: np.ndarray, name: str
+) -> np.ndarray:
+    """Get the indexes of the nearest values in the regular, ascending or
+    descending coordinate array *coords*, and check that *values* lie
+    within the cells of the grid."""
+    size = coords.size
+    descending = size > 1 and coords[0] > coords[-1]
+    ascending_coords = coords[::-1] if descending else coords
+    res = ascending_coords[1] - ascending_coords[0] if size > 1 else np.inf
+    right = np.clip(np.searchsorted(ascending_coords, values), 0, size - 1)
+    left = np.clip(right - 1, 0, size - 1)
+    indexes = np.where(
+        np.abs(values - ascending_coords[left])
+        <= np.abs(ascending_coords[right] - values),
+        left,
+        right,
+    )
+    # NaN values are caught by the negated comparison as well
+    outside = ~(np.abs(ascending_coords[indexes] - values) <= res / 2 + 1e-9)
+    if np.any(outside):
+        raise ValueError(
+            f"Points with {name} {values[outside].tolist()} are outside of the "
+            f"grid, which covers {name} from {ascending_coords[0]} to "
+            f"{ascending_coords[-1]}."
+        )
+    return size - 1 - indexes if descending else indexes
@@ -14,17 +14,75 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
 
-import re
+import functools
+import json
+import math
+import os
+import tempfile
+import threading
+from contextlib import closing, nullcontext
+from typing import Any, Callable
 
+import dask
+import dask.array
 import fsspec
 import icoscp_core
 import xarray as xr
+import zarr
 from xcube.core.chunk import chunk_dataset
 from xcube.core.store import DataStoreError, PreloadedDataStore, new_data_store
 from xcube.core.store.preload import ExecutorPreloadHandle, PreloadState, PreloadStatus
 
-from .constants import TEMP_PROCESSING_FOLDER, FluxcomBaseDataIdsUri
-from .utils import _flatten_time_hour
+from .cache import CubeIndex, ObjectCache, get_params_key
+from .cluster import DaskCluster
+from .constants import (
+    LOG,
+    TEMP_PROCESSING_FOLDER,
+    ZARR_FORMAT,
+    FluxcomBaseDataIdsUri,
+)
+from .download import call_with_retries, download_year_objects, iter_year_objects
+from .encoding import DEFAULT_COMPRESSION_LEVEL, bitround, get_encoding
+from .land import from_land_cells, is_land_only, to_land_cells
+from .memory import (
+    DOWNLOAD_BUFFER_SIZE,
+    MemoryBudget,
+    MemoryMonitor,
+    get_memory_budget,
+)
+from .metrics import IcosdpPreloadState, PreloadMetrics, report_metrics
+from .pyramid import LEVELS_EXT, write_pyramid
+from .rechunk import DEFAULT_MAX_MEM, get_layout_chunks, rechunk_dataset
+from .utils import (
+    _drop_chunk_encoding,
+    _flatten_time_hour,
+    _get_agg_mode_sizes,
+    _get_aligned_chunks,
+    _get_zarr_store,
+    _parse_agg_mode,
+    _select_bbox,
+)
+from .virtual import (
+    REFERENCES_FILE_NAME,
+    VIRTUAL_EXT,
+    open_virtual_cube,
+    write_references,
+)
+
+# parameters which require rewriting the data, not available for virtual cubes
+_REWRITE_PARAMS = (
+    "streaming",
+    "extend_existing",
+    "chunks",
+    "chunk_layout",
+    "compression",
+    "keepbits",
+    "pack_int16",
+    "land_only",
+)
+# characters of the parameter hash appended to the data ID of a cube whose
+# data ID is taken by a cube of other parameters
+_PARAMS_KEY_LENGTH = 8
 
 
 class IcosdpPreloadHandle(ExecutorPreloadHandle):
@@ -36,41 +94,191 @@ class IcosdpPreloadHandle(ExecutorPreloadHandle):
         icos_meta: icoscp_core.metaclient.MetadataClient,
         icos_data: icoscp_core.dataclient.DataClient,
         *data_ids: str,
+        object_cache: ObjectCache | None = None,
+        cache_index: CubeIndex | None = None,
         **preload_params,
     ):
         self._icos_meta = icos_meta
         self._icos_data = icos_data
+        # persistent cache of raw downloads, kept across preloads
+        self._object_cache = object_cache
+        # index of the cubes in the cache store, to reuse them across preloads
+        self._cache_index = cache_index
 
         # setup cache store
         self._cache_store = cache_store
         self._cache_fs: fsspec.AbstractFileSystem = self._cache_store.fs
         self._cache_root = self._cache_store.root
 
-        # setup processing store
+        # setup processing store, each preload job gets its own scratch folder
+        # below its root, so that concurrent preloads do not interfere
         # noinspection PyProtectedMember
-        self._process_store = new_data_store("file", root=TEMP_PROCESSING_FOLDER)
+        self._process_store = new_data_store(
+            "file", root=preload_params.get("scratch_dir", TEMP_PROCESSING_FOLDER)
+        )
         self._process_fs: fsspec.AbstractFileSystem = self._process_store.fs
         self._process_root = self._process_store.root
-        self._clean_up()
         self._process_fs.makedirs(self._process_root, exist_ok=True)
+        self._scratch_dirs: dict[str, str] = {}
+        # memory budgets of the preloads with `max_memory`, which are shares
+        # of the memory budget of the handle
+        self._budgets: dict[str, MemoryBudget] = {}
+        self._free_memory: int | None = preload_params.get("max_memory")
+        self._memory_lock = threading.Lock()
+
+        # dask cluster shared by all preloads of this handle, if requested
+        self._dask_cluster: DaskCluster | None = None
+        dask_params = dict(
+            client=preload_params.get("dask_client"),
+            scheduler_address=preload_params.get("dask_scheduler"),
+            num_workers=preload_params.get("dask_workers"),
+        )
+        if any(value is not None for value in dask_params.values()):
+            if preload_params.get("max_memory"):
+                # the budget limits the tasks of the local scheduler only, it
+                # cannot bound the memory of the workers of a cluster
+                raise DataStoreError(
+                    "`max_memory` cannot be combined with `dask_client`, "
+                    "`dask_scheduler` or `dask_workers`. The memory of the "
+                    "dask workers is limited by the cluster."
+                )
+            try:
+                self._dask_cluster = DaskCluster(**dask_params)
+            except (ImportError, ValueError) as e:
+                raise DataStoreError(f"{e}") from e
+        self._num_pending = len(data_ids)
+        self._pending_lock = threading.Lock()
 
         # all new defaults for xarray confine functions to mute warnings
         xr.set_options(use_new_combine_kwarg_defaults=True)
 
+        # metrics of the preloads, filled while preloading
+        self._metrics: dict[str, PreloadMetrics] = {}
+
         # trigger preload in parent class
         self._data_ids = data_ids
         super().__init__(data_ids=data_ids, **preload_params)
 
     def close(self) -> None:
-        self._clean_up()
+        self._close_dask_cluster()
+        for data_id in list(self._scratch_dirs):
+            self._clean_up(data_id)
         if self._cache_fs.isdir(self._cache_root):
             self._cache_fs.rm(self._cache_root, recursive=True)
+        if self._cache_index is not None:
+            self._cache_index.clear()
+
+    def get_metrics(self, data_id: str) -> PreloadMetrics | None:
+        """Get the per-stage metrics of the preload of *data_id*, or None if
+        it has not started yet."""
+        return self._metrics.get(data_id)
 
     def preload_data(self, data_id: str, **preload_params):
-        uri = FluxcomBaseDataIdsUri.datasets[data_id].agg_mode[
-            preload_params["agg_mode"]
-        ]
-        meta_years = self._icos_meta.get_collection_meta(uri).members
+        metrics = PreloadMetrics(data_id)
+        self._metrics[data_id] = metrics
+        self._scratch_dirs[data_id] = os.path.basename(
+            tempfile.mkdtemp(prefix=f"{data_id}_", dir=self._process_root)
+        )
+        # on a dask cluster, the memory is used by the workers, not by this
+        # process, so that the peak memory is unknown
+        monitor = MemoryMonitor() if self._dask_cluster is None else None
+        try:
+            with monitor or nullcontext(), self._use_dask_cluster():
+                preload_params = self._apply_memory_budget(data_id, preload_params)
+                self._preload_cube(data_id, **preload_params)
+        except BaseException:
+            metrics.status = PreloadStatus.failed
+            raise
+        else:
+            metrics.status = PreloadStatus.completed
+        finally:
+            metrics.peak_memory = None if monitor is None else monitor.peak_memory
+            self._log_peak_memory(data_id)
+            self._release_memory_budget(data_id)
+            # delete temp storage of this job only
+            self._clean_up(data_id)
+            report_metrics(metrics)
+            with self._pending_lock:
+                self._num_pending -= 1
+                if self._num_pending == 0:
+                    # the cluster is shut down after the last preload
+                    self._close_dask_cluster()
+
+    def _preload_cube(self, data_id: str, **preload_params):
+        metrics = self._metrics[data_id]
+        agg_mode = preload_params["agg_mode"]
+        format_id = preload_params.get("target_format", "zarr")
+        streaming = preload_params.get("streaming", False)
+        if streaming and format_id != "zarr":
+            raise DataStoreError(
+                "Streaming assembly is only supported for `target_format='zarr'`."
+            )
+        extend_existing = preload_params.get("extend_existing", False)
+        if extend_existing and format_id != "zarr":
+            raise DataStoreError(
+                "Extending existing datacubes is only supported for "
+                "`target_format='zarr'`."
+            )
+        if preload_params.get("land_only") and (
+            format_id != "zarr" or streaming or extend_existing
+        ):
+            raise DataStoreError(
+                "The land-only layout is only supported for "
+                "`target_format='zarr'` and cannot be combined with `streaming` "
+                "or `extend_existing`."
+            )
+        if preload_params.get("pyramid") and format_id != "zarr":
+            raise DataStoreError(
+                "The pyramid is only supported for `target_format='zarr'`."
+            )
+        if format_id == "virtual":
+            _, freq = _parse_agg_mode(agg_mode)
+            if freq in ("daily", "hourly"):
+                # the yearly files have 365 or 366 time steps, which cannot be
+                # referenced as regular Zarr chunks
+                raise DataStoreError(
+                    f"The aggregation mode {agg_mode!r} is not supported for "
+                    f"`target_format='virtual'`, as its yearly files differ in "
+                    f"the number of time steps."
+                )
+            rewrite_params = [
+                name for name in _REWRITE_PARAMS if preload_params.get(name)
+            ]
+            if rewrite_params:
+                raise DataStoreError(
+                    f"The parameters {rewrite_params} are not supported for "
+                    f"`target_format='virtual'`, which does not rewrite the data."
+                )
+        if format_id == "netcdf" and preload_params.get("compression") in (
+            "zstd",
+            "lz4",
+        ):
+            raise DataStoreError(
+                "Compression with `zstd` or `lz4` is only supported for "
+                "`target_format='zarr'`."
+            )
+        if preload_params.get("pack_int16") and (streaming or extend_existing):
+            raise DataStoreError(
+                "Packing with `pack_int16` requires the value range of the whole "
+                "datacube and cannot be combined with `streaming` or "
+                "`extend_existing`."
+            )
+        bbox = preload_params.get("bbox")
+        if bbox and (bbox[0] >= bbox[2] or bbox[1] >= bbox[3]):
+            raise DataStoreError(
+                f"Invalid bbox {bbox!r}. West must be smaller than East and "
+                f"South must be smaller than North."
+            )
+
+        uri = FluxcomBaseDataIdsUri.datasets[data_id].agg_mode[agg_mode]
+        with metrics.measure("metadata"):
+            meta_years = call_with_retries(
+                self._icos_meta.get_collection_meta,
+                uri,
+                retries=preload_params.get("download_retries", 3),
+            ).members
+
+        meta_years = sorted(meta_years, key=_get_year)
 
         # temporal selection
         if "time_range" in preload_params:
@@ -79,109 +287,1021 @@ class IcosdpPreloadHandle(ExecutorPreloadHandle):
             year_end = int(time_range[1].split("-")[0])
             years = [year for year in range(year_start, year_end + 1)]
             meta_years = [
-                meta_year
-                for meta_year in meta_years
-                if int(meta_year.title.split(" ")[-1]) in years
+                meta_year for meta_year in meta_years if _get_year(meta_year) in years
             ]
             if not meta_years:
                 raise DataStoreError(f"No data found for {time_range}.")
 
-        # download data
-        self.notify(
-            PreloadState(
+        _, freq = _parse_agg_mode(agg_mode)
+        data_id_out = f"{data_id}_{freq}"
+        if "time_range" in preload_params:
+            # noinspection PyUnboundLocalVariable
+            data_id_out += f"_{year_start}_{year_end}"
+        if format_id == "netcdf":
+            data_id_out += ".nc"
+        elif format_id == "virtual":
+            data_id_out += VIRTUAL_EXT
+        else:
+            data_id_out += ".zarr"
+        data_id_out = self._get_output_id(data_id, data_id_out, preload_params)
+
+        self._notify_state(
+            data_id,
+            status=PreloadStatus.started,
+            progress=0.0,
+            message="Download in progress",
+        )
+        years = [_get_year(meta_year) for meta_year in meta_years]
+        sources = {str(_get_year(meta_year)): meta_year.res for meta_year in meta_years}
+        cached_id, is_identical = self._find_cached_cube(
+            data_id, data_id_out, years, sources, preload_params
+        )
+        existing = None
+        if extend_existing and cached_id is None:
+            existing = self._find_extendable_cube(data_id, meta_years, preload_params)
+        if is_identical:
+            self._cache_index.touch(data_id_out)
+            entry = self._cache_index.get(data_id_out)
+            if preload_params.get("pyramid") and (
+                entry.get("pyramid") is None
+                or entry.get("pyramid_levels") != preload_params.get("pyramid_levels")
+            ):
+                self._write_pyramid(data_id, data_id_out, preload_params)
+                self._index_cube(data_id, data_id_out, years, sources, preload_params)
+            self._notify_state(
                 data_id,
-                status=PreloadStatus.started,
-                progress=0.0,
-                message="Download in progress",
+                progress=1.0,
+                message=f"Datacube {data_id_out!r} is up to date.",
+            )
+            LOG.info(f"Reused cached datacube {data_id_out!r} for {data_id!r}.")
+            return
+        if cached_id is not None:
+            self._subset_cube(data_id, data_id_out, cached_id, years, preload_params)
+        elif existing is not None:
+            existing_id, existing_years = existing
+            data_id_out = self._extend_cube(
+                data_id,
+                data_id_out,
+                existing_id,
+                existing_years,
+                meta_years,
+                preload_params,
+            )
+            if self._cache_index is not None:
+                entry = self._cache_index.get(existing_id)
+                if entry is not None:
+                    sources = {**entry["sources"], **sources}
+                if data_id_out != existing_id:
+                    self._cache_index.remove(existing_id)
+            if data_id_out != existing_id:
+                self._remove_cached(_get_levels_id(existing_id))
+            years = sorted(set(existing_years) | set(years))
+        elif format_id == "virtual":
+            self._preload_virtual(data_id, data_id_out, meta_years, preload_params)
+        elif streaming:
+            zarr_store = _get_zarr_store(
+                self._cache_fs, f"{self._cache_root}/{data_id_out}"
             )
+            self._write_years(data_id, zarr_store, meta_years, preload_params)
+        else:
+            self._preload_concat(data_id, data_id_out, meta_years, preload_params)
+        if preload_params.get("pyramid"):
+            self._write_pyramid(data_id, data_id_out, preload_params)
+        else:
+            # a pyramid of a former cube of the same data ID would be stale
+            self._remove_cached(_get_levels_id(data_id_out))
+        self._index_cube(data_id, data_id_out, years, sources, preload_params)
+        self._notify_state(
+            data_id,
+            progress=1.0,
+            message=f"Datacube written to {data_id_out!r}.",
         )
-        num_file = len(meta_years)
-        for i, meta_year in enumerate(meta_years):
-            year_objs = self._icos_meta.get_collection_meta(meta_year.res).members
-            spatial_res, freq = preload_params["agg_mode"].split("_")
-            spatial_res = str(int(spatial_res) / 100)
-            if freq == "monthlycycle":
-                freq_sel = "monthly diurnal cycle"
-            else:
-                freq_sel = freq
-            year_objs_sel = [
-                year_obj
-                for year_obj in year_objs
-                if spatial_res in year_obj.name and freq_sel in year_obj.name
-            ]
-            assert len(year_objs_sel) == 1
-            year_obj = year_objs_sel[0]
-            self._icos_data.save_to_folder(year_obj.res, self._process_root)
-            self.notify(PreloadState(data_id, progress=0.6 * (i + 1) / num_file))
+        LOG.info(f"Preload metrics of {data_id!r}: {metrics.to_dict()}")
+
+    def _preload_concat(
+        self,
+        data_id: str,
+        data_id_out: str,
+        meta_years: list,
+        preload_params: dict,
+    ):
+        """Download all years, concatenate them, and write the cube at once."""
+        metrics = self._metrics[data_id]
+        scratch_dir = self._scratch_dirs[data_id]
+        with metrics.measure("download") as stage:
+            file_names = download_year_objects(
+                self._icos_meta,
+                self._icos_data,
+                meta_years,
+                preload_params["agg_mode"],
+                f"{self._process_root}/{scratch_dir}",
+                max_workers=preload_params.get("download_concurrency", 4),
+                retries=preload_params.get("download_retries", 3),
+                object_cache=self._object_cache,
+                subset=self._get_subset(preload_params),
+                progress_callback=lambda num_done, num_files: self.notify(
+                    PreloadState(data_id, progress=0.6 * num_done / num_files)
+                ),
+            )
+            stage.num_files += len(file_names)
+            stage.num_bytes += sum(
+                self._process_fs.size(f"{self._process_root}/{scratch_dir}/{file_name}")
+                for file_name in file_names
+            )
 
         # build cube
-        self.notify(
-            PreloadState(
-                data_id,
-                progress=0.6,
-                message="Prepare data",
+        self._notify_state(data_id, progress=0.6, message="Prepare data")
+        with metrics.measure("prepare"):
+            dss = [self._open_year(data_id, file_name) for file_name in file_names]
+            ds = xr.concat(dss, dim="time")
+            ds = self._prepare_dataset(ds, preload_params)
+
+        self._write_cube(data_id, data_id_out, ds, preload_params)
+
+    def _write_cube(
+        self, data_id: str, data_id_out: str, ds: xr.Dataset, preload_params: dict
+    ):
+        """Rechunk, encode and write an assembled cube to the cache store."""
+        metrics = self._metrics[data_id]
+        format_id = preload_params.get("target_format", "zarr")
+        chunks = self._get_chunks(data_id, ds, preload_params)
+        if chunks:
+            self._notify_state(data_id, progress=0.65, message="Rechunk data")
+            with metrics.measure("rechunk") as stage:
+                stage.num_tasks += _get_num_tasks(ds)
+                try:
+                    ds = rechunk_dataset(
+                        ds,
+                        chunks,
+                        preload_params.get("rechunk_max_mem", DEFAULT_MAX_MEM),
+                        self._process_fs,
+                        f"{self._process_root}/{self._scratch_dirs[data_id]}"
+                        f"/rechunk",
+                        num_workers=self._get_num_workers(data_id, ds),
+                    )
+                except ValueError as e:
+                    raise DataStoreError(f"{e}") from e
+                ds = chunk_dataset(ds, chunks, format_name=format_id)
+        self._notify_state(data_id, progress=0.7, message="Write data")
+        with metrics.measure("write") as stage:
+            if preload_params.get("land_only"):
+                try:
+                    ds = to_land_cells(ds)
+                except ValueError as e:
+                    raise DataStoreError(f"{e}") from e
+            num_workers = self._get_num_workers(data_id, ds)
+            ds = self._encode_dataset(ds, preload_params, num_workers=num_workers)
+            stage.num_tasks += _get_num_tasks(ds)
+            stage.num_bytes_raw += ds.nbytes
+            self._write_dataset(data_id, data_id_out, ds, num_workers)
+            stage.num_files += 1
+            stage.num_bytes += _get_size(
+                self._cache_fs, f"{self._cache_root}/{data_id_out}"
             )
+
+    def _write_pyramid(self, data_id: str, data_id_out: str, preload_params: dict):
+        """Write the multi-resolution pyramid of a written cube next to it,
+        with level 0 linked to the cube."""
+        metrics = self._metrics[data_id]
+        levels_id = _get_levels_id(data_id_out)
+        path = f"{self._cache_root}/{levels_id}"
+        # packing needs the value range of each level, which is not known
+        # before writing it
+        encode_params = dict(preload_params, pack_int16=[])
+        self._notify_state(data_id, progress=0.95, message="Write pyramid")
+        with metrics.measure("pyramid") as stage:
+            ds = self._open_cube(data_id_out)
+            try:
+                num_levels = write_pyramid(
+                    self._cache_fs,
+                    path,
+                    ds,
+                    num_levels=preload_params.get("pyramid_levels"),
+                    base_name=data_id_out,
+                    encode=functools.partial(
+                        self._encode_dataset, preload_params=encode_params
+                    ),
+                    num_workers=self._get_num_workers(data_id, ds),
+                )
+            except ValueError as e:
+                self._remove_cached(levels_id)
+                raise DataStoreError(f"{e}") from e
+            except BaseException:
+                self._remove_cached(levels_id)
+                raise
+            finally:
+                ds.close()
+            stage.num_files += num_levels - 1
+            stage.num_bytes += _get_size(self._cache_fs, path)
+
+    def _preload_virtual(
+        self,
+        data_id: str,
+        data_id_out: str,
+        meta_years: list,
+        preload_params: dict,
+    ):
+        """Keep the yearly files in the cache store and write references which
+        present them as one cube, without rewriting the data."""
+        metrics = self._metrics[data_id]
+        path = f"{self._cache_root}/{data_id_out}"
+        if self._cache_fs.exists(path):
+            self._cache_fs.rm(path, recursive=True)
+        # files are downloaded into the cube directly if the cache is local
+        is_local = _is_local(self._cache_fs)
+        if is_local:
+            folder = path
+            self._cache_fs.makedirs(path, exist_ok=True)
+        else:
+            folder = f"{self._process_root}/{self._scratch_dirs[data_id]}"
+        try:
+            with metrics.measure("download") as stage:
+                file_names = download_year_objects(
+                    self._icos_meta,
+                    self._icos_data,
+                    meta_years,
+                    preload_params["agg_mode"],
+                    folder,
+                    max_workers=preload_params.get("download_concurrency", 4),
+                    retries=preload_params.get("download_retries", 3),
+                    object_cache=self._object_cache,
+                    subset=self._get_subset(preload_params),
+                    progress_callback=lambda num_done, num_files: self.notify(
+                        PreloadState(data_id, progress=0.9 * num_done / num_files)
+                    ),
+                )
+                stage.num_files += len(file_names)
+                stage.num_bytes += sum(
+                    self._process_fs.size(f"{folder}/{file_name}")
+                    for file_name in file_names
+                )
+                if not is_local:
+                    for file_name in file_names:
+                        self._cache_fs.put_file(
+                            f"{folder}/{file_name}", f"{path}/{file_name}"
+                        )
+            self._notify_state(data_id, progress=0.9, message="Write references")
+            with metrics.measure("write") as stage:
+                try:
+                    write_references(
+                        self._cache_fs,
+                        path,
+                        file_names,
+                        attrs=dict(
+                            icosdp_preload_params=_get_cube_params(preload_params)
+                        ),
+                    )
+                except ValueError as e:
+                    raise DataStoreError(f"{e}") from e
+                stage.num_files += 1
+                stage.num_bytes += _get_size(
+                    self._cache_fs, f"{path}/{REFERENCES_FILE_NAME}"
+                )
+        except BaseException:
+            if self._cache_fs.exists(path):
+                self._cache_fs.rm(path, recursive=True)
+            raise
+
+    def _write_years(
+        self,
+        data_id: str,
+        zarr_store: str | fsspec.FSMap,
+        meta_years: list,
+        preload_params: dict,
+        num_times: int = 0,
+        target_chunks: dict[str, int] | None = None,
+    ):
+        """Write each year into a Zarr dataset as soon as it is downloaded.
+
+        If *target_chunks* is not given, the first year creates the Zarr
+        dataset, otherwise all years are appended along the time dimension
+        of the existing dataset with *num_times* time steps. Downloads of the
+        following years overlap with writing, and each downloaded file is
+        deleted once it has been written. Hence, scratch space is bounded to
+        about `download_concurrency + 1` yearly files. If a year fails, the
+        years written before are kept in the dataset.
+        """
+        metrics = self._metrics[data_id]
+        scratch_dir = self._scratch_dirs[data_id]
+        num_files = len(meta_years)
+        # closing the generator stops the downloads before the scratch folder
+        # of the job is removed, also if a year fails
+        with closing(
+            iter_year_objects(
+                self._icos_meta,
+                self._icos_data,
+                meta_years,
+                preload_params["agg_mode"],
+                f"{self._process_root}/{scratch_dir}",
+                max_workers=preload_params.get("download_concurrency", 4),
+                retries=preload_params.get("download_retries", 3),
+                object_cache=self._object_cache,
+                subset=self._get_subset(preload_params),
+            )
+        ) as file_names:
+            for index in range(num_files):
+                # the download stage only counts the time waiting for a file
+                with metrics.measure("download") as stage:
+                    file_name = next(file_names)
+                    file_path = f"{self._process_root}/{scratch_dir}/{file_name}"
+                    stage.num_files += 1
+                    stage.num_bytes += self._process_fs.size(file_path)
+                with metrics.measure("prepare"):
+                    ds = self._open_year(data_id, file_name)
+                    ds = self._prepare_dataset(ds, preload_params)
+                    if target_chunks is None:
+                        chunks = self._get_chunks(data_id, ds, preload_params)
+                        if chunks:
+                            ds = ds.chunk(chunks)
+                    else:
+                        time_chunks = _get_aligned_chunks(
+                            num_times, target_chunks["time"], ds.sizes["time"]
+                        )
+                        ds = ds.chunk({**target_chunks, "time": time_chunks})
+                with metrics.measure("write") as stage:
+                    # appended years keep the encoding of the existing cube
+                    num_workers = self._get_num_workers(data_id, ds)
+                    ds = self._encode_dataset(
+                        ds,
+                        preload_params,
+                        set_encoding=target_chunks is None,
+                        num_workers=num_workers,
+                    )
+                    stage.num_tasks += _get_num_tasks(ds)
+                    stage.num_bytes_raw += ds.nbytes
+                    size_before = _get_size(self._cache_fs, zarr_store)
+                    if target_chunks is None:
+                        # the chunks of the first year define the chunks of the cube
+                        target_chunks = {
+                            str(dim): c[0] for dim, c in ds.chunksizes.items()
+                        }
+                        write_kwargs = dict(mode="w")
+                    else:
+                        write_kwargs = dict(append_dim="time")
+                    delayed = _drop_chunk_encoding(ds).to_zarr(
+                        zarr_store,
+                        zarr_format=ZARR_FORMAT,
+                        compute=False,
+                        **write_kwargs,
+                    )
+                    dask.compute(delayed, num_workers=num_workers)
+                    stage.num_files += 1
+                    stage.num_bytes += (
+                        _get_size(self._cache_fs, zarr_store) - size_before
+                    )
+                num_times += ds.sizes["time"]
+                ds.close()
+                self._process_fs.rm(file_path)
+                self._notify_state(
+                    data_id,
+                    progress=0.95 * (index + 1) / num_files,
+                    message=f"Written {index + 1} of {num_files} years",
+                )
+
+    def _get_output_id(
+        self, data_id: str, data_id_out: str, preload_params: dict
+    ) -> str:
+        """Get the data ID of the requested cube. It is *data_id_out*, unless
+        the cache index records a cube of other parameters under it, e.g. of a
+        larger bbox. That cube is kept, and the first characters of the
+        parameter hash are appended to the data ID of the requested cube."""
+        if self._cache_index is None:
+            return data_id_out
+        _, key = _get_index_params(data_id, preload_params)
+        entry = self._cache_index.get(data_id_out)
+        if entry is None or entry["key"] == key:
+            return data_id_out
+        stem, ext = os.path.splitext(data_id_out)
+        return f"{stem}_{key[:_PARAMS_KEY_LENGTH]}{ext}"
+
+    def _find_cached_cube(
+        self,
+        data_id: str,
+        data_id_out: str,
+        years: list[int],
+        sources: dict[str, str],
+        preload_params: dict,
+    ) -> tuple[str | None, bool]:
+        """Find a cube in the cache index from which the requested cube can be
+        served.
+
+        Returns *data_id_out* and True if the requested cube exists already
+        with identical parameters and source objects. Otherwise, returns the
+        data ID of a cube of the same content which covers the requested bbox
+        and years, or None, and False.
+        """
+        if self._cache_index is None:
+            return None, False
+        content_params, key = _get_index_params(data_id, preload_params)
+
+        def is_identical(cached_id: str, entry: dict) -> bool:
+            return (
+                cached_id == data_id_out
+                and entry["key"] == key
+                and entry["years"] == years
+                and entry["sources"] == sources
+            )
+
+        def is_covering(cached_id: str, entry: dict) -> bool:
+            cached_params = entry["params"]
+            return (
+                _without_bbox(cached_params) == _without_bbox(content_params)
+                # packed cubes are lossy, subsets would differ from new cubes
+                and not cached_params["pack_int16"]
+                and _contains_bbox(cached_params["bbox"], content_params["bbox"])
+                and all(
+                    entry["sources"].get(year) == uri for year, uri in sources.items()
+                )
+            )
+
+        if self._cache_index.find(is_identical) is not None:
+            return data_id_out, True
+        if preload_params.get("target_format") == "virtual":
+            # virtual cubes reference downloaded files and cannot be subsets
+            return None, False
+        return self._cache_index.find(is_covering), False
+
+    def _subset_cube(
+        self,
+        data_id: str,
+        data_id_out: str,
+        cached_id: str,
+        years: list[int],
+        preload_params: dict,
+    ):
+        """Serve the requested cube by subsetting a larger cached cube."""
+        metrics = self._metrics[data_id]
+        self._notify_state(
+            data_id, progress=0.6, message=f"Subset cached datacube {cached_id!r}"
         )
-        var_name = data_id.replace("FLUXCOM-X-BASE_", "")
-        data_ids_temp = self._process_store.list_data_ids()
-        pattern = re.compile(rf"^{var_name}_[0-9]{{4}}")
-        data_ids_sel = [did for did in data_ids_temp if re.match(pattern, did)]
-        dss = []
-        for did in data_ids_sel:
-            ds = self._process_store.open_data(did, chunks="auto")
-            dss.append(ds)
-        ds = xr.concat(dss, dim="time")
+        self._cache_index.touch(cached_id)
+        with metrics.measure("prepare"):
+            ds = self._open_cube(cached_id)
+            ds = ds.sel(time=slice(str(years[0]), str(years[-1])))
+            bbox = preload_params.get("bbox")
+            if bbox:
+                ds = _select_bbox(ds, bbox)
+            ds = _drop_encoding(ds).assign_attrs(
+                icosdp_preload_params=_get_cube_params(preload_params)
+            )
+        if cached_id != data_id_out:
+            self._write_cube(data_id, data_id_out, ds, preload_params)
+            return
+        # the cached cube is replaced by its subset, which cannot be written
+        # while it is read
+        stem, ext = data_id_out.rsplit(".", 1)
+        temp_id = f"{stem}_subset.{ext}"
+        self._write_cube(data_id, temp_id, ds, preload_params)
+        ds.close()
+        path = f"{self._cache_root}/{data_id_out}"
+        self._cache_fs.rm(path, recursive=True)
+        self._cache_fs.mv(f"{self._cache_root}/{temp_id}", path, recursive=True)
+
+    def _index_cube(
+        self,
+        data_id: str,
+        data_id_out: str,
+        years: list[int],
+        sources: dict[str, str],
+        preload_params: dict,
+    ):
+        """Record a written cube in the cache index and enforce its size
+        limit."""
+        if self._cache_index is None:
+            return
+        content_params, key = _get_index_params(data_id, preload_params)
+        entry = dict(key=key, params=content_params, years=years, sources=sources)
+        size = _get_size(self._cache_fs, f"{self._cache_root}/{data_id_out}")
+        if preload_params.get("pyramid"):
+            levels_id = _get_levels_id(data_id_out)
+            entry.update(
+                pyramid=levels_id, pyramid_levels=preload_params.get("pyramid_levels")
+            )
+            size += _get_size(self._cache_fs, f"{self._cache_root}/{levels_id}")
+        self._cache_index.put(data_id_out, entry, size=size)
+        self._cache_index.evict(keep=data_id_out)
+
+    def _find_extendable_cube(
+        self, data_id: str, meta_years: list, preload_params: dict
+    ) -> tuple[str, list[int]] | None:
+        """Find a cube in the cache index of the same variable, aggregation
+        mode and parameters which can be extended by appending the missing
+        requested years. Returns its data ID and the years it covers."""
+        if self._cache_index is None:
+            return None
+        content_params, key = _get_index_params(data_id, preload_params)
+
+        def is_candidate(cached_id: str, entry: dict) -> bool:
+            return (
+                entry["key"] == key
+                and entry["params"]["data_id"] == data_id
+                and entry["params"]["agg_mode"] == content_params["agg_mode"]
+            )
+
+        requested_years = [_get_year(meta_year) for meta_year in meta_years]
+        best = None
+        for existing_id, entry in self._cache_index.find_all(is_candidate):
+            years = sorted(entry["years"])
+            missing = set(requested_years) - set(years)
+            if years[0] > min(requested_years) or (
+                missing and min(missing) < years[-1]
+            ):
+                # missing years can only be appended at the end of the cube
+                continue
+            if best is None or len(years) > len(best[1]):
+                best = (existing_id, years)
+        return best
+
+    def _extend_cube(
+        self,
+        data_id: str,
+        data_id_out: str,
+        existing_id: str,
+        existing_years: list[int],
+        meta_years: list,
+        preload_params: dict,
+    ) -> str:
+        """Append the years missing in an existing cube and rename the cube.
+
+        If appending fails, the cube is rolled back to its original time
+        steps and attributes, so that it is either extended completely or
+        left unchanged.
+        """
+        missing_meta_years = [
+            meta_year
+            for meta_year in meta_years
+            if _get_year(meta_year) not in existing_years
+        ]
+        requested_years = [_get_year(meta_year) for meta_year in meta_years]
+        if existing_years[0] < min(requested_years):
+            # the extended cube covers more years than requested
+            _, freq = _parse_agg_mode(preload_params["agg_mode"])
+            last_year = max(existing_years[-1], max(requested_years))
+            data_id_out = self._get_output_id(
+                data_id,
+                f"{data_id}_{freq}_{existing_years[0]}_{last_year}.zarr",
+                preload_params,
+            )
+        if not missing_meta_years:
+            self._notify_state(
+                data_id,
+                progress=0.95,
+                message=f"Datacube {existing_id!r} is up to date.",
+            )
+            return existing_id
+
+        existing_path = f"{self._cache_root}/{existing_id}"
+        zarr_store = _get_zarr_store(self._cache_fs, existing_path)
+        ds_existing = self._cache_store.open_data(existing_id)
+        num_times = ds_existing.sizes["time"]
+        attrs = dict(ds_existing.attrs)
+        target_chunks = {
+            str(dim): chunks[0] for dim, chunks in ds_existing.chunksizes.items()
+        }
+        ds_existing.close()
+        try:
+            self._write_years(
+                data_id,
+                zarr_store,
+                missing_meta_years,
+                preload_params,
+                num_times=num_times,
+                target_chunks=target_chunks,
+            )
+        except BaseException:
+            _truncate_time(zarr_store, num_times, attrs)
+            raise
+        if data_id_out != existing_id:
+            self._cache_fs.mv(
+                existing_path, f"{self._cache_root}/{data_id_out}", recursive=True
+            )
+        return data_id_out
+
+    def _open_cube(self, data_id: str) -> xr.Dataset:
+        """Open a cached cube as gridded dataset, whatever its layout."""
+        if data_id.endswith(VIRTUAL_EXT):
+            return open_virtual_cube(self._cache_fs, f"{self._cache_root}/{data_id}")
+        ds = self._cache_store.open_data(data_id)
+        return from_land_cells(ds) if is_land_only(ds) else ds
+
+    @staticmethod
+    def _prepare_dataset(ds: xr.Dataset, preload_params: dict) -> xr.Dataset:
+        ds = ds.assign_attrs(icosdp_preload_params=_get_cube_params(preload_params))
         bbox = preload_params.get("bbox")
         if bbox:
-            if bbox[0] >= bbox[2] or bbox[1] >= bbox[3]:
-                raise DataStoreError(
-                    f"Invalid bbox {bbox!r}. West must be smaller than East and "
-                    f"South must be smaller than North."
-                )
-            ds = ds.sel(lat=slice(bbox[3], bbox[1]), lon=slice(bbox[0], bbox[2]))
+            ds = _select_bbox(ds, bbox)
         if (
             preload_params.get("flatten_time", False)
             and preload_params["agg_mode"] == "025_monthlycycle"
         ):
             ds = _flatten_time_hour(ds)
+        return ds
 
-        # write cube
-        format_id = preload_params.get("target_format", "zarr")
-        if "chunks" in preload_params:
-            chunks = {
-                str(dim): chunk
-                for (dim, chunk) in zip(ds.dims, preload_params["chunks"])
-            }
-            ds = chunk_dataset(ds, chunks, format_name=format_id)
-        # noinspection PyUnboundLocalVariable
-        data_id_out = f"{data_id}_{freq}"
-        if "time_range" in preload_params:
-            # noinspection PyUnboundLocalVariable
-            data_id_out += f"_{year_start}_{year_end}"
-        if format_id == "netcdf":
-            data_id_out += ".nc"
-        else:
-            data_id_out += ".zarr"
-        self.notify(
-            PreloadState(
-                data_id,
-                progress=0.7,
-                message="Write data",
+    @staticmethod
+    def _encode_dataset(
+        ds: xr.Dataset,
+        preload_params: dict,
+        set_encoding: bool = True,
+        num_workers: int | None = None,
+    ) -> xr.Dataset:
+        """Apply the bit rounding and set the compression and packing
+        encoding of the data variables, if requested. The value ranges of
+        packed variables are computed with *num_workers* dask tasks."""
+        keepbits = preload_params.get("keepbits")
+        compression = preload_params.get("compression")
+        pack_int16 = preload_params.get("pack_int16", [])
+        invalid_vars = [name for name in pack_int16 if name not in ds.data_vars]
+        if invalid_vars:
+            raise DataStoreError(
+                f"Invalid variables {invalid_vars} in `pack_int16`, "
+                f"the dataset has data variables {list(ds.data_vars)}."
+            )
+        try:
+            if keepbits is not None:
+                ds = bitround(ds, keepbits)
+            if not set_encoding or (compression is None and not pack_int16):
+                return ds
+            encoding = get_encoding(
+                ds,
+                format_id=preload_params.get("target_format", "zarr"),
+                compression=compression,
+                compression_level=preload_params.get(
+                    "compression_level", DEFAULT_COMPRESSION_LEVEL
+                ),
+                shuffle=preload_params.get("shuffle", True),
+                pack_int16=tuple(pack_int16),
+                num_workers=num_workers,
             )
+        except ValueError as e:
+            raise DataStoreError(f"{e}") from e
+        ds = ds.copy()
+        for name, var_encoding in encoding.items():
+            var = ds[name].variable
+            if "dtype" in var_encoding:
+                # packed variables use the fill value of the packing
+                var.encoding.pop("missing_value", None)
+            var.encoding.update(var_encoding)
+        return ds
+
+    @staticmethod
+    def _get_subset(
+        preload_params: dict,
+    ) -> Callable[[xr.Dataset], xr.Dataset] | None:
+        """Get the function selecting the subset of each yearly file which is
+        read remotely, or None if the whole files are downloaded."""
+        bbox = preload_params.get("bbox")
+        if not preload_params.get("partial_download", False) or not bbox:
+            return None
+        return functools.partial(_select_bbox, bbox=bbox)
+
+    def _get_chunks(
+        self, data_id: str, ds: xr.Dataset, preload_params: dict
+    ) -> dict[str, int] | None:
+        """Resolve the `chunks` or `chunk_layout` parameter to a mapping of
+        dimension names to chunk sizes, where -1 stands for the full size.
+        Without both, uniform chunks within the memory budget of the preload
+        of *data_id* are used, if any."""
+        chunks = preload_params.get("chunks")
+        layout = preload_params.get("chunk_layout")
+        if chunks is not None and layout is not None:
+            raise DataStoreError(
+                "Only one of `chunks` and `chunk_layout` can be given."
+            )
+        if layout is not None:
+            var = max(ds.data_vars.values(), key=lambda v: v.size)
+            return get_layout_chunks(
+                var.sizes,
+                var.dtype.itemsize,
+                layout,
+                preload_params.get("rechunk_max_mem", DEFAULT_MAX_MEM),
+            )
+        if chunks is None:
+            budget = self._budgets.get(data_id)
+            if budget is None:
+                return None
+            return _get_auto_chunks(ds, budget.chunk_size)
+        if not isinstance(chunks, dict):
+            # chunk sizes given positionally in the order of the dimensions
+            chunks = dict(zip(map(str, ds.dims), chunks))
+        invalid_dims = [dim for dim in chunks if dim not in ds.dims]
+        if invalid_dims:
+            raise DataStoreError(
+                f"Invalid dimensions {invalid_dims} in `chunks`, "
+                f"the dataset has dimensions {list(ds.dims)}."
+            )
+        return {
+            dim: ds.sizes[dim] if chunk == -1 else chunk
+            for dim, chunk in chunks.items()
+        }
+
+    def _use_dask_cluster(self):
+        """Run the dask computations of the calling preload on the shared
+        dask cluster, if any, otherwise on the default scheduler."""
+        if self._dask_cluster is None:
+            return nullcontext()
+        return self._dask_cluster.use()
+
+    def _close_dask_cluster(self) -> None:
+        if self._dask_cluster is not None:
+            self._dask_cluster.close()
+            self._dask_cluster = None
+
+    def _apply_memory_budget(self, data_id: str, preload_params: dict) -> dict:
+        """Derive the memory budget of the preload of *data_id* from
+        `max_memory` and return the preload parameters limited to it.
+
+        `max_memory` is the budget of all preloads of the handle. Each
+        preload takes an equal share of the memory not held by the running
+        ones, counting itself and those not started yet, and releases it
+        when done. Hence, the preloads running at the same time never exceed
+        `max_memory` together. The budget applies to the local dask
+        scheduler only, it is rejected for preloads on a dask cluster.
+        """
+        if not preload_params.get("max_memory"):
+            return preload_params
+        with self._memory_lock:
+            num_preloads = max(1, self._num_pending - len(self._budgets))
+            try:
+                budget = get_memory_budget(
+                    self._free_memory // num_preloads,
+                    download_size=_get_download_size(preload_params),
+                    download_concurrency=preload_params.get("download_concurrency", 4),
+                    # streamed years are downloaded while the former ones are
+                    # written
+                    overlap=bool(
+                        preload_params.get("streaming")
+                        or preload_params.get("extend_existing")
+                    ),
+                )
+            except ValueError as e:
+                raise DataStoreError(f"{e}") from e
+            self._free_memory -= budget.max_memory
+            self._budgets[data_id] = budget
+        LOG.info(f"Memory budget of the preload of {data_id!r}: {budget}")
+        return dict(
+            preload_params,
+            download_concurrency=budget.download_concurrency,
+            rechunk_max_mem=min(
+                preload_params.get("rechunk_max_mem", budget.task_memory),
+                budget.task_memory,
+            ),
         )
-        # noinspection PyUnresolvedReferences
-        self._cache_store.write_data(ds, data_id_out, replace=True)
-        self.notify(
-            PreloadState(
-                data_id,
-                progress=1.0,
-                message=f"Datacube written to {data_id_out!r}.",
+
+    def _release_memory_budget(self, data_id: str) -> None:
+        with self._memory_lock:
+            budget = self._budgets.pop(data_id, None)
+            if budget is not None:
+                self._free_memory += budget.max_memory
+
+    def _get_num_workers(self, data_id: str, ds: xr.Dataset) -> int | None:
+        """Get the number of dask tasks on the chunks of *ds* which are
+        computed concurrently within the memory budget of the preload of
+        *data_id*. It is None without budget, which leaves it to the dask
+        scheduler. The number is passed to each computation, since the dask
+        configuration is shared by the concurrent preloads of the process."""
+        budget = self._budgets.get(data_id)
+        if budget is None:
+            return None
+        chunk_size = _get_max_chunk_size(ds)
+        num_workers = budget.get_num_workers(chunk_size)
+        if num_workers < 1:
+            raise DataStoreError(
+                f"Chunks of {chunk_size} bytes exceed the memory budget "
+                f"`max_memory={budget.max_memory}`. Please choose smaller "
+                f"`chunks`."
+            )
+        return num_workers
+
+    def _open_year(self, data_id: str, file_name: str) -> xr.Dataset:
+        """Open a downloaded yearly file of the preload of *data_id* in dask
+        chunks sized to its memory budget, if any."""
+        path = f"{self._scratch_dirs[data_id]}/{file_name}"
+        budget = self._budgets.get(data_id)
+        if budget is None:
+            return self._process_store.open_data(path, chunks="auto")
+        ds = self._process_store.open_data(path, chunks=None)
+        return ds.chunk(_get_auto_chunks(ds, budget.chunk_size))
+
+    def _write_dataset(
+        self,
+        data_id: str,
+        data_id_out: str,
+        ds: xr.Dataset,
+        num_workers: int | None,
+    ) -> None:
+        """Write *ds* to the cache store, replacing the dataset *data_id_out*,
+        with *num_workers* concurrent dask tasks. NetCDF files are written to
+        the scratch folder of the preload of *data_id* first."""
+        self._remove_cached(data_id_out)
+        path = f"{self._cache_root}/{data_id_out}"
+        ds = _drop_chunk_encoding(ds)
+        if not data_id_out.endswith(".nc"):
+            delayed = ds.to_zarr(
+                _get_zarr_store(self._cache_fs, path),
+                mode="w",
+                zarr_format=ZARR_FORMAT,
+                compute=False,
             )
+            dask.compute(delayed, num_workers=num_workers)
+            return
+        temp_path = os.path.join(
+            self._process_root, self._scratch_dirs[data_id], data_id_out
+        )
+        dask.compute(ds.to_netcdf(temp_path, compute=False), num_workers=num_workers)
+        try:
+            self._cache_fs.makedirs(self._cache_root, exist_ok=True)
+            self._cache_fs.put_file(temp_path, path)
+        finally:
+            os.remove(temp_path)
+
+    def _log_peak_memory(self, data_id: str) -> None:
+        peak_memory = self._metrics[data_id].peak_memory
+        if peak_memory is None:
+            return
+        budget = self._budgets.get(data_id)
+        message = (
+            f"Peak memory of the preload of {data_id!r}: "
+            f"{peak_memory / 1024**2:.1f} MiB"
         )
+        if budget is None:
+            LOG.info(message)
+        elif peak_memory > budget.max_memory:
+            LOG.warning(
+                f"{message}, which exceeds `max_memory` of "
+                f"{budget.max_memory / 1024**2:.1f} MiB."
+            )
+        else:
+            LOG.info(f"{message} of {budget.max_memory / 1024**2:.1f} MiB.")
+
+    def _remove_cached(self, data_id: str) -> None:
+        path = f"{self._cache_root}/{data_id}"
+        if self._cache_fs.exists(path):
+            self._cache_fs.rm(path, recursive=True)
+
+    def _notify_state(self, data_id: str, **kwargs) -> None:
+        """Notify a state carrying a snapshot of the current metrics."""
+        self.notify(
+            IcosdpPreloadState(data_id, metrics=self._metrics[data_id].copy(), **kwargs)
+        )
+
+    def _clean_up(self, data_id: str) -> None:
+        scratch_dir = self._scratch_dirs.pop(data_id, None)
+        if scratch_dir is None:
+            return
+        path = f"{self._process_root}/{scratch_dir}"
+        if self._process_fs.isdir(path):
+            self._process_fs.rm(path, recursive=True)
+
+
+def _get_year(meta_year: Any) -> int:
+    # members of the FLUXCOM-X-BASE collections are titled "... <year>"
+    return int(meta_year.title.split(" ")[-1])
+
+
+def _get_cube_params(preload_params: dict) -> str:
+    """Serialize the preload parameters which determine the content of a cube,
+    apart from its time range, so that they can be stored as attribute."""
+    flatten_time = preload_params.get("flatten_time", False)
+    cube_params = dict(
+        agg_mode=preload_params["agg_mode"],
+        bbox=list(preload_params["bbox"]) if preload_params.get("bbox") else None,
+        flatten_time=flatten_time and preload_params["agg_mode"] == "025_monthlycycle",
+    )
+    if preload_params.get("keepbits") is not None:
+        # bit rounding changes the values of the cube
+        cube_params["keepbits"] = preload_params["keepbits"]
+    return json.dumps(cube_params, sort_keys=True)
+
+
+def _get_levels_id(data_id: str) -> str:
+    """Get the data ID of the pyramid of the cube *data_id*."""
+    return f"{data_id.rsplit('.', 1)[0]}{LEVELS_EXT}"
 
-        # delete temp storage
-        self._clean_up()
 
-    def _clean_up(self) -> None:
-        if self._process_fs.isdir(self._process_root):
-            self._process_fs.rm(self._process_root, recursive=True)
+def _is_local(fs: fsspec.AbstractFileSystem) -> bool:
+    protocols = (fs.protocol,) if isinstance(fs.protocol, str) else fs.protocol
+    return "file" in protocols or "local" in protocols
+
+
+def _get_index_params(data_id: str, preload_params: dict) -> tuple[dict, str]:
+    """Get the canonical parameters which determine the content of a cube,
+    apart from its time range, and the hash of all parameters which determine
+    the stored cube, including its format, chunking and encoding."""
+    content_params = dict(
+        json.loads(_get_cube_params(preload_params)),
+        data_id=data_id,
+        pack_int16=sorted(preload_params.get("pack_int16", [])),
+    )
+    layout_params = dict(
+        target_format=preload_params.get("target_format", "zarr"),
+        chunks=preload_params.get("chunks"),
+        chunk_layout=preload_params.get("chunk_layout"),
+        compression=preload_params.get("compression"),
+    )
+    if layout_params["compression"] is not None:
+        layout_params["compression_level"] = preload_params.get(
+            "compression_level", DEFAULT_COMPRESSION_LEVEL
+        )
+        layout_params["shuffle"] = preload_params.get("shuffle", True)
+    if preload_params.get("land_only"):
+        layout_params["land_only"] = True
+    return content_params, get_params_key(dict(content_params, **layout_params))
+
+
+def _without_bbox(params: dict) -> dict:
+    return {name: value for name, value in params.items() if name != "bbox"}
+
+
+def _contains_bbox(bbox: list[float] | None, other: list[float] | None) -> bool:
+    if bbox is None:
+        return True
+    if other is None:
+        return False
+    return (
+        bbox[0] <= other[0]
+        and bbox[1] <= other[1]
+        and bbox[2] >= other[2]
+        and bbox[3] >= other[3]
+    )
+
+
+def _drop_encoding(ds: xr.Dataset) -> xr.Dataset:
+    # the chunking and compression of a cached cube do not apply to its subsets
+    ds = ds.copy()
+    for var in ds.variables.values():
+        var.encoding = {}
+    return ds
+
+
+def _get_download_size(preload_params: dict) -> int:
+    """Estimate the memory of a single download in bytes. Whole files are
+    streamed to the scratch folder, while partial downloads hold the subset
+    of a year in memory."""
+    bbox = preload_params.get("bbox")
+    if not preload_params.get("partial_download", False) or not bbox:
+        return DOWNLOAD_BUFFER_SIZE
+    # sizes of a leap year of float32 values
+    sizes = _get_agg_mode_sizes(preload_params["agg_mode"], [2000])
+    fraction = (
+        (min(bbox[2], 180) - max(bbox[0], -180))
+        * (min(bbox[3], 90) - max(bbox[1], -90))
+        / (360 * 180)
+    )
+    return max(1, math.ceil(math.prod(sizes.values()) * 4 * fraction))
+
+
+def _get_auto_chunks(ds: xr.Dataset, chunk_size: int) -> dict[str, int]:
+    """Get uniform chunk sizes of the dimensions of the largest data variable
+    of *ds*, so that its chunks have at most *chunk_size* bytes."""
+    var = max(ds.data_vars.values(), key=lambda v: v.size)
+    auto_chunks = dask.array.core.normalize_chunks(
+        "auto", var.shape, limit=chunk_size, dtype=var.dtype
+    )
+    return {str(dim): c[0] for dim, c in zip(var.dims, auto_chunks)}
+
+
+def _get_max_chunk_size(ds: xr.Dataset) -> int:
+    """Get the size of the largest chunk of the data variables in bytes."""
+    return max(
+        (
+            math.prod(max(chunks) for chunks in var.chunks) * var.dtype.itemsize
+            for var in ds.data_vars.values()
+            if var.chunks
+        ),
+        default=0,
+    )
+
+
+def _get_num_tasks(ds: xr.Dataset) -> int:
+    graph = ds.__dask_graph__()
+    return len(graph) if graph is not None else 0
+
+
+def _get_size(fs: fsspec.AbstractFileSystem, path: str | fsspec.FSMap) -> int:
+    """Get the total size of the files below *path* in bytes, or 0 if it
+    does not exist."""
+    if isinstance(path, fsspec.FSMap):
+        path = path.root
+    try:
+        return fs.du(path)
+    except FileNotFoundError:
+        return 0
+
+
+def _truncate_time(
+    zarr_store: str | fsspec.FSMap, num_times: int, attrs: dict[str, Any]
+) -> None:
+    """Truncate all arrays of a Zarr dataset along the time dimension and
+    restore its attributes."""
+    group = zarr.open_group(zarr_store, mode="r+")
+    for _, array in group.arrays():
+        metadata = getattr(array, "metadata", None)
+        dims = getattr(metadata, "dimension_names", None) or array.attrs.get(
+            "_ARRAY_DIMENSIONS", ()
+        )
+        if "time" in dims:
+            shape = list(array.shape)
+            shape[list(dims).index("time")] = num_times
+            array.resize(tuple(shape))
+    group.attrs.put(attrs)
+    zarr.consolidate_metadata(zarr_store)
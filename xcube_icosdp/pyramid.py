@@ -0,0 +1,162 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+
+import json
+from typing import Callable
+
+import dask
+import fsspec
+import xarray as xr
+
+from .aggregation import SPATIAL_DIMS, coarsen_spatial
+from .constants import ZARR_FORMAT
+from .utils import _drop_chunk_encoding, _get_zarr_store
+
+LEVELS_EXT = ".levels"
+# metadata of the xcube multi-level dataset layout, written last
+LEVELS_META_FILE_NAME = ".zlevels"
+LEVELS_VERSION = "1.0"
+# each level halves the resolution of the previous one
+LEVEL_FACTOR = 2
+
+
+def get_num_levels(ds: xr.Dataset) -> int:
+    """Get the number of levels of a pyramid of *ds* whose coarsest level
+    fits into a single spatial chunk of *ds*."""
+    tile_size = _get_tile_size(ds)
+    sizes = {dim: ds.sizes[dim] for dim in SPATIAL_DIMS}
+    num_levels = 1
+    while any(sizes[dim] > tile_size[dim] for dim in SPATIAL_DIMS) and all(
+        size >= LEVEL_FACTOR for size in sizes.values()
+    ):
+        sizes = {dim: size // LEVEL_FACTOR for dim, size in sizes.items()}
+        num_levels += 1
+    return num_levels
+
+
+def write_pyramid(
+    fs: fsspec.AbstractFileSystem,
+    path: str,
+    ds: xr.Dataset,
+    num_levels: int | None = None,
+    base_name: str | None = None,
+    encode: Callable[[xr.Dataset], xr.Dataset] | None = None,
+    zarr_format: int = ZARR_FORMAT,
+    num_workers: int | None = None,
+) -> int:
+    """Write a multi-resolution pyramid of *ds* in the xcube multi-level
+    dataset layout.
+
+    Each level halves the spatial resolution of the previous one, weighting
+    the grid cells by their ``land_fraction``. The levels are chained lazily
+    and written in a single dask computation, so that each chunk of *ds* is
+    read only once. All levels use the spatial chunk size of *ds* as tile
+    size and keep its time chunks.
+
+    Args:
+        fs: Filesystem of the pyramid.
+        path: Path of the ``.levels`` folder, which is replaced if it exists.
+        ds: Dataset of level 0 with dimensions ``lat`` and ``lon`` and a
+            ``land_fraction`` variable.
+        num_levels: Number of levels including level 0. If None, levels are
+            added until the coarsest level fits into a single tile.
+        base_name: If given, level 0 is not written, but linked to the
+            dataset of this name next to the ``.levels`` folder.
+        encode: Function setting the encoding of each written level.
+        zarr_format: The Zarr format of the written levels, which must be
+            the format of level 0 and of the encoding set by *encode*.
+            Defaults to the format of the cache store.
+        num_workers: Maximum number of dask tasks computed concurrently.
+            Defaults to the one of the dask scheduler.
+
+    Returns:
+        The number of written levels.
+
+    Raises:
+        ValueError: If *ds* has no ``land_fraction`` variable or is too
+            small for *num_levels*.
+    """
+    if "land_fraction" not in ds:
+        raise ValueError("The pyramid requires the variable 'land_fraction'.")
+    max_levels = _get_max_num_levels(ds)
+    if num_levels is None:
+        num_levels = get_num_levels(ds)
+    elif num_levels > max_levels:
+        raise ValueError(
+            f"The spatial extent of {dict(ds.sizes)} allows at most "
+            f"{max_levels} pyramid levels, but {num_levels} were requested."
+        )
+    tile_size = _get_tile_size(ds)
+    if fs.exists(path):
+        fs.rm(path, recursive=True)
+    fs.makedirs(path, exist_ok=True)
+
+    encode = encode or (lambda level_ds: level_ds)
+    writes = []
+    level_ds = ds
+    for index in range(num_levels):
+        if index > 0:
+            level_ds = coarsen_spatial(level_ds, LEVEL_FACTOR)
+            level_ds = level_ds.chunk(
+                {dim: min(tile_size[dim], level_ds.sizes[dim]) for dim in SPATIAL_DIMS}
+            )
+        if index == 0 and base_name is not None:
+            with fs.open(f"{path}/0.link", "w") as fp:
+                fp.write(base_name)
+            continue
+        writes.append(
+            _drop_chunk_encoding(encode(level_ds)).to_zarr(
+                _get_zarr_store(fs, f"{path}/{index}.zarr"),
+                mode="w",
+                compute=False,
+                zarr_format=zarr_format,
+            )
+        )
+    dask.compute(*writes, num_workers=num_workers)
+
+    agg_methods = {name: "mean" for name in ds.data_vars}
+    with fs.open(f"{path}/{LEVELS_META_FILE_NAME}", "w") as fp:
+        json.dump(
+            dict(
+                version=LEVELS_VERSION,
+                num_levels=num_levels,
+                tile_size=[tile_size["lon"], tile_size["lat"]],
+                use_saved_levels=True,
+                agg_methods=agg_methods,
+            ),
+            fp,
+            indent=2,
+        )
+    return num_levels
+
+
+def _get_max_num_levels(ds: xr.Dataset) -> int:
+    # each level must keep at least one grid cell along both dimensions
+    sizes = [ds.sizes[dim] for dim in SPATIAL_DIMS]
+    num_levels = 1
+    while all(size >= LEVEL_FACTOR for size in sizes):
+        sizes = [size // LEVEL_FACTOR for size in sizes]
+        num_levels += 1
+    return num_levels
+
+
+def _get_tile_size(ds: xr.Dataset) -> dict[str, int]:
+    # the first spatial chunk, or the full extent if the dataset is not chunked
+    return {
+        dim: ds.chunksizes[dim][0] if dim in ds.chunksizes else ds.sizes[dim]
+        for dim in SPATIAL_DIMS
+    }
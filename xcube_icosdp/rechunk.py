@@ -0,0 +1,248 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import math
+import posixpath
+from typing import Mapping, Sequence
+
+import dask
+import fsspec
+import xarray as xr
+
+from .constants import ZARR_FORMAT
+from .utils import _drop_chunk_encoding, _get_zarr_store
+
+CHUNK_LAYOUTS = ("map-optimized", "timeseries-optimized")
+DEFAULT_MAX_MEM = 512 * 1024**2
+
+# maximum size of the chunks of the preset layouts
+_LAYOUT_CHUNK_BYTES = 64 * 1024**2
+_MAX_NUM_STAGES = 8
+
+
+def get_layout_chunks(
+    sizes: Mapping[str, int], itemsize: int, layout: str, max_mem: int
+) -> dict[str, int]:
+    """Get the chunk sizes of a preset chunk layout.
+
+    "map-optimized" uses a single time step per chunk, so that maps are read
+    from few chunks, while "timeseries-optimized" uses the whole time axis,
+    so that time series of a pixel are read from a single chunk. The spatial
+    chunks are balanced, nearly square tiles, sized so that a chunk does not
+    exceed 64 MiB or a quarter of *max_mem*.
+
+    Args:
+        sizes: The dimension sizes of the dataset.
+        itemsize: Number of bytes of an array element.
+        layout: One of "map-optimized" and "timeseries-optimized".
+        max_mem: The memory budget of the rechunking in bytes.
+
+    Returns:
+        Mapping of dimension names to chunk sizes.
+    """
+    if layout not in CHUNK_LAYOUTS:
+        raise ValueError(f"Invalid chunk layout {layout!r}.")
+    chunks = {dim: size for dim, size in sizes.items() if dim not in ("lat", "lon")}
+    if layout == "map-optimized" and "time" in chunks:
+        chunks["time"] = 1
+    num_items = max(1, min(_LAYOUT_CHUNK_BYTES, max_mem // 4) // itemsize)
+    tile_size = max(1, math.isqrt(num_items // math.prod(chunks.values())))
+    for dim in ("lat", "lon"):
+        if dim in sizes:
+            # balance the tiles, so that the last one is not much smaller
+            num_tiles = math.ceil(sizes[dim] / tile_size)
+            chunks[dim] = math.ceil(sizes[dim] / num_tiles)
+    return chunks
+
+
+def plan_rechunk(
+    shape: Sequence[int],
+    source_chunks: Sequence[int],
+    target_chunks: Sequence[int],
+    itemsize: int,
+    max_mem: int,
+) -> list[tuple[int, ...]]:
+    """Plan the stages of rechunking an array within a memory budget.
+
+    Copying from one chunk layout to another needs, per output chunk, the
+    union of all input chunks overlapping it. If this exceeds *max_mem*, as
+    for spatial slabs rechunked to long time series, the data is copied via
+    an intermediate layout: the source and target chunks are consolidated
+    towards each other within the budget, and the intermediate chunks are
+    their minimum, so that both copies only need the chunks of one side.
+    If that does not fit either, intermediate layouts interpolating
+    geometrically between the source and target chunks are used.
+
+    Args:
+        shape: The shape of the array.
+        source_chunks: The chunk sizes of the source array.
+        target_chunks: The chunk sizes of the target array.
+        itemsize: Number of bytes of an array element.
+        max_mem: Maximum memory of a single copy task in bytes.
+
+    Returns:
+        The chunk sizes of each stage, the last one being *target_chunks*.
+
+    Raises:
+        ValueError: If the target chunks or the source chunks exceed the
+            budget, or if no plan is found.
+    """
+    source_chunks = _clip_chunks(shape, source_chunks)
+    target_chunks = _clip_chunks(shape, target_chunks)
+    for name, chunks in (("source", source_chunks), ("target", target_chunks)):
+        if math.prod(chunks) * itemsize > max_mem:
+            raise ValueError(
+                f"The {name} chunks {chunks} of {math.prod(chunks) * itemsize} "
+                f"bytes exceed the memory budget of {max_mem} bytes."
+            )
+
+    def fits(layouts: list[tuple[int, ...]]) -> bool:
+        return all(
+            _get_copy_mem(shape, layouts[i], layouts[i + 1], itemsize) <= max_mem
+            for i in range(len(layouts) - 1)
+        )
+
+    if fits([source_chunks, target_chunks]):
+        return [target_chunks]
+
+    read_chunks = _consolidate_chunks(source_chunks, target_chunks, itemsize, max_mem)
+    write_chunks = _consolidate_chunks(target_chunks, source_chunks, itemsize, max_mem)
+    inter_chunks = tuple(min(r, w) for r, w in zip(read_chunks, write_chunks))
+    if fits([source_chunks, inter_chunks, target_chunks]):
+        return [inter_chunks, target_chunks]
+
+    for num_stages in range(3, _MAX_NUM_STAGES + 1):
+        layouts = [source_chunks]
+        for stage in range(1, num_stages):
+            fraction = stage / num_stages
+            layouts.append(
+                _clip_chunks(
+                    shape,
+                    [
+                        round(s ** (1 - fraction) * t**fraction)
+                        for s, t in zip(source_chunks, target_chunks)
+                    ],
+                )
+            )
+        layouts.append(target_chunks)
+        if fits(layouts):
+            return layouts[1:]
+    raise ValueError(
+        f"Rechunking from {source_chunks} to {target_chunks} does not fit into "
+        f"the memory budget of {max_mem} bytes."
+    )
+
+
+def rechunk_dataset(
+    ds: xr.Dataset,
+    target_chunks: Mapping[str, int],
+    max_mem: int,
+    fs: fsspec.AbstractFileSystem,
+    temp_path: str,
+    num_workers: int | None = None,
+) -> xr.Dataset:
+    """Rechunk a dataset lazily within a memory budget.
+
+    The stages are planned by :func:`plan_rechunk` for the largest variable.
+    All stages but the last are written to intermediate Zarr datasets below
+    *temp_path*, so that every stage is computed separately with bounded
+    memory. The intermediate datasets have the Zarr format of the cache
+    store, so that their encoding can be written to it. The returned dataset
+    is opened from the last intermediate dataset and chunked to
+    *target_chunks*; writing it computes the last stage.
+
+    Args:
+        ds: The dataset to be rechunked.
+        target_chunks: Mapping of dimension names to chunk sizes. Dimensions
+            not given keep their chunks; -1 selects the full dimension.
+        max_mem: Maximum memory of a single copy task in bytes.
+        fs: Filesystem of the intermediate datasets.
+        temp_path: Folder of the intermediate datasets.
+        num_workers: Maximum number of dask tasks writing an intermediate
+            dataset concurrently. Defaults to the one of the dask scheduler.
+
+    Returns:
+        The rechunked dataset.
+    """
+    var = max(ds.data_vars.values(), key=lambda v: v.size * v.dtype.itemsize)
+    source_chunks = (
+        [max(chunks) for chunks in var.chunks] if var.chunks else list(var.shape)
+    )
+    target = [
+        var.sizes[dim] if target_chunks.get(dim, c) == -1 else target_chunks.get(dim, c)
+        for dim, c in zip(var.dims, source_chunks)
+    ]
+    stages = plan_rechunk(var.shape, source_chunks, target, var.dtype.itemsize, max_mem)
+    for index, chunks in enumerate(stages[:-1]):
+        stage_chunks = dict(zip(var.dims, chunks))
+        path = posixpath.join(temp_path, f"rechunk_stage_{index}.zarr")
+        ds = _drop_chunk_encoding(_chunk_dims(ds, stage_chunks))
+        delayed = ds.to_zarr(
+            _get_zarr_store(fs, path),
+            mode="w",
+            consolidated=False,
+            zarr_format=ZARR_FORMAT,
+            compute=False,
+        )
+        dask.compute(delayed, num_workers=num_workers)
+        ds = xr.open_zarr(_get_zarr_store(fs, path), consolidated=False)
+    target = {dim: c for dim, c in target_chunks.items() if dim in ds.dims}
+    target.update(dict(zip(var.dims, stages[-1])))
+    return _chunk_dims(ds, target)
+
+
+def _chunk_dims(ds: xr.Dataset, chunks: Mapping[str, int]) -> xr.Dataset:
+    return ds.chunk({dim: chunks[dim] for dim in ds.dims if dim in chunks})
+
+
+def _clip_chunks(shape: Sequence[int], chunks: Sequence[int]) -> tuple[int, ...]:
+    return tuple(
+        size if chunk in (-1, None) else max(1, min(size, int(chunk)))
+        for size, chunk in zip(shape, chunks)
+    )
+
+
+def _consolidate_chunks(
+    chunks: Sequence[int], limits: Sequence[int], itemsize: int, max_mem: int
+) -> tuple[int, ...]:
+    """Grow *chunks* by integer multiples towards *limits*, as long as a chunk
+    takes at most half of *max_mem*."""
+    chunks = list(chunks)
+    for axis, limit in enumerate(limits):
+        if limit <= chunks[axis]:
+            continue
+        other_items = math.prod(chunks) // chunks[axis]
+        max_items = max_mem // 2 // itemsize // other_items
+        multiple = max(1, min(limit // chunks[axis], max_items // chunks[axis]))
+        chunks[axis] *= multiple
+    return tuple(chunks)
+
+
+def _get_copy_mem(
+    shape: Sequence[int],
+    read_chunks: Sequence[int],
+    write_chunks: Sequence[int],
+    itemsize: int,
+) -> int:
+    """Estimate the bytes of the input chunks needed for one output chunk."""
+    num_items = 1
+    for size, read, write in zip(shape, read_chunks, write_chunks):
+        span = read * math.ceil(write / read)
+        if read % write != 0 and write % read != 0:
+            # misaligned chunks overlap one more input chunk
+            span += read
+        num_items *= min(size, max(read, span))
+    return num_items * itemsize
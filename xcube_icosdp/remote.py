@@ -0,0 +1,132 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import re
+import threading
+import urllib.request
+from typing import IO, Callable
+from urllib.parse import unquote, urlsplit
+
+import icoscp_core.dataclient
+from fsspec.spec import AbstractBufferedFile
+from icoscp_core.auth import http_auth_request
+
+REMOTE_BLOCK_SIZE = 1024**2
+
+Request = Callable[[str, dict[str, str]], IO[bytes]]
+
+
+class HttpRangeFile(AbstractBufferedFile):
+    """Read-only file object which reads a remote HTTP resource lazily with
+    range requests, so that libraries such as h5netcdf read only the parts
+    of a file they need.
+
+    Fetched blocks are cached, so that metadata read repeatedly is fetched
+    only once.
+
+    Args:
+        url: URL of the resource. The server must support range requests.
+        request: Function performing a GET request with the given URL and
+            headers and returning the response. Defaults to an
+            unauthenticated request.
+        block_size: Size of the fetched blocks in bytes.
+        cache_type: The fsspec cache type of the fetched blocks.
+
+    Raises:
+        OSError: If the server does not support range requests.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        request: Request | None = None,
+        block_size: int = REMOTE_BLOCK_SIZE,
+        cache_type: str = "blockcache",
+    ):
+        self._request = request or _request
+        self._lock = threading.Lock()
+        self.num_requests = 0
+        self.num_bytes_fetched = 0
+        # the first byte is fetched to learn the size and name of the file
+        with self._request(url, {"Range": "bytes=0-0"}) as response:
+            content_range = response.headers.get("Content-Range", "")
+            if response.status != 206 or "/" not in content_range:
+                raise OSError(f"Server of {url!r} does not support range requests.")
+            size = int(content_range.rsplit("/", 1)[-1])
+            disposition = response.headers.get("Content-Disposition") or ""
+        match = re.search(r'filename="(.*)"', disposition)
+        self.file_name = (
+            unquote(match.group(1)) if match else urlsplit(url).path.split("/")[-1]
+        )
+        super().__init__(
+            None,
+            url,
+            mode="rb",
+            block_size=block_size,
+            cache_type=cache_type,
+            size=size,
+        )
+
+    def _fetch_range(self, start: int, end: int) -> bytes:
+        if start >= end:
+            return b""
+        with self._request(self.path, {"Range": f"bytes={start}-{end - 1}"}) as r:
+            if r.status != 206:
+                raise OSError(f"Range request for {self.path!r} was not honored.")
+            data = r.read()
+        with self._lock:
+            self.num_requests += 1
+            self.num_bytes_fetched += len(data)
+        return data
+
+
+# noinspection PyUnresolvedReferences
+def open_data_object(
+    icos_data: icoscp_core.dataclient.DataClient,
+    dobj_uri: str,
+    block_size: int = REMOTE_BLOCK_SIZE,
+) -> HttpRangeFile:
+    """Open an ICOS data object for reading with authenticated range requests.
+
+    The URL of the data object is its access URL given by the metadata.
+
+    Args:
+        icos_data: The ICOS data client providing the metadata and the
+            authentication.
+        dobj_uri: The landing page URI of the data object.
+        block_size: Size of the fetched blocks in bytes.
+
+    Returns:
+        The opened file object.
+
+    Raises:
+        OSError: If the data object has no access URL or its server does not
+            support range requests.
+    """
+    url = icos_data.meta.get_dobj_meta(dobj_uri).accessUrl
+    if not url:
+        raise OSError(f"Data object {dobj_uri!r} has no access URL.")
+    return HttpRangeFile(
+        url,
+        request=lambda request_url, headers: http_auth_request(
+            request_url, "Fetching data object range", icos_data.auth, headers=headers
+        ),
+        block_size=block_size,
+    )
+
+
+def _request(url: str, headers: dict[str, str]) -> IO[bytes]:
+    return urllib.request.urlopen(urllib.request.Request(url, headers=headers))
@@ -0,0 +1,489 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Mapping, Sequence
+
+import numpy as np
+import xarray as xr
+
+from .constants import LOG
+
+STATISTICS = ("count", "mean", "std", "min", "max")
+QUANTILE_DIM = "quantile"
+DEFAULT_NUM_BINS = 256
+CHECKPOINT_META_FILE_NAME = "statistics.json"
+
+# number of samples per pixel processed at once, which bounds the memory
+# of the temporary arrays to a small multiple of the read block
+_MAX_STEP_SAMPLES = 256
+
+
+@dataclass
+class PixelAccumulator:
+    """Mergeable accumulator of the statistics of each pixel of a tile.
+
+    The moments are accumulated with the parallel variant of Welford's
+    algorithm, so that blocks of samples can be added in any order, and the
+    quantiles are estimated from a histogram with fixed bins per pixel.
+    Missing values are skipped.
+
+    Attributes:
+        count: Number of valid samples per pixel.
+        mean: Mean of the valid samples per pixel.
+        m2: Sum of the squared deviations from the mean per pixel.
+        min: Minimum per pixel, or +inf if there are no valid samples.
+        max: Maximum per pixel, or -inf if there are no valid samples.
+        histogram: Number of samples per bin and pixel, or None if no
+            quantiles are estimated.
+    """
+
+    count: np.ndarray
+    mean: np.ndarray
+    m2: np.ndarray
+    min: np.ndarray
+    max: np.ndarray
+    histogram: np.ndarray | None = None
+
+    @classmethod
+    def empty(cls, shape: tuple[int, ...], num_bins: int = 0) -> "PixelAccumulator":
+        """Create an accumulator of *shape* without samples, with a histogram
+        of *num_bins* bins if *num_bins* is positive."""
+        return cls(
+            count=np.zeros(shape, dtype=np.int64),
+            mean=np.zeros(shape, dtype=np.float64),
+            m2=np.zeros(shape, dtype=np.float64),
+            min=np.full(shape, np.inf),
+            max=np.full(shape, -np.inf),
+            histogram=(
+                np.zeros((num_bins, *shape), dtype=np.int64) if num_bins else None
+            ),
+        )
+
+    @classmethod
+    def from_values(cls, values: np.ndarray) -> "PixelAccumulator":
+        """Create an accumulator of the samples *values* along the first
+        axis, without histogram."""
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=0)
+        total = np.where(valid, values, 0).sum(axis=0, dtype=np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, total / count, 0.0)
+        deviations = np.where(valid, values - mean, 0.0)
+        return cls(
+            count=count.astype(np.int64),
+            mean=mean,
+            m2=np.square(deviations).sum(axis=0),
+            min=np.where(valid, values, np.inf).min(axis=0, initial=np.inf),
+            max=np.where(valid, values, -np.inf).max(axis=0, initial=-np.inf),
+        )
+
+    def update(
+        self, values: np.ndarray, value_range: tuple[float, float] | None = None
+    ) -> None:
+        """Add the samples *values* along the first axis, binning them within
+        *value_range* if the accumulator has a histogram."""
+        for start in range(0, values.shape[0], _MAX_STEP_SAMPLES):
+            step_values = values[start : start + _MAX_STEP_SAMPLES]
+            other = self.from_values(step_values)
+            if self.histogram is not None:
+                other.histogram = _get_histogram(
+                    step_values, value_range, self.histogram.shape[0]
+                )
+            self.merge(other)
+
+    def merge(self, other: "PixelAccumulator") -> None:
+        """Merge the samples accumulated by *other* into this accumulator."""
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weight = np.where(count > 0, other.count / count, 0.0)
+            self.m2 = self.m2 + other.m2 + delta**2 * self.count * weight
+        self.mean = self.mean + delta * weight
+        self.count = count
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        if self.histogram is not None and other.histogram is not None:
+            self.histogram = self.histogram + other.histogram
+
+    def get_statistic(self, name: str) -> np.ndarray:
+        """Get the statistic *name*, one of :data:`STATISTICS`, per pixel.
+        Pixels without valid samples are NaN, except for the count. The
+        standard deviation is the population standard deviation."""
+        if name == "count":
+            return self.count
+        empty = self.count == 0
+        if name == "mean":
+            values = self.mean
+        elif name == "std":
+            with np.errstate(invalid="ignore", divide="ignore"):
+                values = np.sqrt(self.m2 / self.count)
+        elif name in ("min", "max"):
+            values = getattr(self, name)
+        else:
+            raise ValueError(
+                f"Invalid statistic {name!r}, must be one of {list(STATISTICS)}."
+            )
+        return np.where(empty, np.nan, values)
+
+    def get_quantiles(
+        self, quantiles: Sequence[float], value_range: tuple[float, float]
+    ) -> np.ndarray:
+        """Estimate *quantiles* per pixel by linear interpolation within the
+        bins of the histogram. The error is at most one bin width, and values
+        outside *value_range* are counted in the outermost bins."""
+        num_bins = self.histogram.shape[0]
+        edges = np.linspace(value_range[0], value_range[1], num_bins + 1)
+        cumulative = np.cumsum(self.histogram, axis=0)
+        result = np.full((len(quantiles), *self.count.shape), np.nan)
+        for index, quantile in enumerate(quantiles):
+            target = quantile * self.count
+            # first non-empty bin whose cumulative count reaches the target
+            bin_index = np.minimum(
+                (cumulative < np.maximum(target, 0.5)).sum(axis=0), num_bins - 1
+            )
+            upper = np.take_along_axis(cumulative, bin_index[np.newaxis], 0)[0]
+            in_bin = np.take_along_axis(self.histogram, bin_index[np.newaxis], 0)[0]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                fraction = (target - (upper - in_bin)) / in_bin
+            fraction = np.clip(np.nan_to_num(fraction), 0.0, 1.0)
+            values = edges[bin_index] + fraction * (edges[1] - edges[0])
+            result[index] = np.where(self.count > 0, values, np.nan)
+        return result
+
+    def to_arrays(self) -> dict[str, np.ndarray]:
+        arrays = dict(
+            count=self.count, mean=self.mean, m2=self.m2, min=self.min, max=self.max
+        )
+        if self.histogram is not None:
+            arrays["histogram"] = self.histogram
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray]) -> "PixelAccumulator":
+        return cls(**{name: np.asarray(array) for name, array in arrays.items()})
+
+
+def compute_statistics(
+    ds: xr.Dataset,
+    var_names: Sequence[str] | None = None,
+    statistics: Sequence[str] = STATISTICS,
+    quantiles: Sequence[float] | None = None,
+    value_range: tuple[float, float] | Mapping[str, tuple[float, float]] | None = None,
+    num_bins: int = DEFAULT_NUM_BINS,
+    checkpoint_dir: str | None = None,
+    max_workers: int = 8,
+    progress_callback: Callable[[int, int], None] | None = None,
+) -> xr.Dataset:
+    """Compute statistics over all time steps per pixel in a single pass,
+    walking time in chunk-aligned blocks.
+
+    The spatial extent is split into tiles aligned with the chunks of *ds*,
+    which are processed in parallel. Each tile reads one block of time
+    steps at a time, i.e. one chunk per variable, and merges it into
+    accumulators of its pixels, see :class:`PixelAccumulator`. Hence,
+    memory is bounded by *max_workers* blocks and accumulators, and no
+    dask graph spanning the whole time axis is built. Further dimensions,
+    such as ``hour``, are reduced together with ``time``.
+
+    If *checkpoint_dir* is given, the accumulators of each tile are saved
+    there after each block, and a repeated call with the same arguments
+    resumes from them. The folder is removed when the statistics are
+    complete.
+
+    Args:
+        ds: Dataset with the dimensions ``time``, ``lat`` and ``lon``, e.g.
+            the full-resolution cube or a preloaded cube, already subset to
+            the requested time range and bbox.
+        var_names: Names of the data variables. Defaults to all data
+            variables with the dimensions ``time``, ``lat`` and ``lon``.
+        statistics: Names of the statistics, see :data:`STATISTICS`.
+        quantiles: Quantiles between 0 and 1 estimated per pixel.
+        value_range: Range of the histogram used to estimate the quantiles,
+            for all variables or per variable. Required if *quantiles* is
+            given.
+        num_bins: Number of bins of the histogram.
+        checkpoint_dir: Optional local folder of the checkpoint.
+        max_workers: Maximum number of tiles processed in parallel.
+        progress_callback: Called with the number of finished and the total
+            number of tiles after each finished tile.
+
+    Returns:
+        The dataset with the variables ``<var_name>_<statistic>`` with the
+        dimensions ``(lat, lon)``, and ``<var_name>_quantile`` with the
+        dimensions ``(quantile, lat, lon)`` if *quantiles* is given.
+
+    Raises:
+        ValueError: If the arguments are invalid or the checkpoint was
+            written with other arguments.
+    """
+    if var_names is None:
+        var_names = [
+            str(name)
+            for name, var in ds.data_vars.items()
+            if {"time", "lat", "lon"} <= set(var.dims)
+        ]
+    invalid_vars = [
+        name
+        for name in var_names
+        if name not in ds.data_vars or not {"time", "lat", "lon"} <= set(ds[name].dims)
+    ]
+    if invalid_vars:
+        raise ValueError(
+            f"Invalid variables {invalid_vars}, statistics require data "
+            f"variables with the dimensions 'time', 'lat' and 'lon'."
+        )
+    invalid_stats = [name for name in statistics if name not in STATISTICS]
+    if invalid_stats:
+        raise ValueError(
+            f"Invalid statistics {invalid_stats}, must be in {list(STATISTICS)}."
+        )
+    quantiles = list(quantiles or [])
+    if any(not 0.0 <= quantile <= 1.0 for quantile in quantiles):
+        raise ValueError("Quantiles must be between 0 and 1.")
+    value_ranges = {}
+    if quantiles:
+        if value_range is None:
+            raise ValueError("`value_range` is required to estimate quantiles.")
+        for name in var_names:
+            var_range = (
+                value_range[name] if isinstance(value_range, Mapping) else value_range
+            )
+            if var_range[0] >= var_range[1]:
+                raise ValueError(f"Invalid value range {var_range!r} of {name!r}.")
+            value_ranges[name] = tuple(float(value) for value in var_range)
+
+    # the blocks follow the chunks of the subset, which are aligned with
+    # the chunks of the source cube
+    first_var = ds[var_names[0]]
+    time_blocks = _get_blocks(first_var, "time")
+    tiles = [
+        (lat_block, lon_block)
+        for lat_block in _get_blocks(first_var, "lat")
+        for lon_block in _get_blocks(first_var, "lon")
+    ]
+    checkpoint = None
+    if checkpoint_dir is not None:
+        checkpoint = _Checkpoint(
+            checkpoint_dir,
+            dict(
+                var_names=list(var_names),
+                quantiles=quantiles,
+                value_ranges=value_ranges,
+                num_bins=num_bins if quantiles else 0,
+                time=[str(ds.time.values[0]), str(ds.time.values[-1])],
+                sizes={str(dim): size for dim, size in ds.sizes.items()},
+                num_blocks=len(time_blocks),
+            ),
+        )
+
+    shape = (ds.sizes["lat"], ds.sizes["lon"])
+    results = {
+        f"{name}_{stat}": np.full(
+            shape,
+            0 if stat == "count" else np.nan,
+            dtype=np.int64 if stat == "count" else _get_float_dtype(ds[name]),
+        )
+        for name in var_names
+        for stat in statistics
+    }
+    for name in value_ranges:
+        results[f"{name}_{QUANTILE_DIM}"] = np.full(
+            (len(quantiles), *shape), np.nan, dtype=_get_float_dtype(ds[name])
+        )
+
+    def compute_tile(tile_index: int) -> dict[str, PixelAccumulator]:
+        lat_block, lon_block = tiles[tile_index]
+        tile_shape = (
+            lat_block.stop - lat_block.start,
+            lon_block.stop - lon_block.start,
+        )
+        start_block = 0
+        accumulators = None
+        if checkpoint is not None:
+            start_block, accumulators = checkpoint.load(tile_index)
+        if accumulators is None:
+            accumulators = {
+                name: PixelAccumulator.empty(
+                    tile_shape, num_bins if name in value_ranges else 0
+                )
+                for name in var_names
+            }
+        for block_index in range(start_block, len(time_blocks)):
+            for name in var_names:
+                values = _read_block(
+                    ds[name], time_blocks[block_index], lat_block, lon_block
+                )
+                accumulators[name].update(values, value_ranges.get(name))
+            if checkpoint is not None:
+                checkpoint.save(tile_index, block_index + 1, accumulators)
+        return accumulators
+
+    num_tiles = len(tiles)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(compute_tile, tile_index): tile_index
+            for tile_index in range(num_tiles)
+        }
+        try:
+            for num_done, future in enumerate(as_completed(futures), start=1):
+                lat_block, lon_block = tiles[futures[future]]
+                for name, accumulator in future.result().items():
+                    for stat in statistics:
+                        results[f"{name}_{stat}"][lat_block, lon_block] = (
+                            accumulator.get_statistic(stat)
+                        )
+                    if name in value_ranges:
+                        results[f"{name}_{QUANTILE_DIM}"][:, lat_block, lon_block] = (
+                            accumulator.get_quantiles(quantiles, value_ranges[name])
+                        )
+                if progress_callback is not None:
+                    progress_callback(num_done, num_tiles)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    if checkpoint is not None:
+        checkpoint.remove()
+    data_vars = {}
+    for name, values in results.items():
+        var_name = name.rsplit("_", 1)[0]
+        dims = ("lat", "lon") if values.ndim == 2 else (QUANTILE_DIM, "lat", "lon")
+        data_vars[name] = (dims, values, dict(ds[var_name].attrs))
+    coords = dict(lat=ds["lat"], lon=ds["lon"])
+    if quantiles:
+        coords[QUANTILE_DIM] = quantiles
+    return xr.Dataset(
+        data_vars,
+        coords=coords,
+        attrs=dict(
+            time_coverage_start=str(ds.time.values[0]),
+            time_coverage_end=str(ds.time.values[-1]),
+        ),
+    )
+
+
+def _get_float_dtype(var: xr.DataArray) -> np.dtype:
+    return np.result_type(var.dtype, np.float32)
+
+
+def _get_blocks(var: xr.DataArray, dim: str) -> list[slice]:
+    """Split a dimension into blocks aligned with the chunks of *var*."""
+    block_sizes = var.chunksizes.get(dim) or (var.sizes[dim],)
+    blocks = []
+    start = 0
+    for block_size in block_sizes:
+        blocks.append(slice(start, start + block_size))
+        start += block_size
+    return blocks
+
+
+def _read_block(
+    var: xr.DataArray, time_block: slice, lat_block: slice, lon_block: slice
+) -> np.ndarray:
+    """Read a block of a variable as array of samples along the first axis
+    and pixels along the other two axes."""
+    block = var.isel(time=time_block, lat=lat_block, lon=lon_block)
+    block = block.transpose(..., "lat", "lon")
+    # the tiles are processed in parallel already
+    values = block.compute(scheduler="synchronous").values
+    return values.reshape((-1, *values.shape[-2:]))
+
+
+def _get_histogram(
+    values: np.ndarray, value_range: tuple[float, float], num_bins: int
+) -> np.ndarray:
+    """Count the valid samples along the first axis per bin and pixel."""
+    low, high = value_range
+    num_pixels = int(np.prod(values.shape[1:]))
+    valid = ~np.isnan(values)
+    bins = np.floor((values[valid] - low) * (num_bins / (high - low)))
+    bins = np.clip(bins, 0, num_bins - 1).astype(np.int64)
+    pixels = np.broadcast_to(
+        np.arange(num_pixels).reshape(values.shape[1:]), values.shape
+    )[valid]
+    counts = np.bincount(bins * num_pixels + pixels, minlength=num_bins * num_pixels)
+    return counts.reshape((num_bins, *values.shape[1:]))
+
+
+class _Checkpoint:
+    """Accumulators of the tiles of a statistics computation, persisted in
+    a local folder together with the arguments which determine them."""
+
+    def __init__(self, path: str, params: dict):
+        self._path = os.path.abspath(path)
+        meta_path = os.path.join(self._path, CHECKPOINT_META_FILE_NAME)
+        if os.path.isfile(meta_path):
+            with open(meta_path) as fp:
+                if json.load(fp) != params:
+                    raise ValueError(
+                        f"The checkpoint in {path!r} was written for other "
+                        f"arguments. Remove it or use another folder."
+                    )
+            LOG.info(f"Resuming statistics from checkpoint {path!r}.")
+        else:
+            os.makedirs(self._path, exist_ok=True)
+            with open(meta_path, "w") as fp:
+                json.dump(params, fp)
+
+    def load(self, tile_index: int) -> tuple[int, dict[str, PixelAccumulator] | None]:
+        """Load the number of processed time blocks and the accumulators of
+        a tile, or 0 and None if the tile has not been started."""
+        file_path = self._get_file_path(tile_index)
+        if not os.path.isfile(file_path):
+            return 0, None
+        arrays_by_var: dict[str, dict[str, np.ndarray]] = {}
+        with np.load(file_path) as npz:
+            num_blocks = int(npz["num_blocks"])
+            for key in npz.files:
+                if "/" in key:
+                    name, field_name = key.rsplit("/", 1)
+                    arrays_by_var.setdefault(name, {})[field_name] = npz[key]
+        return num_blocks, {
+            name: PixelAccumulator.from_arrays(arrays)
+            for name, arrays in arrays_by_var.items()
+        }
+
+    def save(
+        self,
+        tile_index: int,
+        num_blocks: int,
+        accumulators: Mapping[str, PixelAccumulator],
+    ) -> None:
+        """Save the accumulators of a tile after *num_blocks* time blocks,
+        replacing the former ones atomically."""
+        arrays = {
+            f"{name}/{field_name}": array
+            for name, accumulator in accumulators.items()
+            for field_name, array in accumulator.to_arrays().items()
+        }
+        fd, temp_path = tempfile.mkstemp(suffix=".npz", dir=self._path)
+        with os.fdopen(fd, "wb") as fp:
+            np.savez(fp, num_blocks=num_blocks, **arrays)
+        os.replace(temp_path, self._get_file_path(tile_index))
+
+    def remove(self) -> None:
+        shutil.rmtree(self._path, ignore_errors=True)
+
+    def _get_file_path(self, tile_index: int) -> str:
+        return os.path.join(self._path, f"tile_{tile_index}.npz")
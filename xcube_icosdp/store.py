@@ -14,8 +14,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
 
-from typing import Any, Container, Iterator, Tuple
+import os
+import posixpath
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Container, Hashable, Iterator, Sequence, Tuple
 
+import fsspec
 import icoscp_core.icos
 import numpy as np
 import pandas as pd
@@ -33,19 +39,45 @@ from xcube.core.store import (
 from xcube.util.jsonschema import (
     JsonArraySchema,
     JsonBooleanSchema,
+    JsonComplexSchema,
     JsonIntegerSchema,
+    JsonNumberSchema,
     JsonObjectSchema,
     JsonStringSchema,
 )
 
+from .aggregation import AGG_FREQS, AGG_METHODS, aggregate_time, coarsen_spatial
+from .cache import CacheStats, CubeIndex, DatasetCache, ObjectCache
+from .catalog import DescriptorCatalog
 from .constants import (
     CACHE_FOLDER_NAME,
+    CACHE_INDEX_FILE_NAME,
+    CATALOG_FILE_NAME,
+    DATA_ID_PREFIX,
     ICOSDP_DATA_OPENER_ID,
+    LOG,
+    RAW_CACHE_FOLDER_NAME,
+    SHARED_VARIABLE_NAMES,
     SPATIOTEMPORAL_PARAMS,
+    TEMP_PROCESSING_FOLDER,
+    TIME_FORMAT,
     FluxcomBaseDataIdsUri,
 )
+from .encoding import COMPRESSIONS, DEFAULT_COMPRESSION_LEVEL
+from .land import from_land_cells, is_land_only
+from .mirror import build_mirror, get_mirror_id, get_read_size, is_mirror_complete
+from .points import extract_points
 from .preload import IcosdpPreloadHandle
-from .utils import _flatten_time_hour
+from .rechunk import CHUNK_LAYOUTS, DEFAULT_MAX_MEM
+from .statistics import DEFAULT_NUM_BINS, STATISTICS, compute_statistics
+from .utils import (
+    _flatten_time_hour,
+    _get_agg_mode_sizes,
+    _get_coarsen_factor,
+    _get_snapped_slice,
+    _select_bbox,
+)
+from .virtual import VIRTUAL_EXT, open_virtual_cube
 
 
 class IcosdpDataStore(DataStore):
@@ -57,6 +89,11 @@ class IcosdpDataStore(DataStore):
         password: str = None,
         cache_store_id: str = "file",
         cache_store_params: dict = None,
+        cache_size: int = None,
+        dataset_cache_size: int = 8,
+        dataset_cache_ttl: float = 3600.0,
+        raw_cache_dir: str = RAW_CACHE_FOLDER_NAME,
+        raw_cache_size: int = 20 * 1024**3,
     ):
         self._icos_meta = None
         self._icos_data = None
@@ -71,6 +108,26 @@ class IcosdpDataStore(DataStore):
         self.cache_store: PreloadedDataStore = new_data_store(
             cache_store_id, **cache_store_params
         )
+        # index of the preloaded cubes, next to the cache root
+        self._cache_index = CubeIndex(
+            self.cache_store.fs,
+            self.cache_store.root,
+            _get_sidecar_path(self.cache_store.root, CACHE_INDEX_FILE_NAME),
+            max_size=cache_size,
+        )
+        # cache for opened datasets of the full-resolution cube
+        self._dataset_cache: DatasetCache[xr.Dataset] = DatasetCache(
+            max_size=dataset_cache_size, ttl=dataset_cache_ttl
+        )
+        # persisted catalog of dataset descriptions, next to the cache root
+        self._catalog = DescriptorCatalog(
+            self.cache_store.fs,
+            _get_sidecar_path(self.cache_store.root, CATALOG_FILE_NAME),
+        )
+        # persistent cache of raw ICOS data objects shared by all preloads
+        self._object_cache = None
+        if raw_cache_size > 0:
+            self._object_cache = ObjectCache(raw_cache_dir, max_size=raw_cache_size)
 
     @classmethod
     def get_data_store_params_schema(cls) -> JsonObjectSchema:
@@ -107,6 +164,53 @@ class IcosdpDataStore(DataStore):
                 ),
                 default=dict(root=CACHE_FOLDER_NAME, max_depth=10),
             ),
+            cache_size=JsonIntegerSchema(
+                title="Maximum total size of the preloaded datasets in bytes.",
+                description=(
+                    "Preloaded datasets are recorded in an index with their "
+                    "parameters, so that identical or covered requests reuse "
+                    "them. If the size is exceeded, the least recently used "
+                    "datasets are deleted from the cache data store. If not "
+                    "given, the size is unbounded."
+                ),
+                minimum=0,
+            ),
+            dataset_cache_size=JsonIntegerSchema(
+                title="Maximum number of cached opened datasets.",
+                description=(
+                    "Opened full-resolution datasets are kept in memory, so that "
+                    "subsequent calls of `open_data` and `describe_data` do not "
+                    "fetch the metadata and coordinates again. "
+                    "If 0, the cache is disabled."
+                ),
+                minimum=0,
+                default=8,
+            ),
+            dataset_cache_ttl=JsonNumberSchema(
+                title="Time-to-live of cached opened datasets in seconds.",
+                exclusive_minimum=0,
+                default=3600.0,
+            ),
+            raw_cache_dir=JsonStringSchema(
+                title="Local folder of the cache of raw ICOS data objects.",
+                description=(
+                    "The yearly files downloaded by `preload_data` are kept in "
+                    "this folder, addressed by their SHA-256 hash, so that "
+                    "subsequent preloads of the same files, e.g. with another "
+                    "bbox or chunking, do not download them again. The folder "
+                    "can be shared by several processes."
+                ),
+                default=RAW_CACHE_FOLDER_NAME,
+            ),
+            raw_cache_size=JsonIntegerSchema(
+                title="Maximum size of the cache of raw ICOS data objects in bytes.",
+                description=(
+                    "If exceeded, the least recently used files are removed. "
+                    "If 0, the cache is disabled."
+                ),
+                minimum=0,
+                default=20 * 1024**3,
+            ),
         )
         return JsonObjectSchema(
             properties=dict(**params),
@@ -132,24 +236,69 @@ class IcosdpDataStore(DataStore):
         return data_id in FluxcomBaseDataIdsUri.datasets.keys()
 
     def describe_data(
-        self, data_id: str, data_type: DataTypeLike = None
+        self,
+        data_id: str,
+        data_type: DataTypeLike = None,
+        agg_mode: str = "005_hourly",
     ) -> DataDescriptor:
+        """Describe a dataset without opening it.
+
+        The description is taken from a catalog persisted next to the root of
+        the cache store. If the catalog has no entry for the dataset yet, the
+        entry is built from the remote metadata once and persisted. Use
+        :meth:`refresh_catalog` to update outdated entries.
+
+        Args:
+            data_id: The data identifier.
+            data_type: The data type; must be "dataset" if given.
+            agg_mode: The aggregation mode; defaults to the full-resolution
+                dataset "005_hourly". The aggregated products published on
+                the ICOS Data Portal can be described too, e.g. "050_monthly".
+
+        Returns:
+            The dataset descriptor.
+        """
+        self._assert_has_data(data_id, data_type=data_type)
         self._assert_valid_data_type(data_type)
-        ds = self.open_data(data_id)
-        schema = self.get_open_data_params_schema(data_id=data_id)
+        self._assert_valid_agg_mode(data_id, agg_mode)
+        entry = self._catalog.get(data_id, agg_mode)
+        if entry is None:
+            entry = self._build_catalog_entry(data_id, agg_mode)
+            self._catalog.put(data_id, agg_mode, entry)
+        if agg_mode == "005_hourly":
+            schema = self.get_open_data_params_schema(data_id=data_id)
+        else:
+            schema = self.get_preload_data_params_schema()
         return DatasetDescriptor(
             data_id,
             crs="EPSG:4326",
             bbox=(-180, -90, 180, 90),
-            time_range=(
-                pd.to_datetime(ds.time[0].item()).strftime("%Y-%m-%dT%H:%M:%SZ"),
-                pd.to_datetime(ds.time[-1].item()).strftime("%Y-%m-%dT%H:%M:%SZ"),
-            ),
-            dims={str(k): int(v) for k, v in ds.sizes.items()},
-            attrs=ds.attrs,
+            time_range=tuple(entry["time_range"]),
+            dims=entry["dims"],
+            attrs=entry["attrs"],
             open_params_schema=schema,
         )
 
+    def refresh_catalog(self, *data_ids: str, agg_modes: Container[str] = None) -> None:
+        """Rebuild the catalog entries of the given datasets from the remote
+        metadata and persist them.
+
+        Args:
+            data_ids: The data identifiers to refresh. If not given, all
+                datasets of the store are refreshed.
+            agg_modes: The aggregation modes to refresh. If not given, all
+                aggregation modes are refreshed.
+        """
+        for data_id in data_ids or self.get_data_ids():
+            self._assert_has_data(data_id)
+            for agg_mode in FluxcomBaseDataIdsUri.datasets[data_id].agg_mode:
+                if agg_modes is not None and agg_mode not in agg_modes:
+                    continue
+                if agg_mode == "005_hourly":
+                    self._dataset_cache.invalidate(data_id)
+                entry = self._build_catalog_entry(data_id, agg_mode)
+                self._catalog.put(data_id, agg_mode, entry)
+
     def get_data_opener_ids(
         self, data_id: str = None, data_type: DataTypeLike = None
     ) -> Tuple[str, ...]:
@@ -159,6 +308,17 @@ class IcosdpDataStore(DataStore):
         self, data_id: str = None, opener_id: str = None
     ) -> JsonObjectSchema:
         params = dict(
+            variables=JsonArraySchema(
+                title="FLUXCOM-X-BASE variables of the dataset",
+                description=(
+                    "If given, the listed variables are opened concurrently and "
+                    "merged into one dataset instead of the variable of "
+                    "`data_id`. Coordinates are read only once and shared by "
+                    "all variables."
+                ),
+                items=JsonStringSchema(enum=_get_variable_names()),
+                min_items=1,
+            ),
             flatten_time=JsonBooleanSchema(
                 title="Flatten time and hour dimensions",
                 description=(
@@ -167,6 +327,33 @@ class IcosdpDataStore(DataStore):
                 ),
                 default=False,
             ),
+            agg_freq=JsonStringSchema(
+                title="Temporal aggregation of the hourly data",
+                description=(
+                    "If given, the hourly data is aggregated lazily to daily or "
+                    "monthly values, or to the diurnal cycle of each month "
+                    "('monthlycycle'), using `agg_method`. Only the requested "
+                    "subset is read when the result is computed."
+                ),
+                enum=list(AGG_FREQS),
+            ),
+            agg_method=JsonStringSchema(
+                title="Aggregation method used with `agg_freq`",
+                enum=list(AGG_METHODS),
+                default="mean",
+            ),
+            spatial_res=JsonNumberSchema(
+                title="Target spatial resolution in degree",
+                description=(
+                    "If given, the 0.05° grid is coarsened lazily to this "
+                    "resolution, which must be an integer multiple of 0.05°, "
+                    "e.g. 0.25 or 0.5. Each coarse cell is the mean of the "
+                    "source cells weighted by `land_fraction`. The bbox is "
+                    "widened to whole coarse cells of the global grid."
+                ),
+                minimum=0.05,
+                maximum=180,
+            ),
         )
         params.update(SPATIOTEMPORAL_PARAMS)
         return JsonObjectSchema(
@@ -188,12 +375,32 @@ class IcosdpDataStore(DataStore):
         schema = self.get_open_data_params_schema(data_id=data_id, opener_id=opener_id)
         schema.validate_instance(open_params)
 
-        ds = xr.open_dataset(
-            FluxcomBaseDataIdsUri.datasets[data_id].agg_mode["005_hourly"],
-            engine="zarr",
-            chunks={},
-        )
-        ds = ds.unify_chunks()
+        factor = 1
+        if "spatial_res" in open_params:
+            try:
+                factor = _get_coarsen_factor(open_params["spatial_res"])
+            except ValueError as e:
+                raise DataStoreError(f"{e}") from e
+
+        data_ids = [data_id]
+        if "variables" in open_params:
+            # unique data IDs in the order of the variables
+            data_ids = list(
+                dict.fromkeys(
+                    f"{DATA_ID_PREFIX}{name}" for name in open_params["variables"]
+                )
+            )
+        if len(data_ids) == 1:
+            ds = self._dataset_cache.get(
+                data_ids[0], lambda: self._open_base_dataset(data_ids[0])
+            )
+        else:
+            ds = self._dataset_cache.get(
+                tuple(data_ids), lambda: self._open_merged_dataset(data_ids)
+            )
+        # shallow copy, so that callers cannot alter the cached dataset
+        ds = ds.copy()
+        ds_full = ds
         time_range = open_params.get("time_range")
         if time_range:
             dt_start = np.datetime64(time_range[0], "ns")
@@ -211,15 +418,296 @@ class IcosdpDataStore(DataStore):
                     f"Invalid bbox {bbox!r}. West must be smaller than East and "
                     f"South must be smaller than North."
                 )
-            ds = ds.sel(lat=slice(bbox[3], bbox[1]), lon=slice(bbox[0], bbox[2]))
+            if factor > 1:
+                ds = ds.isel(
+                    lat=_get_snapped_slice(ds.lat.values, bbox[1], bbox[3], factor),
+                    lon=_get_snapped_slice(ds.lon.values, bbox[0], bbox[2], factor),
+                )
+            else:
+                ds = ds.sel(lat=slice(bbox[3], bbox[1]), lon=slice(bbox[0], bbox[2]))
+        if factor > 1:
+            ds = coarsen_spatial(ds, factor)
+        elif len(data_ids) == 1:
+            ds = self._select_from_mirror(data_ids[0], ds_full, ds, time_range, bbox)
+        agg_freq = open_params.get("agg_freq")
+        if agg_freq:
+            ds = aggregate_time(ds, agg_freq, open_params.get("agg_method", "mean"))
         if open_params.get("flatten_time", False):
+            if agg_freq in ("daily", "monthly"):
+                raise DataStoreError(
+                    f"`flatten_time` is not available for `agg_freq={agg_freq!r}`, "
+                    f"since the aggregated data has no 'hour' dimension."
+                )
             ds = _flatten_time_hour(ds)
         return ds
 
+    def extract_points(
+        self,
+        data_id: str,
+        lat: Sequence[float],
+        lon: Sequence[float],
+        site_ids: Sequence[Hashable] | None = None,
+        time_range: tuple[str, str] | None = None,
+        time_ranges: Sequence[tuple[str, str]] | None = None,
+        flatten_time: bool = True,
+        max_workers: int = 8,
+    ) -> xr.Dataset:
+        """Extract the time series at a set of points, e.g. eddy-covariance
+        sites, from the full-resolution cube or a preloaded cube.
+
+        The points are mapped to the nearest grid cells in one pass and
+        grouped by chunk, so that each chunk containing points is read only
+        once. The chunks are read in parallel.
+
+        Args:
+            data_id: Either a data ID of this store, selecting the remote
+                full-resolution cube, or a data ID of a preloaded cube in
+                the cache store, e.g. "FLUXCOM-X-BASE_NEE_monthly.zarr".
+            lat: Latitudes of the points.
+            lon: Longitudes of the points.
+            site_ids: Identifiers of the points used as ``site`` coordinate.
+                Defaults to the positions of the points.
+            time_range: Optional time range ``(start, end)`` of all points.
+            time_ranges: Optional time range ``(start, end)`` per point.
+                Values outside the time range of a point are NaN. Cannot be
+                combined with *time_range*.
+            flatten_time: Whether the ``time`` and ``hour`` dimensions of the
+                full-resolution cube are merged into a single datetime axis.
+            max_workers: Maximum number of chunks read in parallel.
+
+        Returns:
+            The loaded dataset with the dimensions ``(site, time, ...)``.
+        """
+        if time_range is not None and time_ranges is not None:
+            raise DataStoreError(
+                "Only one of `time_range` and `time_ranges` can be given."
+            )
+        ds = self._open_store_or_preloaded_data(data_id)
+        if time_range is not None:
+            time_ranges = [tuple(time_range)] * len(lat)
+        if self.has_data(data_id):
+            ds = self._select_mirror_for_points(data_id, ds, lat, lon, time_ranges)
+        try:
+            ds = extract_points(
+                ds,
+                lat,
+                lon,
+                site_ids=site_ids,
+                time_ranges=time_ranges,
+                flatten_time=flatten_time,
+            )
+        except ValueError as e:
+            raise DataStoreError(f"{e}") from e
+        return ds.load(scheduler="threads", num_workers=max_workers)
+
+    def compute_statistics(
+        self,
+        data_id: str,
+        variables: Sequence[str] | None = None,
+        time_range: tuple[str, str] | None = None,
+        bbox: Sequence[float] | None = None,
+        statistics: Sequence[str] = STATISTICS,
+        quantiles: Sequence[float] | None = None,
+        value_range: tuple[float, float] | dict[str, tuple[float, float]] | None = None,
+        num_bins: int = DEFAULT_NUM_BINS,
+        checkpoint_dir: str | None = None,
+        max_workers: int = 8,
+    ) -> xr.Dataset:
+        """Compute per-pixel statistics over a time window of the
+        full-resolution cube or a preloaded cube.
+
+        Time is walked in chunk-aligned blocks, which are merged into
+        accumulators of the moments, extrema and a histogram per pixel.
+        Spatial tiles of the size of a chunk are processed in parallel, so
+        that memory stays bounded to a few chunks per worker. All values of
+        the ``time`` and ``hour`` dimensions in the window are reduced.
+
+        Args:
+            data_id: Either a data ID of this store, selecting the remote
+                full-resolution cube, or a data ID of a preloaded cube in
+                the cache store.
+            variables: Names of the data variables. Defaults to all data
+                variables with a time dimension.
+            time_range: Optional time window ``(start, end)``.
+            bbox: Optional bounding box ``[west, south, east, north]``.
+            statistics: Statistics to compute, any of "count", "mean",
+                "std", "min" and "max".
+            quantiles: Optional quantiles between 0 and 1, estimated from a
+                histogram of *num_bins* bins within *value_range*. Their
+                error is at most the width of a bin.
+            value_range: Value range of the histogram, for all variables or
+                per variable. Required if *quantiles* is given.
+            num_bins: Number of bins of the histogram.
+            checkpoint_dir: Optional local folder where the accumulators
+                are saved after each block. A repeated call with the same
+                arguments resumes from there, e.g. after an interruption.
+            max_workers: Maximum number of tiles processed in parallel.
+
+        Returns:
+            The dataset with the variables ``<variable>_<statistic>`` and
+            ``<variable>_quantile`` on the ``lat`` and ``lon`` grid.
+        """
+        if self.has_data(data_id):
+            open_params = dict(time_range=time_range, bbox=bbox)
+            ds = self.open_data(
+                data_id,
+                **{name: value for name, value in open_params.items() if value},
+            )
+        else:
+            ds = self._open_store_or_preloaded_data(data_id)
+            if time_range is not None:
+                ds = ds.sel(time=slice(time_range[0], time_range[1]))
+            if bbox is not None:
+                ds = _select_bbox(ds, bbox)
+        try:
+            return compute_statistics(
+                ds,
+                var_names=variables,
+                statistics=statistics,
+                quantiles=quantiles,
+                value_range=value_range,
+                num_bins=num_bins,
+                checkpoint_dir=checkpoint_dir,
+                max_workers=max_workers,
+            )
+        except ValueError as e:
+            raise DataStoreError(f"{e}") from e
+
+    def build_mirror(
+        self,
+        data_id: str,
+        bbox: Sequence[float],
+        time_range: tuple[str, str] | None = None,
+        max_mem: int = DEFAULT_MAX_MEM,
+        scratch_dir: str = TEMP_PROCESSING_FOLDER,
+        progress_callback: Callable[[int, int], None] | None = None,
+    ) -> str:
+        """Build a time-series-optimized mirror of a bbox of the
+        full-resolution cube in the cache store.
+
+        The mirror spans all time steps of the time range in each chunk and
+        is filled tile by tile, one spatial chunk of the source at a time,
+        so that memory stays bounded by *max_mem*. An interrupted build
+        resumes with the missing tiles when called again with the same
+        arguments. Once complete, ``open_data`` without ``spatial_res``
+        and ``extract_points`` read from the mirror whenever it covers the
+        request and fewer bytes are read than from the source.
+
+        Args:
+            data_id: Data ID of this store.
+            bbox: Bounding box ``[west, south, east, north]``, widened to
+                the spatial chunks of the full-resolution cube.
+            time_range: Optional time range ``(start, end)``. Defaults to
+                all time steps.
+            max_mem: Maximum memory of a single copy task in bytes.
+            scratch_dir: Local folder of the intermediate datasets.
+            progress_callback: Called with the number of finished and the
+                total number of tiles after each finished tile.
+
+        Returns:
+            The data ID of the mirror in the cache store.
+        """
+        self._assert_has_data(data_id)
+        if bbox[0] >= bbox[2] or bbox[1] >= bbox[3]:
+            raise DataStoreError(
+                f"Invalid bbox {bbox!r}. West must be smaller than East and "
+                f"South must be smaller than North."
+            )
+        ds = self._dataset_cache.get(data_id, lambda: self._open_base_dataset(data_id))
+        if time_range:
+            ds = ds.sel(
+                time=slice(
+                    np.datetime64(time_range[0], "ns"),
+                    np.datetime64(time_range[1], "ns"),
+                )
+            )
+            if ds.sizes["time"] == 0:
+                raise DataStoreError(
+                    f"The time range {time_range!r} does not contain any time step."
+                )
+        mirror_id = get_mirror_id(data_id)
+        os.makedirs(scratch_dir, exist_ok=True)
+        temp_dir = tempfile.mkdtemp(prefix=f"{mirror_id}_", dir=scratch_dir)
+        try:
+            build_mirror(
+                ds,
+                self.cache_store.fs,
+                f"{self.cache_store.root}/{mirror_id}",
+                bbox,
+                fsspec.filesystem("file"),
+                temp_dir,
+                max_mem=max_mem,
+                progress_callback=progress_callback,
+            )
+        except ValueError as e:
+            raise DataStoreError(f"{e}") from e
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            # the mirror is opened again with its new progress
+            self._dataset_cache.invalidate(mirror_id)
+        return mirror_id
+
+    def open_preloaded_data(self, data_id: str) -> xr.Dataset:
+        """Open a datacube preloaded into the cache store.
+
+        Unlike ``cache_store.open_data``, this also opens cubes preloaded
+        with ``target_format='virtual'``, and cubes preloaded with
+        ``land_only=True`` are opened as lazy gridded view.
+
+        Args:
+            data_id: Data ID of the preloaded cube in the cache store.
+
+        Returns:
+            The lazily opened dataset.
+        """
+        path = f"{self.cache_store.root}/{data_id}"
+        if data_id.endswith(VIRTUAL_EXT) and self.cache_store.fs.exists(path):
+            ds = open_virtual_cube(self.cache_store.fs, path)
+        elif self.cache_store.has_data(data_id):
+            ds = self.cache_store.open_data(data_id)
+            if is_land_only(ds):
+                ds = from_land_cells(ds)
+        else:
+            raise DataStoreError(
+                f"Data id {data_id!r} is not available in the cache store."
+            )
+        self._cache_index.touch(data_id)
+        return ds
+
+    def get_dataset_cache_stats(self) -> CacheStats:
+        """Get the hit, miss and coalesced counters of the cache of opened
+        datasets.
+
+        Returns:
+            Snapshot of the cache counters.
+        """
+        return self._dataset_cache.stats
+
+    def clear_dataset_cache(self) -> None:
+        """Remove all opened datasets from the cache and reset its counters."""
+        self._dataset_cache.clear()
+
+    def get_raw_cache_stats(self) -> CacheStats | None:
+        """Get the counters of the cache of raw ICOS data objects.
+
+        Returns:
+            Snapshot of the cache counters, or None if the cache is disabled.
+        """
+        if self._object_cache is None:
+            return None
+        return self._object_cache.stats
+
+    def clear_raw_cache(self) -> None:
+        """Remove all raw ICOS data objects from the cache."""
+        if self._object_cache is not None:
+            self._object_cache.clear()
+
     def preload_data(self, *data_ids: str, **preload_params) -> PreloadedDataStore:
         if not data_ids:
             raise ValueError("At least one `data_id` must be provided.")
 
+        # a dask client cannot be described by the JSON schema
+        dask_client = preload_params.pop("dask_client", None)
         schema = self.get_preload_data_params_schema()
         schema.validate_instance(preload_params)
 
@@ -235,6 +723,9 @@ class IcosdpDataStore(DataStore):
             self._icos_meta,
             self._icos_data,
             *data_ids,
+            object_cache=self._object_cache,
+            cache_index=self._cache_index,
+            dask_client=dask_client,
             **preload_params,
         )
         return self.cache_store
@@ -279,13 +770,227 @@ class IcosdpDataStore(DataStore):
             ),
             target_format=JsonStringSchema(
                 title="Format of the preloaded dataset in the cache.",
-                enum=["zarr", "netcdf"],
+                description=(
+                    "The format `virtual` keeps the downloaded yearly files "
+                    "and writes references which present them as one Zarr "
+                    "cube, without rewriting the data. The bbox and the "
+                    "flattening of the time are applied when the cube is "
+                    "opened with `open_preloaded_data`. Not available for the "
+                    "daily and hourly aggregation modes, whose yearly files "
+                    "have irregular numbers of time steps."
+                ),
+                enum=["zarr", "netcdf", "virtual"],
                 default="zarr",
             ),
-            chunks=JsonArraySchema(
-                title="Chunk sizes for each dimension of the preloaded datasets.",
-                description="An iterable with length same as number of dimensions.",
-                items=JsonIntegerSchema(),
+            chunks=JsonComplexSchema(
+                title="Chunk sizes of the preloaded datasets.",
+                description=(
+                    "Either a mapping of dimension names to chunk sizes, or an "
+                    "iterable with a chunk size for each dimension in the order "
+                    "of the dimensions of the dataset. A chunk size of -1 "
+                    "selects the full dimension."
+                ),
+                one_of=[
+                    JsonArraySchema(items=JsonIntegerSchema(minimum=-1)),
+                    JsonObjectSchema(
+                        additional_properties=JsonIntegerSchema(minimum=-1)
+                    ),
+                ],
+            ),
+            chunk_layout=JsonStringSchema(
+                title="Preset chunk layout of the preloaded datasets.",
+                description=(
+                    "'map-optimized' stores one time step per chunk for fast "
+                    "access to maps, 'timeseries-optimized' stores the whole "
+                    "time axis per chunk for fast access to time series. "
+                    "Cannot be combined with `chunks`."
+                ),
+                enum=list(CHUNK_LAYOUTS),
+            ),
+            rechunk_max_mem=JsonIntegerSchema(
+                title="Memory budget of rechunking in bytes.",
+                description=(
+                    "Rechunking to `chunks` or `chunk_layout` is split into "
+                    "stages written to the processing folder, so that copying "
+                    "a chunk needs at most this amount of memory."
+                ),
+                minimum=1024**2,
+                default=DEFAULT_MAX_MEM,
+            ),
+            max_memory=JsonIntegerSchema(
+                title="Memory budget of the preload in bytes.",
+                description=(
+                    "If given, the size of the dask chunks, the number of "
+                    "concurrent write tasks, `rechunk_max_mem` and the number "
+                    "of downloads overlapping with writing are derived from "
+                    "it. The budget is shared by the data IDs preloaded at "
+                    "the same time. The peak memory reached is reported in "
+                    "the preload metrics. Not available with `dask_client`, "
+                    "`dask_scheduler` or `dask_workers`, where the memory of "
+                    "the dask workers is limited by the cluster."
+                ),
+                minimum=16 * 1024**2,
+            ),
+            streaming=JsonBooleanSchema(
+                title="Write the datacube year by year while downloading.",
+                description=(
+                    "If enabled, each yearly file is written, or appended along "
+                    "the time dimension, to the target Zarr dataset as soon as it "
+                    "is downloaded and deleted afterwards. This bounds memory and "
+                    "scratch disk usage to a few years of data. Only available "
+                    "for `target_format='zarr'`."
+                ),
+                default=False,
+            ),
+            extend_existing=JsonBooleanSchema(
+                title="Extend an existing preloaded datacube with missing years.",
+                description=(
+                    "If enabled, a datacube recorded in the cache index, which "
+                    "was preloaded for the same variable, aggregation mode and "
+                    "parameters, is extended by appending only the missing "
+                    "years and renamed according to its new time range. If "
+                    "appending fails, the datacube is left unchanged. Only "
+                    "available for `target_format='zarr'`."
+                ),
+                default=False,
+            ),
+            dask_scheduler=JsonStringSchema(
+                title="Address of a dask scheduler running the preloads.",
+                description=(
+                    "If given, assembling, rechunking and writing the "
+                    "datacubes run on the workers of this dask distributed "
+                    "scheduler, which are shared by the preloads of all data "
+                    "IDs. Alternatively, a `distributed.Client` can be passed "
+                    "as `dask_client`. The cache store and `scratch_dir` must "
+                    "be accessible from the workers. Requires the package "
+                    "`distributed`."
+                ),
+            ),
+            dask_workers=JsonIntegerSchema(
+                title="Number of worker processes of a local dask cluster.",
+                description=(
+                    "If given, a dask distributed `LocalCluster` with this "
+                    "number of worker processes is started, which runs "
+                    "assembling, rechunking and writing the datacubes of all "
+                    "data IDs and is shut down after the last preload. "
+                    "Requires the package `distributed`."
+                ),
+                minimum=1,
+            ),
+            download_concurrency=JsonIntegerSchema(
+                title="Maximum number of concurrent downloads.",
+                description=(
+                    "The yearly files of the ICOS collection are looked up and "
+                    "downloaded in parallel using up to this number of threads."
+                ),
+                minimum=1,
+                default=4,
+            ),
+            scratch_dir=JsonStringSchema(
+                title="Local folder for the temporary files of the preloads.",
+                description=(
+                    "Each preload job downloads and assembles its files in its "
+                    "own subfolder, which is deleted when the job ends, so that "
+                    "several preloads can run concurrently. A fast local disk "
+                    "is recommended."
+                ),
+                default=TEMP_PROCESSING_FOLDER,
+            ),
+            partial_download=JsonBooleanSchema(
+                title="Read only the bbox of the yearly files remotely.",
+                description=(
+                    "If enabled and `bbox` is given, the yearly files are not "
+                    "downloaded completely. Instead, they are opened remotely "
+                    "and only the data within the bbox is read with HTTP range "
+                    "requests. The raw data cache is not used in this case."
+                ),
+                default=False,
+            ),
+            download_retries=JsonIntegerSchema(
+                title="Maximum number of retries of a failed request.",
+                description=(
+                    "Failed metadata requests and downloads are retried with "
+                    "exponential backoff."
+                ),
+                minimum=0,
+                default=3,
+            ),
+            compression=JsonStringSchema(
+                title="Compression of the preloaded datasets.",
+                description=(
+                    "`zstd` and `lz4` use the Blosc meta-compressor and are "
+                    "only available for `target_format='zarr'`. If not given, "
+                    "the default compression of the target format is used."
+                ),
+                enum=list(COMPRESSIONS),
+            ),
+            compression_level=JsonIntegerSchema(
+                title="Compression level from 1 (fastest) to 9 (smallest).",
+                minimum=1,
+                maximum=9,
+                default=DEFAULT_COMPRESSION_LEVEL,
+            ),
+            shuffle=JsonBooleanSchema(
+                title="Shuffle the bytes of the values before compression.",
+                default=True,
+            ),
+            keepbits=JsonComplexSchema(
+                title="Number of mantissa bits kept by lossy bit rounding.",
+                description=(
+                    "Either a number of bits for all data variables, or a "
+                    "mapping of variable names to numbers of bits. The "
+                    "remaining mantissa bits are set to zero, which makes "
+                    "the data compress much better. If not given, the data "
+                    "is stored without loss."
+                ),
+                one_of=[
+                    JsonIntegerSchema(minimum=0, maximum=52),
+                    JsonObjectSchema(
+                        additional_properties=JsonIntegerSchema(minimum=0, maximum=52)
+                    ),
+                ],
+            ),
+            pack_int16=JsonArraySchema(
+                title="Data variables packed into 16-bit integers.",
+                description=(
+                    "The values are stored as int16 with a scale factor and "
+                    "offset derived from the value range of each variable. "
+                    "Not available with `streaming` or `extend_existing`."
+                ),
+                items=JsonStringSchema(),
+            ),
+            land_only=JsonBooleanSchema(
+                title="Store only the land cells of the datacube.",
+                description=(
+                    "If enabled, the data variables are stored for the cells "
+                    "with a positive land fraction only, along a dimension "
+                    "`cell` with the grid indexes `lat_index` and "
+                    "`lon_index`. Use `open_preloaded_data` to open such a "
+                    "datacube as lazy gridded view. Only available for "
+                    "`target_format='zarr'` without `streaming` and "
+                    "`extend_existing`."
+                ),
+                default=False,
+            ),
+            pyramid=JsonBooleanSchema(
+                title="Write a multi-resolution pyramid of the datacube.",
+                description=(
+                    "If enabled, overviews of the datacube are written in the "
+                    "xcube multi-level dataset layout next to it, under the "
+                    "data ID with the extension `.levels`. Each level halves "
+                    "the spatial resolution, weighting the grid cells by "
+                    "their land fraction. Only available for "
+                    "`target_format='zarr'`."
+                ),
+                default=False,
+            ),
+            pyramid_levels=JsonIntegerSchema(
+                title="Number of pyramid levels including the datacube.",
+                description=(
+                    "If not given, levels are added until the coarsest level "
+                    "fits into a single spatial chunk of the datacube."
+                ),
+                minimum=2,
             ),
         )
         params.update(SPATIOTEMPORAL_PARAMS)
@@ -311,6 +1016,196 @@ class IcosdpDataStore(DataStore):
         )
 
     # Auxiliary functions
+    def _open_store_or_preloaded_data(self, data_id: str) -> xr.Dataset:
+        if self.has_data(data_id):
+            return self._dataset_cache.get(
+                data_id, lambda: self._open_base_dataset(data_id)
+            )
+        if self.cache_store.has_data(data_id) or data_id.endswith(VIRTUAL_EXT):
+            return self.open_preloaded_data(data_id)
+        raise DataStoreError(
+            f"Data id {data_id!r} is neither available in the store nor "
+            f"in the cache store."
+        )
+
+    def _get_mirror(self, data_id: str) -> xr.Dataset | None:
+        """Get the complete mirror of the full-resolution cube *data_id*, or
+        None if there is no such mirror in the cache store."""
+        mirror_id = get_mirror_id(data_id)
+        if not self.cache_store.has_data(mirror_id):
+            return None
+        ds = self._dataset_cache.get(
+            mirror_id, lambda: self.cache_store.open_data(mirror_id)
+        )
+        return ds if is_mirror_complete(ds) else None
+
+    def _select_from_mirror(
+        self,
+        data_id: str,
+        ds_full: xr.Dataset,
+        ds: xr.Dataset,
+        time_range: tuple[str, str] | None,
+        bbox: Sequence[float] | None,
+    ) -> xr.Dataset:
+        """Select the subset *ds* of *ds_full* from the mirror of *data_id*
+        instead, if the mirror covers it and fewer bytes are read from it."""
+        ds_mirror = self._get_mirror(data_id)
+        if ds_mirror is None:
+            return ds
+        selected = ds_mirror.copy()
+        if time_range:
+            selected = selected.sel(
+                time=slice(
+                    np.datetime64(time_range[0], "ns"),
+                    np.datetime64(time_range[1], "ns"),
+                )
+            )
+        if bbox:
+            selected = selected.sel(
+                lat=slice(bbox[3], bbox[1]), lon=slice(bbox[0], bbox[2])
+            )
+        for dim in ("time", "lat", "lon"):
+            if selected.sizes[dim] == 0 or not np.array_equal(
+                selected[dim].values, ds[dim].values
+            ):
+                return ds
+        var_names = [
+            name
+            for name, var in ds.data_vars.items()
+            if var.chunks and name in selected.data_vars
+        ]
+        if not var_names:
+            return ds
+        read_size = sum(get_read_size(ds_full[name], ds[name]) for name in var_names)
+        mirror_read_size = sum(
+            get_read_size(ds_mirror[name], selected[name]) for name in var_names
+        )
+        if mirror_read_size >= read_size:
+            return ds
+        LOG.debug(f"Reading {data_id!r} from the mirror {get_mirror_id(data_id)!r}.")
+        selected.attrs = dict(ds.attrs)
+        return selected
+
+    def _select_mirror_for_points(
+        self,
+        data_id: str,
+        ds: xr.Dataset,
+        lat: Sequence[float],
+        lon: Sequence[float],
+        time_ranges: Sequence[tuple[str, str]] | None,
+    ) -> xr.Dataset:
+        """Get the mirror of *data_id* instead of its full-resolution cube
+        *ds*, if the mirror covers the points and the time window."""
+        ds_mirror = self._get_mirror(data_id)
+        if ds_mirror is None:
+            return ds
+        window = slice(None)
+        if time_ranges:
+            window = slice(
+                min(np.datetime64(t[0], "ns") for t in time_ranges),
+                max(np.datetime64(t[1], "ns") for t in time_ranges),
+            )
+        if not np.array_equal(
+            ds.time.sel(time=window).values, ds_mirror.time.sel(time=window).values
+        ):
+            return ds
+        for dim, values in (("lat", lat), ("lon", lon)):
+            values = np.asarray(values, dtype=np.float64)
+            coords = ds_mirror[dim].values
+            half_res = abs(coords[1] - coords[0]) / 2 if coords.size > 1 else 0
+            if values.size == 0 or np.any(
+                (values < coords.min() - half_res) | (values > coords.max() + half_res)
+            ):
+                return ds
+        ds_mirror = ds_mirror.copy()
+        ds_mirror.attrs = dict(ds.attrs)
+        return ds_mirror
+
+    def _build_catalog_entry(self, data_id: str, agg_mode: str) -> dict:
+        if agg_mode == "005_hourly":
+            ds = self._dataset_cache.get(
+                data_id, lambda: self._open_base_dataset(data_id)
+            )
+            return dict(
+                time_range=[
+                    pd.to_datetime(ds.time[0].item()).strftime(TIME_FORMAT),
+                    pd.to_datetime(ds.time[-1].item()).strftime(TIME_FORMAT),
+                ],
+                dims={str(k): int(v) for k, v in ds.sizes.items()},
+                attrs=ds.attrs,
+            )
+
+        icos_meta = self._icos_meta or icoscp_core.icos.meta
+        uri = FluxcomBaseDataIdsUri.datasets[data_id].agg_mode[agg_mode]
+        collection = icos_meta.get_collection_meta(uri)
+        years = sorted(
+            int(member.title.split(" ")[-1]) for member in collection.members
+        )
+        if not years:
+            raise DataStoreError(f"No data found in ICOS collection {uri!r}.")
+        return dict(
+            time_range=[
+                pd.Timestamp(years[0], 1, 1).strftime(TIME_FORMAT),
+                pd.Timestamp(years[-1], 12, 31).strftime(TIME_FORMAT),
+            ],
+            dims=_get_agg_mode_sizes(agg_mode, years),
+            attrs=dict(
+                title=collection.title,
+                description=collection.description,
+                doi=collection.doi,
+                source=uri,
+            ),
+        )
+
+    @staticmethod
+    def _open_base_dataset(
+        data_id: str, drop_variables: Sequence[str] = None
+    ) -> xr.Dataset:
+        ds = xr.open_dataset(
+            FluxcomBaseDataIdsUri.datasets[data_id].agg_mode["005_hourly"],
+            engine="zarr",
+            chunks={},
+            **(dict(drop_variables=drop_variables) if drop_variables else {}),
+        )
+        return ds.unify_chunks()
+
+    def _open_merged_dataset(self, data_ids: list[str]) -> xr.Dataset:
+        """Open the full-resolution datasets of several variables concurrently
+        and merge them. Only the first dataset is opened with coordinates, the
+        data variables of the others are added on its coordinates without
+        alignment."""
+        with ThreadPoolExecutor(max_workers=len(data_ids)) as executor:
+            first = executor.submit(
+                self._dataset_cache.get,
+                data_ids[0],
+                lambda: self._open_base_dataset(data_ids[0]),
+            )
+            others = [
+                executor.submit(
+                    self._open_base_dataset,
+                    other_id,
+                    drop_variables=SHARED_VARIABLE_NAMES,
+                )
+                for other_id in data_ids[1:]
+            ]
+            ds = first.result().copy()
+            for other_id, future in zip(data_ids[1:], others):
+                ds_other = future.result()
+                for name, var in ds_other.data_vars.items():
+                    mismatch = {
+                        dim: size
+                        for dim, size in var.sizes.items()
+                        if ds.sizes.get(dim) != size
+                    }
+                    if mismatch:
+                        raise DataStoreError(
+                            f"Variable {name!r} of {other_id!r} does not match "
+                            f"the grid of {data_ids[0]!r}, sizes {mismatch} "
+                            f"differ."
+                        )
+                    ds[name] = var.variable
+        return ds
+
     def _assert_has_data(self, data_id: str, data_type: str = None) -> None:
         if not self.has_data(data_id, data_type=data_type):
             raise DataStoreError(
@@ -331,9 +1226,36 @@ class IcosdpDataStore(DataStore):
                 f"but got {data_type!r}."
             )
 
+    @staticmethod
+    def _assert_valid_agg_mode(data_id: str, agg_mode: str) -> None:
+        agg_modes = FluxcomBaseDataIdsUri.datasets[data_id].agg_mode
+        if agg_mode not in agg_modes:
+            raise DataStoreError(
+                f"Aggregation mode must be one of {list(agg_modes)!r}, "
+                f"but got {agg_mode!r}."
+            )
+
     def _assert_valid_opener_id(self, opener_id: str) -> None:
         if opener_id is not None and opener_id is not ICOSDP_DATA_OPENER_ID:
             raise DataStoreError(
                 f"Data opener identifier must be one of "
                 f"{self.get_data_opener_ids()}, but got {opener_id!r}."
             )
+
+
+def _get_variable_names() -> list[str]:
+    return [
+        data_id.removeprefix(DATA_ID_PREFIX)
+        for data_id in FluxcomBaseDataIdsUri.datasets
+    ]
+
+
+def _get_sidecar_path(root: str, file_name: str) -> str:
+    """Get the path of a file kept next to the cache root, or within it if
+    the root has no parent, e.g. a bucket. Such files are not listed as data
+    IDs of the cache store."""
+    root = root.rstrip("/")
+    parent = posixpath.dirname(root)
+    if not parent:
+        return f"{root}/{file_name}"
+    return posixpath.join(parent, file_name)
@@ -14,20 +14,139 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
 
-import xarray as xr
+import calendar
+
+import fsspec
 import numpy as np
+import xarray as xr
 
 
 def _flatten_time_hour(ds: xr.Dataset) -> xr.Dataset:
-    times = ds["time"].values
-    hours = ds["hour"].values
-    date_times = np.array(
-        [t + np.timedelta64(int(h), "h") for t in times for h in hours],
-        dtype="datetime64[ns]",
+    """Merge the ``time`` and ``hour`` dimensions into a single datetime axis.
+
+    The datetime axis is computed by broadcasting the days against the hours,
+    and each variable is reshaped lazily without building a MultiIndex.
+    Chunks along ``time`` are kept, so that each chunk of the result covers
+    all hours of the days of one source chunk.
+    """
+    times = ds["time"].values.astype("datetime64[ns]")
+    hours = ds["hour"].values.astype("timedelta64[h]")
+    date_times = (times[:, np.newaxis] + hours[np.newaxis, :]).ravel()
+    sizes = dict(time=ds.sizes["time"], hour=ds.sizes["hour"])
+
+    variables = {}
+    for name, var in ds.variables.items():
+        if name in ("time", "hour", "hour_bnds"):
+            continue
+        if "time" in var.dims or "hour" in var.dims:
+            var = _merge_time_hour(var, sizes)
+        variables[name] = var
+    ds_flat = xr.Dataset(
+        data_vars={name: variables[name] for name in ds.data_vars},
+        coords={name: variables[name] for name in ds.coords if name in variables},
+        attrs=ds.attrs,
     )
-    ds_stacked = ds.stack({"time_new": ("time", "hour")})
-    ds_stacked = ds_stacked.drop_vars(["time_new", "time", "hour", "hour_bnds"])
-    ds_stacked = ds_stacked.rename({"time_new": "time"})
-    ds_stacked = ds_stacked.assign_coords({"time": date_times})
-    ds_stacked = ds_stacked.transpose("time", "lat", "lon", ...)
-    return ds_stacked
+    ds_flat = ds_flat.assign_coords(time=date_times)
+    dims = [dim for dim in ("time", "lat", "lon") if dim in ds_flat.dims]
+    return ds_flat.transpose(*dims, ...)
+
+
+def _merge_time_hour(var: xr.Variable, sizes: dict[str, int]) -> xr.Variable:
+    # variables with only one of both dimensions are broadcast to both
+    var = var.set_dims(sizes) if not all(dim in var.dims for dim in sizes) else var
+    other_dims = [dim for dim in var.dims if dim not in sizes]
+    var = var.transpose("time", "hour", *other_dims)
+    if var.chunks is not None:
+        # a single chunk along "hour" makes the reshape chunk-wise
+        var = var.chunk({"hour": -1})
+    data = var.data.reshape((sizes["time"] * sizes["hour"], *var.shape[2:]))
+    encoding = {
+        key: value
+        for key, value in var.encoding.items()
+        if key not in ("chunks", "chunksizes", "preferred_chunks")
+    }
+    return xr.Variable(("time", *other_dims), data, attrs=var.attrs, encoding=encoding)
+
+
+def _parse_agg_mode(agg_mode: str) -> tuple[float, str]:
+    """Split an aggregation mode such as ``"050_monthly"`` into the spatial
+    resolution in degree and the temporal frequency."""
+    spatial_res, freq = agg_mode.split("_")
+    return int(spatial_res) / 100, freq
+
+
+def _get_agg_mode_sizes(agg_mode: str, years: list[int]) -> dict[str, int]:
+    """Compute the dimension sizes of the cube of an aggregation mode which
+    covers the given years."""
+    spatial_res, freq = _parse_agg_mode(agg_mode)
+    if freq == "daily" or freq == "hourly":
+        num_times = sum(366 if calendar.isleap(year) else 365 for year in years)
+    else:
+        num_times = 12 * len(years)
+    sizes = dict(time=num_times)
+    if freq == "monthlycycle" or freq == "hourly":
+        sizes["hour"] = 24
+    sizes["lat"] = round(180 / spatial_res)
+    sizes["lon"] = round(360 / spatial_res)
+    return sizes
+
+
+def _get_coarsen_factor(spatial_res: float, source_res: float = 0.05) -> int:
+    """Get the integer factor which coarsens *source_res* to *spatial_res*,
+    or raise a ValueError if there is none."""
+    factor = round(spatial_res / source_res)
+    if factor < 1 or not np.isclose(factor * source_res, spatial_res):
+        raise ValueError(
+            f"Spatial resolution {spatial_res} must be an integer multiple "
+            f"of {source_res}."
+        )
+    return factor
+
+
+def _get_snapped_slice(
+    values: np.ndarray, low: float, high: float, factor: int
+) -> slice:
+    """Get the index slice of the coordinate *values* within [*low*, *high*],
+    widened to multiples of *factor*, so that coarse cells computed from the
+    subset coincide with those of the full grid."""
+    indexes = np.flatnonzero((values >= low) & (values <= high))
+    if not indexes.size:
+        return slice(0, 0)
+    start = indexes[0] // factor * factor
+    stop = min(len(values), -(-(indexes[-1] + 1) // factor) * factor)
+    return slice(int(start), int(stop))
+
+
+def _get_aligned_chunks(offset: int, chunk_size: int, size: int) -> tuple[int, ...]:
+    """Compute chunks of a block of *size* elements which is appended at
+    *offset* to an array with regular chunks of *chunk_size*, so that the
+    chunks of the block do not overlap the chunk boundaries of the array."""
+    first = min(size, chunk_size - offset % chunk_size)
+    chunks = [first] if first else []
+    remaining = size - first
+    chunks.extend([chunk_size] * (remaining // chunk_size))
+    if remaining % chunk_size:
+        chunks.append(remaining % chunk_size)
+    return tuple(chunks)
+
+
+def _get_zarr_store(fs: fsspec.AbstractFileSystem, path: str) -> str | fsspec.FSMap:
+    # the local filesystem does not create parent directories of chunk files
+    # if accessed via a mapper, so zarr is given the plain path instead
+    protocols = (fs.protocol,) if isinstance(fs.protocol, str) else fs.protocol
+    if "file" in protocols or "local" in protocols:
+        return path
+    return fs.get_mapper(path, create=True)
+
+
+def _drop_chunk_encoding(ds: xr.Dataset) -> xr.Dataset:
+    # chunk encodings of the source files may conflict with the dask chunks
+    ds = ds.copy()
+    for var in ds.variables.values():
+        for key in ("chunks", "chunksizes", "preferred_chunks"):
+            var.encoding.pop(key, None)
+    return ds
+
+
+def _select_bbox(ds: xr.Dataset, bbox: list[float]) -> xr.Dataset:
+    return ds.sel(lat=slice(bbox[3], bbox[1]), lon=slice(bbox[0], bbox[2]))
@@ -0,0 +1,140 @@
+# The GNU General Public License version 3
+# Copyright (C) 2025  by the xcube development team and contributors
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+
+import json
+
+import fsspec
+import xarray as xr
+
+from .utils import _flatten_time_hour, _select_bbox
+
+VIRTUAL_EXT = ".virtual"
+REFERENCES_FILE_NAME = "references.json"
+# variables up to this size are stored in the references, not read from files
+INLINE_THRESHOLD = 512
+
+
+def write_references(
+    fs: fsspec.AbstractFileSystem,
+    path: str,
+    file_names: list[str],
+    attrs: dict | None = None,
+) -> dict:
+    """Write kerchunk references which present the yearly NetCDF files in
+    the folder *path* as one Zarr dataset concatenated along time.
+
+    The references point to the files by their names relative to *path*,
+    so that the folder can be moved.
+
+    Args:
+        fs: Filesystem of the folder.
+        path: Folder containing the yearly files.
+        file_names: Names of the yearly files in temporal order.
+        attrs: Attributes added to the dataset.
+
+    Returns:
+        The written references.
+
+    Raises:
+        ValueError: If the chunks of the yearly files along time cannot be
+            combined into a regular Zarr chunk grid.
+    """
+    # imported lazily, as kerchunk loads h5py, which is only needed here
+    from kerchunk.combine import MultiZarrToZarr
+    from kerchunk.hdf import SingleHdf5ToZarr
+
+    file_refs = []
+    for file_name in file_names:
+        with fs.open(f"{path}/{file_name}", "rb") as fp:
+            file_refs.append(
+                SingleHdf5ToZarr(
+                    fp, file_name, inline_threshold=INLINE_THRESHOLD
+                ).translate()
+            )
+    time_var_names = _get_time_var_names(file_refs[0])
+    _assert_regular_time_chunks(file_refs, time_var_names)
+    refs = MultiZarrToZarr(
+        file_refs,
+        concat_dims=["time"],
+        coo_map={"time": "cf:time"},
+        identical_dims=[
+            name for name in _get_var_names(file_refs[0]) if name not in time_var_names
+        ],
+    ).translate()
+    root_attrs = json.loads(refs["refs"].get(".zattrs", "{}"))
+    root_attrs.update(attrs or {})
+    refs["refs"][".zattrs"] = json.dumps(root_attrs)
+    with fs.open(f"{path}/{REFERENCES_FILE_NAME}", "w") as fp:
+        json.dump(refs, fp)
+    return refs
+
+
+def open_virtual_cube(fs: fsspec.AbstractFileSystem, path: str) -> xr.Dataset:
+    """Open the virtual cube in the folder *path* lazily.
+
+    The bbox and the flattening of the time and hour dimensions recorded
+    in the preload parameters of the cube are applied when it is opened.
+    """
+    with fs.open(f"{path}/{REFERENCES_FILE_NAME}", "r") as fp:
+        refs = json.load(fp)
+    for ref in refs["refs"].values():
+        if isinstance(ref, list):
+            ref[0] = f"{path}/{ref[0]}"
+    protocol = fs.protocol if isinstance(fs.protocol, str) else fs.protocol[0]
+    ref_fs = fsspec.filesystem("reference", fo=refs, fs=fs, remote_protocol=protocol)
+    ds = xr.open_dataset(
+        ref_fs.get_mapper(""),
+        engine="zarr",
+        consolidated=False,
+        backend_kwargs=dict(zarr_format=2),
+        chunks={},
+    )
+    preload_params = json.loads(ds.attrs.get("icosdp_preload_params", "{}"))
+    if preload_params.get("bbox"):
+        ds = _select_bbox(ds, preload_params["bbox"])
+    if preload_params.get("flatten_time"):
+        ds = _flatten_time_hour(ds)
+    return ds
+
+
+def _get_var_names(refs: dict) -> list[str]:
+    return [key.split("/")[0] for key in refs["refs"] if key.endswith("/.zarray")]
+
+
+def _get_time_var_names(refs: dict) -> list[str]:
+    return [
+        name
+        for name in _get_var_names(refs)
+        if "time"
+        in json.loads(refs["refs"][f"{name}/.zattrs"]).get("_ARRAY_DIMENSIONS", [])
+    ]
+
+
+def _assert_regular_time_chunks(file_refs: list[dict], var_names: list[str]):
+    # Zarr requires chunks of equal size, except for the last one
+    for name in var_names:
+        arrays = [json.loads(refs["refs"][f"{name}/.zarray"]) for refs in file_refs]
+        dims = json.loads(file_refs[0]["refs"][f"{name}/.zattrs"])["_ARRAY_DIMENSIONS"]
+        axis = dims.index("time")
+        chunk_sizes = {array["chunks"][axis] for array in arrays}
+        if len(chunk_sizes) > 1 or any(
+            array["shape"][axis] % array["chunks"][axis] for array in arrays[:-1]
+        ):
+            raise ValueError(
+                f"The yearly files cannot be combined into a virtual cube, "
+                f"because the chunks of {name!r} along time are not regular. "
+                f"Use `target_format='zarr'` instead."
+            )